@@ -0,0 +1,447 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from eligibility_engine import _required_number
+from history_export import WatermarkDesatualizado, _iter_events_forward, history_generations, history_watermark
+from history_store import _diagnostic_input_from_event, _history_path
+from period_engine import ApuracaoMensal
+from regimes_vetorizados import get_tabelas_simples_compiladas
+from ruleset_loader import DEFAULT_RULESET_ID, get_eligibility_rules, get_thresholds
+
+ALERTA_FAIXA = "faixa_simples"
+ALERTA_LIMITE_SIMPLES = "limite_simples"
+ALERTA_LIMITE_PRESUMIDO = "limite_presumido"
+ALERTA_PORTE = "porte"
+
+# Observacoes mensais mantidas por empresa para a tendencia (minimos quadrados).
+JANELA_TENDENCIA = 12
+MINIMO_PONTOS = 2
+HORIZONTE_PADRAO = 6
+
+_RE_MENSAL = re.compile(r"^(\d{4})-(0[1-9]|1[0-2])$")
+_RE_TRIMESTRAL = re.compile(r"^(\d{4})-T([1-4])$")
+_RE_ANUAL = re.compile(r"^(\d{4})$")
+
+
+def mes_indice(competencia: Optional[str]) -> Optional[int]:
+    """Indice absoluto do mes (ano * 12 + mes - 1); trimestre e ano usam o ultimo mes do periodo."""
+    valor = (competencia or "").strip().upper()
+    m = _RE_MENSAL.match(valor)
+    if m:
+        return int(m.group(1)) * 12 + int(m.group(2)) - 1
+    m = _RE_TRIMESTRAL.match(valor)
+    if m:
+        return int(m.group(1)) * 12 + int(m.group(2)) * 3 - 1
+    m = _RE_ANUAL.match(valor)
+    if m:
+        return int(m.group(1)) * 12 + 11
+    return None
+
+
+def competencia_de_indice(indice: int) -> str:
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+
+@dataclass(frozen=True)
+class LimitesCompilados:
+    """Limites monitorados de um ruleset: faixas do Simples por anexo, elegibilidade e portes."""
+
+    ruleset_id: str
+    # anexo -> limites superiores das faixas, sem o teto (o teto e o limite do Simples).
+    faixas: Dict[str, np.ndarray]
+    limite_simples: float
+    limite_presumido: float
+    # (porte, limite_receita_anual) em ordem crescente.
+    portes: Tuple[Tuple[str, float], ...]
+
+    def limites_empresa(self, anexo: str) -> Tuple[np.ndarray, Tuple[Tuple[str, str], ...]]:
+        """Limites de uma empresa e o rotulo (tipo, detalhe) de cada um."""
+        limites: List[float] = []
+        rotulos: List[Tuple[str, str]] = []
+        for j, limite in enumerate(self.faixas.get(_tabela_faixas(anexo), np.empty(0)).tolist()):
+            limites.append(limite)
+            rotulos.append((ALERTA_FAIXA, f"faixa {j + 1} -> {j + 2}"))
+        limites.append(self.limite_simples)
+        rotulos.append((ALERTA_LIMITE_SIMPLES, "RBT12 acima do limite do Simples"))
+        limites.append(self.limite_presumido)
+        rotulos.append((ALERTA_LIMITE_PRESUMIDO, "receita acima do limite do Presumido"))
+        for j, (porte, limite) in enumerate(self.portes):
+            proximo = self.portes[j + 1][0] if j + 1 < len(self.portes) else "acima da tabela"
+            limites.append(limite)
+            rotulos.append((ALERTA_PORTE, f"{porte} -> {proximo}"))
+        return np.asarray(limites, dtype=np.float64), tuple(rotulos)
+
+
+_LIMITES_COMPILADOS: Dict[str, LimitesCompilados] = {}
+
+
+def _normalizar_anexo(anexo: Optional[str]) -> str:
+    return str(anexo or "").strip().upper().replace("-", "/")
+
+
+def _tabela_faixas(anexo: str) -> str:
+    # III/V: as faixas de RBT12 nao dependem do Fator R; usa a tabela do Anexo III.
+    return "III" if anexo == "III/V" else anexo
+
+
+def compilar_limites(ruleset_id: str) -> LimitesCompilados:
+    regras = get_eligibility_rules(ruleset_id)
+    limite_simples = _required_number(
+        regras.get("simples") or {}, "rbt12_max", ruleset_id, "Simples Nacional", "Nao e possivel monitorar limite do Simples"
+    )
+    limite_presumido = _required_number(
+        regras.get("presumido") or {}, "receita_anual_max", ruleset_id, "Lucro Presumido", "Nao e possivel monitorar limite do Presumido"
+    )
+
+    portes_raw = get_thresholds(ruleset_id).get("portes")
+    if not isinstance(portes_raw, list) or not all(isinstance(p, dict) for p in portes_raw):
+        raise ValueError(f"ruleset_id={ruleset_id} | arquivo=thresholds.json | chave=portes | detalhe=lista invalida")
+    portes: List[Tuple[int, str, float]] = []
+    for p in portes_raw:
+        limite = p.get("limite_receita_anual")
+        if not isinstance(limite, (int, float)) or not isinstance(p.get("porte"), str):
+            raise ValueError(f"ruleset_id={ruleset_id} | arquivo=thresholds.json | chave=portes.{p.get('porte')} | detalhe=porte ou limite invalido")
+        portes.append((int(p.get("ordem") or 0), p["porte"], float(limite)))
+    portes.sort(key=lambda p: (p[0], p[2]))
+
+    tabelas = get_tabelas_simples_compiladas(ruleset_id)
+    return LimitesCompilados(
+        ruleset_id=ruleset_id,
+        faixas={nome: tabela.limites[:-1] for nome, tabela in tabelas.anexos.items()},
+        limite_simples=limite_simples,
+        limite_presumido=limite_presumido,
+        portes=tuple((nome, limite) for _, nome, limite in portes),
+    )
+
+
+def get_limites_compilados(ruleset_id: str) -> LimitesCompilados:
+    limites = _LIMITES_COMPILADOS.get(ruleset_id)
+    if limites is None:
+        limites = _LIMITES_COMPILADOS[ruleset_id] = compilar_limites(ruleset_id)
+    return limites
+
+
+def clear_limites_compilados() -> None:
+    _LIMITES_COMPILADOS.clear()
+
+
+def inclinacao_mensal(meses: Any, valores: Any) -> np.ndarray:
+    """Inclinacao (variacao por mes) de minimos quadrados por linha; NaN ignorado, < 2 pontos -> NaN."""
+    x = np.atleast_2d(np.asarray(meses, dtype=np.float64))
+    y = np.atleast_2d(np.asarray(valores, dtype=np.float64))
+    ok = ~(np.isnan(x) | np.isnan(y))
+    n = ok.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_medio = np.where(ok, x, 0.0).sum(axis=1) / n
+        y_medio = np.where(ok, y, 0.0).sum(axis=1) / n
+        dx = np.where(ok, x - x_medio[:, None], 0.0)
+        dy = np.where(ok, y - y_medio[:, None], 0.0)
+        variancia = (dx * dx).sum(axis=1)
+        inclinacao = (dx * dy).sum(axis=1) / variancia
+    return np.where((n >= MINIMO_PONTOS) & (variancia > 0), inclinacao, np.nan)
+
+
+def meses_ate_cruzar(valor: Any, inclinacao: Any, limites: Any) -> np.ndarray:
+    """
+    Meses ate o valor projetado (valor + inclinacao x meses) ficar acima de cada limite, com a
+    mesma comparacao estrita da elegibilidade (> limite). inf quando nao cruza (tendencia nao
+    crescente, limite ja ultrapassado ou limite NaN).
+    """
+    valor = np.asarray(valor, dtype=np.float64)[..., None]
+    inclinacao = np.asarray(inclinacao, dtype=np.float64)[..., None]
+    limites = np.asarray(limites, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        meses = np.floor((limites - valor) / inclinacao) + 1.0
+    return np.where((inclinacao > 0) & (valor <= limites), meses, np.inf)
+
+
+@dataclass(frozen=True)
+class AlertaLimite:
+    chave: str
+    tipo: str
+    detalhe: str
+    limite: float
+    valor_atual: float
+    inclinacao_mensal: float
+    meses: int
+    competencia_atual: str
+    competencia_prevista: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class TendenciaEmpresa:
+    """Janela das ultimas observacoes mensais (indice do mes, receita 12 meses) de uma empresa."""
+
+    meses: List[int] = field(default_factory=list)
+    valores: List[float] = field(default_factory=list)
+    anexo: str = ""
+    ruleset_id: str = DEFAULT_RULESET_ID
+
+    def observar(self, mes: int, valor: float) -> bool:
+        """Inclui a observacao; mesmo mes substitui a anterior, mes mais antigo e ignorado."""
+        if self.meses and mes < self.meses[-1]:
+            return False
+        if self.meses and mes == self.meses[-1]:
+            self.valores[-1] = valor
+        else:
+            self.meses.append(mes)
+            self.valores.append(valor)
+            if len(self.meses) > JANELA_TENDENCIA:
+                del self.meses[0], self.valores[0]
+        return True
+
+
+@dataclass
+class VarreduraLimites:
+    eventos: int = 0
+    ignorados: int = 0
+    empresas_atualizadas: List[str] = field(default_factory=list)
+    alertas: Dict[str, List[AlertaLimite]] = field(default_factory=dict)
+
+    def resumo(self) -> Dict[str, Any]:
+        por_tipo: Dict[str, int] = {}
+        for lista in self.alertas.values():
+            for alerta in lista:
+                por_tipo[alerta.tipo] = por_tipo.get(alerta.tipo, 0) + 1
+        return {
+            "eventos": self.eventos,
+            "ignorados": self.ignorados,
+            "empresas_atualizadas": len(self.empresas_atualizadas),
+            "empresas_com_alerta": sum(1 for lista in self.alertas.values() if lista),
+            "alertas_por_tipo": por_tipo,
+        }
+
+
+def _alertas_de_linhas(
+    chaves: Sequence[str],
+    meses_atuais: np.ndarray,
+    valores: np.ndarray,
+    inclinacoes: np.ndarray,
+    limites: np.ndarray,
+    rotulos: Tuple[Tuple[str, str], ...],
+    horizonte: int,
+) -> Dict[str, List[AlertaLimite]]:
+    """Alertas (ordenados por meses) para empresas que compartilham os mesmos limites."""
+    meses = meses_ate_cruzar(valores, inclinacoes, limites)
+    resultado: Dict[str, List[AlertaLimite]] = {chave: [] for chave in chaves}
+    linhas, colunas = np.nonzero(meses <= horizonte)
+    for i, j in zip(linhas.tolist(), colunas.tolist()):
+        tipo, detalhe = rotulos[j]
+        k = int(meses[i, j])
+        resultado[chaves[i]].append(
+            AlertaLimite(
+                chave=chaves[i],
+                tipo=tipo,
+                detalhe=detalhe,
+                limite=float(limites[j]),
+                valor_atual=float(valores[i]),
+                inclinacao_mensal=float(inclinacoes[i]),
+                meses=k,
+                competencia_atual=competencia_de_indice(int(meses_atuais[i])),
+                competencia_prevista=competencia_de_indice(int(meses_atuais[i]) + k),
+            )
+        )
+    for lista in resultado.values():
+        lista.sort(key=lambda a: (a.meses, a.limite))
+    return resultado
+
+
+class MonitorLimites:
+    """
+    Alerta antecipado de limites: mantem por empresa a tendencia da receita acumulada em 12 meses
+    (RBT12; receita anual quando o evento nao traz RBT12) e sinaliza quem, na tendencia linear
+    atual, cruza faixa do Simples, limite do Simples, limite do Presumido ou porte (thresholds.json)
+    em ate `horizonte` meses. Atualizacao incremental: cada observacao recalcula so a sua empresa
+    e a leitura do historico continua do watermark (segmento + offset + geracao) da execucao anterior.
+    Estado, watermark e alertas podem ser persistidos em JSON (`estado_path`).
+    """
+
+    def __init__(self, horizonte: int = HORIZONTE_PADRAO, estado_path: Optional[str] = None) -> None:
+        if horizonte <= 0:
+            raise ValueError("horizonte deve ser maior que zero.")
+        self.horizonte = horizonte
+        self.estado_path = estado_path
+        self.tendencias: Dict[str, TendenciaEmpresa] = {}
+        self.alertas: Dict[str, List[AlertaLimite]] = {}
+        self.watermark: Optional[Dict[str, Any]] = None
+        if estado_path:
+            self._carregar_estado()
+
+    def _carregar_estado(self) -> None:
+        if not self.estado_path or not os.path.exists(self.estado_path):
+            return
+        with open(self.estado_path, "r", encoding="utf-8") as f:
+            bruto = json.load(f)
+        self.watermark = bruto.get("watermark")
+        self.tendencias = {chave: TendenciaEmpresa(**valores) for chave, valores in (bruto.get("tendencias") or {}).items()}
+        self.alertas = {chave: [AlertaLimite(**a) for a in lista] for chave, lista in (bruto.get("alertas") or {}).items()}
+
+    def salvar_estado(self) -> None:
+        if not self.estado_path:
+            return
+        diretorio = os.path.dirname(self.estado_path)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        payload = {
+            "watermark": self.watermark,
+            "tendencias": {chave: asdict(t) for chave, t in self.tendencias.items()},
+            "alertas": {chave: [a.to_dict() for a in lista] for chave, lista in self.alertas.items() if lista},
+        }
+        temporario = self.estado_path + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, sort_keys=True)
+        os.replace(temporario, self.estado_path)
+
+    def _reavaliar(self, chave: str) -> List[AlertaLimite]:
+        tendencia = self.tendencias[chave]
+        limites, rotulos = get_limites_compilados(tendencia.ruleset_id).limites_empresa(tendencia.anexo)
+        inclinacao = inclinacao_mensal([tendencia.meses], [tendencia.valores])
+        alertas = _alertas_de_linhas(
+            [chave],
+            np.asarray(tendencia.meses[-1:]),
+            np.asarray(tendencia.valores[-1:], dtype=np.float64),
+            inclinacao,
+            limites,
+            rotulos,
+            self.horizonte,
+        )[chave]
+        self.alertas[chave] = alertas
+        return alertas
+
+    def observar(
+        self,
+        chave: str,
+        competencia: str,
+        valor: float,
+        anexo: Optional[str] = None,
+        ruleset_id: Optional[str] = None,
+    ) -> List[AlertaLimite]:
+        """Registra a receita 12 meses da empresa na competencia e devolve os alertas atualizados."""
+        mes = mes_indice(competencia)
+        if mes is None:
+            raise ValueError(f"Competencia invalida para monitoramento de limites: {competencia}.")
+        tendencia = self.tendencias.setdefault(chave, TendenciaEmpresa())
+        if anexo:
+            tendencia.anexo = _normalizar_anexo(anexo)
+        if ruleset_id:
+            tendencia.ruleset_id = ruleset_id
+        if not tendencia.observar(mes, float(valor)):
+            return self.alertas.get(chave, [])
+        return self._reavaliar(chave)
+
+    def _eventos_desde_watermark(self, caminho: str) -> Iterator[Tuple[str, int, Dict[str, Any]]]:
+        """
+        Eventos apos o watermark. Se ele nao vale mais (segmento compactado/removido), rele o
+        historico desde o inicio: reobservar e idempotente (mesmo mes substitui, mes antigo e ignorado).
+        """
+        eventos = _iter_events_forward(caminho, self.watermark)
+        try:
+            primeiro = next(eventos, None)
+        except WatermarkDesatualizado:
+            eventos = _iter_events_forward(caminho, None)
+            primeiro = next(eventos, None)
+        return chain([primeiro], eventos) if primeiro is not None else iter(())
+
+    def processar_historico(self, pasta: str = "data", arquivo: str = "history.jsonl") -> VarreduraLimites:
+        """
+        Consome os eventos gravados desde a ultima chamada (empresa = nome_empresa). Eventos sem
+        competencia ou sem receita sao ignorados. Ao final, reavalia uma vez cada empresa tocada.
+        """
+        resultado = VarreduraLimites()
+        tocadas: Dict[str, None] = {}
+        ultimo: Optional[Tuple[str, int]] = None
+        caminho = _history_path(pasta=pasta, arquivo=arquivo)
+        geracoes = history_generations(caminho)
+        for segmento, offset_fim, evento in self._eventos_desde_watermark(caminho):
+            ultimo = (segmento, offset_fim)
+            resultado.eventos += 1
+            inp = _diagnostic_input_from_event(evento)
+            mes = mes_indice(inp.competencia)
+            valor = inp.rbt12 if inp.rbt12 is not None else inp.receita_anual
+            if mes is None or not inp.nome_empresa or not valor or valor <= 0:
+                resultado.ignorados += 1
+                continue
+            tendencia = self.tendencias.setdefault(inp.nome_empresa, TendenciaEmpresa())
+            if inp.anexo_simples:
+                tendencia.anexo = _normalizar_anexo(inp.anexo_simples)
+            tendencia.ruleset_id = inp.ruleset_id or tendencia.ruleset_id
+            if tendencia.observar(mes, float(valor)):
+                tocadas[inp.nome_empresa] = None
+            else:
+                resultado.ignorados += 1
+
+        if ultimo is not None:
+            self.watermark = history_watermark(ultimo[0], ultimo[1], geracoes)
+        for chave in tocadas:
+            resultado.alertas[chave] = self._reavaliar(chave)
+        resultado.empresas_atualizadas = list(tocadas)
+        self.salvar_estado()
+        return resultado
+
+    def carregar_apuracao(self, apuracao: ApuracaoMensal, chaves: Sequence[str]) -> VarreduraLimites:
+        """
+        Carga em lote a partir do period_engine: a janela das ultimas competencias de RBT12 de
+        cada empresa substitui a tendencia anterior; alertas calculados por grupo de anexo.
+        """
+        n, m = apuracao.shape
+        if len(chaves) != n:
+            raise ValueError("chaves deve ter uma chave por empresa da apuracao.")
+        indices = [mes_indice(c) for c in apuracao.competencias]
+        if any(i is None for i in indices):
+            raise ValueError("Competencias da apuracao devem estar no formato YYYY-MM.")
+        inicio = max(0, m - JANELA_TENDENCIA)
+        meses = np.asarray(indices[inicio:], dtype=np.float64)
+        janela = apuracao.rbt12[:, inicio:]
+        inclinacoes = inclinacao_mensal(np.broadcast_to(meses, janela.shape), janela)
+
+        # Ultima competencia com atividade de cada empresa.
+        ativo = ~np.isnan(janela)
+        ultima = janela.shape[1] - 1 - np.argmax(ativo[:, ::-1], axis=1)
+        valores = janela[np.arange(n), ultima]
+        meses_atuais = meses[ultima].astype(np.int64)
+        anexo_final = apuracao.anexo[np.arange(n), inicio + ultima]
+        limites_ruleset = get_limites_compilados(apuracao.ruleset_id)
+
+        resultado = VarreduraLimites(eventos=n * (m - inicio))
+        grupos: Dict[str, List[int]] = {}
+        for i, chave in enumerate(chaves):
+            if not ativo[i].any():
+                resultado.ignorados += 1
+                continue
+            codigo = int(anexo_final[i])
+            anexo = apuracao.anexos[codigo] if codigo >= 0 else ""
+            self.tendencias[chave] = TendenciaEmpresa(
+                meses=[int(x) for x, ok in zip(meses, ativo[i]) if ok],
+                valores=[float(v) for v, ok in zip(janela[i], ativo[i]) if ok],
+                anexo=anexo,
+                ruleset_id=apuracao.ruleset_id,
+            )
+            grupos.setdefault(anexo, []).append(i)
+
+        for anexo, linhas in grupos.items():
+            limites, rotulos = limites_ruleset.limites_empresa(anexo)
+            sel = np.asarray(linhas)
+            alertas = _alertas_de_linhas(
+                [chaves[i] for i in linhas], meses_atuais[sel], valores[sel], inclinacoes[sel], limites, rotulos, self.horizonte
+            )
+            self.alertas.update(alertas)
+            resultado.alertas.update(alertas)
+            resultado.empresas_atualizadas.extend(alertas)
+        self.salvar_estado()
+        return resultado
+
+    def alertas_ativos(self, tipo: Optional[str] = None) -> List[AlertaLimite]:
+        """Alertas vigentes de toda a carteira (sem recalculo), ordenados por meses ate o cruzamento."""
+        todos = [a for lista in self.alertas.values() for a in lista if tipo is None or a.tipo == tipo]
+        return sorted(todos, key=lambda a: (a.meses, a.chave, a.limite))
@@ -5,18 +5,23 @@ from typing import Any, Dict, List, Optional
 import streamlit as st
 
 from demo_config import demo_example_event, resolve_demo_mode, resolve_storage_targets
-from dto import DiagnosticInput
+from diagnostic_session import DiagnosticSession
+from dto import DiagnosticInput, DiagnosticOutput
 from file_exporter import salvar_relatorio_txt
 from history_store import (
-    append_event,
+    EventRef,
+    append_event_ref,
     build_refreshed_event,
     get_event_report_text,
-    has_audit,
-    list_events,
+    history_signature,
+    list_event_page,
+    load_event_at,
     normalize_event,
+    ref_generation,
 )
 from input_utils import validar_competencia, validar_periodicidade
 from pdf_exporter import salvar_relatorio_pdf
+from profiling import profile_from_env
 from regime_utils import (
     REGIME_CODE_SIMPLES,
     REGIME_DISPLAY_PRESUMIDO,
@@ -27,6 +32,11 @@ from ruleset_loader import DEFAULT_RULESET_ID, get_simples_tables
 from scenarios import gerar_cenarios_reforma
 from tax_engine import DiagnosticService
 
+HISTORICO_CACHE_TTL_SEGUNDOS = 30
+HISTORICO_PAGINA_TAMANHO = 25
+# Grafos de diagnostico guardados por sessao (aba): inputs ja vistos reaproveitam o calculo.
+DIAGNOSTICO_SESSAO_MAX_GRAFOS = 16
+
 
 def nome_arquivo_seguro(nome_empresa: str) -> str:
     """Gera base de nome de arquivo sem caracteres especiais."""
@@ -54,6 +64,7 @@ def _resultados_evento(evento: Dict[str, Any]) -> List[Dict[str, Any]]:
 
 
 def _historico_tabela(eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Monta tabela de listagem; aceita eventos completos ou a projecao de `list_event_page`."""
     tabela: List[Dict[str, Any]] = []
     for evento in eventos:
         tabela.append(
@@ -61,8 +72,8 @@ def _historico_tabela(eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                 "Data/Hora": evento.get("timestamp", ""),
                 "Empresa": evento.get("nome_empresa", ""),
                 "Regime": evento.get("regime", ""),
-                "Receita (R$)": round(float(evento.get("receita_anual", 0.0)), 2),
-                "Imposto atual (R$)": round(float(evento.get("imposto_atual", 0.0)), 2),
+                "Receita (R$)": round(float(evento.get("receita_anual") or 0.0), 2),
+                "Imposto atual (R$)": round(float(evento.get("imposto_atual") or 0.0), 2),
             }
         )
     return tabela
@@ -131,45 +142,155 @@ def _competencia_placeholder(periodicidade: str) -> str:
     return "YYYY (ex: 2026)"
 
 
-def _deve_exibir_refresh_legado(evento: Dict[str, Any]) -> bool:
-    texto = evento.get("relatorio_texto")
-    if not (isinstance(texto, str) and texto.strip()):
-        return False
-    tem_bloco_auditoria = "=== AUDITORIA" in texto
-    return (not has_audit(evento)) or (not tem_bloco_auditoria)
+@st.cache_resource(show_spinner=False)
+def _diagnostic_service() -> DiagnosticService:
+    """Instancia unica do service por processo Streamlit (compartilhada entre sessoes)."""
+    return DiagnosticService()
+
+
+def _sessao_diagnostico() -> DiagnosticSession:
+    """Sessao incremental por aba: edicoes so de cenarios/modo_analise reaproveitam o ultimo grafo."""
+    sessao = st.session_state.get("diagnostico_sessao")
+    if sessao is None:
+        sessao = DiagnosticSession(_diagnostic_service(), max_graphs=DIAGNOSTICO_SESSAO_MAX_GRAFOS)
+        st.session_state["diagnostico_sessao"] = sessao
+    return sessao
+
+
+@st.cache_resource(show_spinner=False)
+def _ruleset_defaults(ruleset_id: str) -> Dict[str, Any]:
+    """Defaults de UI derivados do ruleset, validados uma vez por processo."""
+    simples_tables = get_simples_tables(ruleset_id)
+    fator_r_limite_raw = simples_tables.get("fator_r_limite")
+    if not isinstance(fator_r_limite_raw, (int, float)):
+        raise ValueError(
+            f"ruleset_id={ruleset_id} | arquivo=simples_tables.json | chave=fator_r_limite | "
+            "regime=Simples Nacional | impacto=Default de fator R invalido na UI | detalhe=valor nao numerico"
+        )
+    cenarios_items = list(gerar_cenarios_reforma(ruleset_id).items())
+    if len(cenarios_items) < 3:
+        raise ValueError(
+            f"ruleset_id={ruleset_id} | arquivo=metadata.json | chave=cenarios_reforma | "
+            "regime=Todos | impacto=UI sem cenarios padrao | detalhe=menos de 3 cenarios"
+        )
+    return {
+        "fator_r_limite": float(fator_r_limite_raw),
+        "cenarios_items": cenarios_items,
+    }
+
+
+@st.cache_data(ttl=HISTORICO_CACHE_TTL_SEGUNDOS, show_spinner=False)
+def _pagina_historico(
+    pasta: str,
+    arquivo: str,
+    cursor: Optional[EventRef],
+    busca: str,
+    assinatura: Any,
+) -> Dict[str, Any]:
+    """
+    Pagina do historico (projecao de listagem) com cache TTL. `assinatura` (mtime/tamanho
+    do arquivo) entra na chave para que appends de outros processos tambem invalidem o cache.
+    """
+    with profile_from_env("app_historico"):
+        return list_event_page(
+            cursor=cursor,
+            page_size=HISTORICO_PAGINA_TAMANHO,
+            pasta=pasta,
+            arquivo=arquivo,
+            busca=busca,
+        )
+
+
+@st.cache_data(ttl=HISTORICO_CACHE_TTL_SEGUNDOS, max_entries=64, show_spinner=False)
+def _carregar_evento(pasta: str, arquivo: str, offset: EventRef, geracao: int) -> Optional[Dict[str, Any]]:
+    """`geracao` entra na chave: apos a compactacao o mesmo offset aponta para outra linha."""
+    return load_event_at(offset, pasta=pasta, arquivo=arquivo)
+
+
+def _ref_evento(pasta: str, arquivo: str, offset: EventRef, resumo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Referencia guardada no session state: offset + geracao do segmento + identidade da listagem."""
+    ref: Dict[str, Any] = {
+        "pasta": pasta,
+        "arquivo": arquivo,
+        "offset": offset,
+        "geracao": ref_generation(offset, pasta=pasta, arquivo=arquivo),
+    }
+    if resumo is not None:
+        ref["timestamp"] = resumo.get("timestamp")
+        ref["nome_empresa"] = resumo.get("nome_empresa")
+    return ref
+
+
+def _evento_por_ref(ref: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Session state guarda apenas a referencia; o evento vem sob demanda. Referencia de antes de
+    uma compactacao (geracao diferente) ou que nao bate com a listagem retorna None.
+    """
+    if not isinstance(ref, dict):
+        return None
+    pasta, arquivo = str(ref["pasta"]), str(ref["arquivo"])
+    geracao = int(ref.get("geracao") or 0)
+    if geracao != ref_generation(ref["offset"], pasta=pasta, arquivo=arquivo):
+        return None
+    evento = _carregar_evento(pasta, arquivo, ref["offset"], geracao)
+    if evento is None:
+        return None
+    for campo in ("timestamp", "nome_empresa"):
+        if ref.get(campo) is not None and evento.get(campo) != ref[campo]:
+            return None
+    return evento
+
+
+def _evento_da_sessao(chave: str) -> Optional[Dict[str, Any]]:
+    """Carrega a referencia `chave` do session state; referencia invalidada e descartada com aviso."""
+    ref = st.session_state.get(chave)
+    evento = _evento_por_ref(ref)
+    if ref is not None and evento is None:
+        for outra in (chave, "carregado_ref", "evento_aberto_ref"):
+            if st.session_state.get(outra) == ref:
+                st.session_state[outra] = None
+        st.warning("A analise selecionada mudou de posicao no historico (compactacao). Selecione-a novamente.")
+    return evento
+
+
+def _append_historico(evento: Dict[str, Any], pasta: str, arquivo: str) -> Dict[str, Any]:
+    offset = append_event_ref(evento, pasta=pasta, arquivo=arquivo)
+    _pagina_historico.clear()
+    return _ref_evento(pasta, arquivo, offset)
+
+
+def _executar_diagnostico(inp: DiagnosticInput) -> DiagnosticOutput:
+    """
+    Executa pela sessao incremental da aba (memo por sessao, nao por processo): inputs ja vistos
+    nesta aba reaproveitam o grafo e refazem so auditoria e relatorio, entao o `generated_at`
+    salvo no historico e sempre o do clique atual. Com TDE_PROFILE=1 grava profile em outputs/profiles.
+    """
+    with profile_from_env("app_diagnostico"):
+        return _sessao_diagnostico().run(inp)
 
 
 st.set_page_config(page_title="Tax Diagnostic Engine", layout="wide")
 st.title("Tax Diagnostic Engine")
 st.caption("Diagnostico tributario continuo (MVP v1) para apoio a decisao.")
 
-service = DiagnosticService()
-simples_tables_default = get_simples_tables(DEFAULT_RULESET_ID)
-fator_r_limite_default_raw = simples_tables_default.get("fator_r_limite")
-if not isinstance(fator_r_limite_default_raw, (int, float)):
-    raise ValueError(
-        f"ruleset_id={DEFAULT_RULESET_ID} | arquivo=simples_tables.json | chave=fator_r_limite | "
-        "regime=Simples Nacional | impacto=Default de fator R invalido na UI | detalhe=valor nao numerico"
-    )
-fator_r_limite_default = float(fator_r_limite_default_raw)
-cenarios_default_ruleset = gerar_cenarios_reforma(DEFAULT_RULESET_ID)
-cenarios_default_items = list(cenarios_default_ruleset.items())
-if len(cenarios_default_items) < 3:
-    raise ValueError(
-        f"ruleset_id={DEFAULT_RULESET_ID} | arquivo=metadata.json | chave=cenarios_reforma | "
-        "regime=Todos | impacto=UI sem cenarios padrao | detalhe=menos de 3 cenarios"
-    )
+ruleset_defaults = _ruleset_defaults(DEFAULT_RULESET_ID)
+fator_r_limite_default = ruleset_defaults["fator_r_limite"]
+cenarios_default_items = ruleset_defaults["cenarios_items"]
 
 if "carregado" not in st.session_state:
     st.session_state["carregado"] = None
+if "carregado_ref" not in st.session_state:
+    st.session_state["carregado_ref"] = None
 if "ultimo_out" not in st.session_state:
     st.session_state["ultimo_out"] = None
-if "evento_aberto" not in st.session_state:
-    st.session_state["evento_aberto"] = None
+if "evento_aberto_ref" not in st.session_state:
+    st.session_state["evento_aberto_ref"] = None
 if "demo_toggle" not in st.session_state:
     st.session_state["demo_toggle"] = False
+if "historico_cursores" not in st.session_state:
+    st.session_state["historico_cursores"] = [None]
 
-carregado = normalize_event(st.session_state["carregado"] or {})
+carregado = normalize_event(st.session_state["carregado"] or _evento_da_sessao("carregado_ref") or {})
 nome_default = carregado.get("nome_empresa", "")
 receita_default = float(carregado.get("receita_anual", 0.0))
 regime_default = carregado.get("regime", REGIME_DISPLAY_SIMPLES)
@@ -219,19 +340,22 @@ with st.sidebar:
 
         if st.button("Carregar Exemplo - Simples Nacional", use_container_width=True, key="demo_exemplo_simples"):
             st.session_state["carregado"] = normalize_event(demo_example_event("simples"))
-            st.session_state["evento_aberto"] = None
+            st.session_state["carregado_ref"] = None
+            st.session_state["evento_aberto_ref"] = None
             st.session_state["ultimo_out"] = None
             st.rerun()
 
         if st.button("Carregar Exemplo - Lucro Presumido", use_container_width=True, key="demo_exemplo_presumido"):
             st.session_state["carregado"] = normalize_event(demo_example_event("presumido"))
-            st.session_state["evento_aberto"] = None
+            st.session_state["carregado_ref"] = None
+            st.session_state["evento_aberto_ref"] = None
             st.session_state["ultimo_out"] = None
             st.rerun()
 
         if st.button("Carregar Exemplo - Lucro Real", use_container_width=True, key="demo_exemplo_real"):
             st.session_state["carregado"] = normalize_event(demo_example_event("real"))
-            st.session_state["evento_aberto"] = None
+            st.session_state["carregado_ref"] = None
+            st.session_state["evento_aberto_ref"] = None
             st.session_state["ultimo_out"] = None
             st.rerun()
 
@@ -260,14 +384,21 @@ with st.sidebar:
     st.subheader("Historico")
 
     busca = st.text_input("Buscar empresa", value="", key="historico_busca").strip().lower()
-    eventos = list_events(
-        limit=200,
-        pasta=storage_targets["history_pasta"],
-        arquivo=storage_targets["history_arquivo"],
+    if st.session_state.get("historico_busca_aplicada") != busca:
+        st.session_state["historico_busca_aplicada"] = busca
+        st.session_state["historico_cursores"] = [None]
+
+    history_pasta = storage_targets["history_pasta"]
+    history_arquivo = storage_targets["history_arquivo"]
+    cursores: List[Optional[EventRef]] = st.session_state["historico_cursores"]
+    pagina = _pagina_historico(
+        history_pasta,
+        history_arquivo,
+        cursores[-1],
+        busca,
+        history_signature(pasta=history_pasta, arquivo=history_arquivo),
     )
-
-    if busca:
-        eventos = [e for e in eventos if busca in (e.get("nome_empresa", "") or "").lower()]
+    eventos = pagina["items"]
 
     if not eventos:
         st.caption("Nenhuma analise encontrada.")
@@ -275,74 +406,102 @@ with st.sidebar:
         tabela_historico = _historico_tabela(eventos)
         st.dataframe(tabela_historico, hide_index=True, width="stretch")
 
+        p1, p2 = st.columns(2)
+        with p1:
+            if st.button("Pagina anterior", use_container_width=True, disabled=len(cursores) <= 1):
+                cursores.pop()
+                st.rerun()
+        with p2:
+            if st.button("Proxima pagina", use_container_width=True, disabled=pagina["next_cursor"] is None):
+                cursores.append(pagina["next_cursor"])
+                st.rerun()
+        st.caption(f"Pagina {len(cursores)}")
+
         opcoes = [
-            f"{idx + 1}. {e.get('timestamp', '')} | {e.get('nome_empresa', '(sem nome)')}"
+            f"{idx + 1}. {e.get('timestamp', '')} | {e.get('nome_empresa') or '(sem nome)'}"
             for idx, e in enumerate(eventos)
         ]
         escolhido = st.selectbox("Selecionar analise", options=opcoes, key="historico_select")
-        idx_escolhido = opcoes.index(escolhido)
-        evento_escolhido = normalize_event(eventos[idx_escolhido])
+        resumo_escolhido = eventos[opcoes.index(escolhido)]
+        ref_escolhido = _ref_evento(history_pasta, history_arquivo, resumo_escolhido["offset"], resumo_escolhido)
 
         c1, c2 = st.columns(2)
         with c1:
             if st.button("Abrir analise", use_container_width=True):
-                st.session_state["evento_aberto"] = evento_escolhido
-                st.session_state["carregado"] = evento_escolhido
+                st.session_state["evento_aberto_ref"] = ref_escolhido
+                st.session_state["carregado_ref"] = ref_escolhido
+                st.session_state["carregado"] = None
                 st.session_state["ultimo_out"] = None
                 st.success("Analise salva aberta.")
                 st.rerun()
         with c2:
             if st.button("Limpar", use_container_width=True):
-                st.session_state["evento_aberto"] = None
+                st.session_state["evento_aberto_ref"] = None
+                st.session_state["carregado_ref"] = None
                 st.session_state["carregado"] = None
                 st.info("Selecao limpa.")
                 st.rerun()
 
-        relatorio_salvo = get_event_report_text(evento_escolhido)
-        base_historico = nome_arquivo_seguro(evento_escolhido.get("nome_empresa", "empresa")) + "_historico"
+        # O evento completo (com relatorio) so e carregado dentro dos handlers dos botoes.
+        base_historico = nome_arquivo_seguro(resumo_escolhido.get("nome_empresa") or "empresa") + "_historico"
+        aviso_indisponivel = "Analise nao encontrada no historico (lista desatualizada). Atualize a pagina."
 
         c3, c4 = st.columns(2)
         with c3:
             if st.button("Exportar TXT salvo", use_container_width=True):
-                caminho = salvar_relatorio_txt(
-                    relatorio_salvo,
-                    nome_base=base_historico,
-                    pasta=storage_targets["outputs_txt_pasta"],
-                )
-                st.info(f"TXT salvo: {caminho}")
+                evento_escolhido = _evento_por_ref(ref_escolhido)
+                if evento_escolhido is None:
+                    st.warning(aviso_indisponivel)
+                else:
+                    caminho = salvar_relatorio_txt(
+                        get_event_report_text(evento_escolhido),
+                        nome_base=base_historico,
+                        pasta=storage_targets["outputs_txt_pasta"],
+                    )
+                    st.info(f"TXT salvo: {caminho}")
         with c4:
             if st.button("Exportar PDF salvo", use_container_width=True):
-                caminho = salvar_relatorio_pdf(
-                    relatorio_salvo,
-                    nome_base=base_historico,
-                    pasta=storage_targets["outputs_pdf_pasta"],
-                )
-                st.info(f"PDF salvo: {caminho}")
-
-        if _deve_exibir_refresh_legado(evento_escolhido):
+                evento_escolhido = _evento_por_ref(ref_escolhido)
+                if evento_escolhido is None:
+                    st.warning(aviso_indisponivel)
+                else:
+                    caminho = salvar_relatorio_pdf(
+                        get_event_report_text(evento_escolhido),
+                        nome_base=base_historico,
+                        pasta=storage_targets["outputs_pdf_pasta"],
+                    )
+                    st.info(f"PDF salvo: {caminho}")
+
+        if resumo_escolhido.get("refresh_legado"):
             if st.button("Regerar relatorio no formato atual (sem recalcular)", use_container_width=True):
-                refreshed_event = build_refreshed_event(evento_escolhido)
-                base_refresh = "relatorio_REFRESH_" + nome_arquivo_seguro(
-                    refreshed_event.get("nome_empresa", "empresa")
-                ).replace("relatorio_", "", 1)
-                caminho_txt = salvar_relatorio_txt(
-                    refreshed_event["relatorio_texto"],
-                    nome_base=base_refresh,
-                    pasta=storage_targets["outputs_txt_pasta"],
-                )
-                caminho_hist = append_event(
-                    refreshed_event,
-                    pasta=storage_targets["history_pasta"],
-                    arquivo=storage_targets["history_arquivo"],
-                )
-
-                st.session_state["evento_aberto"] = refreshed_event
-                st.session_state["carregado"] = refreshed_event
-                st.session_state["ultimo_out"] = None
-
-                st.success(f"Relatorio refresh salvo: {caminho_txt}")
-                st.info(f"Evento de refresh append no historico: {caminho_hist}")
-                st.rerun()
+                evento_escolhido = _evento_por_ref(ref_escolhido)
+                if evento_escolhido is None:
+                    st.warning(aviso_indisponivel)
+                else:
+                    refreshed_event = build_refreshed_event(evento_escolhido)
+                    base_refresh = "relatorio_REFRESH_" + nome_arquivo_seguro(
+                        refreshed_event.get("nome_empresa", "empresa")
+                    ).replace("relatorio_", "", 1)
+                    caminho_txt = salvar_relatorio_txt(
+                        refreshed_event["relatorio_texto"],
+                        nome_base=base_refresh,
+                        pasta=storage_targets["outputs_txt_pasta"],
+                    )
+                    ref_refresh = _append_historico(
+                        refreshed_event,
+                        pasta=history_pasta,
+                        arquivo=history_arquivo,
+                    )
+
+                    st.session_state["evento_aberto_ref"] = ref_refresh
+                    st.session_state["carregado_ref"] = ref_refresh
+                    st.session_state["carregado"] = None
+                    st.session_state["ultimo_out"] = None
+                    st.session_state["historico_cursores"] = [None]
+
+                    st.success(f"Relatorio refresh salvo: {caminho_txt}")
+                    st.info(f"Evento de refresh append no historico: {history_pasta}/{history_arquivo}")
+                    st.rerun()
 
 if demo_mode:
     st.warning("DEMO — não insira dados sensíveis.")
@@ -503,9 +662,9 @@ if gerar or comparar_regimes:
         cenarios=cenarios,
     )
 
-    out = service.run(inp)
+    out = _executar_diagnostico(inp)
     st.session_state["ultimo_out"] = out
-    st.session_state["evento_aberto"] = None
+    st.session_state["evento_aberto_ref"] = None
     st.success("Diagnostico gerado.")
 
 evento_exibicao: Optional[Dict[str, Any]] = None
@@ -514,9 +673,9 @@ origem_historico = False
 if st.session_state["ultimo_out"] is not None:
     evento_exibicao = normalize_event(st.session_state["ultimo_out"].to_event())
 else:
-    evento_salvo = st.session_state["evento_aberto"]
+    evento_salvo = _evento_da_sessao("evento_aberto_ref")
     if evento_salvo:
-        evento_exibicao = normalize_event(evento_salvo)
+        evento_exibicao = evento_salvo
         origem_historico = True
 
 if evento_exibicao:
@@ -555,12 +714,13 @@ if evento_exibicao:
 
     with b3:
         if not origem_historico and st.button("Salvar no historico"):
-            caminho = append_event(
+            _append_historico(
                 evento_exibicao,
                 pasta=storage_targets["history_pasta"],
                 arquivo=storage_targets["history_arquivo"],
             )
-            st.info(f"Historico atualizado: {caminho}")
+            st.session_state["historico_cursores"] = [None]
+            st.info(f"Historico atualizado: {storage_targets['history_pasta']}/{storage_targets['history_arquivo']}")
             st.rerun()
 else:
     st.info("Gere um diagnostico ou abra uma analise salva para ver resultados.")
@@ -1,5 +1,5 @@
 ﻿from datetime import date, datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from dto import DiagnosticInput
 from regime_utils import (
@@ -11,6 +11,7 @@ from regime_utils import (
     canonicalize_regime,
 )
 from ruleset_loader import DEFAULT_RULESET_ID, load_ruleset
+from stage_timing import stage
 from tools.ruleset_audit import get_integrity_summary
 
 # Mantido para compatibilidade legada; nao usar como fonte principal de ruleset atual.
@@ -75,7 +76,7 @@ def _sources_por_regime(regime_code: str, regime_model: str, ruleset_id: str) ->
     return sources
 
 
-def _resolve_ruleset_id(detalhes_regime: Dict[str, Any], inp: DiagnosticInput) -> str:
+def _requested_ruleset_id(detalhes_regime: Dict[str, Any], inp: DiagnosticInput) -> str:
     requested = None
     if isinstance(inp.ruleset_id, str) and inp.ruleset_id.strip():
         requested = inp.ruleset_id.strip()
@@ -84,17 +85,26 @@ def _resolve_ruleset_id(detalhes_regime: Dict[str, Any], inp: DiagnosticInput) -
         if isinstance(val, str) and val.strip():
             requested = val.strip()
 
-    target = requested or DEFAULT_RULESET_ID
+    return requested or DEFAULT_RULESET_ID
 
-    metadata = load_ruleset(target)
+
+def _resolve_ruleset_id(
+    detalhes_regime: Dict[str, Any],
+    inp: DiagnosticInput,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> str:
+    target = _requested_ruleset_id(detalhes_regime, inp)
+    if metadata is None:
+        metadata = load_ruleset(target)
     rid = metadata.get("ruleset_id", target)
     if not isinstance(rid, str) or not rid.strip():
         raise ValueError(f"Ruleset '{target}' invalido: ruleset_id ausente em metadata.")
     return rid.strip()
 
 
-def _load_ruleset_metadata_subset(ruleset_id: str) -> Dict[str, Any]:
-    metadata = load_ruleset(ruleset_id)
+def _load_ruleset_metadata_subset(ruleset_id: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    if metadata is None:
+        metadata = load_ruleset(ruleset_id)
     return {
         "ruleset_id": metadata.get("ruleset_id", ruleset_id),
         "vigencia_inicio": metadata.get("vigencia_inicio"),
@@ -103,8 +113,9 @@ def _load_ruleset_metadata_subset(ruleset_id: str) -> Dict[str, Any]:
     }
 
 
-def _references_from_metadata(ruleset_id: str) -> List[str]:
-    metadata = load_ruleset(ruleset_id)
+def _references_from_metadata(ruleset_id: str, metadata: Optional[Dict[str, Any]] = None) -> List[str]:
+    if metadata is None:
+        metadata = load_ruleset(ruleset_id)
     fontes = metadata.get("fontes_oficiais")
     if not isinstance(fontes, list):
         raise ValueError(f"ruleset '{ruleset_id}' invalido: fontes_oficiais ausente em metadata.json.")
@@ -126,12 +137,24 @@ def _references_from_metadata(ruleset_id: str) -> List[str]:
     return refs
 
 
-def build_audit_metadata(inp: DiagnosticInput, detalhes_regime: Dict[str, Any]) -> Dict[str, Any]:
-    """Monta metadados de auditoria para rastreabilidade do calculo no relatorio e historico."""
-    regime_info = canonicalize_regime(inp.regime, regime_code=inp.regime_code, regime_model=inp.regime_model)
+def build_audit_metadata(
+    inp: DiagnosticInput,
+    detalhes_regime: Dict[str, Any],
+    regime_info: Optional[Dict[str, str]] = None,
+    ruleset_metadata: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Monta metadados de auditoria para rastreabilidade do calculo no relatorio e historico.
+    `regime_info`/`ruleset_metadata` (metadata.json do ruleset solicitado) podem vir ja
+    resolvidos pelo grafo de avaliacao do diagnostico, evitando recanonicalizar/recarregar.
+    """
+    if regime_info is None:
+        regime_info = canonicalize_regime(inp.regime, regime_code=inp.regime_code, regime_model=inp.regime_model)
     regime_code = regime_info["regime_code"]
     regime_model = regime_info["regime_model"]
-    ruleset_id = _resolve_ruleset_id(detalhes_regime, inp)
+    ruleset_id = _resolve_ruleset_id(detalhes_regime, inp, ruleset_metadata)
+    if ruleset_metadata is None or ruleset_id != _requested_ruleset_id(detalhes_regime, inp):
+        ruleset_metadata = load_ruleset(ruleset_id)
 
     assumptions: List[str] = [
         "Valores tratados como anuais; periodicidade registrada, mas a matematica ainda e anual.",
@@ -202,7 +225,8 @@ def build_audit_metadata(inp: DiagnosticInput, detalhes_regime: Dict[str, Any])
         if status == "NEGADA":
             alerts.append("Recomendação conservadora negada por elegibilidade/insuficiência de dados.")
 
-    integrity = get_integrity_summary(ruleset_id)
+    with stage("audit_metadata.integrity"):
+        integrity = get_integrity_summary(ruleset_id)
     if integrity.get("status") != "PASS":
         alerts.append("Integridade do ruleset/baseline em FAIL. Verificar auditoria de compliance.")
 
@@ -211,12 +235,12 @@ def build_audit_metadata(inp: DiagnosticInput, detalhes_regime: Dict[str, Any])
 
     return {
         "ruleset_id": ruleset_id,
-        "ruleset_metadata": _load_ruleset_metadata_subset(ruleset_id),
+        "ruleset_metadata": _load_ruleset_metadata_subset(ruleset_id, ruleset_metadata),
         "as_of_date": date.today().isoformat(),
         "generated_at": datetime.now().isoformat(timespec="seconds"),
         "calculo_tipo": _calculo_tipo_por_regime(regime_code, regime_model),
         "sources": _sources_por_regime(regime_code, regime_model, ruleset_id),
-        "references": _references_from_metadata(ruleset_id),
+        "references": _references_from_metadata(ruleset_id, ruleset_metadata),
         "integrity": integrity,
         "assumptions": assumptions,
         "limitations": limitations,
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import math
+import os
+import random
+import sys
+from typing import Any, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from dto import DiagnosticInput
+from regime_utils import (
+    REGIME_CODE_PRESUMIDO,
+    REGIME_CODE_REAL,
+    REGIME_CODE_SIMPLES,
+    REGIME_DISPLAY_PRESUMIDO,
+    REGIME_DISPLAY_REAL,
+    REGIME_DISPLAY_SIMPLES,
+)
+
+# Distribuicoes aproximadas de uma carteira de consultoria (pesos relativos).
+REGIME_PESOS = ((REGIME_CODE_SIMPLES, 0.60), (REGIME_CODE_PRESUMIDO, 0.30), (REGIME_CODE_REAL, 0.10))
+ANEXO_PESOS = (("I", 0.25), ("II", 0.05), ("III", 0.30), ("IV", 0.05), ("V", 0.10), ("III/V", 0.25))
+ATIVIDADE_PESOS = (("Comercio", 0.40), ("Servicos (geral)", 0.40), ("Industria", 0.15), ("Outros", 0.05))
+
+LIMITE_SIMPLES = 4_800_000.0
+LIMITE_PRESUMIDO = 78_000_000.0
+
+
+def _escolher(rng: random.Random, pesos: tuple) -> str:
+    valores = [v for v, _ in pesos]
+    return rng.choices(valores, weights=[p for _, p in pesos], k=1)[0]
+
+
+def _lognormal_limitado(rng: random.Random, mediana: float, sigma: float, minimo: float, maximo: float) -> float:
+    valor = rng.lognormvariate(math.log(mediana), sigma)
+    return round(min(max(valor, minimo), maximo), 2)
+
+
+def gerar_input(rng: random.Random, idx: int) -> DiagnosticInput:
+    """Gera um DiagnosticInput sintetico com distribuicoes realistas de anexo/RBT12/margem."""
+    regime_code = _escolher(rng, REGIME_PESOS)
+    nome = f"Empresa Sintetica {idx:06d}"
+    margem = round(rng.triangular(0.02, 0.35, 0.10), 4)
+    tipo_atividade = _escolher(rng, ATIVIDADE_PESOS)
+    competencia = str(rng.choice((2025, 2026)))
+
+    if regime_code == REGIME_CODE_SIMPLES:
+        # ~2% acima do limite para exercitar bloqueios de elegibilidade.
+        teto = LIMITE_SIMPLES * 1.2 if rng.random() < 0.02 else LIMITE_SIMPLES
+        rbt12 = _lognormal_limitado(rng, 800_000.0, 0.9, 60_000.0, teto)
+        receita = round(rbt12 * rng.uniform(0.85, 1.15), 2)
+        anexo = _escolher(rng, ANEXO_PESOS)
+        folha_12m = round(rbt12 * rng.uniform(0.10, 0.45), 2) if anexo == "III/V" else None
+        return DiagnosticInput(
+            nome_empresa=nome,
+            receita_anual=receita,
+            regime=REGIME_DISPLAY_SIMPLES,
+            regime_code=REGIME_CODE_SIMPLES,
+            regime_model="tabelado",
+            rbt12=rbt12,
+            receita_base_periodo=receita,
+            anexo_simples=anexo,
+            folha_12m=folha_12m,
+            tipo_atividade=tipo_atividade,
+            margem_lucro=margem,
+            competencia=competencia,
+        )
+
+    if regime_code == REGIME_CODE_PRESUMIDO:
+        receita = _lognormal_limitado(rng, 5_000_000.0, 1.0, 300_000.0, LIMITE_PRESUMIDO)
+        return DiagnosticInput(
+            nome_empresa=nome,
+            receita_anual=receita,
+            regime=REGIME_DISPLAY_PRESUMIDO,
+            regime_code=REGIME_CODE_PRESUMIDO,
+            regime_model="padrao",
+            tipo_atividade=tipo_atividade,
+            margem_lucro=margem,
+            periodicidade=rng.choice(("trimestral", "anual")),
+            competencia=competencia if rng.random() < 0.5 else None,
+            modo_analise=rng.choice(("conservador", "estrategico")),
+        )
+
+    receita = _lognormal_limitado(rng, 30_000_000.0, 1.0, 1_000_000.0, 500_000_000.0)
+    percentual_credito = round(rng.uniform(0.2, 0.6), 4) if rng.random() < 0.5 else None
+    return DiagnosticInput(
+        nome_empresa=nome,
+        receita_anual=receita,
+        regime=REGIME_DISPLAY_REAL,
+        regime_code=REGIME_CODE_REAL,
+        regime_model="padrao",
+        tipo_atividade=tipo_atividade,
+        margem_lucro=margem,
+        percentual_credito_estimado=percentual_credito,
+        competencia=competencia,
+        modo_analise=rng.choice(("conservador", "estrategico")),
+    )
+
+
+def gerar_portfolio(n: int, seed: int = 42) -> List[DiagnosticInput]:
+    """Carteira sintetica deterministica (mesma seed => mesmos inputs)."""
+    rng = random.Random(seed)
+    return [gerar_input(rng, idx) for idx in range(n)]
+
+
+def gerar_eventos(inputs: List[DiagnosticInput]) -> List[Dict[str, Any]]:
+    """Executa o diagnostico completo para obter eventos de historico realistas."""
+    from tax_engine import DiagnosticService
+
+    service = DiagnosticService()
+    return [service.run(inp).to_event() for inp in inputs]
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence
+
+import numpy as np
+
+from dto import DiagnosticInput
+from regime_registry import MARGEM_LUCRO_PADRAO
+from regime_utils import REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL, REGIME_CODE_SIMPLES
+from regimes import _required_number, _required_object, presuncao_por_tipo_atividade
+from regimes_vetorizados import (
+    das_simples,
+    get_tabelas_simples_compiladas,
+    imposto_lucro_presumido_vetorizado,
+    imposto_lucro_real_vetorizado,
+)
+from ruleset_loader import DEFAULT_RULESET_ID, get_presumido_params, get_real_params
+from tax_engine import DiagnosticService
+
+BREAKEVEN_VARIAVEIS = ("margem_lucro", "receita_anual", "rbt12", "folha_12m")
+BREAKEVEN_REGIMES = (REGIME_CODE_SIMPLES, REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL)
+METODO_FECHADO = "fechado"
+METODO_BISSECCAO = "bisseccao"
+BISSECCAO_ITERACOES = 64
+
+
+@dataclass(frozen=True)
+class BreakevenResult:
+    """
+    Limiar por empresa (NaN = sem cruzamento no intervalo) e quem vence abaixo dele:
+    `a_vence_abaixo[i]` e True quando regime_a e estritamente mais barato logo abaixo do limiar
+    (sem cruzamento: em todo o intervalo). `metodo` indica solucao fechada ou bisseccao.
+    """
+
+    variavel: str
+    regime_a: str
+    regime_b: str
+    limiar: np.ndarray
+    a_vence_abaixo: np.ndarray
+    metodo: str
+
+
+def _opcional(valor: Any) -> float:
+    return float(valor) if valor is not None else np.nan
+
+
+class _Carteira:
+    """Entradas da carteira em colunas + parametros do ruleset, na semantica do DiagnosticService."""
+
+    def __init__(self, inputs: Sequence[DiagnosticInput], ruleset_id: str) -> None:
+        if not inputs:
+            raise ValueError("Breakeven requer ao menos uma empresa.")
+        self.ruleset_id = ruleset_id
+        self.receita = np.asarray([float(i.receita_anual) for i in inputs])
+        if not np.all(self.receita > 0):
+            raise ValueError("receita_anual deve ser maior que zero em todas as empresas.")
+        self.receita_base = np.asarray([_opcional(i.receita_base_periodo) for i in inputs])
+        self.receita_base = np.where(np.isnan(self.receita_base), self.receita, self.receita_base)
+        self.rbt12 = np.asarray([_opcional(i.rbt12) for i in inputs])
+        self.rbt12 = np.where(np.isnan(self.rbt12), self.receita, self.rbt12)
+        self.margem = np.asarray([_opcional(i.margem_lucro) for i in inputs])
+        self.margem = np.where(np.isnan(self.margem), MARGEM_LUCRO_PADRAO, self.margem)
+        self.folha = np.asarray([_opcional(i.folha_12m) for i in inputs])
+        self.fator_r = np.asarray([_opcional(i.fator_r) for i in inputs])
+        self.despesas = np.asarray([_opcional(i.despesas_creditaveis) for i in inputs])
+        self.percentual_credito = np.asarray([_opcional(i.percentual_credito_estimado) for i in inputs])
+        self.anexo = np.asarray([str(i.anexo_simples or "").strip().upper().replace("-", "/") for i in inputs], dtype=object)
+
+        self.simples = get_tabelas_simples_compiladas(ruleset_id)
+        presumido = get_presumido_params(ruleset_id)
+        regime = "Lucro Presumido"
+        numero = lambda payload, chave, arquivo, regime: _required_number(  # noqa: E731
+            payload, chave, ruleset_id=ruleset_id, arquivo=arquivo, regime=regime, impacto="Nao e possivel calcular breakeven"
+        )
+        self.presumido = {k: numero(presumido, k, "presumido_params.json", regime) for k in ("pis", "cofins", "irpj", "adicional_irpj", "csll")}
+        mapa = _required_object(
+            presumido, "percentual_presuncao", ruleset_id=ruleset_id, arquivo="presumido_params.json", regime=regime, impacto="Nao e possivel calcular breakeven"
+        )
+        limites = _required_object(
+            presumido, "limites_adicional_irpj", ruleset_id=ruleset_id, arquivo="presumido_params.json", regime=regime, impacto="Nao e possivel calcular breakeven"
+        )
+        self.percentual_presuncao = np.asarray(
+            [presuncao_por_tipo_atividade((i.tipo_atividade or "").strip() or None, mapa, fallback_key="Comercio") for i in inputs]
+        )
+        self.limite_adicional = np.asarray(
+            [numero(limites, DiagnosticService._normalizar_periodicidade(i.periodicidade), "presumido_params.json", regime) for i in inputs]
+        )
+        real = get_real_params(ruleset_id)
+        self.real = {
+            k: numero(real, k, "real_params.json", "Lucro Real") for k in ("irpj", "csll", "pis_nao_cumulativo", "cofins_nao_cumulativo")
+        }
+
+    def custo(self, regime: str, variavel: str, x: np.ndarray, linhas: np.ndarray) -> np.ndarray:
+        """Imposto do regime com `variavel` = x (shape (len(linhas), k)) e demais entradas fixas."""
+        col = lambda valores: valores[linhas][:, None]  # noqa: E731
+        receita, receita_base, rbt12 = col(self.receita), col(self.receita_base), col(self.rbt12)
+        margem, folha, fator_r = col(self.margem), col(self.folha), col(self.fator_r)
+        if variavel == "receita_anual":
+            # Receita anual varia junto com a base do periodo e o RBT12 (visao anual).
+            receita = receita_base = rbt12 = x
+        elif variavel == "rbt12":
+            rbt12 = x
+        elif variavel == "margem_lucro":
+            margem = x
+        else:
+            folha = x
+            fator_r = np.full_like(fator_r, np.nan)
+
+        if regime == REGIME_CODE_SIMPLES:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                fator = np.where(np.isnan(fator_r), folha / rbt12, fator_r)
+            return das_simples(self.simples, col(self.anexo), receita_base, rbt12, fator)
+        if regime == REGIME_CODE_PRESUMIDO:
+            p = self.presumido
+            return imposto_lucro_presumido_vetorizado(
+                receita, p["pis"], p["cofins"], col(self.percentual_presuncao), col(self.limite_adicional), p["irpj"], p["adicional_irpj"], p["csll"]
+            ) + np.zeros_like(x)
+        r = self.real
+        return imposto_lucro_real_vetorizado(
+            receita,
+            receita_base,
+            margem,
+            r["irpj"],
+            r["csll"],
+            r["pis_nao_cumulativo"],
+            r["cofins_nao_cumulativo"],
+            col(self.despesas),
+            col(self.percentual_credito),
+        ) + np.zeros_like(x)
+
+    def pontos_quebra(self, regime: str, variavel: str) -> List[np.ndarray]:
+        """Pontos onde o custo muda de trecho linear (faixas, clip em zero, adicional IRPJ, III/V, credito)."""
+        n = self.receita.size
+        pontos: List[np.ndarray] = []
+        if regime == REGIME_CODE_SIMPLES and variavel in ("receita_anual", "rbt12"):
+            for tabela in self.simples.anexos.values():
+                pontos.append(np.broadcast_to(tabela.limites, (n, tabela.limites.size)))
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    zeros = np.where(tabela.aliquotas > 0, tabela.parcelas / tabela.aliquotas, np.nan)
+                pontos.append(np.broadcast_to(zeros, (n, zeros.size)))
+            pontos.append((self.folha / self.simples.fator_r_limite)[:, None])
+        if regime == REGIME_CODE_SIMPLES and variavel == "folha_12m":
+            pontos.append((self.rbt12 * self.simples.fator_r_limite)[:, None])
+        if regime == REGIME_CODE_PRESUMIDO and variavel == "receita_anual":
+            pontos.append((self.limite_adicional / self.percentual_presuncao)[:, None])
+        if regime == REGIME_CODE_REAL and variavel == "receita_anual":
+            pontos.append(self.despesas[:, None])
+        return pontos
+
+
+def _troca(d_x: np.ndarray, d_y: np.ndarray) -> np.ndarray:
+    return ((np.sign(d_x) * np.sign(d_y)) < 0) | ((d_x == 0) & (d_y != 0))
+
+
+def _resolver(
+    diff: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    lo: np.ndarray,
+    hi: np.ndarray,
+    pontos: List[np.ndarray],
+    linear: bool,
+) -> tuple:
+    """
+    Primeiro cruzamento de diff (= custo_a - custo_b) em [lo, hi] por linha. Entre pontos de
+    quebra consecutivos [a, b] o custo e linear (solucao fechada) ou suave (bisseccao) em
+    [a+, b-]; saltos em a (faixa: rbt12 <= limite) ou em b (Fator R: fator >= limite) sao
+    detectados comparando diff nos vizinhos de ponto flutuante.
+    """
+    n = lo.size
+    linhas = np.arange(n)
+    grade = np.concatenate([lo[:, None], hi[:, None]] + [np.asarray(p, dtype=np.float64) for p in pontos], axis=1)
+    grade = np.where(np.isnan(grade) | (grade < lo[:, None]) | (grade > hi[:, None]), hi[:, None], grade)
+    grade = np.sort(grade, axis=1)
+    a, b = grade[:, :-1], grade[:, 1:]
+    a_mais = np.minimum(np.nextafter(a, np.inf), b)
+    b_menos = np.maximum(np.nextafter(b, -np.inf), a_mais)
+
+    d_a, d_am, d_bm, d_b = diff(a, linhas), diff(a_mais, linhas), diff(b_menos, linhas), diff(b, linhas)
+    valido = b > a
+    salto_a = valido & _troca(d_a, d_am)
+    interno = valido & ~salto_a & _troca(d_am, d_bm)
+    salto_b = valido & ~salto_a & ~interno & _troca(d_bm, d_b)
+    cruza = salto_a | interno | salto_b
+
+    tem = cruza.any(axis=1)
+    seg = np.argmax(cruza, axis=1)
+    limiar = np.full(n, np.nan)
+    sinal_abaixo = np.sign(d_am[:, 0])
+
+    for mascara, pos, sinal in ((salto_a, a, d_a), (salto_b, b, d_bm)):
+        e_salto = tem & mascara[linhas, seg]
+        limiar[e_salto] = pos[e_salto, seg[e_salto]]
+        sinal_abaixo = np.where(e_salto, np.sign(sinal[linhas, seg]), sinal_abaixo)
+
+    e_interno = tem & interno[linhas, seg]
+    if e_interno.any():
+        idx = linhas[e_interno]
+        s = seg[e_interno]
+        xa, xb = a_mais[idx, s], b_menos[idx, s]
+        fa, fb = d_am[idx, s], d_bm[idx, s]
+        if linear:
+            raiz = np.where(fb == fa, xa, xa - fa * (xb - xa) / np.where(fb == fa, 1.0, fb - fa))
+        else:
+            esq, dir_ = xa.copy(), xb.copy()
+            sinal_esq = np.sign(fa)
+            for _ in range(BISSECCAO_ITERACOES):
+                meio = (esq + dir_) / 2.0
+                fm = diff(meio[:, None], idx)[:, 0]
+                mesmo_lado = np.sign(fm) == sinal_esq
+                esq = np.where(mesmo_lado, meio, esq)
+                dir_ = np.where(mesmo_lado, dir_, meio)
+            raiz = np.where(fb == 0, xb, (esq + dir_) / 2.0)
+        limiar[idx] = raiz
+        sinal_abaixo[idx] = np.sign(fa)
+    return limiar, sinal_abaixo < 0
+
+
+def _ruleset_unico(inputs: Sequence[DiagnosticInput], ruleset_id: Optional[str]) -> str:
+    if ruleset_id:
+        return ruleset_id
+    ids = {DiagnosticService._resolve_ruleset_id(i) for i in inputs}
+    if len(ids) > 1:
+        raise ValueError("Breakeven em lote requer um unico ruleset_id; informe ruleset_id explicitamente.")
+    return ids.pop() if ids else DEFAULT_RULESET_ID
+
+
+def find_breakeven(
+    inputs: Sequence[DiagnosticInput],
+    regime_a: str,
+    regime_b: str,
+    variavel: str,
+    lo: Any,
+    hi: Any,
+    ruleset_id: Optional[str] = None,
+) -> BreakevenResult:
+    """
+    Valor de `variavel` (margem_lucro, receita_anual, rbt12 ou folha_12m) em [lo, hi] onde o
+    imposto de regime_a e regime_b se igualam, para cada empresa do lote, mantendo as demais
+    entradas. Trechos lineares sao resolvidos em forma fechada; o Simples em funcao do RBT12
+    (aliquota efetiva hiperbolica) usa bisseccao dentro do trecho com troca de sinal.
+    Elegibilidade nao e considerada (comparacao puramente aritmetica).
+    """
+    if variavel not in BREAKEVEN_VARIAVEIS:
+        raise ValueError(f"Variavel de breakeven invalida: {variavel}. Use: {', '.join(BREAKEVEN_VARIAVEIS)}.")
+    for regime in (regime_a, regime_b):
+        if regime not in BREAKEVEN_REGIMES:
+            raise ValueError(f"Regime de breakeven invalido: {regime}. Use: {', '.join(BREAKEVEN_REGIMES)}.")
+    if regime_a == regime_b:
+        raise ValueError("Breakeven requer dois regimes distintos.")
+
+    carteira = _Carteira(inputs, _ruleset_unico(inputs, ruleset_id))
+    n = carteira.receita.size
+    lo_arr = np.broadcast_to(np.asarray(lo, dtype=np.float64), (n,)).copy()
+    hi_arr = np.broadcast_to(np.asarray(hi, dtype=np.float64), (n,)).copy()
+    if np.any(hi_arr < lo_arr):
+        raise ValueError("Intervalo de breakeven invalido: hi < lo.")
+
+    def diff(x: np.ndarray, linhas: np.ndarray) -> np.ndarray:
+        return carteira.custo(regime_a, variavel, x, linhas) - carteira.custo(regime_b, variavel, x, linhas)
+
+    pontos = carteira.pontos_quebra(regime_a, variavel) + carteira.pontos_quebra(regime_b, variavel)
+    linear = not (variavel == "rbt12" and REGIME_CODE_SIMPLES in (regime_a, regime_b))
+    limiar, a_vence_abaixo = _resolver(diff, lo_arr, hi_arr, pontos, linear)
+    return BreakevenResult(
+        variavel=variavel,
+        regime_a=regime_a,
+        regime_b=regime_b,
+        limiar=limiar,
+        a_vence_abaixo=a_vence_abaixo,
+        metodo=METODO_FECHADO if linear else METODO_BISSECCAO,
+    )
+
+
+def breakeven_margem_real_presumido(
+    inputs: Sequence[DiagnosticInput],
+    ruleset_id: Optional[str] = None,
+    margem_max: float = 1.0,
+) -> BreakevenResult:
+    """Margem abaixo da qual o Lucro Real fica mais barato que o Presumido (forma fechada)."""
+    return find_breakeven(inputs, REGIME_CODE_REAL, REGIME_CODE_PRESUMIDO, "margem_lucro", 0.0, margem_max, ruleset_id)
+
+
+def breakeven_folha_fator_r(inputs: Sequence[DiagnosticInput], ruleset_id: Optional[str] = None) -> BreakevenResult:
+    """
+    Folha 12m a partir da qual um cliente III/V passa do Anexo V para o III
+    (folha = fator_r_limite * RBT12). Linhas fora de III/V ficam NaN. `a_vence_abaixo` e sempre
+    False: abaixo do limiar vale o Anexo V (regime_b).
+    """
+    carteira = _Carteira(inputs, _ruleset_unico(inputs, ruleset_id))
+    limiar = np.where(carteira.anexo == "III/V", carteira.rbt12 * carteira.simples.fator_r_limite, np.nan).astype(np.float64)
+    return BreakevenResult(
+        variavel="folha_12m",
+        regime_a="SIMPLES_III",
+        regime_b="SIMPLES_V",
+        limiar=limiar,
+        a_vence_abaixo=np.zeros(limiar.size, dtype=bool),
+        metodo=METODO_FECHADO,
+    )
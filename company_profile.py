@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, replace
+from typing import FrozenSet, List, Optional
 
 from dto import DiagnosticInput
 from input_utils import validar_competencia, validar_periodicidade
@@ -11,8 +11,14 @@ from ruleset_loader import DEFAULT_RULESET_ID
 MODO_CONSERVADOR = "conservador"
 MODO_ESTRATEGICO = "estrategico"
 
+# Flags estruturadas dos defaults aplicados (espelham os textos de `assumptions`).
+ASSUMPTION_COMPETENCIA_DESCARTADA = "competencia_descartada"
+ASSUMPTION_RBT12_DEFAULT = "rbt12_default"
+ASSUMPTION_RECEITA_BASE_DEFAULT = "receita_base_periodo_default"
+ASSUMPTION_MARGEM_DEFAULT = "margem_lucro_default"
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class CompanyProfile:
     nome_empresa: str
     receita_anual: float
@@ -32,6 +38,7 @@ class CompanyProfile:
     folha_12m: Optional[float]
     assumptions: List[str]
     missing_inputs: List[str]
+    assumption_flags: FrozenSet[str] = frozenset()
 
 
 def _normalize_mode(value: Optional[str]) -> str:
@@ -53,6 +60,7 @@ def normalize_company_profile(inp: DiagnosticInput) -> CompanyProfile:
 
     regime_info = canonicalize_regime(inp.regime, inp.regime_code, inp.regime_model)
     assumptions: List[str] = []
+    flags: List[str] = []
     missing_inputs: List[str] = []
 
     periodicidade = validar_periodicidade(str(inp.periodicidade or "anual"))
@@ -65,6 +73,7 @@ def normalize_company_profile(inp: DiagnosticInput) -> CompanyProfile:
             assumptions.append(
                 f"Competência inválida no input foi descartada ({comp_or_err}); metadado mantido sem competência."
             )
+            flags.append(ASSUMPTION_COMPETENCIA_DESCARTADA)
 
     ruleset_id = str(inp.ruleset_id or DEFAULT_RULESET_ID).strip() or DEFAULT_RULESET_ID
     modo_analise = _normalize_mode(inp.modo_analise)
@@ -73,6 +82,7 @@ def normalize_company_profile(inp: DiagnosticInput) -> CompanyProfile:
     if rbt12 is None:
         rbt12 = float(inp.receita_anual)
         assumptions.append("RBT12 não informado; assumido igual à receita anual para metadados/comparativo.")
+        flags.append(ASSUMPTION_RBT12_DEFAULT)
     elif rbt12 <= 0:
         raise ValueError("rbt12 deve ser maior que zero quando informado.")
 
@@ -80,6 +90,7 @@ def normalize_company_profile(inp: DiagnosticInput) -> CompanyProfile:
     if receita_base_periodo is None:
         receita_base_periodo = float(inp.receita_anual)
         assumptions.append("Receita base do período não informada; assumida igual à receita anual.")
+        flags.append(ASSUMPTION_RECEITA_BASE_DEFAULT)
     elif receita_base_periodo <= 0:
         raise ValueError("receita_base_periodo deve ser maior que zero quando informada.")
 
@@ -87,6 +98,7 @@ def normalize_company_profile(inp: DiagnosticInput) -> CompanyProfile:
     if margem_lucro is None:
         margem_lucro = 0.10
         assumptions.append("Margem de lucro não informada; assumida em 10% para análises de Lucro Real.")
+        flags.append(ASSUMPTION_MARGEM_DEFAULT)
     elif margem_lucro < 0:
         raise ValueError("margem_lucro não pode ser negativa.")
 
@@ -128,4 +140,13 @@ def normalize_company_profile(inp: DiagnosticInput) -> CompanyProfile:
         folha_12m=folha_12m,
         assumptions=assumptions,
         missing_inputs=missing_inputs,
+        assumption_flags=frozenset(flags),
     )
+
+
+def apply_modo_analise(profile: CompanyProfile, modo_analise: Optional[str]) -> CompanyProfile:
+    """Mesmo perfil com outro modo de análise (o restante da normalização não depende do modo)."""
+    modo = _normalize_mode(modo_analise)
+    if modo == profile.modo_analise:
+        return profile
+    return replace(profile, modo_analise=modo)
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import importlib
+from dataclasses import dataclass, fields
+from itertools import chain
+from operator import attrgetter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dto import DiagnosticInput, DiagnosticOutput, ScenarioResult
+from history_export import _slug
+from scenario_engine import ScenarioGrid
+from tax_engine import CLASSIFICACOES_IMPACTO, DiagnosticService
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+# Campos do DiagnosticInput guardados como float64 (None -> NaN) e como texto categorico.
+CAMPOS_NUMERICOS = tuple(f.name for f in fields(DiagnosticInput) if f.type in ("float", "Optional[float]"))
+CAMPOS_TEXTO = tuple(
+    f.name for f in fields(DiagnosticInput) if f.type in ("str", "Optional[str]") and f.name != "nome_empresa"
+)
+# Colunas por cenario em `to_pandas`/`to_arrow` (classificacao vem dos codigos da grade).
+CAMPOS_CENARIO = ("imposto_reforma", "diferenca", "impacto_percentual", "classificacao")
+_CLASSE_POR_CLASSIFICACAO = {c: idx for idx, c in enumerate(CLASSIFICACOES_IMPACTO)}
+_ATRIBUTOS = {campo: attrgetter(campo) for campo in CAMPOS_CENARIO}
+_NOME_CENARIO = attrgetter("nome_cenario")
+_RESULTADOS = attrgetter("resultados")
+_REGIME = attrgetter("regime")
+_IMPOSTO_ATUAL = attrgetter("imposto_atual")
+_NOME_EMPRESA = attrgetter("nome_empresa")
+_CENARIOS = attrgetter("cenarios")
+
+
+@dataclass(frozen=True, slots=True)
+class ColunaTexto:
+    """Texto categorico: `codigos` int32 indexa `rotulos` (-1 = None)."""
+
+    codigos: np.ndarray
+    rotulos: Tuple[str, ...]
+
+    @classmethod
+    def de_valores(cls, valores: Sequence[Optional[str]]) -> "ColunaTexto":
+        rotulos = tuple(v for v in dict.fromkeys(valores) if v is not None)
+        mapa: Dict[Optional[str], int] = {v: idx for idx, v in enumerate(rotulos)}
+        mapa[None] = -1
+        return cls(codigos=np.fromiter(map(mapa.__getitem__, valores), dtype=np.int32, count=len(valores)), rotulos=rotulos)
+
+    def __len__(self) -> int:
+        return int(self.codigos.size)
+
+    def __getitem__(self, linha: int) -> Optional[str]:
+        codigo = int(self.codigos[linha])
+        return None if codigo < 0 else self.rotulos[codigo]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codigos.nbytes)
+
+
+@dataclass(frozen=True, slots=True)
+class DiagnosticBatch:
+    """
+    Diagnosticos de um lote em colunas (struct-of-arrays): entradas (numericos em float64 com
+    NaN para ausente, textos categoricos), regime/imposto atual e a grade de cenarios
+    (`ScenarioGrid`, cenarios iguais para todo o lote). Nao guarda `detalhes_regime` nem o
+    relatorio: `lote[i]` recalcula o DiagnosticOutput completo da linha sob demanda e
+    `entrada(i)`/`resultados(i)` materializam so a entrada/os cenarios.
+    """
+
+    nome_empresa: np.ndarray
+    numericos: Dict[str, np.ndarray]
+    textos: Dict[str, ColunaTexto]
+    cenarios: np.ndarray
+    regime: ColunaTexto
+    imposto_atual: np.ndarray
+    grade: ScenarioGrid
+
+    def __len__(self) -> int:
+        return int(self.imposto_atual.size)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes dos arrays (sem os objetos str de `nome_empresa`/`cenarios`, so as referencias)."""
+        total = self.nome_empresa.nbytes + self.cenarios.nbytes + self.regime.nbytes + self.imposto_atual.nbytes
+        total += sum(a.nbytes for a in self.numericos.values()) + sum(c.nbytes for c in self.textos.values())
+        return int(total + self.grade.nbytes)
+
+    def entrada(self, linha: int) -> DiagnosticInput:
+        valores: Dict[str, Any] = {"nome_empresa": self.nome_empresa[linha], "cenarios": self.cenarios[linha]}
+        for campo, coluna in self.numericos.items():
+            valor = float(coluna[linha])
+            valores[campo] = None if np.isnan(valor) else valor
+        for campo, coluna in self.textos.items():
+            valores[campo] = coluna[linha]
+        return DiagnosticInput(**valores)
+
+    def resultados(self, linha: int) -> List[ScenarioResult]:
+        return self.grade.scenario_results(linha)
+
+    def __getitem__(self, linha: int) -> DiagnosticOutput:
+        """DiagnosticOutput completo (detalhes + relatorio) da linha, recalculado sob demanda."""
+        n = len(self)
+        if not isinstance(linha, (int, np.integer)):
+            raise TypeError("DiagnosticBatch aceita apenas indice inteiro.")
+        if linha < 0:
+            linha += n
+        if not 0 <= linha < n:
+            raise IndexError(f"linha fora do lote: {linha}")
+        return DiagnosticService().run(self.entrada(int(linha)))
+
+    def colunas_cenario(self) -> List[Tuple[str, str, int]]:
+        """(coluna, campo, indice do cenario) no padrao de nomes do export colunar do historico."""
+        return [
+            (f"cenario_{_slug(nome)}_{campo}", campo, j)
+            for j, nome in enumerate(self.grade.nomes_cenario)
+            for campo in CAMPOS_CENARIO
+        ]
+
+    def to_pandas(self) -> "pd.DataFrame":
+        """
+        DataFrame uma linha por diagnostico, montado direto dos arrays (sem objetos por linha):
+        numericos sem copia, textos/classificacao como `Categorical` sobre os codigos.
+        """
+        pd = _importar_opcional("pandas")
+        dados: Dict[str, Any] = {"nome_empresa": self.nome_empresa, **self.numericos}
+        for campo, coluna in self.textos.items():
+            dados[campo] = pd.Categorical.from_codes(coluna.codigos, categories=list(coluna.rotulos))
+        dados["regime_display"] = pd.Categorical.from_codes(self.regime.codigos, categories=list(self.regime.rotulos))
+        dados["imposto_atual"] = self.imposto_atual
+        for nome, campo, j in self.colunas_cenario():
+            if campo == "classificacao":
+                dados[nome] = pd.Categorical.from_codes(self.grade.classe[:, j], categories=list(CLASSIFICACOES_IMPACTO))
+            else:
+                dados[nome] = getattr(self.grade, campo)[:, j]
+        return pd.DataFrame(dados, copy=False)
+
+    def to_arrow(self) -> "pa.Table":
+        """Tabela Arrow com as mesmas colunas de `to_pandas` (textos como dictionary arrays)."""
+        pa = _importar_opcional("pyarrow")
+
+        def _dicionario(codigos: np.ndarray, rotulos: Sequence[str]) -> Any:
+            nulos = codigos < 0
+            indices = pa.array(codigos, mask=nulos) if nulos.any() else pa.array(codigos)
+            return pa.DictionaryArray.from_arrays(indices, pa.array(list(rotulos), type=pa.string()))
+
+        dados: Dict[str, Any] = {"nome_empresa": pa.array(self.nome_empresa, type=pa.string())}
+        dados.update({campo: pa.array(coluna) for campo, coluna in self.numericos.items()})
+        for campo, coluna in self.textos.items():
+            dados[campo] = _dicionario(coluna.codigos, coluna.rotulos)
+        dados["regime_display"] = _dicionario(self.regime.codigos, self.regime.rotulos)
+        dados["imposto_atual"] = pa.array(self.imposto_atual)
+        for nome, campo, j in self.colunas_cenario():
+            if campo == "classificacao":
+                dados[nome] = _dicionario(self.grade.classe[:, j], CLASSIFICACOES_IMPACTO)
+            else:
+                dados[nome] = pa.array(getattr(self.grade, campo)[:, j])
+        return pa.table(dados)
+
+    @classmethod
+    def from_outputs(cls, inputs: Sequence[DiagnosticInput], outputs: Sequence[DiagnosticOutput]) -> "DiagnosticBatch":
+        """Colunas a partir de pares input/output ja calculados (mesmos cenarios em todo o lote)."""
+        if len(inputs) != len(outputs):
+            raise ValueError("inputs e outputs devem ter o mesmo tamanho.")
+        construtor = _Construtor()
+        construtor.estender(outputs)
+        return construtor.concluir(inputs)
+
+
+def _importar_opcional(modulo: str) -> Any:
+    try:
+        return importlib.import_module(modulo)
+    except ImportError as exc:
+        raise ValueError(f"Exportacao do lote requer o pacote opcional `{modulo}`.") from exc
+
+
+def _coluna_float(valores: Sequence[Optional[float]]) -> np.ndarray:
+    """float64 com None -> NaN (conversao do proprio NumPy, sem laco Python)."""
+    return np.array(valores, dtype=np.float64)
+
+
+class _Construtor:
+    """Acumula as linhas (so valores escalares, sem reter os DiagnosticOutput) e monta as colunas."""
+
+    def __init__(self) -> None:
+        self.nomes: Optional[Tuple[str, ...]] = None
+        self.aliquotas: List[float] = []
+        self.regimes: List[str] = []
+        self.imposto_atual: List[float] = []
+        self.celulas: Dict[str, List[Any]] = {campo: [] for campo in CAMPOS_CENARIO}
+
+    def estender(self, outputs: Sequence[DiagnosticOutput]) -> None:
+        if not outputs:
+            return
+        if self.nomes is None:
+            self.nomes = tuple(map(_NOME_CENARIO, outputs[0].resultados))
+            self.aliquotas = [r.aliquota_reforma for r in outputs[0].resultados]
+        resultados = list(chain.from_iterable(map(_RESULTADOS, outputs)))
+        if list(map(_NOME_CENARIO, resultados)) != list(self.nomes) * len(outputs):
+            raise ValueError("Lote com cenarios diferentes entre diagnosticos; use um lote por conjunto de cenarios.")
+        for campo, celulas in self.celulas.items():
+            celulas.extend(map(_ATRIBUTOS[campo], resultados))
+        self.regimes.extend(map(_REGIME, outputs))
+        self.imposto_atual.extend(map(_IMPOSTO_ATUAL, outputs))
+
+    def concluir(self, inputs: Sequence[DiagnosticInput]) -> DiagnosticBatch:
+        n = len(self.imposto_atual)
+        m = len(self.nomes or ())
+        numericos = {campo: _coluna_float(list(map(attrgetter(campo), inputs))) for campo in CAMPOS_NUMERICOS}
+        imposto_atual = np.asarray(self.imposto_atual, dtype=np.float64)
+        matriz = {
+            campo: np.asarray(self.celulas[campo], dtype=np.float64).reshape(n, m)
+            for campo in ("imposto_reforma", "diferenca", "impacto_percentual")
+        }
+        classe = np.fromiter(map(_CLASSE_POR_CLASSIFICACAO.__getitem__, self.celulas["classificacao"]), dtype=np.int8, count=n * m)
+        grade = ScenarioGrid(
+            receitas=numericos["receita_anual"],
+            impostos_atuais=imposto_atual,
+            aliquotas=np.asarray(self.aliquotas, dtype=np.float64),
+            nomes_cenario=self.nomes or (),
+            classe=classe.reshape(n, m),
+            **matriz,
+        )
+        cenarios = np.empty(n, dtype=object)
+        cenarios[:] = list(map(_CENARIOS, inputs))
+        return DiagnosticBatch(
+            nome_empresa=np.array(list(map(_NOME_EMPRESA, inputs)), dtype=object),
+            numericos=numericos,
+            textos={campo: ColunaTexto.de_valores(list(map(attrgetter(campo), inputs))) for campo in CAMPOS_TEXTO},
+            cenarios=cenarios,
+            regime=ColunaTexto.de_valores(self.regimes),
+            imposto_atual=imposto_atual,
+            grade=grade,
+        )
+
+
+def executar_lote(inputs: Sequence[DiagnosticInput], service: Optional[DiagnosticService] = None) -> DiagnosticBatch:
+    """
+    Roda o DiagnosticService sobre o lote guardando so as colunas: cada DiagnosticOutput
+    (detalhes + relatorio) e descartado assim que suas linhas sao copiadas.
+    """
+    service = service or DiagnosticService()
+    construtor = _Construtor()
+    for inp in inputs:
+        construtor.estender((service.run(inp),))
+    return construtor.concluir(inputs)
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dto import DiagnosticInput
+from history_store import append_event_ref
+from period_engine import apurar_simples_mensal
+from regimes_vetorizados import get_tabelas_simples_compiladas
+from tax_engine import DiagnosticService
+from tools.ruleset_audit import get_integrity_summary
+
+# Campos derivados pelo proprio agendador a cada competencia: nao entram no hash do input.
+CAMPOS_DERIVADOS = ("competencia", "rbt12")
+
+MOTIVO_NOVA = "nova"
+MOTIVO_INPUT = "input_alterado"
+MOTIVO_RULESET = "ruleset_alterado"
+MOTIVO_FRONTEIRA = "fronteira_rbt12"
+
+
+def input_hash(inp: DiagnosticInput) -> str:
+    """SHA-256 do input canonico sem os campos derivados por competencia."""
+    payload = asdict(inp)
+    for campo in CAMPOS_DERIVADOS:
+        payload.pop(campo, None)
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class EstadoEmpresa:
+    input_hash: str
+    ruleset_id: str
+    ruleset_hash: str
+    # (anexo aplicado, faixa, acima do limite do Simples) no RBT12 movel; None sem serie de receita.
+    fronteira: Optional[Tuple[str, int, bool]]
+    competencia: str
+    ref: Optional[str] = None
+
+
+@dataclass
+class TickResult:
+    competencia: str
+    recalculadas: Dict[str, str] = field(default_factory=dict)
+    ignoradas: List[str] = field(default_factory=list)
+    refs: Dict[str, str] = field(default_factory=dict)
+    erros: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        return len(self.recalculadas) + len(self.ignoradas) + len(self.erros)
+
+    def resumo(self) -> Dict[str, Any]:
+        motivos: Dict[str, int] = {}
+        for motivo in self.recalculadas.values():
+            motivos[motivo] = motivos.get(motivo, 0) + 1
+        return {
+            "competencia": self.competencia,
+            "total": self.total,
+            "recalculadas": len(self.recalculadas),
+            "ignoradas": len(self.ignoradas),
+            "erros": len(self.erros),
+            "motivos": motivos,
+        }
+
+
+def _fronteiras(
+    carteira: Mapping[str, DiagnosticInput],
+    receitas_mensais: Mapping[str, Sequence[float]],
+    competencia: str,
+) -> Dict[str, Tuple[Tuple[str, int, bool], float]]:
+    """
+    (fronteira, rbt12) na competencia para cada empresa com serie de receita: RBT12 movel dos
+    meses anteriores (a serie termina na competencia do tick), agrupado por ruleset e avaliado
+    em lote pelo period_engine.
+    """
+    grupos: Dict[str, List[str]] = {}
+    for chave in receitas_mensais:
+        if chave in carteira:
+            grupos.setdefault(DiagnosticService._resolve_ruleset_id(carteira[chave]), []).append(chave)
+
+    resultado: Dict[str, Tuple[Tuple[str, int, bool], float]] = {}
+    for ruleset_id, chaves in grupos.items():
+        meses = max(len(receitas_mensais[c]) for c in chaves)
+        if meses == 0:
+            continue
+        matriz = np.full((len(chaves), meses), np.nan)
+        for i, chave in enumerate(chaves):
+            serie = np.asarray(receitas_mensais[chave], dtype=np.float64)
+            if serie.size:
+                matriz[i, meses - serie.size :] = serie
+        anexos = [carteira[c].anexo_simples or "" for c in chaves]
+        # Fator R: fator_r informado vale para todos os meses; folha_12m vira folha mensal uniforme.
+        folhas = np.full_like(matriz, np.nan)
+        for i, chave in enumerate(chaves):
+            inp = carteira[chave]
+            if inp.fator_r is not None:
+                folhas[i] = float(inp.fator_r) * matriz[i]
+            elif inp.folha_12m is not None:
+                folhas[i] = float(inp.folha_12m) / 12.0
+        rotulos = [f"{competencia}[{j - meses + 1}]" for j in range(meses)]
+        apuracao = apurar_simples_mensal(matriz, anexos, rotulos, folhas, ruleset_id=ruleset_id)
+        limite = get_tabelas_simples_compiladas(ruleset_id).limite_elegibilidade
+        for i, chave in enumerate(chaves):
+            rbt12 = float(apuracao.rbt12[i, -1])
+            if np.isnan(rbt12):
+                continue
+            codigo = int(apuracao.anexo[i, -1])
+            anexo = apuracao.anexos[codigo] if codigo >= 0 else ""
+            resultado[chave] = ((anexo, int(apuracao.faixa[i, -1]), rbt12 > limite), rbt12)
+    return resultado
+
+
+class DiagnosticScheduler:
+    """
+    Diagnostico continuo: a cada competencia (`tick`) recalcula apenas as empresas com input
+    alterado, ruleset resolvido/hash diferente ou RBT12 movel que cruzou faixa, anexo (Fator R)
+    ou limite do Simples; as demais sao contadas como ignoradas. Variacoes do RBT12 dentro da
+    mesma faixa nao disparam recalculo. Eventos recalculados vao para o historico.
+    O estado por empresa pode ser persistido em JSON (`estado_path`) entre ciclos.
+    """
+
+    def __init__(
+        self,
+        service: Optional[DiagnosticService] = None,
+        pasta: str = "data",
+        arquivo: str = "history.jsonl",
+        estado_path: Optional[str] = None,
+    ) -> None:
+        self.service = service or DiagnosticService()
+        self.pasta = pasta
+        self.arquivo = arquivo
+        self.estado_path = estado_path
+        self.estado: Dict[str, EstadoEmpresa] = self._carregar_estado() if estado_path else {}
+
+    def _carregar_estado(self) -> Dict[str, EstadoEmpresa]:
+        if not self.estado_path or not os.path.exists(self.estado_path):
+            return {}
+        with open(self.estado_path, "r", encoding="utf-8") as f:
+            bruto = json.load(f)
+        estado: Dict[str, EstadoEmpresa] = {}
+        for chave, valores in bruto.items():
+            fronteira = valores.get("fronteira")
+            estado[chave] = EstadoEmpresa(**{**valores, "fronteira": tuple(fronteira) if fronteira is not None else None})
+        return estado
+
+    def _salvar_estado(self) -> None:
+        if not self.estado_path:
+            return
+        diretorio = os.path.dirname(self.estado_path)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        temporario = self.estado_path + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({k: asdict(v) for k, v in self.estado.items()}, f, ensure_ascii=False, sort_keys=True)
+        os.replace(temporario, self.estado_path)
+
+    @staticmethod
+    def _ruleset_hash(ruleset_id: str) -> str:
+        return str(get_integrity_summary(ruleset_id).get("ruleset_hash") or "N/D")
+
+    def tick(
+        self,
+        competencia: str,
+        carteira: Mapping[str, DiagnosticInput],
+        receitas_mensais: Optional[Mapping[str, Sequence[float]]] = None,
+    ) -> TickResult:
+        """
+        `carteira`: chave da empresa -> input base. `receitas_mensais` (opcional): serie mensal de
+        receita por empresa terminando na competencia; quando presente, o RBT12 do input e o
+        RBT12 movel dos 12 meses anteriores.
+        """
+        resultado = TickResult(competencia=competencia)
+        fronteiras = _fronteiras(carteira, receitas_mensais or {}, competencia)
+        hashes_ruleset: Dict[str, str] = {}
+
+        # Estado salvo mesmo se o tick for interrompido: eventos ja gravados nao sao duplicados.
+        try:
+            for chave, inp in carteira.items():
+                ruleset_id = DiagnosticService._resolve_ruleset_id(inp)
+                if ruleset_id not in hashes_ruleset:
+                    hashes_ruleset[ruleset_id] = self._ruleset_hash(ruleset_id)
+                fronteira, rbt12 = fronteiras.get(chave, (None, None))
+                novo = EstadoEmpresa(
+                    input_hash=input_hash(inp),
+                    ruleset_id=ruleset_id,
+                    ruleset_hash=hashes_ruleset[ruleset_id],
+                    fronteira=fronteira,
+                    competencia=competencia,
+                )
+
+                anterior = self.estado.get(chave)
+                if anterior is None:
+                    motivo = MOTIVO_NOVA
+                elif anterior.input_hash != novo.input_hash:
+                    motivo = MOTIVO_INPUT
+                elif (anterior.ruleset_id, anterior.ruleset_hash) != (novo.ruleset_id, novo.ruleset_hash):
+                    motivo = MOTIVO_RULESET
+                elif anterior.fronteira != novo.fronteira:
+                    motivo = MOTIVO_FRONTEIRA
+                else:
+                    resultado.ignoradas.append(chave)
+                    continue
+
+                atual = replace(inp, competencia=competencia) if rbt12 is None else replace(inp, competencia=competencia, rbt12=rbt12)
+                try:
+                    evento = self.service.run(atual).to_event()
+                except ValueError as exc:
+                    # Estado gravado mesmo com erro: o mesmo input nao e reprocessado no proximo tick.
+                    self.estado[chave] = novo
+                    resultado.erros[chave] = str(exc)
+                    continue
+                except Exception as exc:
+                    # Falha inesperada (plugin, IO): estado nao gravado, a empresa e refeita no proximo tick.
+                    resultado.erros[chave] = f"{type(exc).__name__}: {exc}"
+                    continue
+                try:
+                    ref = append_event_ref(evento, pasta=self.pasta, arquivo=self.arquivo)
+                except OSError as exc:
+                    resultado.erros[chave] = f"{type(exc).__name__}: {exc}"
+                    continue
+                self.estado[chave] = replace(novo, ref=ref)
+                resultado.recalculadas[chave] = motivo
+                resultado.refs[chave] = ref
+
+            for chave in [c for c in self.estado if c not in carteira]:
+                del self.estado[chave]
+        finally:
+            self._salvar_estado()
+        return resultado
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Optional, Set
+
+from dto import DiagnosticInput, DiagnosticOutput
+from evaluation_graph import EvaluationGraph
+from tax_engine import DiagnosticService
+
+# Campos do input com no de entrada proprio no grafo: alterar apenas estes reaproveita o restante.
+INCREMENTAL_FIELDS = ("cenarios", "modo_analise")
+# No refeito a cada reuso do grafo: auditoria (`generated_at`) e relatorio sempre do run atual.
+AUDIT_NODE = "audit_metadata"
+
+
+class DiagnosticSession:
+    """
+    Sessao what-if sobre o grafo de avaliacao do DiagnosticService.
+    `run(inp)` procura um grafo da sessao com os mesmos campos (exceto `cenarios`/`modo_analise`):
+    achando, troca essas entradas e recalcula apenas os nos a jusante (cenarios + relatorio;
+    recomendacao + auditoria + relatorio); senao monta um grafo novo. Guarda ate `max_graphs`
+    grafos (LRU). A auditoria e o relatorio sao sempre refeitos, para o `generated_at` ser do run.
+    Nao e thread-safe: uma sessao por usuario/aba.
+    """
+
+    def __init__(self, service: Optional[DiagnosticService] = None, max_graphs: int = 1) -> None:
+        if max_graphs < 1:
+            raise ValueError("max_graphs deve ser maior ou igual a 1.")
+        self.service = service or DiagnosticService()
+        self.max_graphs = max_graphs
+        self.graph: Optional[EvaluationGraph] = None
+        self.last_invalidated: Set[str] = set()
+        self._graphs: "OrderedDict[DiagnosticInput, EvaluationGraph]" = OrderedDict()
+
+    @staticmethod
+    def _base(inp: DiagnosticInput) -> DiagnosticInput:
+        return replace(inp, **{campo: None for campo in INCREMENTAL_FIELDS})
+
+    def run(self, inp: DiagnosticInput) -> DiagnosticOutput:
+        self.service.validar_input(inp)
+        base = self._base(inp)
+        graph = self._graphs.get(base)
+        if graph is None:
+            graph = self.service.build_graph(inp)
+            self._graphs[base] = graph
+            while len(self._graphs) > self.max_graphs:
+                self._graphs.popitem(last=False)
+            self.last_invalidated = {item["node"] for item in graph.describe() if item["deps"]}
+        else:
+            self._graphs.move_to_end(base)
+            self.last_invalidated = graph.invalidate(AUDIT_NODE)
+            for campo in INCREMENTAL_FIELDS:
+                valor = getattr(inp, campo)
+                if valor != graph.get(campo):
+                    self.last_invalidated |= graph.set_input(campo, valor)
+        self.graph = graph
+        return self.service.evaluate_graph(graph)
+
+    def reset(self) -> None:
+        self.graph = None
+        self._graphs.clear()
+        self.last_invalidated = set()
@@ -1,12 +1,12 @@
 ﻿from __future__ import annotations
 
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 
 from ruleset_loader import DEFAULT_RULESET_ID
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class DiagnosticInput:
     nome_empresa: str
     receita_anual: float
@@ -30,7 +30,7 @@ class DiagnosticInput:
     cenarios: Optional[Dict[str, float]] = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ScenarioResult:
     nome_cenario: str
     aliquota_reforma: float
@@ -40,8 +40,19 @@ class ScenarioResult:
     classificacao: str
     recomendacao: str
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "nome_cenario": self.nome_cenario,
+            "aliquota_reforma": self.aliquota_reforma,
+            "imposto_reforma": self.imposto_reforma,
+            "diferenca": self.diferenca,
+            "impacto_percentual": self.impacto_percentual,
+            "classificacao": self.classificacao,
+            "recomendacao": self.recomendacao,
+        }
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class DiagnosticOutput:
     nome_empresa: str
     receita_anual: float
@@ -50,6 +61,20 @@ class DiagnosticOutput:
     imposto_atual: float
     resultados: List[ScenarioResult]
     relatorio_texto: str
+    # Side channel de instrumentacao (TDE_TIMING=1); nao faz parte do evento persistido.
+    stage_timings: Optional[Dict[str, float]] = field(default=None, compare=False, repr=False)
 
     def to_event(self) -> Dict[str, Any]:
-        return asdict(self)
+        """
+        Evento do historico sem copia profunda: dicts de topo novos, objetos aninhados de
+        `detalhes_regime` (audit, comparativo, ...) compartilhados com o output (somente leitura).
+        """
+        return {
+            "nome_empresa": self.nome_empresa,
+            "receita_anual": self.receita_anual,
+            "regime": self.regime,
+            "detalhes_regime": dict(self.detalhes_regime),
+            "imposto_atual": self.imposto_atual,
+            "resultados": [r.to_dict() for r in self.resultados],
+            "relatorio_texto": self.relatorio_texto,
+        }
@@ -1,18 +1,42 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from company_profile import CompanyProfile
+import numpy as np
+
+from company_profile import ASSUMPTION_MARGEM_DEFAULT, CompanyProfile
 from regime_utils import REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL, REGIME_CODE_SIMPLES
+from regimes import RulesetError
 from ruleset_loader import get_eligibility_rules
 
 STATUS_OK = "OK"
 STATUS_WARNING = "WARNING"
 STATUS_BLOCKED = "BLOCKED"
+# Ordem dos codigos de status nas mascaras em lote (0 OK, 1 WARNING, 2 BLOCKED).
+ELIGIBILITY_STATUSES = (STATUS_OK, STATUS_WARNING, STATUS_BLOCKED)
+ELIGIBILITY_REGIMES = (REGIME_CODE_SIMPLES, REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL)
 
+# Codigos de motivo (regime, status que o motivo impoe).
+REASON_SIMPLES_RBT12_ACIMA_LIMITE = "SIMPLES_RBT12_ACIMA_LIMITE"
+REASON_SIMPLES_RBT12_AUSENTE = "SIMPLES_RBT12_AUSENTE"
+REASON_SIMPLES_ANEXO_AUSENTE = "SIMPLES_ANEXO_AUSENTE"
+REASON_SIMPLES_FATOR_R_AUSENTE = "SIMPLES_FATOR_R_AUSENTE"
+REASON_PRESUMIDO_RECEITA_ACIMA_LIMITE = "PRESUMIDO_RECEITA_ACIMA_LIMITE"
+REASON_PRESUMIDO_TIPO_ATIVIDADE_AUSENTE = "PRESUMIDO_TIPO_ATIVIDADE_AUSENTE"
+REASON_REAL_MARGEM_ASSUMIDA = "REAL_MARGEM_ASSUMIDA"
+REASON_CODES = {
+    REASON_SIMPLES_RBT12_ACIMA_LIMITE: (REGIME_CODE_SIMPLES, STATUS_BLOCKED),
+    REASON_SIMPLES_RBT12_AUSENTE: (REGIME_CODE_SIMPLES, STATUS_BLOCKED),
+    REASON_SIMPLES_ANEXO_AUSENTE: (REGIME_CODE_SIMPLES, STATUS_BLOCKED),
+    REASON_SIMPLES_FATOR_R_AUSENTE: (REGIME_CODE_SIMPLES, STATUS_BLOCKED),
+    REASON_PRESUMIDO_RECEITA_ACIMA_LIMITE: (REGIME_CODE_PRESUMIDO, STATUS_BLOCKED),
+    REASON_PRESUMIDO_TIPO_ATIVIDADE_AUSENTE: (REGIME_CODE_PRESUMIDO, STATUS_WARNING),
+    REASON_REAL_MARGEM_ASSUMIDA: (REGIME_CODE_REAL, STATUS_WARNING),
+}
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class EligibilityResult:
     regime_code: str
     status: str
@@ -30,8 +54,8 @@ class EligibilityResult:
         }
 
 
-def _ruleset_error(ruleset_id: str, key: str, regime: str, impacto: str, detalhe: str) -> ValueError:
-    return ValueError(
+def _ruleset_error(ruleset_id: str, key: str, regime: str, impacto: str, detalhe: str) -> RulesetError:
+    return RulesetError(
         f"ruleset_id={ruleset_id} | arquivo=eligibility_rules.json | chave={key} | "
         f"regime={regime} | impacto={impacto} | detalhe={detalhe}"
     )
@@ -64,11 +88,170 @@ def _required_list(payload: Dict[str, Any], key: str, ruleset_id: str, regime: s
     return value
 
 
-def evaluate_eligibility(profile: CompanyProfile, ruleset_id: str) -> Dict[str, EligibilityResult]:
+@dataclass(frozen=True)
+class EligibilityBatch:
     """
-    Avalia elegibilidade por regime em modo conservador (ruleset-driven).
+    Perfis em colunas para avaliacao em lote. Ausentes: NaN (numeros) e "" (anexo);
+    `anexo_simples` ja normalizado como no perfil (maiusculo, "III/V").
     """
-    rules = get_eligibility_rules(ruleset_id)
+
+    rbt12: np.ndarray
+    receita_anual: np.ndarray
+    anexo_simples: np.ndarray
+    fator_r: np.ndarray
+    folha_12m: np.ndarray
+    tipo_atividade_informado: np.ndarray
+    margem_assumida: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.receita_anual.size)
+
+    @classmethod
+    def from_profiles(cls, profiles: Sequence[CompanyProfile]) -> "EligibilityBatch":
+        def _coluna(valores: List[Optional[float]]) -> np.ndarray:
+            return np.asarray([np.nan if v is None else float(v) for v in valores], dtype=np.float64)
+
+        return cls(
+            rbt12=_coluna([p.rbt12 for p in profiles]),
+            receita_anual=_coluna([p.receita_anual for p in profiles]),
+            anexo_simples=np.asarray([p.anexo_simples or "" for p in profiles], dtype=object),
+            fator_r=_coluna([p.fator_r for p in profiles]),
+            folha_12m=_coluna([p.folha_12m for p in profiles]),
+            tipo_atividade_informado=np.asarray([bool(p.tipo_atividade) for p in profiles], dtype=bool),
+            margem_assumida=np.asarray([ASSUMPTION_MARGEM_DEFAULT in p.assumption_flags for p in profiles], dtype=bool),
+        )
+
+
+@dataclass(frozen=True)
+class BatchEligibility:
+    """`status` (n, 3) com codigos de ELIGIBILITY_STATUSES por ELIGIBILITY_REGIMES; `reasons`: codigo -> mascara."""
+
+    status: np.ndarray
+    reasons: Dict[str, np.ndarray]
+
+    def status_of(self, regime_code: str) -> np.ndarray:
+        return self.status[:, ELIGIBILITY_REGIMES.index(regime_code)]
+
+    def reason_codes(self, linha: int) -> List[str]:
+        return [codigo for codigo, mascara in self.reasons.items() if mascara[linha]]
+
+
+@dataclass(frozen=True)
+class CompiledEligibilityRules:
+    """
+    eligibility_rules.json validado uma vez: predicados prontos para um perfil (`evaluate`)
+    ou para um lote em colunas (`evaluate_batch`), com as mesmas regras nos dois caminhos.
+    """
+
+    ruleset_id: str
+    rbt12_max: float
+    receita_anual_max: float
+    real_warnings: Tuple[str, ...]
+
+    def reasons(self, profile: CompanyProfile) -> List[str]:
+        """Codigos de motivo do perfil (ordem de REASON_CODES)."""
+        codigos: List[str] = []
+        if profile.rbt12 is None:
+            codigos.append(REASON_SIMPLES_RBT12_AUSENTE)
+        elif profile.rbt12 > self.rbt12_max:
+            codigos.append(REASON_SIMPLES_RBT12_ACIMA_LIMITE)
+        if not profile.anexo_simples:
+            codigos.append(REASON_SIMPLES_ANEXO_AUSENTE)
+        elif profile.anexo_simples == "III/V" and profile.fator_r is None and profile.folha_12m is None:
+            codigos.append(REASON_SIMPLES_FATOR_R_AUSENTE)
+        if profile.receita_anual > self.receita_anual_max:
+            codigos.append(REASON_PRESUMIDO_RECEITA_ACIMA_LIMITE)
+        if not profile.tipo_atividade:
+            codigos.append(REASON_PRESUMIDO_TIPO_ATIVIDADE_AUSENTE)
+        if ASSUMPTION_MARGEM_DEFAULT in profile.assumption_flags:
+            codigos.append(REASON_REAL_MARGEM_ASSUMIDA)
+        return codigos
+
+    def evaluate(self, profile: CompanyProfile) -> Dict[str, EligibilityResult]:
+        codigos = set(self.reasons(profile))
+
+        sim_reasons: List[str] = []
+        sim_missing: List[str] = []
+        sim_assumptions: List[str] = []
+        if REASON_SIMPLES_RBT12_AUSENTE in codigos:
+            sim_missing.append("RBT12")
+        if REASON_SIMPLES_RBT12_ACIMA_LIMITE in codigos:
+            sim_reasons.append(f"RBT12 acima do limite do Simples ({self.rbt12_max:,.2f}).")
+        if REASON_SIMPLES_ANEXO_AUSENTE in codigos:
+            sim_missing.append("Anexo do Simples")
+        if REASON_SIMPLES_FATOR_R_AUSENTE in codigos:
+            sim_missing.append("fator_r ou folha_12m para III/V")
+        if profile.anexo_simples is None:
+            sim_assumptions.append("Comparativo não inferiu anexo automaticamente para Simples.")
+
+        pres_reasons: List[str] = []
+        pres_missing: List[str] = []
+        pres_assumptions: List[str] = []
+        if REASON_PRESUMIDO_RECEITA_ACIMA_LIMITE in codigos:
+            pres_reasons.append(f"Receita anual acima do limite do Presumido ({self.receita_anual_max:,.2f}).")
+        if REASON_PRESUMIDO_TIPO_ATIVIDADE_AUSENTE in codigos:
+            pres_missing.append("Tipo de atividade")
+            pres_assumptions.append("Sem tipo de atividade, o cálculo do Presumido pode usar fallback do ruleset.")
+
+        real_assumptions: List[str] = []
+        if REASON_REAL_MARGEM_ASSUMIDA in codigos:
+            real_assumptions.append("Margem de lucro foi assumida por default no perfil normalizado.")
+
+        return {
+            REGIME_CODE_SIMPLES: EligibilityResult(
+                regime_code=REGIME_CODE_SIMPLES,
+                status=_status(REGIME_CODE_SIMPLES, codigos),
+                reasons=sim_reasons,
+                missing_inputs=sim_missing,
+                assumptions=sim_assumptions,
+            ),
+            REGIME_CODE_PRESUMIDO: EligibilityResult(
+                regime_code=REGIME_CODE_PRESUMIDO,
+                status=_status(REGIME_CODE_PRESUMIDO, codigos),
+                reasons=pres_reasons,
+                missing_inputs=pres_missing,
+                assumptions=pres_assumptions,
+            ),
+            REGIME_CODE_REAL: EligibilityResult(
+                regime_code=REGIME_CODE_REAL,
+                status=_status(REGIME_CODE_REAL, codigos),
+                reasons=[],
+                missing_inputs=[],
+                assumptions=real_assumptions,
+            ),
+        }
+
+    def evaluate_batch(self, batch: EligibilityBatch) -> BatchEligibility:
+        sem_rbt12 = np.isnan(batch.rbt12)
+        sem_anexo = batch.anexo_simples == ""
+        reasons = {
+            REASON_SIMPLES_RBT12_ACIMA_LIMITE: batch.rbt12 > self.rbt12_max,
+            REASON_SIMPLES_RBT12_AUSENTE: sem_rbt12,
+            REASON_SIMPLES_ANEXO_AUSENTE: sem_anexo,
+            REASON_SIMPLES_FATOR_R_AUSENTE: (batch.anexo_simples == "III/V") & np.isnan(batch.fator_r) & np.isnan(batch.folha_12m),
+            REASON_PRESUMIDO_RECEITA_ACIMA_LIMITE: batch.receita_anual > self.receita_anual_max,
+            REASON_PRESUMIDO_TIPO_ATIVIDADE_AUSENTE: ~np.asarray(batch.tipo_atividade_informado, dtype=bool),
+            REASON_REAL_MARGEM_ASSUMIDA: np.asarray(batch.margem_assumida, dtype=bool),
+        }
+        status = np.zeros((len(batch), len(ELIGIBILITY_REGIMES)), dtype=np.int8)
+        for codigo, mascara in reasons.items():
+            regime, nivel = REASON_CODES[codigo]
+            coluna = ELIGIBILITY_REGIMES.index(regime)
+            status[:, coluna] = np.where(mascara, np.maximum(status[:, coluna], ELIGIBILITY_STATUSES.index(nivel)), status[:, coluna])
+        return BatchEligibility(status=status, reasons=reasons)
+
+
+def _status(regime_code: str, codigos: Any) -> str:
+    nivel = 0
+    for codigo in codigos:
+        regime, status = REASON_CODES[codigo]
+        if regime == regime_code:
+            nivel = max(nivel, ELIGIBILITY_STATUSES.index(status))
+    return ELIGIBILITY_STATUSES[nivel]
+
+
+def compile_eligibility_rules(rules: Dict[str, Any], ruleset_id: str) -> CompiledEligibilityRules:
+    """Valida eligibility_rules.json (mesmos erros de antes) e compila os limites."""
     sim_rules = _required_dict(
         rules,
         "simples",
@@ -90,93 +273,58 @@ def evaluate_eligibility(profile: CompanyProfile, ruleset_id: str) -> Dict[str,
         "Lucro Real",
         "Não é possível avaliar elegibilidade do Real",
     )
-
-    # Simples
-    sim_reasons: List[str] = []
-    sim_missing: List[str] = []
-    sim_assumptions: List[str] = []
-    limite_simples = _required_number(
-        sim_rules,
-        "rbt12_max",
-        ruleset_id,
-        "Simples Nacional",
-        "Não é possível validar limite de receita",
-    )
-    if profile.rbt12 is None:
-        sim_missing.append("RBT12")
-    elif profile.rbt12 > limite_simples:
-        sim_reasons.append(f"RBT12 acima do limite do Simples ({limite_simples:,.2f}).")
-    if not profile.anexo_simples:
-        sim_missing.append("Anexo do Simples")
-    elif profile.anexo_simples == "III/V" and profile.fator_r is None and profile.folha_12m is None:
-        sim_missing.append("fator_r ou folha_12m para III/V")
-
-    sim_status = STATUS_OK
-    if sim_reasons or sim_missing:
-        sim_status = STATUS_BLOCKED
-    if profile.anexo_simples is None:
-        sim_assumptions.append("Comparativo não inferiu anexo automaticamente para Simples.")
-
-    # Presumido
-    pres_reasons: List[str] = []
-    pres_missing: List[str] = []
-    pres_assumptions: List[str] = []
-    limite_pres = _required_number(
-        pres_rules,
-        "receita_anual_max",
-        ruleset_id,
-        "Lucro Presumido",
-        "Não é possível validar limite de receita",
-    )
-    if profile.receita_anual > limite_pres:
-        pres_reasons.append(f"Receita anual acima do limite do Presumido ({limite_pres:,.2f}).")
-    if not profile.tipo_atividade:
-        pres_missing.append("Tipo de atividade")
-        pres_assumptions.append("Sem tipo de atividade, o cálculo do Presumido pode usar fallback do ruleset.")
-
-    pres_status = STATUS_OK
-    if pres_reasons:
-        pres_status = STATUS_BLOCKED
-    elif pres_missing:
-        pres_status = STATUS_WARNING
-
-    # Real
-    real_reasons: List[str] = []
-    real_missing: List[str] = []
-    real_assumptions: List[str] = []
-    if any("Margem de lucro não informada" in ass for ass in profile.assumptions):
-        real_assumptions.append("Margem de lucro foi assumida por default no perfil normalizado.")
-        real_status = STATUS_WARNING
-    else:
-        real_status = STATUS_OK
-    _required_list(
-        real_rules,
-        "warnings",
-        ruleset_id,
-        "Lucro Real",
-        "Não é possível carregar configuração mínima do Real",
-    )
-
-    return {
-        REGIME_CODE_SIMPLES: EligibilityResult(
-            regime_code=REGIME_CODE_SIMPLES,
-            status=sim_status,
-            reasons=sim_reasons,
-            missing_inputs=sim_missing,
-            assumptions=sim_assumptions,
+    return CompiledEligibilityRules(
+        ruleset_id=ruleset_id,
+        rbt12_max=_required_number(
+            sim_rules,
+            "rbt12_max",
+            ruleset_id,
+            "Simples Nacional",
+            "Não é possível validar limite de receita",
         ),
-        REGIME_CODE_PRESUMIDO: EligibilityResult(
-            regime_code=REGIME_CODE_PRESUMIDO,
-            status=pres_status,
-            reasons=pres_reasons,
-            missing_inputs=pres_missing,
-            assumptions=pres_assumptions,
+        receita_anual_max=_required_number(
+            pres_rules,
+            "receita_anual_max",
+            ruleset_id,
+            "Lucro Presumido",
+            "Não é possível validar limite de receita",
         ),
-        REGIME_CODE_REAL: EligibilityResult(
-            regime_code=REGIME_CODE_REAL,
-            status=real_status,
-            reasons=real_reasons,
-            missing_inputs=real_missing,
-            assumptions=real_assumptions,
+        real_warnings=tuple(
+            str(w)
+            for w in _required_list(
+                real_rules,
+                "warnings",
+                ruleset_id,
+                "Lucro Real",
+                "Não é possível carregar configuração mínima do Real",
+            )
         ),
-    }
+    )
+
+
+_COMPILED_RULES: Dict[str, CompiledEligibilityRules] = {}
+
+
+def get_compiled_eligibility_rules(ruleset_id: str) -> CompiledEligibilityRules:
+    compiled = _COMPILED_RULES.get(ruleset_id)
+    if compiled is None:
+        compiled = _COMPILED_RULES[ruleset_id] = compile_eligibility_rules(get_eligibility_rules(ruleset_id), ruleset_id)
+    return compiled
+
+
+def clear_compiled_eligibility_rules() -> None:
+    _COMPILED_RULES.clear()
+
+
+def evaluate_eligibility(
+    profile: CompanyProfile,
+    ruleset_id: str,
+    rules: Optional[Dict[str, Any]] = None,
+) -> Dict[str, EligibilityResult]:
+    """
+    Avalia elegibilidade por regime em modo conservador (ruleset-driven).
+    Sem `rules`, usa as regras compiladas (cache por ruleset); `rules` avalia um
+    eligibility_rules.json informado, compilando-o nesta chamada.
+    """
+    compiled = get_compiled_eligibility_rules(ruleset_id) if rules is None else compile_eligibility_rules(rules, ruleset_id)
+    return compiled.evaluate(profile)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+
+from stage_timing import stage
+
+_MISSING = object()
+
+
+class EvaluationGraph:
+    """
+    Grafo de avaliacao de um diagnostico: nos nomeados com dependencias explicitas.
+    Cada no e calculado no maximo uma vez (ate ser invalidado) e o valor e compartilhado
+    entre todos os dependentes. Dependencias precisam existir no momento do cadastro,
+    o que garante grafo aciclico.
+    Cada avaliacao roda dentro de `stage_timing.stage(nome)` (TDE_TIMING) e registra a duracao
+    exclusiva do no em `timings` (ms), sem contar as dependencias.
+    """
+
+    def __init__(self) -> None:
+        self._nodes: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+        self._values: Dict[str, Any] = {}
+        self._dependents: Dict[str, List[str]] = {}
+        self.timings: Dict[str, float] = {}
+        self.evaluations: Dict[str, int] = {}
+        self.order: List[str] = []
+
+    def input(self, name: str, value: Any) -> None:
+        """Cadastra um no de entrada (valor fixo, sem dependencias)."""
+        self.node(name, lambda: value)
+        self._values[name] = value
+
+    def node(self, name: str, fn: Callable[..., Any], deps: Iterable[str] = ()) -> None:
+        """Cadastra `name = fn(*valores_das_dependencias)`."""
+        if name in self._nodes:
+            raise ValueError(f"No duplicado no grafo de avaliacao: {name}.")
+        deps = tuple(deps)
+        for dep in deps:
+            if dep not in self._nodes:
+                raise ValueError(f"Dependencia desconhecida no grafo de avaliacao: {name} -> {dep}.")
+            self._dependents.setdefault(dep, []).append(name)
+        self._nodes[name] = (fn, deps)
+
+    def get(self, name: str) -> Any:
+        value = self._values.get(name, _MISSING)
+        if value is not _MISSING:
+            return value
+        if name not in self._nodes:
+            raise ValueError(f"No desconhecido no grafo de avaliacao: {name}.")
+        fn, deps = self._nodes[name]
+        args = [self.get(dep) for dep in deps]
+        inicio = time.perf_counter_ns()
+        with stage(name):
+            value = fn(*args)
+        self.timings[name] = (time.perf_counter_ns() - inicio) / 1_000_000.0
+        self.evaluations[name] = self.evaluations.get(name, 0) + 1
+        self.order.append(name)
+        self._values[name] = value
+        return value
+
+    def dependents(self, name: str) -> Set[str]:
+        """Todos os nos que dependem (direta ou indiretamente) de `name`."""
+        encontrados: Set[str] = set()
+        pendentes = list(self._dependents.get(name, []))
+        while pendentes:
+            atual = pendentes.pop()
+            if atual in encontrados:
+                continue
+            encontrados.add(atual)
+            pendentes.extend(self._dependents.get(atual, []))
+        return encontrados
+
+    def set_input(self, name: str, value: Any) -> Set[str]:
+        """Troca o valor de uma entrada e invalida apenas os nos a jusante. Retorna os invalidados."""
+        if name not in self._nodes or self._nodes[name][1]:
+            raise ValueError(f"Entrada desconhecida no grafo de avaliacao: {name}.")
+        self._nodes[name] = (lambda: value, ())
+        self._values[name] = value
+        invalidados = self.dependents(name)
+        for dependente in invalidados:
+            self._values.pop(dependente, None)
+        return invalidados
+
+    def invalidate(self, name: str) -> Set[str]:
+        """Descarta o valor de um no calculado e dos nos a jusante. Retorna os invalidados."""
+        if name not in self._nodes or not self._nodes[name][1]:
+            raise ValueError(f"No calculado desconhecido no grafo de avaliacao: {name}.")
+        invalidados = {name} | self.dependents(name)
+        for no in invalidados:
+            self._values.pop(no, None)
+        return invalidados
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Nos na ordem de cadastro: dependencias, se ja avaliado, ultima duracao (ms) e contagem."""
+        return [
+            {
+                "node": name,
+                "deps": list(deps),
+                "evaluated": name in self._values,
+                "ms": self.timings.get(name),
+                "evaluations": self.evaluations.get(name, 0),
+            }
+            for name, (_, deps) in self._nodes.items()
+        ]
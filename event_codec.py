@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from copy import deepcopy
+from typing import Any, Dict, Optional, Tuple
+
+import json_codec
+
+# Versao do contrato persistido. Eventos sem `schema_version` sao legados (v1: evento integral).
+LEGACY_SCHEMA_VERSION = 1
+EVENT_SCHEMA_VERSION = 2
+
+# Blocos do audit que se repetem entre eventos do mesmo ruleset; vao para a tabela lateral.
+AUDIT_SHARED_KEYS = (
+    "ruleset_id",
+    "ruleset_metadata",
+    "calculo_tipo",
+    "sources",
+    "references",
+    "assumptions",
+    "limitations",
+    "integrity",
+)
+REF_KEY = "$ref"
+OMIT_KEY = "$omit"
+
+
+def content_hash(data: Any) -> str:
+    canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def blob_table_path(history_path: str) -> str:
+    """`data/history.jsonl` -> `data/history.blobs.jsonl`."""
+    base, _ = os.path.splitext(history_path)
+    return base + ".blobs.jsonl"
+
+
+class BlobTable:
+    """
+    Tabela lateral enderecada por conteudo (JSONL `{"hash": ..., "data": ...}`), somente append.
+    Recarrega do disco quando a assinatura (mtime/tamanho) muda, p/ enxergar gravacoes de outros processos.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._entries: Dict[str, Any] = {}
+        self._signature: Tuple[int, int] = (0, 0)
+
+    def _current_signature(self) -> Tuple[int, int]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return (0, 0)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self) -> None:
+        signature = self._current_signature()
+        if signature == self._signature:
+            return
+        entries: Dict[str, Any] = {}
+        if signature != (0, 0):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for linha in f:
+                    try:
+                        registro = json_codec.loads(linha)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(registro, dict) and isinstance(registro.get("hash"), str):
+                        entries.setdefault(registro["hash"], registro.get("data"))
+        self._entries = entries
+        self._signature = signature
+
+    def get(self, digest: str) -> Optional[Any]:
+        if digest not in self._entries:
+            self.refresh()
+        return self._entries.get(digest)
+
+    def put(self, data: Any) -> str:
+        digest = content_hash(data)
+        if self.get(digest) is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(json_codec.dumps({"hash": digest, "data": data}) + b"\n")
+            self._entries[digest] = data
+            self._signature = self._current_signature()
+        return digest
+
+
+_TABLES: Dict[str, BlobTable] = {}
+
+
+def get_blob_table(history_path: str) -> BlobTable:
+    path = blob_table_path(history_path)
+    table = _TABLES.get(path)
+    if table is None:
+        table = BlobTable(path)
+        _TABLES[path] = table
+    return table
+
+
+def clear_blob_tables() -> None:
+    _TABLES.clear()
+
+
+def schema_version(payload: Dict[str, Any]) -> int:
+    try:
+        return int(payload.get("schema_version") or LEGACY_SCHEMA_VERSION)
+    except (TypeError, ValueError):
+        return LEGACY_SCHEMA_VERSION
+
+
+def _encode_audit(audit: Dict[str, Any], table: BlobTable) -> Dict[str, Any]:
+    shared = {k: audit[k] for k in AUDIT_SHARED_KEYS if k in audit}
+    proprio = {k: v for k, v in audit.items() if k not in shared}
+    if shared:
+        proprio[REF_KEY] = table.put(shared)
+    return proprio
+
+
+def _encode_comparison_row(row: Dict[str, Any], detalhes: Dict[str, Any]) -> Dict[str, Any]:
+    """Linha do regime atual repete um subconjunto de `detalhes_regime`: guarda so as chaves omitidas."""
+    row_detalhes = row.get("detalhes_regime")
+    if not isinstance(row_detalhes, dict) or not row_detalhes:
+        return row
+    if any(k not in detalhes or detalhes[k] != v for k, v in row_detalhes.items()):
+        return row
+    encoded = dict(row)
+    encoded["detalhes_regime"] = {OMIT_KEY: [k for k in detalhes if k not in row_detalhes]}
+    return encoded
+
+
+def encode_event(event: Dict[str, Any], table: BlobTable) -> Dict[str, Any]:
+    """
+    Codifica um evento (shape de `DiagnosticOutput.to_event`) no formato compacto v2:
+    - remove `relatorio_texto` (reconstruivel via `build_report_from_event`);
+    - move blocos compartilhados do audit para a tabela lateral (`$ref` = sha256);
+    - linhas do `comparison_snapshot` que repetem `detalhes_regime` viram `{"$omit": [...]}`.
+    """
+    compact = {k: v for k, v in event.items() if k != "relatorio_texto"}
+    compact["schema_version"] = EVENT_SCHEMA_VERSION
+
+    detalhes = compact.get("detalhes_regime")
+    if not isinstance(detalhes, dict):
+        return compact
+    detalhes = dict(detalhes)
+
+    audit = detalhes.get("audit")
+    if isinstance(audit, dict):
+        detalhes["audit"] = _encode_audit(audit, table)
+
+    comparison = detalhes.get("comparison_snapshot")
+    if isinstance(comparison, list):
+        detalhes["comparison_snapshot"] = [
+            _encode_comparison_row(row, detalhes) if isinstance(row, dict) else row for row in comparison
+        ]
+
+    compact["detalhes_regime"] = detalhes
+    return compact
+
+
+def decode_event(payload: Dict[str, Any], table: Optional[BlobTable]) -> Dict[str, Any]:
+    """
+    Restaura o shape atual a partir de um evento v2 (sem `relatorio_texto`), mantendo
+    `schema_version` para o caminho rapido de `normalize_event`. Eventos legados (v1) e eventos
+    v2 sem marcadores (`$ref`/`$omit`) sao idempotentes. `$ref` ausente na tabela mantem apenas
+    os campos proprios do audit (o evento passa a ser tratado como sem auditoria).
+    """
+    if schema_version(payload) < EVENT_SCHEMA_VERSION:
+        return payload
+
+    event = dict(payload)
+    detalhes = event.get("detalhes_regime")
+    if not isinstance(detalhes, dict):
+        return event
+    detalhes = dict(detalhes)
+
+    comparison = detalhes.get("comparison_snapshot")
+    if isinstance(comparison, list):
+        linhas = []
+        for row in comparison:
+            row_detalhes = row.get("detalhes_regime") if isinstance(row, dict) else None
+            if isinstance(row_detalhes, dict) and OMIT_KEY in row_detalhes:
+                omitidas = set(row_detalhes.get(OMIT_KEY) or [])
+                row = dict(row)
+                row["detalhes_regime"] = {k: v for k, v in detalhes.items() if k not in omitidas}
+            linhas.append(row)
+        detalhes["comparison_snapshot"] = linhas
+
+    audit = detalhes.get("audit")
+    if isinstance(audit, dict) and REF_KEY in audit:
+        proprio = {k: v for k, v in audit.items() if k != REF_KEY}
+        shared = table.get(str(audit[REF_KEY])) if table is not None else None
+        if isinstance(shared, dict):
+            restaurado = deepcopy(shared)
+            restaurado.update(proprio)
+            proprio = restaurado
+        detalhes["audit"] = proprio
+
+    event["detalhes_regime"] = detalhes
+    return event
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from breakeven import _ruleset_unico
+from dto import DiagnosticInput
+from regimes_vetorizados import TabelasSimplesCompiladas, das_simples_anexo, get_tabelas_simples_compiladas
+
+# Custo da folha adicional por real de folha (1.0 = so o valor pago; a CPP ja esta no DAS do III/V).
+CUSTO_FOLHA_FATOR_PADRAO = 1.0
+
+
+@dataclass(frozen=True)
+class PlanoFatorR:
+    """
+    Plano por cliente III/V em colunas (indices apontam para a lista de entrada). Horizonte de
+    12 meses: DAS sobre a receita anual, comparavel a folha_12m. Clientes ja no Anexo III tem
+    folha_extra = 0 e economia 0.
+    """
+
+    ruleset_id: str
+    indices: np.ndarray
+    nomes: Tuple[str, ...]
+    folha_atual: np.ndarray
+    folha_minima: np.ndarray
+    folha_extra: np.ndarray
+    das_anexo_v: np.ndarray
+    das_anexo_iii: np.ndarray
+    economia_das: np.ndarray
+    economia_liquida: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.indices.size)
+
+    def linha(self, pos: int) -> Dict[str, Any]:
+        return {
+            "indice": int(self.indices[pos]),
+            "nome_empresa": self.nomes[pos],
+            "folha_atual": float(self.folha_atual[pos]),
+            "folha_minima": float(self.folha_minima[pos]),
+            "folha_extra": float(self.folha_extra[pos]),
+            "das_anexo_v": float(self.das_anexo_v[pos]),
+            "das_anexo_iii": float(self.das_anexo_iii[pos]),
+            "economia_das": float(self.economia_das[pos]),
+            "economia_liquida": float(self.economia_liquida[pos]),
+        }
+
+    def top(self, k: int, apenas_positivos: bool = True) -> List[Dict[str, Any]]:
+        """K maiores economias liquidas (heap; empate desfeito pelo indice de entrada)."""
+        if k <= 0:
+            return []
+        elegiveis = np.flatnonzero(self.economia_liquida > 0) if apenas_positivos else np.arange(len(self))
+        valores = self.economia_liquida[elegiveis].tolist()
+        melhores = heapq.nlargest(k, zip(valores, (-p for p in elegiveis.tolist())))
+        return [self.linha(-neg_pos) for _, neg_pos in melhores]
+
+
+def _folha_minima(limite: float, rbt12: np.ndarray) -> np.ndarray:
+    """Menor folha (em float64) com folha / rbt12 >= limite, como compara o calculo escalar."""
+    folha = limite * rbt12
+    for _ in range(4):
+        abaixo = np.nextafter(folha, -np.inf)
+        folha = np.where(folha / rbt12 < limite, np.nextafter(folha, np.inf), np.where(abaixo / rbt12 >= limite, abaixo, folha))
+    return folha
+
+
+def planejar_fator_r(
+    compiladas: TabelasSimplesCompiladas,
+    receita: Any,
+    rbt12: Any,
+    folha_12m: Any,
+    custo_folha_fator: float = CUSTO_FOLHA_FATOR_PADRAO,
+    fator_r: Any = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Nucleo vetorizado: folha minima para fator_r >= limite, DAS nos anexos V e III e economia
+    liquida (economia_das - folha_extra * custo_folha_fator). Linhas sem rbt12 > 0 ficam NaN.
+    `fator_r` informado (nao NaN) decide o anexo atual no lugar de folha_12m / rbt12, como no
+    calculo escalar.
+    """
+    if "III" not in compiladas.anexos or "V" not in compiladas.anexos:
+        raise ValueError(f"ruleset_id={compiladas.ruleset_id} | arquivo=simples_tables.json | chave=anexos | detalhe=anexos III e V obrigatorios")
+    receita = np.asarray(receita, dtype=np.float64)
+    rbt12 = np.asarray(rbt12, dtype=np.float64)
+    folha = np.asarray(folha_12m, dtype=np.float64)
+    limite = compiladas.fator_r_limite
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        folha_minima = _folha_minima(limite, rbt12)
+        fator = folha / rbt12
+        if fator_r is not None:
+            fator_r = np.asarray(fator_r, dtype=np.float64)
+            fator = np.where(np.isnan(fator_r), fator, fator_r)
+        ja_iii = fator >= limite
+    folha_extra = np.where(ja_iii, 0.0, np.maximum(0.0, folha_minima - folha))
+
+    das_v = das_simples_anexo(compiladas.anexos["V"], receita, rbt12)
+    das_iii = das_simples_anexo(compiladas.anexos["III"], receita, rbt12)
+    economia_das = np.where(ja_iii, 0.0, das_v - das_iii)
+    economia_liquida = economia_das - folha_extra * custo_folha_fator
+    invalido = ~(rbt12 > 0)
+    return {
+        "folha_minima": np.where(invalido, np.nan, folha_minima),
+        "folha_extra": np.where(invalido, np.nan, folha_extra),
+        "das_anexo_v": das_v,
+        "das_anexo_iii": das_iii,
+        "economia_das": np.where(invalido, np.nan, economia_das),
+        "economia_liquida": np.where(invalido, np.nan, economia_liquida),
+    }
+
+
+def otimizar_fator_r(
+    inputs: Sequence[DiagnosticInput],
+    ruleset_id: Optional[str] = None,
+    custo_folha_fator: float = CUSTO_FOLHA_FATOR_PADRAO,
+) -> PlanoFatorR:
+    """
+    Plano de Fator R para os clientes com anexo III/V da carteira. rbt12 ausente usa a receita
+    anual (como o DiagnosticService). Como em `imposto_simples_tabelado`, fator_r informado tem
+    prioridade sobre folha_12m (a folha atual passa a ser fator_r * rbt12); clientes sem folha
+    nem fator_r ficam de fora.
+    """
+    ruleset = _ruleset_unico(inputs, ruleset_id)
+    compiladas = get_tabelas_simples_compiladas(ruleset)
+
+    indices: List[int] = []
+    nomes: List[str] = []
+    receita: List[float] = []
+    rbt12: List[float] = []
+    folha: List[float] = []
+    fator: List[float] = []
+    for idx, inp in enumerate(inputs):
+        if str(inp.anexo_simples or "").strip().upper().replace("-", "/") != "III/V":
+            continue
+        r = float(inp.rbt12) if inp.rbt12 is not None else float(inp.receita_anual)
+        if inp.fator_r is not None:
+            f = float(inp.fator_r) * r
+        elif inp.folha_12m is not None:
+            f = float(inp.folha_12m)
+        else:
+            continue
+        indices.append(idx)
+        nomes.append(inp.nome_empresa)
+        receita.append(float(inp.receita_anual))
+        rbt12.append(r)
+        folha.append(f)
+        fator.append(float(inp.fator_r) if inp.fator_r is not None else np.nan)
+
+    folha_atual = np.asarray(folha, dtype=np.float64)
+    colunas = planejar_fator_r(compiladas, receita, rbt12, folha_atual, custo_folha_fator, fator_r=fator)
+    return PlanoFatorR(
+        ruleset_id=ruleset,
+        indices=np.asarray(indices, dtype=np.int64),
+        nomes=tuple(nomes),
+        folha_atual=folha_atual,
+        **colunas,
+    )
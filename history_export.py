@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import json_codec
+from event_codec import decode_event, get_blob_table
+from history_segments import list_segments, open_segment, segment_generations
+from history_store import TRIBUTOS_DAS, _history_path, _to_float, normalize_loaded_event
+
+EXPORT_FORMATS = ("parquet", "arrow", "npz")
+EXPORT_TEXT_COLUMNS = (
+    "timestamp",
+    "nome_empresa",
+    "regime_code",
+    "regime_model",
+    "ruleset_id",
+    "competencia",
+    "recomendacao_status",
+    "regime_recomendado",
+    "evento_tipo",
+    "refresh_of",
+)
+EXPORT_FLOAT_COLUMNS = ("receita_anual", "imposto_atual") + tuple(f"das_{tributo}" for tributo in TRIBUTOS_DAS)
+WATERMARK_FILE = "watermark.json"
+DEFAULT_EXPORT_DIR = os.path.join("outputs", "history_columnar")
+_PART_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow", "npz": ".npz"}
+
+
+def _slug(nome: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", nome.lower()).strip("_") or "cenario"
+
+
+def _float_or_nan(value: Any) -> float:
+    return _to_float(value, default=math.nan)
+
+
+def flatten_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Evento normalizado -> linha plana (texto/float). Ausentes viram "" (texto) ou NaN (float).
+    Eventos `report_refresh` repetem os valores do diagnostico original: `evento_tipo`/`refresh_of`
+    permitem filtra-los (diagnosticos ficam com `evento_tipo` vazio).
+    """
+    detalhes = event.get("detalhes_regime") if isinstance(event.get("detalhes_regime"), dict) else {}
+    recomendacao = detalhes.get("recommendation_snapshot")
+    recomendacao = recomendacao if isinstance(recomendacao, dict) else {}
+    breakdown = detalhes.get("breakdown_das")
+    breakdown = breakdown if isinstance(breakdown, dict) else {}
+
+    linha: Dict[str, Any] = {
+        "timestamp": str(event.get("timestamp") or ""),
+        "nome_empresa": str(event.get("nome_empresa") or ""),
+        "regime_code": str(detalhes.get("regime_code") or ""),
+        "regime_model": str(detalhes.get("regime_model") or ""),
+        "ruleset_id": str(detalhes.get("ruleset_id") or ""),
+        "competencia": str(detalhes.get("competencia") or ""),
+        "recomendacao_status": str(recomendacao.get("status") or ""),
+        "regime_recomendado": str(recomendacao.get("regime_recomendado") or ""),
+        "evento_tipo": str(event.get("evento_tipo") or ""),
+        "refresh_of": str(event.get("refresh_of") or ""),
+        "receita_anual": _to_float(event.get("receita_anual")),
+        "imposto_atual": _to_float(event.get("imposto_atual")),
+    }
+    for tributo in TRIBUTOS_DAS:
+        linha[f"das_{tributo}"] = _float_or_nan(breakdown.get(tributo))
+    for cenario in event.get("resultados") or []:
+        if not isinstance(cenario, dict):
+            continue
+        slug = _slug(str(cenario.get("nome_cenario") or ""))
+        linha[f"cenario_{slug}_impacto_percentual"] = _float_or_nan(cenario.get("impacto_percentual"))
+        linha[f"cenario_{slug}_imposto_reforma"] = _float_or_nan(cenario.get("imposto_reforma"))
+    return linha
+
+
+class WatermarkDesatualizado(ValueError):
+    """O watermark nao vale mais para o historico (segmento removido ou reescrito pela compactacao)."""
+
+
+def history_generations(caminho: str) -> Dict[str, int]:
+    """Geracoes dos segmentos de `caminho`; capture antes de ler para montar o watermark."""
+    return segment_generations(*os.path.split(caminho))
+
+
+def history_watermark(segmento: str, offset: int, geracoes: Dict[str, int]) -> Dict[str, Any]:
+    """Watermark `segmento + offset` com a geracao do segmento (offsets mudam quando ele e reescrito)."""
+    return {"segmento": segmento, "offset": offset, "geracao": geracoes.get(segmento, 0)}
+
+
+def _iter_events_forward(caminho: str, watermark: Optional[Dict[str, Any]]) -> Iterator[Tuple[str, int, Dict[str, Any]]]:
+    """
+    Eventos apos o watermark, em ordem cronologica: (segmento, offset_fim, evento_normalizado).
+    Levanta `WatermarkDesatualizado` se o segmento do watermark sumiu ou mudou de geracao.
+    """
+    diretorio, arquivo = os.path.split(caminho)
+    segmentos = list_segments(diretorio, arquivo)
+    inicio_offset = 0
+    if watermark:
+        nomes = [s.name for s in segmentos]
+        nome = watermark.get("segmento")
+        if nome not in nomes:
+            raise WatermarkDesatualizado(f"Watermark aponta para segmento inexistente ({nome}); execute exportacao completa.")
+        if int(watermark.get("geracao") or 0) != segment_generations(diretorio, arquivo).get(str(nome), 0):
+            raise WatermarkDesatualizado(
+                f"Segmento {nome} foi reescrito (compactacao) depois do watermark; execute exportacao completa."
+            )
+        segmentos = segmentos[nomes.index(str(nome)) :]
+        inicio_offset = int(watermark.get("offset") or 0)
+
+    table = get_blob_table(caminho)
+    for segmento in segmentos:
+        with open_segment(segmento) as f:
+            if inicio_offset > f.seek(0, os.SEEK_END):
+                raise WatermarkDesatualizado(f"Watermark alem do fim do segmento {segmento.name}; execute exportacao completa.")
+            f.seek(inicio_offset)
+            pos = inicio_offset
+            for linha in f:
+                pos += len(linha)
+                if not linha.endswith(b"\n"):
+                    # Linha parcial (append em andamento): fica para a proxima exportacao.
+                    break
+                if not linha.strip():
+                    continue
+                try:
+                    evento = normalize_loaded_event(decode_event(json_codec.loads(linha), table))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                yield segmento.name, pos, evento
+        inicio_offset = 0
+
+
+def _to_columns(linhas: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    nomes = list(EXPORT_TEXT_COLUMNS + EXPORT_FLOAT_COLUMNS)
+    extras = sorted({k for linha in linhas for k in linha if k not in nomes})
+    columns: Dict[str, List[Any]] = {}
+    for nome in nomes + extras:
+        vazio: Any = "" if nome in EXPORT_TEXT_COLUMNS else math.nan
+        columns[nome] = [linha.get(nome, vazio) for linha in linhas]
+    return columns
+
+
+def resolve_format(formato: str = "auto") -> str:
+    if formato not in ("auto",) + EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportacao invalido: {formato}. Use: auto, {', '.join(EXPORT_FORMATS)}.")
+    if formato in ("parquet", "arrow"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise ValueError(f"Formato '{formato}' requer o pacote opcional `pyarrow`.") from exc
+        return formato
+    if formato == "npz":
+        return formato
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "npz"
+    return "parquet"
+
+
+def _write_part(columns: Dict[str, List[Any]], caminho: str, formato: str) -> None:
+    if formato == "npz":
+        import numpy as np
+
+        arrays = {
+            nome: np.asarray(valores, dtype=str if nome in EXPORT_TEXT_COLUMNS else np.float64)
+            for nome, valores in columns.items()
+        }
+        with open(caminho, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        return
+
+    import pyarrow as pa
+
+    tabela = pa.table(
+        {
+            nome: pa.array(valores, type=pa.string() if nome in EXPORT_TEXT_COLUMNS else pa.float64())
+            for nome, valores in columns.items()
+        }
+    )
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(tabela, caminho)
+    else:
+        with pa.OSFile(caminho, "wb") as sink:
+            with pa.ipc.new_file(sink, tabela.schema) as writer:
+                writer.write_table(tabela)
+
+
+def _load_watermark(output_dir: str) -> Optional[Dict[str, Any]]:
+    caminho = os.path.join(output_dir, WATERMARK_FILE)
+    if not os.path.isfile(caminho):
+        return None
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _list_parts(output_dir: str) -> List[str]:
+    if not os.path.isdir(output_dir):
+        return []
+    extensoes = tuple(_PART_EXTENSIONS.values())
+    return sorted(os.path.join(output_dir, n) for n in os.listdir(output_dir) if n.startswith("part-") and n.endswith(extensoes))
+
+
+def export_history(
+    pasta: str = "data",
+    arquivo: str = "history.jsonl",
+    output_dir: str = DEFAULT_EXPORT_DIR,
+    formato: str = "auto",
+    full: bool = False,
+) -> Dict[str, Any]:
+    """
+    Exporta eventos normalizados em colunas tipadas (Parquet/Arrow IPC com pyarrow; NPZ sem pyarrow).
+    Incremental: cada execucao grava um `part-NNNNNN.<ext>` apenas com eventos apos o watermark
+    (`watermark.json`: segmento + offset + geracao do segmento). `full=True` descarta partes
+    anteriores (e o watermark) e reexporta tudo. Se a compactacao reescreveu o segmento do
+    watermark, a exportacao incremental falha (`WatermarkDesatualizado`) e exige `full=True`.
+    """
+    watermark = None if full else _load_watermark(output_dir)
+    if watermark and formato == "auto":
+        formato = str(watermark.get("formato") or "auto")
+    formato = resolve_format(formato)
+    if watermark and watermark.get("formato") != formato:
+        raise ValueError(f"Exportacao existente em '{watermark.get('formato')}'; use o mesmo formato ou full=True.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    watermark_path = os.path.join(output_dir, WATERMARK_FILE)
+    if full:
+        for parte in _list_parts(output_dir):
+            os.remove(parte)
+        if os.path.isfile(watermark_path):
+            os.remove(watermark_path)
+
+    caminho = _history_path(pasta=pasta, arquivo=arquivo)
+    geracoes = history_generations(caminho)
+    linhas: List[Dict[str, Any]] = []
+    ultimo: Optional[Tuple[str, int]] = None
+    for segmento, offset_fim, evento in _iter_events_forward(caminho, watermark):
+        linhas.append(flatten_event(evento))
+        ultimo = (segmento, offset_fim)
+
+    parte_path = None
+    if linhas:
+        numero = len(_list_parts(output_dir)) + 1
+        parte_path = os.path.join(output_dir, f"part-{numero:06d}{_PART_EXTENSIONS[formato]}")
+        _write_part(_to_columns(linhas), parte_path, formato)
+        novo_watermark = {**history_watermark(ultimo[0], ultimo[1], geracoes), "formato": formato}
+        with open(watermark_path, "w", encoding="utf-8") as f:
+            json.dump(novo_watermark, f, ensure_ascii=False, indent=2)
+        watermark = novo_watermark
+
+    return {"formato": formato, "eventos": len(linhas), "arquivo": parte_path, "watermark": watermark}
+
+
+def read_export(output_dir: str = DEFAULT_EXPORT_DIR) -> Dict[str, List[Any]]:
+    """Le todas as partes exportadas e concatena as colunas (uniao de colunas; ausentes viram ""/NaN)."""
+    partes: List[Dict[str, List[Any]]] = []
+    for caminho in _list_parts(output_dir):
+        if caminho.endswith(".npz"):
+            import numpy as np
+
+            with np.load(caminho) as data:
+                partes.append({nome: data[nome].tolist() for nome in data.files})
+        elif caminho.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            partes.append(pq.read_table(caminho).to_pydict())
+        else:
+            import pyarrow as pa
+
+            with pa.memory_map(caminho, "r") as source:
+                partes.append(pa.ipc.open_file(source).read_all().to_pydict())
+
+    nomes: List[str] = []
+    for parte in partes:
+        nomes.extend(n for n in parte if n not in nomes)
+    resultado: Dict[str, List[Any]] = {nome: [] for nome in nomes}
+    for parte in partes:
+        tamanho = len(next(iter(parte.values()), []))
+        for nome in nomes:
+            vazio: Any = "" if nome in EXPORT_TEXT_COLUMNS else math.nan
+            resultado[nome].extend(parte.get(nome, [vazio] * tamanho))
+    return resultado
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import json_codec
+from history_segments import Segment, list_segments, read_segment_bytes
+from history_store import _history_path, _to_float, normalize_loaded_event
+
+SCAN_TEXT_FIELDS = ("timestamp", "nome_empresa", "regime", "regime_code", "regime_model", "evento_tipo")
+SCAN_FLOAT_FIELDS = ("receita_anual", "imposto_atual")
+DEFAULT_RANGE_BYTES = 32 * 1024 * 1024
+# Abaixo disso o custo de subir processos supera o ganho: varre em linha no processo atual.
+MIN_PARALLEL_BYTES = 8 * 1024 * 1024
+
+# Tarefa: (caminho, codec, inicio, fim); codec != None => segmento comprimido inteiro (inicio/fim ignorados).
+_Task = Tuple[str, Optional[str], int, int]
+
+
+def _empty_columns() -> Dict[str, List[Any]]:
+    return {field: [] for field in SCAN_TEXT_FIELDS + SCAN_FLOAT_FIELDS}
+
+
+def _empty_aggregates() -> Dict[str, Any]:
+    return {"eventos": 0, "linhas_invalidas": 0, "refreshes": 0, "por_regime": {}}
+
+
+def _parse_lines(data: Any, start: int, end: int) -> Dict[str, Any]:
+    """Parseia as linhas em data[start:end] (bytes ou mmap) com a semantica de `normalize_loaded_event`."""
+    columns = _empty_columns()
+    aggregates = _empty_aggregates()
+    por_regime = aggregates["por_regime"]
+    pos = start
+    while pos < end:
+        fim_linha = data.find(b"\n", pos, end)
+        if fim_linha < 0:
+            fim_linha = end
+        linha = data[pos:fim_linha]
+        pos = fim_linha + 1
+        if not linha.strip():
+            continue
+        try:
+            bruto = json_codec.loads(linha)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            aggregates["linhas_invalidas"] += 1
+            continue
+        if not isinstance(bruto, dict):
+            aggregates["linhas_invalidas"] += 1
+            continue
+
+        evento = normalize_loaded_event(bruto)
+        detalhes = evento["detalhes_regime"]
+        valores = {
+            "timestamp": str(evento.get("timestamp") or ""),
+            "nome_empresa": str(evento.get("nome_empresa") or ""),
+            "regime": str(evento.get("regime") or ""),
+            "regime_code": str(detalhes.get("regime_code") or ""),
+            "regime_model": str(detalhes.get("regime_model") or ""),
+            "evento_tipo": str(evento.get("evento_tipo") or ""),
+        }
+        for field in SCAN_TEXT_FIELDS:
+            columns[field].append(valores[field])
+        receita = _to_float(evento.get("receita_anual"))
+        imposto = _to_float(evento.get("imposto_atual"))
+        columns["receita_anual"].append(receita)
+        columns["imposto_atual"].append(imposto)
+
+        aggregates["eventos"] += 1
+        if valores["evento_tipo"] == "report_refresh":
+            # Refresh repete receita/imposto do diagnostico original: fica so nas colunas.
+            aggregates["refreshes"] += 1
+            continue
+        regime = por_regime.setdefault(valores["regime_code"], {"eventos": 0, "receita_total": 0.0, "imposto_total": 0.0})
+        regime["eventos"] += 1
+        regime["receita_total"] += receita
+        regime["imposto_total"] += imposto
+    return {"columns": columns, "aggregates": aggregates}
+
+
+def _scan_task(task: _Task) -> Dict[str, Any]:
+    caminho, codec, start, end = task
+    if codec is not None:
+        data = read_segment_bytes(Segment(name="", path=caminho, month="", seq=0, codec=codec))
+        return _parse_lines(data, 0, len(data))
+    with open(caminho, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _parse_lines(mm, start, min(end, len(mm)))
+
+
+def split_ranges(caminho: str, range_bytes: int = DEFAULT_RANGE_BYTES) -> List[Tuple[int, int]]:
+    """Divide o arquivo em faixas [inicio, fim) alinhadas em quebra de linha (via mmap)."""
+    tamanho = os.path.getsize(caminho)
+    if tamanho == 0:
+        return []
+    range_bytes = max(1, int(range_bytes))
+    faixas: List[Tuple[int, int]] = []
+    with open(caminho, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            inicio = 0
+            while inicio < tamanho:
+                alvo = inicio + range_bytes
+                if alvo >= tamanho:
+                    fim = tamanho
+                else:
+                    quebra = mm.find(b"\n", alvo)
+                    fim = tamanho if quebra < 0 else quebra + 1
+                faixas.append((inicio, fim))
+                inicio = fim
+    return faixas
+
+
+def _build_tasks(segmentos: List[Segment], range_bytes: int) -> Tuple[List[_Task], int]:
+    tasks: List[_Task] = []
+    total_bytes = 0
+    for segmento in segmentos:
+        tamanho = os.path.getsize(segmento.path)
+        total_bytes += tamanho
+        if tamanho == 0:
+            continue
+        if segmento.codec is not None:
+            tasks.append((segmento.path, segmento.codec, 0, 0))
+            continue
+        for inicio, fim in split_ranges(segmento.path, range_bytes):
+            tasks.append((segmento.path, None, inicio, fim))
+    return tasks, total_bytes
+
+
+def _merge(parciais: List[Dict[str, Any]]) -> Dict[str, Any]:
+    columns = _empty_columns()
+    aggregates = _empty_aggregates()
+    for parcial in parciais:
+        for field, valores in parcial["columns"].items():
+            columns[field].extend(valores)
+        aggregates["eventos"] += parcial["aggregates"]["eventos"]
+        aggregates["linhas_invalidas"] += parcial["aggregates"]["linhas_invalidas"]
+        aggregates["refreshes"] += parcial["aggregates"]["refreshes"]
+        for code, stats in parcial["aggregates"]["por_regime"].items():
+            destino = aggregates["por_regime"].setdefault(code, {"eventos": 0, "receita_total": 0.0, "imposto_total": 0.0})
+            for chave, valor in stats.items():
+                destino[chave] += valor
+    return {"columns": columns, "aggregates": aggregates}
+
+
+def scan_history(
+    pasta: str = "data",
+    arquivo: str = "history.jsonl",
+    workers: Optional[int] = None,
+    range_bytes: int = DEFAULT_RANGE_BYTES,
+    min_parallel_bytes: int = MIN_PARALLEL_BYTES,
+) -> Dict[str, Any]:
+    """
+    Varredura analitica completa do historico (todos os segmentos, ordem cronologica).
+    Segmentos sem compressao sao mapeados (mmap) e divididos em faixas por quebra de linha;
+    segmentos comprimidos viram uma tarefa cada. As faixas sao parseadas num pool de processos.
+    Retorna `columns` (lote colunar: listas alinhadas por evento, do mais antigo ao mais recente)
+    e `aggregates` (eventos, linhas_invalidas, refreshes e totais por regime_code), alem de `bytes`
+    e `tarefas`. Eventos `report_refresh` entram nas colunas mas nao nos totais por regime.
+    `workers=1` (ou historico menor que `min_parallel_bytes`) executa no processo atual.
+    """
+    diretorio, nome_arquivo = os.path.split(_history_path(pasta=pasta, arquivo=arquivo))
+    tasks, total_bytes = _build_tasks(list_segments(diretorio, nome_arquivo), range_bytes)
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+
+    if workers <= 1 or len(tasks) <= 1 or total_bytes < min_parallel_bytes:
+        parciais = [_scan_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            parciais = list(pool.map(_scan_task, tasks))
+
+    resultado = _merge(parciais)
+    resultado["bytes"] = total_bytes
+    resultado["tarefas"] = len(tasks)
+    return resultado
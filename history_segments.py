@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import lzma
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
+
+import json_codec
+
+# Segmentos: `<stem>.<AAAA-MM>.<NNN>.jsonl` (ativo, sem compressao) e `...jsonl.gz|.xz|.zst` (fechados).
+# O arquivo unico legado (`history.jsonl`) continua legivel como segmento mais antigo.
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+CODEC_ENV_VAR = "TDE_HISTORY_CODEC"
+DEFAULT_CODEC = "gzip"
+CODEC_EXTENSIONS = {"gzip": ".gz", "lzma": ".xz", "zstd": ".zst"}
+_DECOMPRESSED_CACHE_MAX = 2
+_DECOMPRESSED_CACHE: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+_DECOMPRESSED_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Segment:
+    name: str  # nome logico (sem extensao de compressao); usado nas referencias `nome:offset`
+    path: str
+    month: str  # "" para o arquivo legado
+    seq: int  # -1 para o arquivo legado
+    codec: Optional[str]  # None = sem compressao
+
+    @property
+    def legacy(self) -> bool:
+        return self.seq < 0
+
+
+def resolve_codec(codec: Optional[str] = None) -> str:
+    escolhido = str(codec or os.getenv(CODEC_ENV_VAR) or DEFAULT_CODEC).strip().lower()
+    if escolhido not in CODEC_EXTENSIONS:
+        raise ValueError(f"Codec de historico invalido: {escolhido}. Use: {', '.join(CODEC_EXTENSIONS)}.")
+    return escolhido
+
+
+def _zstd() -> Any:
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ValueError("Codec 'zstd' requer o pacote opcional `zstandard` (pip install zstandard).") from exc
+    return zstandard
+
+
+def compress_bytes(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if codec == "lzma":
+        return lzma.compress(data, preset=6)
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=10).compress(data)
+    raise ValueError(f"Codec de historico invalido: {codec}.")
+
+
+def decompress_bytes(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "lzma":
+        return lzma.decompress(data)
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"Codec de historico invalido: {codec}.")
+
+
+def _segment_pattern(arquivo: str) -> "re.Pattern[str]":
+    stem = os.path.splitext(arquivo)[0]
+    extensoes = "|".join(re.escape(ext) for ext in CODEC_EXTENSIONS.values())
+    return re.compile(rf"^{re.escape(stem)}\.(\d{{4}}-\d{{2}})\.(\d{{3}})\.jsonl({extensoes})?$")
+
+
+def segment_name(arquivo: str, month: str, seq: int) -> str:
+    return f"{os.path.splitext(arquivo)[0]}.{month}.{seq:03d}.jsonl"
+
+
+@contextmanager
+def history_lock(diretorio: str, arquivo: str) -> Iterator[None]:
+    """
+    Trava exclusiva do historico (`<stem>.lock`, entre processos e threads) para append,
+    rotacao/compressao e compactacao: nenhum segmento e fechado entre a escolha do ativo e a escrita.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, os.path.splitext(arquivo)[0] + ".lock")
+    with open(caminho, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _scan_segments(diretorio: str, arquivo: str) -> Tuple[List[Segment], List[Tuple[Segment, Segment]]]:
+    """(segmentos, pares (nao comprimido, comprimido) do mesmo segmento logico)."""
+    segmentos: List[Segment] = []
+    legado = os.path.join(diretorio, arquivo)
+    if os.path.isfile(legado):
+        segmentos.append(Segment(name=arquivo, path=legado, month="", seq=-1, codec=None))
+    try:
+        nomes = os.listdir(diretorio)
+    except OSError:
+        return segmentos, []
+
+    pattern = _segment_pattern(arquivo)
+    codec_por_ext = {ext: codec for codec, ext in CODEC_EXTENSIONS.items()}
+    por_nome: Dict[str, Segment] = {}
+    duplicados: List[Tuple[Segment, Segment]] = []
+    for nome in nomes:
+        match = pattern.match(nome)
+        if not match:
+            continue
+        month, seq, ext = match.group(1), int(match.group(2)), match.group(3)
+        logico = segment_name(arquivo, month, seq)
+        segmento = Segment(
+            name=logico,
+            path=os.path.join(diretorio, nome),
+            month=month,
+            seq=seq,
+            codec=codec_por_ext.get(ext) if ext else None,
+        )
+        anterior = por_nome.get(logico)
+        if anterior is not None:
+            duplicados.append((anterior, segmento) if anterior.codec is None else (segmento, anterior))
+            segmento = anterior if anterior.codec is not None else segmento
+        por_nome[logico] = segmento
+    segmentos.extend(sorted(por_nome.values(), key=lambda s: (s.month, s.seq)))
+    return segmentos, duplicados
+
+
+def _erro_duplicado(aberto: Segment, fechado: Segment) -> ValueError:
+    return ValueError(
+        f"Segmento {aberto.name} existe sem compressao e comprimido ({os.path.basename(fechado.path)}). "
+        "Execute `tools/history_maintenance.py --rotate` (remove a copia identica) ou concilie manualmente."
+    )
+
+
+def _list_segments_locked(diretorio: str, arquivo: str) -> List[Segment]:
+    """`list_segments` para quem ja segura `history_lock`: duplicado e sempre erro."""
+    segmentos, duplicados = _scan_segments(diretorio, arquivo)
+    if duplicados:
+        raise _erro_duplicado(*duplicados[0])
+    return segmentos
+
+
+def list_segments(diretorio: str, arquivo: str) -> List[Segment]:
+    """
+    Segmentos do mais antigo para o mais recente (arquivo legado primeiro, se existir).
+    Um `.jsonl` ao lado da sua versao comprimida e erro (ValueError): ele pode ter linhas que
+    nao estao na versao comprimida. Antes de falhar, confere de novo sob a trava (compressao
+    em andamento).
+    """
+    segmentos, duplicados = _scan_segments(diretorio, arquivo)
+    if not duplicados:
+        return segmentos
+    with history_lock(diretorio, arquivo):
+        return _list_segments_locked(diretorio, arquivo)
+
+
+def _generations_path(diretorio: str, arquivo: str) -> str:
+    return os.path.join(diretorio, os.path.splitext(arquivo)[0] + ".generations.json")
+
+
+def segment_generations(diretorio: str, arquivo: str) -> Dict[str, int]:
+    """
+    Geracao de cada segmento (0 = nunca reescrito): incrementada por `compact_report_refreshes`
+    antes de reescrever o segmento. Offsets `nome:offset` so valem na geracao em que foram lidos.
+    """
+    caminho = _generations_path(diretorio, arquivo)
+    if not os.path.isfile(caminho):
+        return {}
+    with open(caminho, "r", encoding="utf-8") as f:
+        return {str(nome): int(geracao) for nome, geracao in json.load(f).items()}
+
+
+def _bump_generations(diretorio: str, arquivo: str, nomes: List[str]) -> None:
+    geracoes = segment_generations(diretorio, arquivo)
+    for nome in nomes:
+        geracoes[nome] = geracoes.get(nome, 0) + 1
+    _write_atomic(_generations_path(diretorio, arquivo), json.dumps(geracoes, sort_keys=True, indent=2).encode("utf-8"))
+
+
+def find_segment(diretorio: str, arquivo: str, name: str) -> Optional[Segment]:
+    for segmento in list_segments(diretorio, arquivo):
+        if segmento.name == name:
+            return segmento
+    return None
+
+
+def segments_signature(diretorio: str, arquivo: str) -> Tuple[int, int]:
+    """(maior mtime_ns, tamanho total) dos segmentos; (0, 0) se nao houver historico."""
+    mtime, total = 0, 0
+    for segmento in list_segments(diretorio, arquivo):
+        try:
+            stat = os.stat(segmento.path)
+        except OSError:
+            continue
+        mtime = max(mtime, stat.st_mtime_ns)
+        total += stat.st_size
+    return (mtime, total)
+
+
+def read_segment_bytes(segmento: Segment) -> bytes:
+    """Conteudo descomprimido; segmentos comprimidos ficam num LRU pequeno (chave inclui mtime/tamanho)."""
+    stat = os.stat(segmento.path)
+    if segmento.codec is None:
+        with open(segmento.path, "rb") as f:
+            return f.read()
+    chave = (segmento.path, stat.st_mtime_ns, stat.st_size)
+    with _DECOMPRESSED_LOCK:
+        data = _DECOMPRESSED_CACHE.get(chave)
+        if data is not None:
+            _DECOMPRESSED_CACHE.move_to_end(chave)
+            return data
+    with open(segmento.path, "rb") as f:
+        data = decompress_bytes(f.read(), segmento.codec)
+    with _DECOMPRESSED_LOCK:
+        _DECOMPRESSED_CACHE[chave] = data
+        while len(_DECOMPRESSED_CACHE) > _DECOMPRESSED_CACHE_MAX:
+            _DECOMPRESSED_CACHE.popitem(last=False)
+    return data
+
+
+def open_segment(segmento: Segment) -> IO[bytes]:
+    """Arquivo binario seekable com offsets do conteudo descomprimido."""
+    if segmento.codec is None:
+        return open(segmento.path, "rb")
+    return io.BytesIO(read_segment_bytes(segmento))
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def close_segment(segmento: Segment, codec: Optional[str] = None) -> Segment:
+    """
+    Comprime um segmento fechado (grava `.ext` atomico e remove o `.jsonl`). Legado nao e tocado.
+    Chamado sob `history_lock` (`rotate_segments`): nenhum append concorre com a compressao.
+    """
+    if segmento.codec is not None or segmento.legacy:
+        return segmento
+    codec = resolve_codec(codec)
+    destino = segmento.path + CODEC_EXTENSIONS[codec]
+    with open(segmento.path, "rb") as f:
+        _write_atomic(destino, compress_bytes(f.read(), codec))
+    os.remove(segmento.path)
+    return Segment(name=segmento.name, path=destino, month=segmento.month, seq=segmento.seq, codec=codec)
+
+
+def _choose_active(
+    segmentos: List[Segment], diretorio: str, arquivo: str, now: Optional[datetime], max_bytes: Optional[int]
+) -> Segment:
+    month = (now or datetime.now()).strftime("%Y-%m")
+    do_mes = [s for s in segmentos if not s.legacy and s.month == month]
+    ultimo = do_mes[-1] if do_mes else None
+    limite = SEGMENT_MAX_BYTES if max_bytes is None else max_bytes
+    if ultimo is not None and ultimo.codec is None and os.path.getsize(ultimo.path) < limite:
+        return ultimo
+    seq = (ultimo.seq + 1) if ultimo is not None else 1
+    nome = segment_name(arquivo, month, seq)
+    return Segment(name=nome, path=os.path.join(diretorio, nome), month=month, seq=seq, codec=None)
+
+
+def active_segment(
+    diretorio: str,
+    arquivo: str,
+    now: Optional[datetime] = None,
+    max_bytes: Optional[int] = None,
+) -> Segment:
+    """
+    Segmento que recebe o proximo append: mes corrente, rotacionando por tamanho (`max_bytes`,
+    padrao `SEGMENT_MAX_BYTES`). So escolhe: nao comprime nada (ver `rotate_segments`).
+    """
+    return _choose_active(list_segments(diretorio, arquivo), diretorio, arquivo, now, max_bytes)
+
+
+def append_line(diretorio: str, arquivo: str, linha: bytes) -> Tuple[str, int]:
+    """
+    Acrescenta `linha` ao segmento ativo sob `history_lock`; retorna (caminho_segmento, offset).
+    Nunca recria um segmento que ja foi comprimido.
+    """
+    with history_lock(diretorio, arquivo):
+        ativo = _choose_active(_list_segments_locked(diretorio, arquivo), diretorio, arquivo, None, None)
+        if any(os.path.exists(ativo.path + ext) for ext in CODEC_EXTENSIONS.values()):
+            raise ValueError(f"Segmento {ativo.name} ja foi fechado; append recusado.")
+        with open(ativo.path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(linha)
+    return ativo.path, offset
+
+
+def rotate_segments(
+    diretorio: str,
+    arquivo: str,
+    now: Optional[datetime] = None,
+    max_bytes: Optional[int] = None,
+    codec: Optional[str] = None,
+) -> Segment:
+    """
+    Manutencao (fora do caminho de append): sob `history_lock`, comprime os segmentos nao
+    comprimidos que deixaram de ser o ativo e retorna o ativo. Um `.jsonl` deixado ao lado da
+    versao comprimida (compressao interrompida) e removido so se o conteudo for identico;
+    caso contrario e erro.
+    """
+    with history_lock(diretorio, arquivo):
+        segmentos, duplicados = _scan_segments(diretorio, arquivo)
+        for aberto, fechado in duplicados:
+            with open(aberto.path, "rb") as f_aberto, open(fechado.path, "rb") as f_fechado:
+                identicos = f_aberto.read() == decompress_bytes(f_fechado.read(), str(fechado.codec))
+            if not identicos:
+                raise _erro_duplicado(aberto, fechado)
+            os.remove(aberto.path)
+        ativo = _choose_active(segmentos, diretorio, arquivo, now, max_bytes)
+        for segmento in segmentos:
+            if segmento.codec is None and not segmento.legacy and segmento.name != ativo.name:
+                close_segment(segmento, codec)
+    return ativo
+
+
+def _fold_key(event: Dict[str, Any]) -> Tuple[str, float, float]:
+    def _num(value: Any) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    return (str(event.get("nome_empresa", "")), _num(event.get("receita_anual")), _num(event.get("imposto_atual")))
+
+
+def compact_report_refreshes(diretorio: str, arquivo: str) -> Dict[str, int]:
+    """
+    Incorpora eventos `evento_tipo == "report_refresh"` ao evento que eles substituem.
+    O evento original passa a ter o conteudo do refresh mais recente (mantendo seu `timestamp`
+    e registrando `refreshed_at`); a linha do refresh e removida.
+    Atua apenas em segmentos fechados (comprimidos e legado): o segmento ativo nao e reescrito.
+    Reescrever um segmento invalida referencias `nome:offset` apontando para ele: a geracao do
+    segmento (`segment_generations`) e incrementada antes da reescrita.
+    """
+    with history_lock(diretorio, arquivo):
+        return _compact_report_refreshes(diretorio, arquivo)
+
+
+def _compact_report_refreshes(diretorio: str, arquivo: str) -> Dict[str, int]:
+    fechados = [s for s in _list_segments_locked(diretorio, arquivo) if s.codec is not None or s.legacy]
+    linhas_por_segmento: List[List[bytes]] = []
+    por_timestamp: Dict[Tuple[str, str], Tuple[int, int]] = {}
+    por_chave: Dict[Tuple[str, float, float], Tuple[int, int]] = {}
+    substituicoes: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    removidas: set = set()
+
+    for seg_idx, segmento in enumerate(fechados):
+        linhas = [linha for linha in read_segment_bytes(segmento).split(b"\n") if linha.strip()]
+        linhas_por_segmento.append(linhas)
+        for linha_idx, linha in enumerate(linhas):
+            try:
+                evento = json_codec.loads(linha)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if not isinstance(evento, dict):
+                continue
+            posicao = (seg_idx, linha_idx)
+            if evento.get("evento_tipo") != "report_refresh":
+                por_timestamp[(str(evento.get("nome_empresa", "")), str(evento.get("timestamp", "")))] = posicao
+                por_chave[_fold_key(evento)] = posicao
+                continue
+
+            alvo = None
+            if evento.get("refresh_of"):
+                alvo = por_timestamp.get((str(evento.get("nome_empresa", "")), str(evento["refresh_of"])))
+            if alvo is None:
+                alvo = por_chave.get(_fold_key(evento))
+            if alvo is None:
+                continue
+            original = substituicoes.get(alvo) or json_codec.loads(linhas_por_segmento[alvo[0]][alvo[1]])
+            folded = {k: v for k, v in evento.items() if k not in ("evento_tipo", "refresh_of")}
+            folded["timestamp"] = original.get("timestamp", "")
+            folded["refreshed_at"] = evento.get("timestamp", "")
+            substituicoes[alvo] = folded
+            removidas.add(posicao)
+
+    afetados = {pos[0] for pos in substituicoes} | {pos[0] for pos in removidas}
+    # Geracao primeiro: uma falha entre as duas etapas so forca releitura completa, nunca pula linhas.
+    if afetados:
+        _bump_generations(diretorio, arquivo, [fechados[idx].name for idx in sorted(afetados)])
+    for seg_idx in sorted(afetados):
+        segmento = fechados[seg_idx]
+        saida = io.BytesIO()
+        for linha_idx, linha in enumerate(linhas_por_segmento[seg_idx]):
+            posicao = (seg_idx, linha_idx)
+            if posicao in removidas:
+                continue
+            if posicao in substituicoes:
+                linha = json_codec.dumps(substituicoes[posicao])
+            saida.write(linha + b"\n")
+        data = saida.getvalue()
+        _write_atomic(segmento.path, compress_bytes(data, segmento.codec) if segmento.codec else data)
+
+    return {"refreshes_incorporados": len(removidas), "segmentos_reescritos": len(afetados)}
@@ -1,15 +1,30 @@
 ﻿import json
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Tuple, Union
 
+import json_codec
 from audit_metadata import build_audit_metadata
 from dto import DiagnosticInput
+from event_codec import EVENT_SCHEMA_VERSION, decode_event, encode_event, get_blob_table, schema_version
+from history_segments import (
+    Segment,
+    append_line,
+    find_segment,
+    list_segments,
+    open_segment,
+    segment_generations,
+    segments_signature,
+)
 from report_formatters import (
+    render_auditoria_section,
     render_comparativo_section,
     render_detalhes_regime,
     render_eligibilidade_section,
     render_recomendacao_section,
+    render_rodape_relatorio,
 )
 from ruleset_loader import DEFAULT_RULESET_ID, get_simples_tables
 from regime_utils import (
@@ -22,25 +37,85 @@ from report_builder import montar_relatorio_executivo
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TRIBUTOS_DAS = ("IRPJ", "CSLL", "PIS", "COFINS", "CPP", "ICMS", "ISS")
+EVENT_SUMMARY_FIELDS = ("timestamp", "nome_empresa", "regime", "receita_anual", "imposto_atual")
+_REVERSE_CHUNK_BYTES = 64 * 1024
+# Referencia de evento: `"segmento:offset"`; int = offset no arquivo legado (formato anterior).
+EventRef = Union[int, str]
+_NORMALIZE_MEMO_MAX = 4096
+_NORMALIZE_MEMO: "OrderedDict[int, Tuple[Dict[str, Any], Dict[str, Any]]]" = OrderedDict()
+_NORMALIZE_LOCK = threading.Lock()
 
 
 def _history_path(pasta: str = "data", arquivo: str = "history.jsonl") -> str:
     return os.path.join(BASE_DIR, pasta, arquivo)
 
 
-def append_event(event: Dict[str, Any], pasta: str = "data", arquivo: str = "history.jsonl") -> str:
-    caminho = _history_path(pasta=pasta, arquivo=arquivo)
-    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+def _append_payload(event: Dict[str, Any], caminho: str, compact: bool = True) -> Tuple[str, int]:
+    """Grava no segmento ativo de `caminho` (historico logico); retorna (caminho_segmento, offset)."""
+    diretorio, arquivo = os.path.split(caminho)
+    os.makedirs(diretorio, exist_ok=True)
 
     payload = {
         **event,
         "timestamp": datetime.now().isoformat(timespec="seconds"),
     }
+    if compact:
+        payload = encode_event(payload, get_blob_table(caminho))
+    else:
+        payload["schema_version"] = EVENT_SCHEMA_VERSION
+    return append_line(diretorio, arquivo, json_codec.dumps(payload) + b"\n")
+
+
+def append_event(
+    event: Dict[str, Any],
+    pasta: str = "data",
+    arquivo: str = "history.jsonl",
+    compact: bool = True,
+) -> str:
+    """
+    Grava o evento no historico e retorna o caminho do segmento escrito.
+    Por padrao usa o formato compacto v2 (`event_codec`): sem `relatorio_texto` e com o audit
+    compartilhado na tabela lateral `<arquivo>.blobs.jsonl`. Segmentos mensais em `history_segments`.
+    """
+    caminho_segmento, _ = _append_payload(event, _history_path(pasta=pasta, arquivo=arquivo), compact=compact)
+    return caminho_segmento
+
+
+def append_event_ref(
+    event: Dict[str, Any],
+    pasta: str = "data",
+    arquivo: str = "history.jsonl",
+    compact: bool = True,
+) -> EventRef:
+    """Como `append_event`, mas retorna a referencia (`segmento:offset`) do evento para `load_event_at`."""
+    caminho_segmento, offset = _append_payload(event, _history_path(pasta=pasta, arquivo=arquivo), compact=compact)
+    return f"{os.path.basename(caminho_segmento)}:{offset}"
+
+
+def _parse_ref(ref: EventRef | None, arquivo: str) -> Tuple[str | None, int | None]:
+    """
+    Referencia/cursor -> (nome_segmento, offset). Inteiros (formato anterior) apontam para o
+    arquivo legado; `"nome:"` (offset vazio) significa o fim do segmento.
+    """
+    if ref is None:
+        return None, None
+    if isinstance(ref, int):
+        return arquivo, ref
+    nome, _, offset = str(ref).rpartition(":")
+    if not nome:
+        return arquivo, int(offset)
+    return nome, (int(offset) if offset else None)
+
+
+def _decode_line(linha: bytes, caminho: str) -> Dict[str, Any]:
+    """json -> decode v2 (tabela lateral) -> normalize. Propaga JSONDecodeError/UnicodeDecodeError."""
+    return normalize_loaded_event(decode_event(json_codec.loads(linha), get_blob_table(caminho)))
 
-    with open(caminho, "a", encoding="utf-8") as f:
-        f.write(json.dumps(payload, ensure_ascii=False) + "\n")
 
-    return caminho
+def history_signature(pasta: str = "data", arquivo: str = "history.jsonl") -> Tuple[int, int]:
+    """Assinatura barata (maior mtime_ns, tamanho total dos segmentos) para chaves de cache; (0, 0) se ausente."""
+    diretorio, arquivo = os.path.split(_history_path(pasta=pasta, arquivo=arquivo))
+    return segments_signature(diretorio, arquivo)
 
 
 def _to_float(value: Any, default: float = 0.0) -> float:
@@ -151,75 +226,6 @@ def _bloco_periodo_detalhes(detalhes_regime: Dict[str, Any]) -> str:
     return "\n".join(linhas) + "\n"
 
 
-def _formatar_data_hora_br(iso_text: Any) -> str | None:
-    if not iso_text:
-        return None
-    try:
-        dt = datetime.fromisoformat(str(iso_text))
-    except (TypeError, ValueError):
-        return None
-    return dt.strftime("%d/%m/%Y %H:%M:%S")
-
-
-def _bloco_auditoria(audit: Dict[str, Any]) -> str:
-    ruleset_metadata = audit.get("ruleset_metadata") if isinstance(audit.get("ruleset_metadata"), dict) else {}
-    ruleset_id = str(audit.get("ruleset_id", ruleset_metadata.get("ruleset_id", "N/D")))
-    vigencia_inicio = ruleset_metadata.get("vigencia_inicio", "N/D")
-    vigencia_fim = ruleset_metadata.get("vigencia_fim", "N/D")
-    descricao_ruleset = ruleset_metadata.get("descricao", "N/D")
-    as_of_date = str(audit.get("as_of_date", "N/D"))
-    calculo_tipo = str(audit.get("calculo_tipo", "N/D"))
-    generated_at = str(audit.get("generated_at", "N/D"))
-
-    integrity = audit.get("integrity") if isinstance(audit.get("integrity"), dict) else {}
-    integrity_status = integrity.get("status", "N/D")
-    integrity_ruleset_hash = integrity.get("ruleset_hash", "N/D")
-    integrity_baseline_hash = integrity.get("baseline_hash", "N/D")
-    checked_files = integrity.get("checked_files", []) if isinstance(integrity.get("checked_files"), list) else []
-
-    sources = audit.get("sources") if isinstance(audit.get("sources"), list) else []
-    references = audit.get("references") if isinstance(audit.get("references"), list) else []
-    assumptions = audit.get("assumptions") if isinstance(audit.get("assumptions"), list) else []
-    limitations = audit.get("limitations") if isinstance(audit.get("limitations"), list) else []
-    alerts = audit.get("alerts") if isinstance(audit.get("alerts"), list) else []
-
-    linhas = [
-        "=== AUDITORIA (BASE NORMATIVA & PREMISSAS) ===",
-        f"Ruleset: {ruleset_id}",
-        f"Vigência: {vigencia_inicio} até {vigencia_fim}",
-        f"Descrição do ruleset: {descricao_ruleset}",
-        f"As of date: {as_of_date}",
-        f"Tipo de cálculo: {calculo_tipo}",
-        f"Gerado em (ISO): {generated_at}",
-        f"Integridade ruleset/baseline: {integrity_status}",
-        f"Hash ruleset: {integrity_ruleset_hash}",
-        f"Hash baseline: {integrity_baseline_hash}",
-        f"Arquivos verificados: {', '.join(checked_files) if checked_files else 'N/D'}",
-        "Fontes:",
-    ]
-    linhas.extend(f"- {s}" for s in sources)
-    if references:
-        linhas.append("Referências oficiais:")
-        linhas.extend(f"- {r}" for r in references)
-    linhas.append("Premissas:")
-    linhas.extend(f"- {s}" for s in assumptions)
-    linhas.append("Limitações:")
-    linhas.extend(f"- {s}" for s in limitations)
-    if alerts:
-        linhas.append("Alertas:")
-        linhas.extend(f"- {s}" for s in alerts)
-    return "\n".join(linhas)
-
-
-def _rodape_relatorio(audit: Dict[str, Any] | None) -> str:
-    if not isinstance(audit, dict):
-        return "Relatório gerado em: (não disponível — evento legado)"
-    data_hora = _formatar_data_hora_br(audit.get("generated_at"))
-    if not data_hora:
-        return "Relatório gerado em: (não disponível — evento legado)"
-    return f"Relatório gerado em: {data_hora}"
-
-
 def has_audit(event: Dict[str, Any]) -> bool:
     payload = normalize_event(event)
     detalhes = payload.get("detalhes_regime", {})
@@ -229,6 +235,14 @@ def has_audit(event: Dict[str, Any]) -> bool:
     return bool(audit.get("ruleset_id")) and bool(audit.get("generated_at"))
 
 
+def needs_report_refresh(event: Dict[str, Any]) -> bool:
+    """Evento com relatorio salvo sem audit ou sem o bloco de auditoria (oferece refresh legado)."""
+    texto = event.get("relatorio_texto")
+    if not (isinstance(texto, str) and texto.strip()):
+        return False
+    return (not has_audit(event)) or ("=== AUDITORIA" not in texto)
+
+
 def _diagnostic_input_from_event(payload: Dict[str, Any]) -> DiagnosticInput:
     detalhes = payload.get("detalhes_regime", {})
     tipo_atividade = detalhes.get("tipo_atividade_considerado")
@@ -337,14 +351,84 @@ def build_refreshed_event(event: Dict[str, Any]) -> Dict[str, Any]:
     refreshed["detalhes_regime"]["audit"] = build_audit_metadata(inp, refreshed["detalhes_regime"])
     refreshed["relatorio_texto"] = build_report_from_event(refreshed)
     refreshed["evento_tipo"] = "report_refresh"
+    refreshed["refresh_of"] = str(payload.get("timestamp") or "")
     return refreshed
 
 
+def _memo_get(event: Any) -> Dict[str, Any] | None:
+    with _NORMALIZE_LOCK:
+        entrada = _NORMALIZE_MEMO.get(id(event))
+        if entrada is None or entrada[0] is not event:
+            return None
+        _NORMALIZE_MEMO.move_to_end(id(event))
+        return entrada[1]
+
+
+def _memo_put(event: Dict[str, Any], normalized: Dict[str, Any]) -> None:
+    # Guarda a referencia ao proprio evento: o id nao pode ser reutilizado enquanto estiver no memo.
+    with _NORMALIZE_LOCK:
+        _NORMALIZE_MEMO[id(event)] = (event, normalized)
+        if normalized is not event:
+            _NORMALIZE_MEMO[id(normalized)] = (normalized, normalized)
+        while len(_NORMALIZE_MEMO) > _NORMALIZE_MEMO_MAX:
+            _NORMALIZE_MEMO.popitem(last=False)
+
+
+def _normalize_current_schema(event: Dict[str, Any]) -> Dict[str, Any] | None:
+    """
+    Caminho rapido: eventos gravados no schema atual ja trazem regime canonico, codigos em
+    `detalhes_regime` e valores float. Nao escreve no evento recebido: chaves de topo ausentes
+    (`cenarios`, ...) vao numa copia rasa; aninhados sao compartilhados. Retorna None se alguma
+    invariante falhar.
+    """
+    if schema_version(event) != EVENT_SCHEMA_VERSION:
+        return None
+    detalhes = event.get("detalhes_regime")
+    resultados = event.get("resultados")
+    if not isinstance(detalhes, dict) or not isinstance(resultados, list):
+        return None
+    if not isinstance(event.get("cenarios", resultados), list):
+        return None
+    if not detalhes.get("regime_code") or not detalhes.get("regime_model"):
+        return None
+    if event.get("regime") != detalhes.get("regime_display"):
+        return None
+    if not isinstance(event.get("receita_anual"), float) or not isinstance(event.get("imposto_atual"), float):
+        return None
+    if "cenarios" in event and "timestamp" in event and "nome_empresa" in event:
+        return event
+    return {"cenarios": resultados, "timestamp": "", "nome_empresa": "", **event}
+
+
+def normalize_loaded_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    `normalize_event` sem memo, para leitores em lote/streaming (varredura, exportacao,
+    listagens): cada linha lida e um objeto novo, entao o memo nunca acertaria.
+    """
+    if not isinstance(event, dict):
+        return _normalize_legacy(event)
+    normalized = _normalize_current_schema(event)
+    return normalized if normalized is not None else _normalize_legacy(event)
+
+
 def normalize_event(event: Dict[str, Any]) -> Dict[str, Any]:
     """
     Normaliza eventos antigos/novos para um contrato unico consumivel na UI.
     Mantem compatibilidade com chaves historicas (cenarios) e atuais (resultados).
+    Eventos no schema atual (`schema_version`) seguem sem copia profunda; o resultado e
+    memoizado por objeto para consultas repetidas do mesmo evento (app, relatorio).
     """
+    if not isinstance(event, dict):
+        return _normalize_legacy(event)
+    normalized = _memo_get(event)
+    if normalized is not None:
+        return normalized
+    normalized = normalize_loaded_event(event)
+    _memo_put(event, normalized)
+    return normalized
+
+
+def _normalize_legacy(event: Dict[str, Any] | None) -> Dict[str, Any]:
     payload = dict(event or {})
     resultados = payload.get("resultados")
     cenarios = payload.get("cenarios")
@@ -363,7 +447,7 @@ def normalize_event(event: Dict[str, Any]) -> Dict[str, Any]:
     payload["imposto_atual"] = _to_float(payload.get("imposto_atual"))
 
     detalhes = payload.get("detalhes_regime")
-    detalhes = detalhes if isinstance(detalhes, dict) else {}
+    detalhes = dict(detalhes) if isinstance(detalhes, dict) else {}
 
     regime_original = payload.get("regime", "")
     regime_info = canonicalize_regime(regime_original, detalhes.get("regime_code"), detalhes.get("regime_model"))
@@ -425,8 +509,8 @@ def build_report_from_event(event: Dict[str, Any]) -> str:
         integrity = audit.get("integrity") if isinstance(audit.get("integrity"), dict) else {}
         if integrity.get("status") == "FAIL":
             relatorio = "ALERTA DE INTEGRIDADE: ruleset/baseline com divergencia (compliance FAIL).\n\n" + relatorio
-        relatorio += "\n\n" + _bloco_auditoria(audit)
-    relatorio += "\n" + _rodape_relatorio(audit if isinstance(audit, dict) else None)
+        relatorio += "\n\n" + render_auditoria_section(audit)
+    relatorio += "\n" + render_rodape_relatorio(audit if isinstance(audit, dict) else None)
     return relatorio
 
 
@@ -441,20 +525,143 @@ def get_event_report_text(event: Dict[str, Any]) -> str:
     return build_report_from_event(payload)
 
 
-def list_events(limit: int = 50, pasta: str = "data", arquivo: str = "history.jsonl") -> List[Dict[str, Any]]:
+def _iter_lines_reverse(segmento: Segment, end_offset: int | None = None) -> Iterator[Tuple[int, bytes]]:
+    """
+    Itera linhas nao vazias do segmento do fim para o inicio, sem carregar o arquivo inteiro
+    (segmentos comprimidos sao lidos do conteudo descomprimido em cache).
+    Gera (offset_inicio_linha, bytes_da_linha) a partir de `end_offset` (exclusivo).
+    """
+    with open_segment(segmento) as f:
+        pos = f.seek(0, os.SEEK_END) if end_offset is None else min(int(end_offset), f.seek(0, os.SEEK_END))
+        resto = b""
+        while pos > 0:
+            leitura = min(_REVERSE_CHUNK_BYTES, pos)
+            pos -= leitura
+            f.seek(pos)
+            bloco = f.read(leitura) + resto
+            partes = bloco.split(b"\n")
+            resto = partes[0]
+            inicio = pos + len(resto) + 1
+            segmentos: List[Tuple[int, bytes]] = []
+            for parte in partes[1:]:
+                segmentos.append((inicio, parte))
+                inicio += len(parte) + 1
+            for offset, parte in reversed(segmentos):
+                if parte.strip():
+                    yield offset, parte
+        if resto.strip():
+            yield 0, resto
+
+
+def _iter_history_reverse(caminho: str, cursor: EventRef | None = None) -> Iterator[Tuple[str, int, bytes]]:
+    """Linhas de todos os segmentos, do mais recente para o mais antigo: (nome_segmento, offset, linha)."""
+    diretorio, arquivo = os.path.split(caminho)
+    segmentos = list_segments(diretorio, arquivo)
+    nome_cursor, end_offset = _parse_ref(cursor, arquivo)
+    if nome_cursor is not None:
+        nomes = [s.name for s in segmentos]
+        if nome_cursor not in nomes:
+            return
+        segmentos = segmentos[: nomes.index(nome_cursor) + 1]
+
+    for segmento in reversed(segmentos):
+        for offset, linha in _iter_lines_reverse(segmento, end_offset=end_offset):
+            yield segmento.name, offset, linha
+        end_offset = None
+
+
+def summarize_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Projecao minima de um evento normalizado para listagens (tabela/selecao de historico),
+    com `refresh_legado` para decidir o botao de refresh sem carregar o evento completo.
+    """
+    resumo = {field: event.get(field) for field in EVENT_SUMMARY_FIELDS}
+    resumo["refresh_legado"] = needs_report_refresh(event)
+    return resumo
+
+
+def list_event_page(
+    cursor: EventRef | None = None,
+    page_size: int = 50,
+    pasta: str = "data",
+    arquivo: str = "history.jsonl",
+    busca: str = "",
+) -> Dict[str, Any]:
+    """
+    Pagina o historico (todos os segmentos) do mais recente para o mais antigo usando cursor
+    `segmento:offset`. Retorna apenas a projecao de listagem (`summarize_event`) mais o `offset`
+    (referencia do evento); o evento completo e carregado sob demanda via `load_event_at`.
+    `next_cursor` e None quando nao ha mais paginas.
+    """
+    caminho = _history_path(pasta=pasta, arquivo=arquivo)
+    termo = (busca or "").strip().lower()
+    page_size = max(1, int(page_size))
+    items: List[Dict[str, Any]] = []
+    next_cursor: EventRef | None = None
+
+    for nome_segmento, offset, linha in _iter_history_reverse(caminho, cursor):
+        if len(items) >= page_size:
+            next_cursor = f"{nome_segmento}:{offset + len(linha) + 1}"
+            break
+        try:
+            # A projecao de listagem nao precisa do audit: dispensa resolver a tabela lateral.
+            evento = normalize_loaded_event(json_codec.loads(linha))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+        if termo and termo not in str(evento.get("nome_empresa", "") or "").lower():
+            continue
+        resumo = summarize_event(evento)
+        resumo["offset"] = f"{nome_segmento}:{offset}"
+        items.append(resumo)
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def ref_generation(offset: EventRef, pasta: str = "data", arquivo: str = "history.jsonl") -> int:
+    """
+    Geracao atual do segmento da referencia (`history_segments.segment_generations`): guarde junto
+    com a referencia; se mudar, a compactacao reescreveu o segmento e o offset nao vale mais.
+    """
+    diretorio, nome_arquivo = os.path.split(_history_path(pasta=pasta, arquivo=arquivo))
+    nome_segmento, _ = _parse_ref(offset, nome_arquivo)
+    return segment_generations(diretorio, nome_arquivo).get(str(nome_segmento), 0)
+
+
+def load_event_at(offset: EventRef, pasta: str = "data", arquivo: str = "history.jsonl") -> Dict[str, Any] | None:
+    """
+    Carrega e normaliza um unico evento pela referencia retornada em `list_event_page`/`append_event_ref`.
+    Offset que nao cai no inicio de uma linha (referencia antiga apos compactacao) retorna None.
+    """
     caminho = _history_path(pasta=pasta, arquivo=arquivo)
-    if not os.path.exists(caminho):
-        return []
+    diretorio, nome_arquivo = os.path.split(caminho)
+    nome_segmento, posicao = _parse_ref(offset, nome_arquivo)
+    segmento = find_segment(diretorio, nome_arquivo, str(nome_segmento))
+    if segmento is None:
+        return None
+    posicao = max(0, int(posicao or 0))
+    with open_segment(segmento) as f:
+        if posicao > 0:
+            f.seek(posicao - 1)
+            if f.read(1) != b"\n":
+                return None
+        f.seek(posicao)
+        linha = f.readline()
+    try:
+        return _decode_line(linha, caminho)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
 
-    with open(caminho, "r", encoding="utf-8") as f:
-        linhas = [l.strip() for l in f.readlines() if l.strip()]
 
-    eventos: List[Dict[str, Any]] = []
-    for linha in linhas[-limit:]:
+def list_events(limit: int = 50, pasta: str = "data", arquivo: str = "history.jsonl") -> List[Dict[str, Any]]:
+    caminho = _history_path(pasta=pasta, arquivo=arquivo)
+
+    # Le apenas o final do historico: as ultimas `limit` linhas nao vazias (corrompidas contam no limite).
+    eventos: List[Dict[str, Any]] = []  # mais recentes primeiro
+    for idx, (_, _, linha) in enumerate(_iter_history_reverse(caminho)):
+        if idx >= limit:
+            break
         try:
-            eventos.append(normalize_event(json.loads(linha)))
-        except json.JSONDecodeError:
+            eventos.append(_decode_line(linha, caminho))
+        except (json.JSONDecodeError, UnicodeDecodeError):
             continue
-
-    eventos.reverse()  # mais recentes primeiro
     return eventos
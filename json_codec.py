@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Backend de (de)serializacao para linhas de historico e arquivos de ruleset.
+# Hashes canonicos (event_codec.content_hash, tools.ruleset_audit._hash_json_payload) NAO passam
+# por aqui: continuam no `json` da stdlib com sort_keys/separators fixos.
+JSON_BACKEND_ENV_VAR = "TDE_JSON_BACKEND"
+JSON_BACKENDS = ("orjson", "ujson", "json")
+
+_Dumps = Callable[[Any], bytes]
+_Loads = Callable[[Any], Any]
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _stdlib_loads(data: Any) -> Any:
+    return json.loads(data)
+
+
+def _tem_nao_finito(obj: Any) -> bool:
+    """NaN/Infinity em algum float do payload (busca iterativa: bem mais barata que o dumps da stdlib)."""
+    pilha = [obj]
+    isfinite = math.isfinite
+    while pilha:
+        valor = pilha.pop()
+        tipo = type(valor)
+        if tipo is float:
+            if not isfinite(valor):
+                return True
+        elif tipo is dict:
+            pilha.extend(valor.values())
+        elif tipo is list or tipo is tuple:
+            pilha.extend(valor)
+    return False
+
+
+def _build_orjson() -> Tuple[_Dumps, _Loads]:
+    import orjson
+
+    options = orjson.OPT_NON_STR_KEYS
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=options)
+
+    return _dumps, orjson.loads
+
+
+def _build_ujson() -> Tuple[_Dumps, _Loads]:
+    import ujson
+
+    def _dumps(obj: Any) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+
+    return _dumps, ujson.loads
+
+
+_BUILDERS: Dict[str, Callable[[], Tuple[_Dumps, _Loads]]] = {
+    "orjson": _build_orjson,
+    "ujson": _build_ujson,
+    "json": lambda: (_stdlib_dumps, _stdlib_loads),
+}
+
+
+class JsonCodec:
+    """
+    Codec com caminho rapido opcional. Qualquer falha do backend rapido (tipo nao suportado,
+    NaN/Infinity na leitura, bytes invalidos) cai no `json` da stdlib, de modo que as mesmas
+    entradas sao aceitas/rejeitadas e os erros continuam sendo `json.JSONDecodeError` /
+    `UnicodeDecodeError` / `TypeError` como antes.
+    Payloads com NaN/Infinity sao gravados pela stdlib (`NaN`), pois o orjson os gravaria como
+    `null`: o conteudo salvo nao depende do backend. O orjson ainda le inteiros acima de 64 bits
+    como float; por isso dados que alimentam hashes usam `loads_exact`.
+    """
+
+    def __init__(self, name: str) -> None:
+        if name not in _BUILDERS:
+            raise ValueError(f"Backend JSON invalido: {name}. Use: {', '.join(JSON_BACKENDS)}.")
+        self.name = name
+        self._dumps, self._loads = _BUILDERS[name]()
+
+    def dumps(self, obj: Any) -> bytes:
+        """JSON em UTF-8 (sem `\\n`). Com stdlib: identico a `json.dumps(obj, ensure_ascii=False)`."""
+        if self._dumps is _stdlib_dumps or _tem_nao_finito(obj):
+            return _stdlib_dumps(obj)
+        try:
+            return self._dumps(obj)
+        except (TypeError, ValueError, OverflowError):
+            return _stdlib_dumps(obj)
+
+    def loads(self, data: Any) -> Any:
+        if self._loads is _stdlib_loads:
+            return _stdlib_loads(data)
+        try:
+            return self._loads(data)
+        except (TypeError, ValueError, OverflowError):
+            return _stdlib_loads(data)
+
+
+_ACTIVE: Optional[JsonCodec] = None
+
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    """
+    Backend explicito/`TDE_JSON_BACKEND`; sem preferencia, stdlib. orjson/ujson sao opt-in: ter o
+    pacote instalado nao muda o backend (nem o que e gravado no historico).
+    """
+    escolhido = str(name or os.getenv(JSON_BACKEND_ENV_VAR) or "").strip().lower()
+    if not escolhido:
+        return "json"
+    if escolhido not in JSON_BACKENDS:
+        raise ValueError(f"Backend JSON invalido: {escolhido}. Use: {', '.join(JSON_BACKENDS)}.")
+    return escolhido
+
+
+def get_codec() -> JsonCodec:
+    global _ACTIVE
+    if _ACTIVE is None:
+        _ACTIVE = JsonCodec(resolve_backend())
+    return _ACTIVE
+
+
+def set_backend(name: Optional[str]) -> JsonCodec:
+    """Troca o backend ativo (None = reavaliar `TDE_JSON_BACKEND`/instalados). Uso: testes e benchmarks."""
+    global _ACTIVE
+    _ACTIVE = JsonCodec(resolve_backend(name))
+    return _ACTIVE
+
+
+def dumps(obj: Any) -> bytes:
+    return get_codec().dumps(obj)
+
+
+def loads(data: Any) -> Any:
+    return get_codec().loads(data)
+
+
+def loads_exact(data: Any) -> Any:
+    """Sempre stdlib: para payloads cujo conteudo parseado entra em hashes (arquivos de ruleset/baseline)."""
+    return _stdlib_loads(data)
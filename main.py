@@ -1,4 +1,5 @@
-﻿import re
+﻿import argparse
+import re
 from datetime import datetime
 
 from dto import DiagnosticInput
@@ -8,6 +9,7 @@ from history_store import append_event, list_events
 from input_utils import validar_competencia, validar_periodicidade
 from outputs_manager import listar_relatorios, ler_relatorio
 from pdf_exporter import salvar_relatorio_pdf
+from profiling import add_profile_arguments, profile_from_args
 from regime_selector import escolher_regime
 from tax_engine import DiagnosticService
 
@@ -151,7 +153,7 @@ def _ler_simples_tabelado_inputs(receita_anual: float) -> tuple[float, float, st
 service = DiagnosticService()
 
 
-def executar_analise():
+def executar_analise(profile_args: argparse.Namespace | None = None):
     print("\n=== NOVA ANALISE ===")
 
     nome_empresa = input("Digite o nome da empresa: ").strip()
@@ -245,7 +247,8 @@ def executar_analise():
             modo_analise=modo_analise,
         )
 
-    out = service.run(inp)
+    with profile_from_args("main_diagnostico", profile_args):
+        out = service.run(inp)
 
     print("\nRegime:", out.regime)
     print("Imposto atual:", formatar_reais(out.imposto_atual))
@@ -343,9 +346,9 @@ def ver_historico():
         print("Imposto atual:", formatar_reais(e.get("imposto_atual", 0)))
 
 
-def menu():
+def menu(profile_args: argparse.Namespace | None = None):
     opcoes = {
-        "1": ("Nova analise", executar_analise),
+        "1": ("Nova analise", lambda: executar_analise(profile_args)),
         "3": ("Listar relatorios TXT", mostrar_relatorios),
         "4": ("Abrir relatorio TXT", abrir_relatorio),
         "5": ("Exportar TXT para PDF", exportar_relatorio_pdf),
@@ -370,5 +373,13 @@ def menu():
             print("Opcao invalida.")
 
 
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tax Diagnostic Engine (menu interativo).")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    # So o diagnostico e perfilado: a espera por input() do menu nao entra no profile.
+    menu(args)
+
+
 if __name__ == "__main__":
-    menu()
+    main()
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from company_profile import normalize_company_profile
+from dto import DiagnosticInput
+from regime_comparator import _input_for_regime, compare_regimes
+from regime_registry import get_compiled_regimes
+from regime_utils import REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL, REGIME_CODE_SIMPLES
+
+# O comparativo calcula o Lucro Real sem creditos de PIS/COFINS (despesas_creditaveis e
+# percentual_credito_estimado ficam de fora da linha REAL), entao so a margem e sorteavel.
+MONTE_CARLO_VARIAVEIS = ("margem_lucro",)
+_CAMPOS_FORA_DO_COMPARATIVO = ("percentual_credito_estimado", "despesas_creditaveis")
+MONTE_CARLO_REGIMES = (REGIME_CODE_SIMPLES, REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL)
+MONTE_CARLO_AMOSTRAS_PADRAO = 10_000
+MONTE_CARLO_QUANTIS_PADRAO = (0.05, 0.5, 0.95)
+
+# Dominio valido de cada variavel (mesmas validacoes do calculo escalar); amostras sao recortadas nele.
+_DOMINIOS = {
+    "margem_lucro": (0.0, np.inf),
+}
+
+# tipo -> parametros obrigatorios
+DISTRIBUICOES = {
+    "fixo": ("valor",),
+    "uniforme": ("minimo", "maximo"),
+    "triangular": ("minimo", "moda", "maximo"),
+    "normal": ("media", "desvio"),
+}
+
+
+@dataclass(frozen=True)
+class MonteCarloResult:
+    """
+    Probabilidade de cada regime ser o mais barato e quantis do imposto_total por regime.
+    Regimes bloqueados (ou sem calculo valido) no comparativo ficam fora (`regimes_avaliados`).
+    """
+
+    n_amostras: int
+    seed: Optional[int]
+    regimes_avaliados: Tuple[str, ...]
+    probabilidade_menor: Dict[str, float]
+    quantis: Dict[str, Dict[str, float]]
+    media: Dict[str, float]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "n_amostras": self.n_amostras,
+            "seed": self.seed,
+            "regimes_avaliados": list(self.regimes_avaliados),
+            "probabilidade_menor": dict(self.probabilidade_menor),
+            "quantis": {k: dict(v) for k, v in self.quantis.items()},
+            "media": dict(self.media),
+        }
+
+
+def _rotulo_quantil(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+def _erro_variavel(variaveis: Sequence[str]) -> ValueError:
+    detalhe = ""
+    if set(variaveis) & set(_CAMPOS_FORA_DO_COMPARATIVO):
+        detalhe = " Creditos de PIS/COFINS nao entram no Lucro Real do comparativo."
+    return ValueError(f"Variavel de Monte Carlo invalida: {', '.join(variaveis)}. Use: {', '.join(MONTE_CARLO_VARIAVEIS)}.{detalhe}")
+
+
+def distribuicao_de_texto(texto: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    "variavel=tipo:p1[:p2[:p3]]" (parametros na ordem de DISTRIBUICOES, ex.
+    "margem_lucro=triangular:0.05:0.12:0.25") -> (variavel, spec).
+    """
+    variavel, sep, resto = texto.partition("=")
+    partes = resto.split(":")
+    tipo = partes[0].strip().lower()
+    if not sep or tipo not in DISTRIBUICOES:
+        raise ValueError(f"Distribuicao invalida: {texto}. Formato: variavel=tipo:p1[:p2[:p3]] com tipo em {', '.join(DISTRIBUICOES)}.")
+    nomes = DISTRIBUICOES[tipo]
+    if len(partes) - 1 != len(nomes):
+        raise ValueError(f"Distribuicao {tipo} requer parametros: {', '.join(nomes)}.")
+    try:
+        valores = [float(p.replace(",", ".")) for p in partes[1:]]
+    except ValueError:
+        raise ValueError(f"Parametros nao numericos em: {texto}.") from None
+    return variavel.strip(), {"tipo": tipo, **dict(zip(nomes, valores))}
+
+
+def amostrar(rng: np.random.Generator, variavel: str, spec: Mapping[str, Any], n: int) -> np.ndarray:
+    """n amostras de `spec` ({"tipo": ..., parametros}) recortadas ao dominio da variavel."""
+    if variavel not in _DOMINIOS:
+        raise _erro_variavel([variavel])
+    tipo = str(spec.get("tipo", "")).strip().lower()
+    if tipo not in DISTRIBUICOES:
+        raise ValueError(f"Distribuicao invalida para {variavel}: {tipo or 'N/D'}. Use: {', '.join(DISTRIBUICOES)}.")
+    faltando = [p for p in DISTRIBUICOES[tipo] if not isinstance(spec.get(p), (int, float))]
+    if faltando:
+        raise ValueError(f"Distribuicao {tipo} de {variavel} requer parametros numericos: {', '.join(faltando)}.")
+
+    if tipo == "fixo":
+        valores = np.full(n, float(spec["valor"]))
+    elif tipo == "uniforme":
+        if spec["maximo"] < spec["minimo"]:
+            raise ValueError(f"Distribuicao uniforme de {variavel} requer minimo <= maximo.")
+        valores = rng.uniform(float(spec["minimo"]), float(spec["maximo"]), n)
+    elif tipo == "triangular":
+        if not (spec["minimo"] <= spec["moda"] <= spec["maximo"]) or spec["minimo"] == spec["maximo"]:
+            raise ValueError(f"Distribuicao triangular de {variavel} requer minimo <= moda <= maximo e minimo < maximo.")
+        valores = rng.triangular(float(spec["minimo"]), float(spec["moda"]), float(spec["maximo"]), n)
+    else:
+        if spec["desvio"] < 0:
+            raise ValueError(f"Distribuicao normal de {variavel} requer desvio >= 0.")
+        valores = rng.normal(float(spec["media"]), float(spec["desvio"]), n)
+    minimo, maximo = _DOMINIOS[variavel]
+    return np.clip(valores, minimo, maximo)
+
+
+def simular_regimes(
+    inp: DiagnosticInput,
+    distribuicoes: Mapping[str, Mapping[str, Any]],
+    n_amostras: int = MONTE_CARLO_AMOSTRAS_PADRAO,
+    seed: Optional[int] = None,
+    quantis: Sequence[float] = MONTE_CARLO_QUANTIS_PADRAO,
+) -> MonteCarloResult:
+    """
+    Monte Carlo do comparativo: sorteia a margem conforme `distribuicoes` e avalia o Lucro Real
+    pelo `calcular_lote` do plugin, com o mesmo input da linha REAL de `compare_regimes` (sem
+    creditos). Simples e Presumido nao dependem da margem e entram com o valor do comparativo.
+    Distribuicao degenerada reproduz o comparativo; `seed` torna o resultado reprodutivel.
+    """
+    if n_amostras <= 0:
+        raise ValueError("n_amostras deve ser maior que zero.")
+    for q in quantis:
+        if not 0.0 <= float(q) <= 1.0:
+            raise ValueError("quantis devem estar entre 0 e 1.")
+    desconhecidas = sorted(set(distribuicoes) - set(MONTE_CARLO_VARIAVEIS))
+    if desconhecidas:
+        raise _erro_variavel(desconhecidas)
+
+    profile = normalize_company_profile(inp)
+    ruleset_id = profile.ruleset_id
+    comparison = compare_regimes(profile, ruleset_id)
+    fixos = {
+        row["regime_code"]: float(row["imposto_total"])
+        for row in comparison["rows"]
+        if row["eligibility_status"] != "BLOCKED" and row["imposto_total"] is not None
+    }
+
+    rng = np.random.default_rng(seed)
+    # Ordem fixa de sorteio para que a mesma seed gere as mesmas amostras independente do dict.
+    amostras = {v: amostrar(rng, v, distribuicoes[v], n_amostras) for v in MONTE_CARLO_VARIAVEIS if v in distribuicoes}
+
+    impostos: Dict[str, np.ndarray] = {}
+    for regime in MONTE_CARLO_REGIMES:
+        if regime not in fixos:
+            continue
+        if regime != REGIME_CODE_REAL:
+            impostos[regime] = np.full(n_amostras, fixos[regime])
+            continue
+        real = _input_for_regime(profile, REGIME_CODE_REAL)
+        colunas: Dict[str, Any] = {"receita_anual": np.full(n_amostras, real.receita_anual)}
+        if real.receita_base_periodo is not None:
+            colunas["receita_base_periodo"] = np.full(n_amostras, float(real.receita_base_periodo))
+        if "margem_lucro" in amostras:
+            colunas["margem_lucro"] = amostras["margem_lucro"]
+        elif real.margem_lucro is not None:
+            colunas["margem_lucro"] = np.full(n_amostras, float(real.margem_lucro))
+        impostos[regime] = get_compiled_regimes(ruleset_id).plugin(REGIME_CODE_REAL).calcular_lote(colunas)
+
+    regimes = tuple(impostos)
+    if not regimes:
+        return MonteCarloResult(n_amostras, seed, (), {}, {}, {})
+    matriz = np.stack([impostos[r] for r in regimes])
+    # Empate: vence o primeiro na ordem do comparativo (SIMPLES, PRESUMIDO, REAL).
+    vencedores = np.bincount(np.argmin(matriz, axis=0), minlength=len(regimes))
+    valores_quantis = np.quantile(matriz, list(quantis), axis=1)
+    return MonteCarloResult(
+        n_amostras=n_amostras,
+        seed=seed,
+        regimes_avaliados=regimes,
+        probabilidade_menor={r: float(vencedores[i]) / n_amostras for i, r in enumerate(regimes)},
+        quantis={r: {_rotulo_quantil(float(q)): float(valores_quantis[j, i]) for j, q in enumerate(quantis)} for i, r in enumerate(regimes)},
+        media={r: float(matriz[i].mean()) for i, r in enumerate(regimes)},
+    )
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from regimes import TRIBUTOS_DAS
+from regimes_vetorizados import anexo_aplicado, get_tabelas_simples_compiladas
+from ruleset_loader import DEFAULT_RULESET_ID
+
+JANELA_MESES = 12
+_RE_COMPETENCIA_MENSAL = re.compile(r"^(\d{4})-(0[1-9]|1[0-2])$")
+
+
+def competencias_mensais(inicio: str, meses: int) -> Tuple[str, ...]:
+    """Sequencia YYYY-MM a partir de `inicio` (inclusivo)."""
+    m = _RE_COMPETENCIA_MENSAL.match((inicio or "").strip())
+    if not m:
+        raise ValueError("Competência inválida para periodicidade mensal. Use formato YYYY-MM.")
+    base = int(m.group(1)) * 12 + int(m.group(2)) - 1
+    return tuple(f"{(base + i) // 12:04d}-{(base + i) % 12 + 1:02d}" for i in range(meses))
+
+
+def _janela_anterior(valores: np.ndarray, ativo: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Soma e quantidade de meses ativos nos 12 meses anteriores a cada competencia, via somas
+    acumuladas (O(1) por mes): janela[j] = acumulado[j] - acumulado[j - 12].
+    """
+    n, m = valores.shape
+    acumulado = np.zeros((n, m + 1))
+    np.cumsum(valores, axis=1, out=acumulado[:, 1:])
+    contagem = np.zeros((n, m + 1), dtype=np.int64)
+    np.cumsum(ativo, axis=1, out=contagem[:, 1:])
+    fim = np.arange(m)
+    inicio = np.maximum(fim - JANELA_MESES, 0)
+    return acumulado[:, fim] - acumulado[:, inicio], contagem[:, fim] - contagem[:, inicio]
+
+
+def rbt12_movel(receitas: Any) -> np.ndarray:
+    """
+    RBT12 de cada competencia (shape (empresas, meses)): receita dos 12 meses anteriores.
+    Inicio de atividade (menos de 12 meses anteriores): media dos meses anteriores x 12; no
+    primeiro mes, receita do proprio mes x 12 (LC 123/2006, art. 18, §§ 1-2). Meses NaN nao
+    sao de atividade (NaN no resultado).
+    """
+    receitas = np.atleast_2d(np.asarray(receitas, dtype=np.float64))
+    ativo = ~np.isnan(receitas)
+    valores = np.where(ativo, receitas, 0.0)
+    soma, meses = _janela_anterior(valores, ativo)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        proporcional = (soma / meses) * JANELA_MESES
+    rbt12 = np.where(meses >= JANELA_MESES, soma, np.where(meses > 0, proporcional, valores * JANELA_MESES))
+    return np.where(ativo, rbt12, np.nan)
+
+
+def fator_r_movel(receitas: Any, folhas: Any) -> np.ndarray:
+    """Fator R por competencia: folha / receita dos mesmos meses usados no RBT12."""
+    receitas = np.atleast_2d(np.asarray(receitas, dtype=np.float64))
+    folhas = np.atleast_2d(np.asarray(folhas, dtype=np.float64))
+    if folhas.shape != receitas.shape:
+        raise ValueError("folhas deve ter o mesmo shape de receitas (empresas x meses).")
+    ativo = ~np.isnan(receitas)
+    valores = np.where(ativo, receitas, 0.0)
+    folha_valores = np.where(ativo, np.nan_to_num(folhas), 0.0)
+    soma_receita, meses = _janela_anterior(valores, ativo)
+    soma_folha, _ = _janela_anterior(folha_valores, ativo)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fator = np.where(meses > 0, soma_folha / soma_receita, folha_valores / valores)
+    return np.where(ativo, fator, np.nan)
+
+
+@dataclass(frozen=True)
+class ApuracaoMensal:
+    """
+    Apuracao do Simples mes a mes (arrays (empresas, meses)). `anexo` indexa `anexos`
+    (-1 = sem calculo: sem atividade, anexo desconhecido ou III/V sem folha); `faixa` e 1-based.
+    """
+
+    ruleset_id: str
+    competencias: Tuple[str, ...]
+    anexos: Tuple[str, ...]
+    receita: np.ndarray
+    rbt12: np.ndarray
+    fator_r: np.ndarray
+    anexo: np.ndarray
+    faixa: np.ndarray
+    aliquota_nominal: np.ndarray
+    parcela_deduzir: np.ndarray
+    aliquota_efetiva: np.ndarray
+    das: np.ndarray
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.das.shape
+
+    def partilha(self) -> np.ndarray:
+        """DAS por tributo, shape (empresas, meses, len(TRIBUTOS_DAS)); calculado sob demanda."""
+        compiladas = get_tabelas_simples_compiladas(self.ruleset_id)
+        resultado = np.full(self.das.shape + (len(TRIBUTOS_DAS),), np.nan)
+        for codigo, nome in enumerate(self.anexos):
+            percentuais = compiladas.anexos[nome].partilha
+            mascara = self.anexo == codigo
+            if percentuais is None or not mascara.any():
+                continue
+            resultado[mascara] = self.das[mascara][:, None] * percentuais[self.faixa[mascara] - 1]
+        return resultado
+
+    def to_rows(self, nomes: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Tabela por competencia (uma linha por empresa x mes), com a partilha por tributo."""
+        partilha = self.partilha()
+        linhas: List[Dict[str, Any]] = []
+        n, m = self.shape
+        for i in range(n):
+            for j in range(m):
+                codigo = int(self.anexo[i, j])
+                linha: Dict[str, Any] = {
+                    "empresa": nomes[i] if nomes is not None else i,
+                    "competencia": self.competencias[j],
+                    "receita": float(self.receita[i, j]),
+                    "rbt12": float(self.rbt12[i, j]),
+                    "fator_r": float(self.fator_r[i, j]),
+                    "anexo_aplicado": self.anexos[codigo] if codigo >= 0 else None,
+                    "faixa": int(self.faixa[i, j]) if codigo >= 0 else None,
+                    "aliquota_nominal": float(self.aliquota_nominal[i, j]),
+                    "parcela_deduzir": float(self.parcela_deduzir[i, j]),
+                    "aliquota_efetiva": float(self.aliquota_efetiva[i, j]),
+                    "das": float(self.das[i, j]),
+                }
+                linha["breakdown_das"] = {t: float(partilha[i, j, k]) for k, t in enumerate(TRIBUTOS_DAS)} if codigo >= 0 else {}
+                linhas.append(linha)
+        return linhas
+
+
+def apurar_simples_mensal(
+    receitas: Any,
+    anexos: Sequence[str],
+    competencias: Sequence[str],
+    folhas: Optional[Any] = None,
+    ruleset_id: str = DEFAULT_RULESET_ID,
+) -> ApuracaoMensal:
+    """
+    DAS mensal com RBT12 movel para uma carteira (`receitas` shape (empresas, meses), um anexo
+    por empresa). Mesma formula de `imposto_simples_tabelado` por mes: faixa pelo RBT12,
+    aliquota efetiva max(0, (RBT12 x nominal - PD) / RBT12) e DAS = receita do mes x efetiva.
+    III/V resolve o anexo mes a mes pelo Fator R movel (requer `folhas`).
+    """
+    receitas = np.atleast_2d(np.asarray(receitas, dtype=np.float64))
+    n, m = receitas.shape
+    if len(anexos) != n:
+        raise ValueError("anexos deve ter um anexo por empresa.")
+    if len(competencias) != m:
+        raise ValueError("competencias deve ter uma competencia por mes.")
+    compiladas = get_tabelas_simples_compiladas(ruleset_id)
+
+    rbt12 = rbt12_movel(receitas)
+    fator_r = fator_r_movel(receitas, folhas) if folhas is not None else np.full((n, m), np.nan)
+    normalizados = np.asarray([str(a or "").strip().upper().replace("-", "/") for a in anexos], dtype=object)
+    aplicado = anexo_aplicado(compiladas, normalizados[:, None], fator_r)
+
+    nomes = tuple(compiladas.anexos)
+    codigo = np.full((n, m), -1, dtype=np.int8)
+    faixa = np.zeros((n, m), dtype=np.int8)
+    nominal = np.full((n, m), np.nan)
+    parcela = np.full((n, m), np.nan)
+    calculavel = rbt12 > 0
+    for idx, nome in enumerate(nomes):
+        mascara = (aplicado == nome) & calculavel
+        if not mascara.any():
+            continue
+        tabela = compiladas.anexos[nome]
+        pos = np.minimum(np.searchsorted(tabela.limites, rbt12[mascara], side="left"), tabela.limites.size - 1)
+        codigo[mascara] = idx
+        faixa[mascara] = pos + 1
+        nominal[mascara] = tabela.aliquotas[pos]
+        parcela[mascara] = tabela.parcelas[pos]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        efetiva = np.maximum(0.0, ((rbt12 * nominal) - parcela) / rbt12)
+    das = receitas * efetiva
+    return ApuracaoMensal(
+        ruleset_id=ruleset_id,
+        competencias=tuple(competencias),
+        anexos=nomes,
+        receita=receitas,
+        rbt12=rbt12,
+        fator_r=fator_r,
+        anexo=codigo,
+        faixa=faixa,
+        aliquota_nominal=nominal,
+        parcela_deduzir=parcela,
+        aliquota_efetiva=efetiva,
+        das=das,
+    )
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+PROFILE_ENV_VAR = "TDE_PROFILE"
+PROFILE_MODE_ENV_VAR = "TDE_PROFILE_MODE"
+PROFILE_MODES = ("sample", "cprofile")
+DEFAULT_PROFILE_DIR = os.path.join("outputs", "profiles")
+DEFAULT_SAMPLE_INTERVAL_S = 0.002
+DEFAULT_TOP_N = 30
+
+# Modulos de interesse destacados na tabela de hotspots.
+FOCUS_MODULES = ("regimes", "tax_engine", "history_store", "tools/ruleset_audit")
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Sufixo unico por sessao no processo (PID separa processos; sessoes Streamlit dividem o PID).
+_SESSAO_SEQ = itertools.count(1)
+
+
+def profile_enabled_from_env() -> bool:
+    value = os.getenv(PROFILE_ENV_VAR)
+    if value is None:
+        return False
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def profile_mode_from_env() -> str:
+    mode = str(os.getenv(PROFILE_MODE_ENV_VAR) or "sample").strip().lower()
+    return mode if mode in PROFILE_MODES else "sample"
+
+
+def _module_label(filename: str) -> str:
+    path = os.path.abspath(filename)
+    if path.startswith(PROJECT_ROOT + os.sep):
+        rel = os.path.relpath(path, PROJECT_ROOT)
+    else:
+        rel = os.path.basename(path)
+    rel = rel.replace(os.sep, "/")
+    return rel[:-3] if rel.endswith(".py") else rel
+
+
+def _is_focus(label: str) -> bool:
+    modulo = label.split(":", 1)[0]
+    return modulo in FOCUS_MODULES
+
+
+class StackSampler:
+    """
+    Amostrador de pilha leve: thread daemon que le `sys._current_frames()` da thread alvo
+    em intervalo fixo e acumula pilhas colapsadas (formato flamegraph `a;b;c N`).
+    """
+
+    def __init__(self, interval_s: float = DEFAULT_SAMPLE_INTERVAL_S, thread_id: Optional[int] = None) -> None:
+        self.interval_s = interval_s
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _capture(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        labels: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            labels.append(f"{_module_label(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        labels.reverse()
+        self.stacks[";".join(labels)] += 1
+        self.samples += 1
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self._capture()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="tde-stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def hotspots(self) -> Tuple[Counter, Counter]:
+        """Retorna (self_samples, total_samples) por frame."""
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                total_counts[frame] += count
+        return self_counts, total_counts
+
+
+def render_sample_hotspots(sampler: StackSampler, top_n: int = DEFAULT_TOP_N) -> str:
+    self_counts, total_counts = sampler.hotspots()
+    total = max(1, sampler.samples)
+    linhas = [f"Amostras: {sampler.samples} (intervalo {sampler.interval_s * 1000:.1f} ms)", ""]
+
+    def _tabela(titulo: str, counts: Counter, filtro_focus: bool = False) -> None:
+        linhas.append(titulo)
+        linhas.append("self% | total% | frame")
+        itens = [(f, c) for f, c in counts.most_common() if not filtro_focus or _is_focus(f)]
+        for frame, _ in itens[:top_n]:
+            linhas.append(
+                f"{self_counts.get(frame, 0) * 100.0 / total:6.2f} | {total_counts.get(frame, 0) * 100.0 / total:6.2f} | {frame}"
+            )
+        linhas.append("")
+
+    _tabela(f"Top {top_n} por tempo proprio (self):", self_counts)
+    _tabela(f"Top {top_n} por tempo inclusivo (total):", total_counts)
+    _tabela(f"Modulos foco ({', '.join(FOCUS_MODULES)}) por tempo inclusivo:", total_counts, filtro_focus=True)
+    return "\n".join(linhas)
+
+
+def render_cprofile_hotspots(profiler: cProfile.Profile, top_n: int = DEFAULT_TOP_N) -> str:
+    linhas: List[str] = []
+    for titulo, sort_key in (("tempo proprio (tottime)", "tottime"), ("tempo inclusivo (cumulative)", "cumulative")):
+        buffer = io.StringIO()
+        stats = pstats.Stats(profiler, stream=buffer)
+        stats.sort_stats(sort_key).print_stats(top_n)
+        linhas.append(f"=== Top {top_n} por {titulo} ===")
+        linhas.append(buffer.getvalue())
+
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    padrao = "|".join(m.replace("/", "[/\\\\]") + r"\.py" for m in FOCUS_MODULES)
+    stats.sort_stats("cumulative").print_stats(padrao, top_n)
+    linhas.append(f"=== Modulos foco ({', '.join(FOCUS_MODULES)}) ===")
+    linhas.append(buffer.getvalue())
+    return "\n".join(linhas)
+
+
+@contextmanager
+def profile_session(
+    nome: str,
+    mode: str = "sample",
+    output_dir: str = DEFAULT_PROFILE_DIR,
+    top_n: int = DEFAULT_TOP_N,
+    interval_s: float = DEFAULT_SAMPLE_INTERVAL_S,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Executa o bloco sob profiling e grava artefatos em `output_dir`:
+    - mode=sample: `<base>.collapsed` (flamegraph) + `<base>_hotspots.txt`
+    - mode=cprofile: `<base>.prof` (pstats) + `<base>_hotspots.txt`
+    `<base>` = `<nome>_<ts com microssegundos>_<pid>_<seq>`: sessoes concorrentes nao se sobrescrevem.
+    O dict produzido recebe os caminhos gerados em `files` ao final do bloco.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de profiling invalido: {mode}. Use: {', '.join(PROFILE_MODES)}.")
+
+    info: Dict[str, Any] = {"mode": mode, "files": []}
+    sampler: Optional[StackSampler] = None
+    profiler: Optional[cProfile.Profile] = None
+    inicio = time.perf_counter()
+    if mode == "sample":
+        sampler = StackSampler(interval_s=interval_s)
+        sampler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield info
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if profiler is not None:
+            profiler.disable()
+        info["elapsed_s"] = time.perf_counter() - inicio
+
+        os.makedirs(output_dir, exist_ok=True)
+        sufixo = f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S_%f')}_{os.getpid()}_{next(_SESSAO_SEQ)}"
+        base = os.path.join(output_dir, f"{nome}_{sufixo}")
+        cabecalho = f"Profile: {nome} | modo={mode} | duracao={info['elapsed_s']:.3f}s\n\n"
+        if sampler is not None:
+            with open(base + ".collapsed", "w", encoding="utf-8") as f:
+                f.write(sampler.collapsed())
+            hotspots = render_sample_hotspots(sampler, top_n=top_n)
+            info["files"].append(base + ".collapsed")
+        else:
+            profiler.dump_stats(base + ".prof")
+            hotspots = render_cprofile_hotspots(profiler, top_n=top_n)
+            info["files"].append(base + ".prof")
+        with open(base + "_hotspots.txt", "w", encoding="utf-8") as f:
+            f.write(cabecalho + hotspots)
+        info["files"].append(base + "_hotspots.txt")
+
+
+@contextmanager
+def profile_from_env(nome: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """Ativa `profile_session` apenas quando TDE_PROFILE estiver ligado (modo via TDE_PROFILE_MODE)."""
+    if not profile_enabled_from_env():
+        yield None
+        return
+    with profile_session(nome, mode=profile_mode_from_env()) as info:
+        yield info
+
+
+def add_profile_arguments(parser: Any, flag: str = "--profile") -> None:
+    parser.add_argument(
+        flag,
+        dest="profile_run",
+        action="store_true",
+        help="Executa sob profiling e grava artefatos em outputs/profiles.",
+    )
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default="sample")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR)
+    parser.add_argument("--profile-top", type=int, default=DEFAULT_TOP_N)
+
+
+@contextmanager
+def profile_from_args(nome: str, args: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    if not getattr(args, "profile_run", False):
+        yield None
+        return
+    with profile_session(nome, mode=args.profile_mode, output_dir=args.profile_dir, top_n=args.profile_top) as info:
+        yield info
+    for path in info["files"]:
+        print(f"Profile gerado: {path}")
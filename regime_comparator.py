@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 from company_profile import CompanyProfile
 from dto import DiagnosticInput
@@ -13,10 +13,19 @@ from regime_utils import (
     REGIME_DISPLAY_PRESUMIDO,
     REGIME_DISPLAY_REAL,
     REGIME_DISPLAY_SIMPLES,
+    REGIME_MODEL_PADRAO,
+    canonicalize_regime,
 )
+from regime_registry import get_compiled_regimes
+from regimes import RulesetError
 
+if TYPE_CHECKING:
+    from tax_engine import RegimeCalculator
 
-@dataclass(frozen=True)
+REGIMES_NATIVOS = (REGIME_CODE_SIMPLES, REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL)
+
+
+@dataclass(frozen=True, slots=True)
 class ComparatorRow:
     regime_code: str
     regime_display: str
@@ -40,14 +49,6 @@ class ComparatorRow:
         }
 
 
-def _display_by_code(code: str) -> str:
-    if code == REGIME_CODE_SIMPLES:
-        return REGIME_DISPLAY_SIMPLES
-    if code == REGIME_CODE_PRESUMIDO:
-        return REGIME_DISPLAY_PRESUMIDO
-    return REGIME_DISPLAY_REAL
-
-
 def _input_for_regime(profile: CompanyProfile, regime_code: str) -> DiagnosticInput:
     if regime_code == REGIME_CODE_SIMPLES:
         return DiagnosticInput(
@@ -79,74 +80,114 @@ def _input_for_regime(profile: CompanyProfile, regime_code: str) -> DiagnosticIn
             tipo_atividade=profile.tipo_atividade,
             modo_analise=profile.modo_analise,
         )
+    if regime_code == REGIME_CODE_REAL:
+        return DiagnosticInput(
+            nome_empresa=profile.nome_empresa,
+            receita_anual=profile.receita_anual,
+            regime=REGIME_DISPLAY_REAL,
+            regime_code=REGIME_CODE_REAL,
+            regime_model="padrao",
+            periodicidade=profile.periodicidade,
+            competencia=profile.competencia,
+            ruleset_id=profile.ruleset_id,
+            margem_lucro=profile.margem_lucro,
+            receita_base_periodo=profile.receita_base_periodo,
+            modo_analise=profile.modo_analise,
+        )
+    # Regimes de plugin (fora dos tres nativos) recebem o perfil completo.
     return DiagnosticInput(
         nome_empresa=profile.nome_empresa,
         receita_anual=profile.receita_anual,
-        regime=REGIME_DISPLAY_REAL,
-        regime_code=REGIME_CODE_REAL,
-        regime_model="padrao",
+        regime=regime_code,
+        regime_code=regime_code,
+        regime_model=REGIME_MODEL_PADRAO,
         periodicidade=profile.periodicidade,
         competencia=profile.competencia,
         ruleset_id=profile.ruleset_id,
-        margem_lucro=profile.margem_lucro,
+        rbt12=profile.rbt12,
         receita_base_periodo=profile.receita_base_periodo,
+        margem_lucro=profile.margem_lucro,
+        tipo_atividade=profile.tipo_atividade,
+        anexo_simples=profile.anexo_simples,
+        fator_r=profile.fator_r,
+        folha_12m=profile.folha_12m,
         modo_analise=profile.modo_analise,
     )
 
 
-def compare_regimes(profile: CompanyProfile, ruleset_id: str) -> Dict[str, Any]:
+def _regime_info(inp: DiagnosticInput, display_name: str) -> Dict[str, str]:
+    if inp.regime_code in REGIMES_NATIVOS:
+        return canonicalize_regime(inp.regime, inp.regime_code, inp.regime_model)
+    return {"regime_code": inp.regime_code, "regime_model": inp.regime_model, "regime_display": display_name}
+
+
+def _linha_bloqueada(regime_code: str, display: str, alerts: List[str]) -> ComparatorRow:
+    return ComparatorRow(
+        regime_code=regime_code,
+        regime_display=display,
+        eligibility_status=STATUS_BLOCKED,
+        imposto_total=None,
+        carga_efetiva_percentual=None,
+        alerts=alerts,
+        critical_alerts=list(alerts),
+        detalhes_regime={},
+    )
+
+
+def compare_regimes(
+    profile: CompanyProfile,
+    ruleset_id: str,
+    eligibility: Optional[Dict[str, EligibilityResult]] = None,
+    calcular: Optional["RegimeCalculator"] = None,
+) -> Dict[str, Any]:
     """
-    Compara regimes preservando matemática atual e usando elegibilidade conservadora.
-    Regimes BLOCKED são retornados sem cálculo, com justificativa explícita.
+    Compara os regimes habilitados no regime_catalog.json do ruleset, na ordem do catálogo,
+    preservando a matemática atual e usando elegibilidade conservadora.
+    Regimes BLOCKED (inclusive por campo obrigatório ausente) são retornados sem cálculo, com
+    justificativa explícita; erros de ruleset (`RulesetError`) interrompem a execução.
+    `eligibility`/`calcular` permitem reaproveitar elegibilidade e cálculos já feitos no run
+    (ver grafo de avaliação do DiagnosticService).
     """
-    from tax_engine import DiagnosticService
+    if eligibility is None:
+        eligibility = evaluate_eligibility(profile, ruleset_id)
+    eligibility = dict(eligibility)
+    if calcular is None:
+        regimes = get_compiled_regimes(ruleset_id)
+
+        def calcular(inp: DiagnosticInput, regime_info: Dict[str, str]) -> Tuple[float, Dict[str, Any]]:
+            return regimes.calcular(inp, regime_info, profile.periodicidade)
 
-    eligibility = evaluate_eligibility(profile, ruleset_id)
-    service = DiagnosticService()
+    else:
+        regimes = calcular.regimes
 
     rows: List[ComparatorRow] = []
-    for regime_code in (REGIME_CODE_SIMPLES, REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL):
-        elig: EligibilityResult = eligibility[regime_code]
+    for regime_code in regimes.codigos:
+        plugin = regimes.plugin(regime_code)
+        display = plugin.display_name
+        inp = _input_for_regime(profile, regime_code)
+        regime_info = _regime_info(inp, display)
+        elig = eligibility.get(regime_code)
+        if elig is None:
+            elig = eligibility[regime_code] = plugin.elegibilidade(inp, regime_info["regime_model"])
         alerts = list(elig.reasons) + list(elig.missing_inputs)
         critical_alerts: List[str] = []
 
         if elig.status == STATUS_BLOCKED:
-            critical_alerts.extend(alerts)
-            rows.append(
-                ComparatorRow(
-                    regime_code=regime_code,
-                    regime_display=_display_by_code(regime_code),
-                    eligibility_status=elig.status,
-                    imposto_total=None,
-                    carga_efetiva_percentual=None,
-                    alerts=alerts,
-                    critical_alerts=critical_alerts,
-                    detalhes_regime={},
-                )
-            )
+            rows.append(_linha_bloqueada(regime_code, display, alerts))
+            continue
+
+        faltantes = plugin.campos_faltantes(inp, regime_info["regime_model"])
+        if faltantes:
+            rows.append(_linha_bloqueada(regime_code, display, alerts + [f"Campo obrigatório ausente: {c}" for c in faltantes]))
             continue
 
-        inp = _input_for_regime(profile, regime_code)
         try:
-            imposto, detalhes = service._imposto_atual_por_regime(inp)
-        except ValueError as exc:
-            msg = str(exc)
+            imposto, detalhes = calcular(inp, regime_info)
+        except RulesetError:
             # Falhas de ruleset são críticas e devem interromper execução.
-            if "ruleset_id=" in msg and "arquivo=" in msg and "chave=" in msg:
-                raise
-            critical_alerts.append(msg)
-            rows.append(
-                ComparatorRow(
-                    regime_code=regime_code,
-                    regime_display=_display_by_code(regime_code),
-                    eligibility_status=STATUS_BLOCKED,
-                    imposto_total=None,
-                    carga_efetiva_percentual=None,
-                    alerts=alerts + [msg],
-                    critical_alerts=critical_alerts,
-                    detalhes_regime={},
-                )
-            )
+            raise
+        except ValueError as exc:
+            rows.append(_linha_bloqueada(regime_code, display, alerts + [str(exc)]))
             continue
 
         carga = (float(imposto) / float(profile.receita_anual)) * 100.0 if profile.receita_anual > 0 else None
@@ -155,7 +196,7 @@ def compare_regimes(profile: CompanyProfile, ruleset_id: str) -> Dict[str, Any]:
         rows.append(
             ComparatorRow(
                 regime_code=regime_code,
-                regime_display=_display_by_code(regime_code),
+                regime_display=display,
                 eligibility_status=elig.status,
                 imposto_total=float(imposto),
                 carga_efetiva_percentual=carga,
@@ -0,0 +1,511 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Type
+
+import numpy as np
+
+from dto import DiagnosticInput
+from eligibility_engine import STATUS_BLOCKED, STATUS_OK, EligibilityResult
+from regime_utils import REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL, REGIME_CODE_SIMPLES, REGIME_MODEL_MANUAL
+from regimes import (
+    _required_number,
+    _required_object,
+    _ruleset_error,
+    imposto_lucro_presumido,
+    imposto_lucro_real_estimado_completo,
+    imposto_simples,
+    imposto_simples_tabelado,
+    presuncao_por_tipo_atividade,
+)
+from regimes_vetorizados import (
+    TabelasSimplesCompiladas,
+    compilar_tabelas_simples,
+    das_simples,
+    imposto_lucro_presumido_vetorizado,
+    imposto_lucro_real_vetorizado,
+)
+from ruleset_loader import get_presumido_params, get_real_params, get_regime_catalog, get_simples_tables
+
+MARGEM_LUCRO_PADRAO = 0.10
+# Campos do input que nao entram no calculo de nenhum regime (fora da chave de memo padrao).
+_CAMPOS_FORA_DO_CALCULO = ("nome_empresa", "competencia", "modo_analise", "cenarios")
+
+
+@dataclass(frozen=True)
+class RegimeCatalogEntry:
+    regime_code: str
+    display_name: str
+    enabled: bool
+    requires_fields: Tuple[str, ...]
+    notes: str = ""
+
+
+def compilar_catalogo(catalogo: Dict[str, Any], ruleset_id: str) -> Dict[str, RegimeCatalogEntry]:
+    """Entradas do regime_catalog.json por regime_code, na ordem do arquivo."""
+    impacto = "Nao e possivel montar calculadores de regime"
+    regimes = catalogo.get("regimes") if isinstance(catalogo, dict) else None
+    if not isinstance(regimes, list) or not regimes:
+        raise _ruleset_error(ruleset_id, "regime_catalog.json", "regimes", "Catalogo de regimes", impacto, "lista ausente/invalida")
+    entradas: Dict[str, RegimeCatalogEntry] = {}
+    for idx, item in enumerate(regimes):
+        code = str(item.get("regime_code") or "").strip().upper() if isinstance(item, dict) else ""
+        requires = item.get("requires_fields") if isinstance(item, dict) else None
+        if not code or not isinstance(item.get("enabled"), bool) or not isinstance(requires, list):
+            raise _ruleset_error(ruleset_id, "regime_catalog.json", f"regimes[{idx}]", "Catalogo de regimes", impacto, "entrada invalida")
+        if code in entradas:
+            raise _ruleset_error(ruleset_id, "regime_catalog.json", f"regimes.{code}", "Catalogo de regimes", impacto, "regime duplicado")
+        entradas[code] = RegimeCatalogEntry(
+            regime_code=code,
+            display_name=str(item.get("display_name") or code),
+            enabled=item["enabled"],
+            requires_fields=tuple(str(c) for c in requires),
+            notes=str(item.get("notes") or ""),
+        )
+    return entradas
+
+
+class RegimePlugin:
+    """
+    Calculador de um regime. Subclasses definem `regime_code`, leem e validam os parametros
+    do ruleset no construtor (uma vez por snapshot do ruleset) e se registram com
+    `register_regime_plugin`. `arquivos` expoe os arquivos do ruleset (ver RulesetSnapshot).
+    Lote: colunas com os nomes dos campos do DiagnosticInput (ausentes NaN / ""), textos ja
+    normalizados como no perfil (anexo em maiusculas com "/", periodicidade valida).
+    """
+
+    regime_code = ""
+
+    def __init__(self, ruleset_id: str, entrada: RegimeCatalogEntry, arquivos: Any) -> None:
+        self.ruleset_id = ruleset_id
+        self.entrada = entrada
+
+    @property
+    def display_name(self) -> str:
+        return self.entrada.display_name
+
+    @classmethod
+    def chave_calculo(cls, inp: DiagnosticInput, regime_model: str) -> Tuple[Any, ...]:
+        """Campos lidos pelo calculo (chave do memo por run). Padrao: todos os campos de calculo."""
+        return tuple(getattr(inp, f.name) for f in fields(inp) if f.name not in _CAMPOS_FORA_DO_CALCULO)
+
+    def valor_campo(self, inp: DiagnosticInput, campo: str) -> Any:
+        """Valor efetivo do campo para o calculo (com os defaults do regime)."""
+        valor = getattr(inp, campo, None)
+        return valor.strip() if isinstance(valor, str) else valor
+
+    def campos_faltantes(self, inp: DiagnosticInput, regime_model: str) -> List[str]:
+        """Campos obrigatorios (requires_fields do catalogo) sem valor efetivo."""
+        return [c for c in self.entrada.requires_fields if self.valor_campo(inp, c) in (None, "")]
+
+    def elegibilidade(self, inp: DiagnosticInput, regime_model: str) -> EligibilityResult:
+        """Elegibilidade minima (campos obrigatorios) para regimes sem regra no eligibility_rules.json."""
+        faltantes = self.campos_faltantes(inp, regime_model)
+        return EligibilityResult(
+            regime_code=self.regime_code,
+            status=STATUS_BLOCKED if faltantes else STATUS_OK,
+            reasons=[],
+            missing_inputs=faltantes,
+            assumptions=[],
+        )
+
+    def calcular(self, inp: DiagnosticInput, regime_info: Dict[str, str], periodicidade: str) -> Tuple[float, Dict[str, Any]]:
+        raise NotImplementedError
+
+    def calcular_lote(self, colunas: Mapping[str, Any]) -> np.ndarray:
+        raise NotImplementedError(f"Regime {self.regime_code} nao implementa calculo em lote.")
+
+    def _metadados(self, regime_info: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            "regime_code": self.regime_code,
+            "regime_model": regime_info["regime_model"],
+            "regime_display": regime_info["regime_display"],
+            "ruleset_id": self.ruleset_id,
+        }
+
+
+REGIME_PLUGINS: Dict[str, Type[RegimePlugin]] = {}
+
+
+def register_regime_plugin(plugin: Type[RegimePlugin]) -> Type[RegimePlugin]:
+    """Registra o calculador para o seu `regime_code` (ativo quando habilitado no catalogo)."""
+    if not plugin.regime_code:
+        raise ValueError("Plugin de regime requer regime_code.")
+    REGIME_PLUGINS[plugin.regime_code] = plugin
+    return plugin
+
+
+def _coluna(colunas: Mapping[str, Any], nome: str, n: int) -> np.ndarray:
+    valores = colunas.get(nome)
+    if valores is None:
+        return np.full(n, np.nan)
+    return np.asarray(valores, dtype=np.float64)
+
+
+def _padrao(valores: np.ndarray, padrao: Any) -> np.ndarray:
+    return np.where(np.isnan(valores), padrao, valores)
+
+
+@register_regime_plugin
+class SimplesPlugin(RegimePlugin):
+    regime_code = REGIME_CODE_SIMPLES
+
+    def __init__(self, ruleset_id: str, entrada: RegimeCatalogEntry, arquivos: Any) -> None:
+        super().__init__(ruleset_id, entrada, arquivos)
+        regime = "Simples Nacional"
+        self.tabelas = arquivos.simples_tables()
+        self.limite_elegibilidade = _required_number(
+            self.tabelas,
+            "limite_elegibilidade_simples",
+            ruleset_id=ruleset_id,
+            arquivo="simples_tables.json",
+            regime=regime,
+            impacto="Nao e possivel validar elegibilidade do Simples",
+        )
+        self.fator_r_limite = _required_number(
+            self.tabelas,
+            "fator_r_limite",
+            ruleset_id=ruleset_id,
+            arquivo="simples_tables.json",
+            regime=regime,
+            impacto="Nao e possivel determinar anexo III/V",
+        )
+        self._compiladas: Optional[TabelasSimplesCompiladas] = None
+
+    @classmethod
+    def chave_calculo(cls, inp: DiagnosticInput, regime_model: str) -> Tuple[Any, ...]:
+        if regime_model == REGIME_MODEL_MANUAL:
+            return (_opcional(inp.aliquota_simples),)
+        # Valores efetivos: `calcular` so usa receita_base/rbt12 ja resolvidos (nao distingue ausente de informado).
+        receita = float(inp.receita_anual)
+        receita_base = float(inp.receita_base_periodo) if inp.receita_base_periodo is not None else receita
+        rbt12 = float(inp.rbt12) if inp.rbt12 is not None else receita
+        return (receita_base, rbt12, str(inp.anexo_simples or "").strip(), _opcional(inp.fator_r), _opcional(inp.folha_12m))
+
+    def valor_campo(self, inp: DiagnosticInput, campo: str) -> Any:
+        if campo == "rbt12" and inp.rbt12 is None:
+            return inp.receita_anual
+        return super().valor_campo(inp, campo)
+
+    def campos_faltantes(self, inp: DiagnosticInput, regime_model: str) -> List[str]:
+        if regime_model == REGIME_MODEL_MANUAL:
+            return ["aliquota_simples"] if inp.aliquota_simples is None else []
+        faltantes = super().campos_faltantes(inp, regime_model)
+        anexo = str(inp.anexo_simples or "").strip().upper().replace("-", "/")
+        if anexo == "III/V" and inp.fator_r is None and inp.folha_12m is None:
+            faltantes.append("fator_r ou folha_12m")
+        return faltantes
+
+    def calcular(self, inp: DiagnosticInput, regime_info: Dict[str, str], periodicidade: str) -> Tuple[float, Dict[str, Any]]:
+        if regime_info["regime_model"] == REGIME_MODEL_MANUAL:
+            if inp.aliquota_simples is None:
+                raise ValueError("Evento manual do Simples requer aliquota_simples informada.")
+            return imposto_simples(inp.receita_anual, float(inp.aliquota_simples)), {
+                "aliquota_efetiva": float(inp.aliquota_simples),
+                "modelo": "manual_aliquota_informada",
+                **self._metadados(regime_info),
+            }
+
+        receita_base = float(inp.receita_base_periodo) if inp.receita_base_periodo is not None else float(inp.receita_anual)
+        rbt12 = float(inp.rbt12) if inp.rbt12 is not None else float(inp.receita_anual)
+        anexo = str(inp.anexo_simples or "").strip()
+        if not anexo:
+            raise ValueError(
+                "ruleset_id="
+                + self.ruleset_id
+                + " | arquivo=simples_tables.json | chave=anexo_simples | regime=Simples Nacional | "
+                "impacto=Nao e possivel calcular DAS | detalhe=input obrigatorio ausente"
+            )
+        imposto, calc = imposto_simples_tabelado(
+            receita_base=receita_base,
+            rbt12=rbt12,
+            anexo=anexo,
+            tabelas=self.tabelas,
+            fator_r=inp.fator_r,
+            folha_12m=inp.folha_12m,
+            limite_elegibilidade=self.limite_elegibilidade,
+            fator_r_limite=self.fator_r_limite,
+            ruleset_id=self.ruleset_id,
+        )
+        return imposto, {"modelo": "simples_tabelado_anexo_faixa", **self._metadados(regime_info), **calc}
+
+    def calcular_lote(self, colunas: Mapping[str, Any]) -> np.ndarray:
+        """DAS tabelado (modelo manual fora do lote); anexo desconhecido ou III/V sem folha -> NaN."""
+        if self._compiladas is None:
+            self._compiladas = compilar_tabelas_simples(self.tabelas, self.ruleset_id)
+        receita = np.asarray(colunas["receita_anual"], dtype=np.float64)
+        n = receita.size
+        rbt12 = _padrao(_coluna(colunas, "rbt12", n), receita)
+        receita_base = _padrao(_coluna(colunas, "receita_base_periodo", n), receita)
+        fator_r = _coluna(colunas, "fator_r", n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fator = np.where(np.isnan(fator_r), _coluna(colunas, "folha_12m", n) / rbt12, fator_r)
+        anexo = np.asarray(colunas.get("anexo_simples", [""] * n), dtype=object)
+        return das_simples(self._compiladas, anexo, receita_base, rbt12, fator)
+
+
+@register_regime_plugin
+class PresumidoPlugin(RegimePlugin):
+    regime_code = REGIME_CODE_PRESUMIDO
+
+    def __init__(self, ruleset_id: str, entrada: RegimeCatalogEntry, arquivos: Any) -> None:
+        super().__init__(ruleset_id, entrada, arquivos)
+        params = arquivos.presumido_params()
+        regime = "Lucro Presumido"
+
+        def _objeto(chave: str, impacto: str) -> Dict[str, Any]:
+            return _required_object(params, chave, ruleset_id=ruleset_id, arquivo="presumido_params.json", regime=regime, impacto=impacto)
+
+        def _numero(chave: str, impacto: str) -> float:
+            return _required_number(params, chave, ruleset_id=ruleset_id, arquivo="presumido_params.json", regime=regime, impacto=impacto)
+
+        self.percentual_map = _objeto("percentual_presuncao", "Nao e possivel definir base presumida por atividade")
+        self.limites = _objeto("limites_adicional_irpj", "Nao e possivel calcular adicional de IRPJ")
+        self.pis = _numero("pis", "Nao e possivel calcular PIS/COFINS")
+        self.cofins = _numero("cofins", "Nao e possivel calcular PIS/COFINS")
+        self.irpj = _numero("irpj", "Nao e possivel calcular IRPJ")
+        self.adicional_irpj = _numero("adicional_irpj", "Nao e possivel calcular adicional de IRPJ")
+        self.csll = _numero("csll", "Nao e possivel calcular CSLL")
+
+    @classmethod
+    def chave_calculo(cls, inp: DiagnosticInput, regime_model: str) -> Tuple[Any, ...]:
+        return ((inp.tipo_atividade or "").strip(),)
+
+    def limite_adicional(self, periodicidade: str) -> float:
+        if periodicidade not in self.limites:
+            raise _ruleset_error(
+                self.ruleset_id,
+                "presumido_params.json",
+                f"limites_adicional_irpj.{periodicidade}",
+                "Lucro Presumido",
+                "Nao e possivel calcular adicional de IRPJ",
+                "chave ausente",
+            )
+        return float(self.limites[periodicidade])
+
+    def calcular(self, inp: DiagnosticInput, regime_info: Dict[str, str], periodicidade: str) -> Tuple[float, Dict[str, Any]]:
+        tipo_atividade = (inp.tipo_atividade or "").strip()
+        percentual_presuncao = presuncao_por_tipo_atividade(tipo_atividade if tipo_atividade else None, self.percentual_map, fallback_key="Comercio")
+        limite_utilizado = self.limite_adicional(periodicidade)
+
+        imposto = imposto_lucro_presumido(
+            receita_anual=inp.receita_anual,
+            pis=self.pis,
+            cofins=self.cofins,
+            percentual_presuncao=percentual_presuncao,
+            limite_adicional_irpj=limite_utilizado,
+            irpj=self.irpj,
+            adicional_irpj=self.adicional_irpj,
+            csll=self.csll,
+        )
+
+        base_presumida = inp.receita_anual * percentual_presuncao
+        excedente_adicional = max(0.0, base_presumida - limite_utilizado)
+        detalhes = {
+            "modelo": "presumido_ruleset",
+            **self._metadados(regime_info),
+            "tipo_atividade_considerado": tipo_atividade or "Nao informado",
+            "percentual_presuncao": percentual_presuncao,
+            "base_presumida": base_presumida,
+            "aliquota_irpj": self.irpj,
+            "aliquota_csll": self.csll,
+            "aliquota_pis": self.pis,
+            "aliquota_cofins": self.cofins,
+            "irpj_calculado": base_presumida * self.irpj,
+            "csll_calculado": base_presumida * self.csll,
+            "pis_calculado": inp.receita_anual * self.pis,
+            "cofins_calculado": inp.receita_anual * self.cofins,
+            "adicional_irpj_calculado": excedente_adicional * self.adicional_irpj,
+            "periodicidade": periodicidade,
+            "periodicidade_aplicada_adicional_irpj": periodicidade,
+            "limite_adicional_irpj_utilizado": limite_utilizado,
+        }
+        if not tipo_atividade:
+            detalhes["alerta_premissa"] = "tipo_atividade ausente; fallback do ruleset aplicado (Comercio)."
+        elif tipo_atividade.lower() in ("outros", "outro"):
+            detalhes["alerta_premissa"] = "tipo 'Outros' usando percentual definido no ruleset."
+        return imposto, detalhes
+
+    def calcular_lote(self, colunas: Mapping[str, Any]) -> np.ndarray:
+        """`tipo_atividade` e `periodicidade` como sequencias de texto."""
+        receita = np.asarray(colunas["receita_anual"], dtype=np.float64)
+        tipos = colunas.get("tipo_atividade", ("",) * receita.size)
+        periodicidades = colunas.get("periodicidade", ("anual",) * receita.size)
+        por_tipo = {t: presuncao_por_tipo_atividade(t or None, self.percentual_map, fallback_key="Comercio") for t in set(tipos)}
+        por_periodicidade = {p: self.limite_adicional(p) for p in set(periodicidades)}
+        return imposto_lucro_presumido_vetorizado(
+            receita,
+            self.pis,
+            self.cofins,
+            np.asarray([por_tipo[t] for t in tipos], dtype=np.float64),
+            np.asarray([por_periodicidade[p] for p in periodicidades], dtype=np.float64),
+            self.irpj,
+            self.adicional_irpj,
+            self.csll,
+        )
+
+
+@register_regime_plugin
+class RealPlugin(RegimePlugin):
+    regime_code = REGIME_CODE_REAL
+
+    def __init__(self, ruleset_id: str, entrada: RegimeCatalogEntry, arquivos: Any) -> None:
+        super().__init__(ruleset_id, entrada, arquivos)
+        params = arquivos.real_params()
+
+        def _numero(chave: str, impacto: str) -> float:
+            return _required_number(params, chave, ruleset_id=ruleset_id, arquivo="real_params.json", regime="Lucro Real", impacto=impacto)
+
+        self.irpj = _numero("irpj", "Nao e possivel calcular IRPJ")
+        self.csll = _numero("csll", "Nao e possivel calcular CSLL")
+        self.pis_nao_cumulativo = _numero("pis_nao_cumulativo", "Nao e possivel calcular PIS nao cumulativo")
+        self.cofins_nao_cumulativo = _numero("cofins_nao_cumulativo", "Nao e possivel calcular COFINS nao cumulativo")
+
+    @classmethod
+    def chave_calculo(cls, inp: DiagnosticInput, regime_model: str) -> Tuple[Any, ...]:
+        # receita_base_periodo crua: `calcular` registra em base_pis_cofins_usada se ela foi informada.
+        return (
+            _opcional(inp.receita_base_periodo),
+            _opcional(inp.margem_lucro),
+            _opcional(inp.despesas_creditaveis),
+            _opcional(inp.percentual_credito_estimado),
+        )
+
+    def valor_campo(self, inp: DiagnosticInput, campo: str) -> Any:
+        if campo == "margem_lucro" and inp.margem_lucro is None:
+            return MARGEM_LUCRO_PADRAO
+        return super().valor_campo(inp, campo)
+
+    def calcular(self, inp: DiagnosticInput, regime_info: Dict[str, str], periodicidade: str) -> Tuple[float, Dict[str, Any]]:
+        margem = inp.margem_lucro if inp.margem_lucro is not None else MARGEM_LUCRO_PADRAO
+        receita_base_periodo = float(inp.receita_base_periodo) if inp.receita_base_periodo is not None else float(inp.receita_anual)
+        base_pis_cofins_usada = "receita_base_periodo" if inp.receita_base_periodo is not None else "receita_anual"
+
+        imposto, componentes_real = imposto_lucro_real_estimado_completo(
+            receita_anual=inp.receita_anual,
+            receita_base_periodo=receita_base_periodo,
+            margem_lucro=margem,
+            irpj=self.irpj,
+            csll=self.csll,
+            pis_nao_cumulativo=self.pis_nao_cumulativo,
+            cofins_nao_cumulativo=self.cofins_nao_cumulativo,
+            despesas_creditaveis=inp.despesas_creditaveis,
+            percentual_credito_estimado=inp.percentual_credito_estimado,
+        )
+        return imposto, {
+            "margem_lucro_estimada": margem,
+            "irpj": self.irpj,
+            "csll": self.csll,
+            "pis_nao_cumulativo": self.pis_nao_cumulativo,
+            "cofins_nao_cumulativo": self.cofins_nao_cumulativo,
+            "despesas_creditaveis": _opcional(inp.despesas_creditaveis),
+            "percentual_credito_estimado": _opcional(inp.percentual_credito_estimado),
+            "base_pis_cofins_usada": base_pis_cofins_usada,
+            "valor_base_pis_cofins": receita_base_periodo,
+            **componentes_real,
+            **self._metadados(regime_info),
+        }
+
+    def calcular_lote(self, colunas: Mapping[str, Any]) -> np.ndarray:
+        receita = np.asarray(colunas["receita_anual"], dtype=np.float64)
+        n = receita.size
+        return imposto_lucro_real_vetorizado(
+            receita,
+            _padrao(_coluna(colunas, "receita_base_periodo", n), receita),
+            _padrao(_coluna(colunas, "margem_lucro", n), MARGEM_LUCRO_PADRAO),
+            self.irpj,
+            self.csll,
+            self.pis_nao_cumulativo,
+            self.cofins_nao_cumulativo,
+            _coluna(colunas, "despesas_creditaveis", n),
+            _coluna(colunas, "percentual_credito_estimado", n),
+        )
+
+
+def _opcional(valor: Any) -> Optional[float]:
+    return float(valor) if valor is not None else None
+
+
+class CompiledRegimes:
+    """
+    Calculadores habilitados no regime_catalog.json de um ruleset. Regime habilitado sem plugin
+    registrado e erro de ruleset; entradas desabilitadas (placeholders) sao ignoradas. Cada
+    plugin e construido (parametros lidos e validados) no primeiro uso.
+    """
+
+    def __init__(self, ruleset_id: str, arquivos: Any) -> None:
+        self.ruleset_id = ruleset_id
+        self._arquivos = arquivos
+        self.entradas = compilar_catalogo(arquivos.regime_catalog(), ruleset_id)
+        for code, entrada in self.entradas.items():
+            if entrada.enabled and code not in REGIME_PLUGINS:
+                raise _ruleset_error(
+                    ruleset_id,
+                    "regime_catalog.json",
+                    f"regimes.{code}",
+                    entrada.display_name,
+                    "Nao e possivel montar calculadores de regime",
+                    "regime habilitado sem plugin registrado",
+                )
+        self._plugins: Dict[str, RegimePlugin] = {}
+
+    @property
+    def codigos(self) -> Tuple[str, ...]:
+        return tuple(code for code, entrada in self.entradas.items() if entrada.enabled)
+
+    def plugin(self, regime_code: str) -> RegimePlugin:
+        plugin = self._plugins.get(regime_code)
+        if plugin is None:
+            entrada = self.entradas.get(regime_code)
+            if entrada is None or not entrada.enabled:
+                raise _ruleset_error(
+                    self.ruleset_id,
+                    "regime_catalog.json",
+                    f"regimes.{regime_code}",
+                    regime_code,
+                    "Nao e possivel calcular o regime",
+                    "regime ausente ou desabilitado no catalogo",
+                )
+            plugin = self._plugins[regime_code] = REGIME_PLUGINS[regime_code](self.ruleset_id, entrada, self._arquivos)
+        return plugin
+
+    def calcular(self, inp: DiagnosticInput, regime_info: Dict[str, str], periodicidade: str) -> Tuple[float, Dict[str, Any]]:
+        return self.plugin(regime_info["regime_code"]).calcular(inp, regime_info, periodicidade)
+
+
+class _ArquivosRuleset:
+    """Arquivos lidos direto do ruleset_loader (calculadores compilados por processo)."""
+
+    def __init__(self, ruleset_id: str) -> None:
+        self.ruleset_id = ruleset_id
+
+    def simples_tables(self) -> Dict[str, Any]:
+        return get_simples_tables(self.ruleset_id)
+
+    def presumido_params(self) -> Dict[str, Any]:
+        return get_presumido_params(self.ruleset_id)
+
+    def real_params(self) -> Dict[str, Any]:
+        return get_real_params(self.ruleset_id)
+
+    def regime_catalog(self) -> Dict[str, Any]:
+        return get_regime_catalog(self.ruleset_id)
+
+
+_COMPILED_REGIMES: Dict[str, CompiledRegimes] = {}
+
+
+def get_compiled_regimes(ruleset_id: str) -> CompiledRegimes:
+    compiled = _COMPILED_REGIMES.get(ruleset_id)
+    if compiled is None:
+        compiled = _COMPILED_REGIMES[ruleset_id] = CompiledRegimes(ruleset_id, _ArquivosRuleset(ruleset_id))
+    return compiled
+
+
+def clear_compiled_regimes() -> None:
+    _COMPILED_REGIMES.clear()
+
+
+def chave_calculo(inp: DiagnosticInput, regime_info: Dict[str, str]) -> Tuple[Any, ...]:
+    plugin = REGIME_PLUGINS.get(regime_info["regime_code"], RegimePlugin)
+    return plugin.chave_calculo(inp, regime_info["regime_model"])
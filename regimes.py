@@ -6,6 +6,10 @@ TRIBUTOS_DAS = ("IRPJ", "CSLL", "PIS", "COFINS", "CPP", "ICMS", "ISS")
 PARTILHA_SOMA_TOLERANCIA = 1e-6
 
 
+class RulesetError(ValueError):
+    """Ruleset ausente/invalido (falha critica); erros de input continuam como ValueError."""
+
+
 def _ruleset_error(
     ruleset_id: str,
     arquivo: str,
@@ -13,14 +17,14 @@ def _ruleset_error(
     regime: str,
     impacto: str,
     detalhe: str = "",
-) -> ValueError:
+) -> RulesetError:
     msg = (
         f"ruleset_id={ruleset_id} | arquivo={arquivo} | chave={chave} | "
         f"regime={regime} | impacto={impacto}"
     )
     if detalhe:
         msg += f" | detalhe={detalhe}"
-    return ValueError(msg)
+    return RulesetError(msg)
 
 
 def _required_number(
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from regimes import TRIBUTOS_DAS, _partilha_por_faixa, _required_number, _required_object, _ruleset_error
+from ruleset_loader import get_simples_tables
+
+# Versoes NumPy (broadcast) de `regimes.imposto_simples_tabelado`, `imposto_lucro_presumido` e
+# `imposto_lucro_real_estimado_completo`: mesma ordem de operacoes, resultados iguais bit a bit.
+# Entradas ausentes (fator_r, despesas etc.) sao NaN; onde o escalar levantaria ValueError o
+# vetorizado devolve NaN.
+
+
+@dataclass(frozen=True)
+class AnexoCompilado:
+    limites: np.ndarray
+    aliquotas: np.ndarray
+    parcelas: np.ndarray
+    # (faixas, len(TRIBUTOS_DAS)); None quando o anexo nao traz percentuais_partilha.
+    partilha: Optional[np.ndarray] = None
+
+
+@dataclass(frozen=True)
+class TabelasSimplesCompiladas:
+    ruleset_id: str
+    anexos: Dict[str, AnexoCompilado]
+    fator_r_limite: float
+    limite_elegibilidade: float
+
+
+_TABELAS_COMPILADAS: Dict[str, TabelasSimplesCompiladas] = {}
+
+
+def compilar_tabelas_simples(tabelas: Dict[str, Any], ruleset_id: str = "N/D") -> TabelasSimplesCompiladas:
+    """Faixas de cada anexo em arrays (limite_superior, aliquota_nominal, parcela_deduzir)."""
+    regime = "Simples Nacional"
+    anexos_raw = _required_object(
+        tabelas,
+        "anexos",
+        ruleset_id=ruleset_id,
+        arquivo="simples_tables.json",
+        regime=regime,
+        impacto="Nao e possivel calcular DAS",
+    )
+    anexos: Dict[str, AnexoCompilado] = {}
+    for nome, faixas in anexos_raw.items():
+        if not isinstance(faixas, list) or not faixas or not all(isinstance(f, dict) for f in faixas):
+            raise _ruleset_error(
+                ruleset_id, "simples_tables.json", f"anexos.{nome}", regime, "Nao e possivel calcular DAS", "tabela de faixas invalida"
+            )
+        colunas = []
+        for chave in ("limite_superior", "aliquota_nominal", "parcela_deduzir"):
+            valores = [f.get(chave) for f in faixas]
+            if not all(isinstance(v, (int, float)) for v in valores):
+                raise _ruleset_error(
+                    ruleset_id, "simples_tables.json", f"anexos.{nome}.{chave}", regime, "Nao e possivel calcular DAS", "valor nao numerico"
+                )
+            colunas.append(np.asarray(valores, dtype=np.float64))
+        partilha = None
+        if all("percentuais_partilha" in f for f in faixas):
+            percentuais = [_partilha_por_faixa(f, ruleset_id=ruleset_id, regime=regime) for f in faixas]
+            partilha = np.asarray([[p[t] for t in TRIBUTOS_DAS] for p in percentuais], dtype=np.float64)
+        anexos[str(nome)] = AnexoCompilado(limites=colunas[0], aliquotas=colunas[1], parcelas=colunas[2], partilha=partilha)
+    return TabelasSimplesCompiladas(
+        ruleset_id=ruleset_id,
+        anexos=anexos,
+        fator_r_limite=_required_number(
+            tabelas,
+            "fator_r_limite",
+            ruleset_id=ruleset_id,
+            arquivo="simples_tables.json",
+            regime=regime,
+            impacto="Nao e possivel determinar anexo III/V",
+        ),
+        limite_elegibilidade=_required_number(
+            tabelas,
+            "limite_elegibilidade_simples",
+            ruleset_id=ruleset_id,
+            arquivo="simples_tables.json",
+            regime=regime,
+            impacto="Nao e possivel validar elegibilidade do Simples",
+        ),
+    )
+
+
+def get_tabelas_simples_compiladas(ruleset_id: str) -> TabelasSimplesCompiladas:
+    compiladas = _TABELAS_COMPILADAS.get(ruleset_id)
+    if compiladas is None:
+        compiladas = _TABELAS_COMPILADAS[ruleset_id] = compilar_tabelas_simples(get_simples_tables(ruleset_id), ruleset_id)
+    return compiladas
+
+
+def clear_tabelas_compiladas() -> None:
+    _TABELAS_COMPILADAS.clear()
+
+
+def faixa_por_rbt12(tabela: AnexoCompilado, rbt12: Any) -> np.ndarray:
+    """Indice (0-based) da faixa: primeira com rbt12 <= limite; acima do teto, a ultima."""
+    idx = np.searchsorted(tabela.limites, np.asarray(rbt12, dtype=np.float64), side="left")
+    return np.minimum(idx, tabela.limites.size - 1)
+
+
+def das_simples_anexo(tabela: AnexoCompilado, receita_base: Any, rbt12: Any) -> np.ndarray:
+    rbt12 = np.asarray(rbt12, dtype=np.float64)
+    idx = faixa_por_rbt12(tabela, rbt12)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        efetiva = np.maximum(0.0, ((rbt12 * tabela.aliquotas[idx]) - tabela.parcelas[idx]) / rbt12)
+        das = np.asarray(receita_base, dtype=np.float64) * efetiva
+    return np.where(rbt12 > 0, das, np.nan)
+
+
+def anexo_aplicado(compiladas: TabelasSimplesCompiladas, anexo: Any, fator_r: Any) -> np.ndarray:
+    """Resolve III/V pelo Fator R (>= limite -> III); fator ausente (NaN) em III/V vira ""."""
+    anexo = np.asarray(anexo, dtype=object)
+    fator_r = np.asarray(fator_r, dtype=np.float64)
+    anexo, fator_r = np.broadcast_arrays(anexo, fator_r)
+    resolvido = np.where(fator_r >= compiladas.fator_r_limite, "III", np.where(np.isnan(fator_r), "", "V"))
+    return np.where(anexo == "III/V", resolvido, anexo)
+
+
+def das_simples(
+    compiladas: TabelasSimplesCompiladas,
+    anexo: Any,
+    receita_base: Any,
+    rbt12: Any,
+    fator_r: Any = np.nan,
+) -> np.ndarray:
+    """DAS por celula com o anexo de cada linha (III/V via Fator R). Anexo desconhecido -> NaN."""
+    aplicado = anexo_aplicado(compiladas, anexo, fator_r)
+    aplicado, receita_base, rbt12 = np.broadcast_arrays(aplicado, np.asarray(receita_base, dtype=np.float64), np.asarray(rbt12, dtype=np.float64))
+    resultado = np.full(aplicado.shape, np.nan)
+    for nome, tabela in compiladas.anexos.items():
+        mascara = aplicado == nome
+        if mascara.any():
+            resultado[mascara] = das_simples_anexo(tabela, receita_base[mascara], rbt12[mascara])
+    return resultado
+
+
+def imposto_lucro_presumido_vetorizado(
+    receita_anual: Any,
+    pis: float,
+    cofins: float,
+    percentual_presuncao: Any,
+    limite_adicional_irpj: Any,
+    irpj: float,
+    adicional_irpj: float,
+    csll: float,
+) -> np.ndarray:
+    receita_anual = np.asarray(receita_anual, dtype=np.float64)
+    pis_cofins = receita_anual * (pis + cofins)
+
+    base_presumida = receita_anual * np.asarray(percentual_presuncao, dtype=np.float64)
+    irpj_calc = base_presumida * irpj
+    excedente_adicional = np.maximum(0.0, base_presumida - np.asarray(limite_adicional_irpj, dtype=np.float64))
+    adicional_calc = excedente_adicional * adicional_irpj
+    csll_calc = base_presumida * csll
+
+    return pis_cofins + irpj_calc + adicional_calc + csll_calc
+
+
+def imposto_lucro_real_vetorizado(
+    receita_anual: Any,
+    receita_base_periodo: Any,
+    margem_lucro: Any,
+    irpj: float,
+    csll: float,
+    pis_nao_cumulativo: float,
+    cofins_nao_cumulativo: float,
+    despesas_creditaveis: Optional[Any] = None,
+    percentual_credito_estimado: Optional[Any] = None,
+) -> np.ndarray:
+    receita_base_periodo = np.asarray(receita_base_periodo, dtype=np.float64)
+    aliquota_pis_cofins = pis_nao_cumulativo + cofins_nao_cumulativo
+    lucro_estimado = np.asarray(receita_anual, dtype=np.float64) * np.asarray(margem_lucro, dtype=np.float64)
+    irpj_calc = lucro_estimado * irpj
+    csll_calc = lucro_estimado * csll
+    debito_pis_cofins = receita_base_periodo * aliquota_pis_cofins
+
+    despesas = np.asarray(np.nan if despesas_creditaveis is None else despesas_creditaveis, dtype=np.float64)
+    percentual = np.asarray(np.nan if percentual_credito_estimado is None else percentual_credito_estimado, dtype=np.float64)
+    credito = np.where(
+        ~np.isnan(despesas),
+        despesas * aliquota_pis_cofins,
+        np.where(~np.isnan(percentual), (receita_base_periodo * percentual) * aliquota_pis_cofins, 0.0),
+    )
+    credito_utilizado = np.minimum(credito, debito_pis_cofins)
+    return irpj_calc + csll_calc + (debito_pis_cofins - credito_utilizado)
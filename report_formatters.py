@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Any, Dict, List
 
 from formatters import formatar_percentual, formatar_reais
@@ -174,3 +175,73 @@ def render_recomendacao_section(recommendation: Dict[str, Any]) -> str:
     if modo == "estrategico":
         return _render_strategic_recommendation(recommendation)
     return _render_conservative_recommendation(recommendation)
+
+
+def _formatar_data_hora_br(iso_text: Any) -> str | None:
+    if not iso_text:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(iso_text))
+    except (TypeError, ValueError):
+        return None
+    return dt.strftime("%d/%m/%Y %H:%M:%S")
+
+
+def render_auditoria_section(audit: Dict[str, Any]) -> str:
+    """Bloco de auditoria do relatorio (mesmo texto no diagnostico e na reconstrucao pelo historico)."""
+    ruleset_metadata = audit.get("ruleset_metadata") if isinstance(audit.get("ruleset_metadata"), dict) else {}
+    ruleset_id = str(audit.get("ruleset_id", ruleset_metadata.get("ruleset_id", "N/D")))
+    vigencia_inicio = ruleset_metadata.get("vigencia_inicio", "N/D")
+    vigencia_fim = ruleset_metadata.get("vigencia_fim", "N/D")
+    descricao_ruleset = ruleset_metadata.get("descricao", "N/D")
+    as_of_date = str(audit.get("as_of_date", "N/D"))
+    calculo_tipo = str(audit.get("calculo_tipo", "N/D"))
+    generated_at = str(audit.get("generated_at", "N/D"))
+
+    integrity = audit.get("integrity") if isinstance(audit.get("integrity"), dict) else {}
+    integrity_status = integrity.get("status", "N/D")
+    integrity_ruleset_hash = integrity.get("ruleset_hash", "N/D")
+    integrity_baseline_hash = integrity.get("baseline_hash", "N/D")
+    checked_files = integrity.get("checked_files", []) if isinstance(integrity.get("checked_files"), list) else []
+
+    sources = audit.get("sources") if isinstance(audit.get("sources"), list) else []
+    references = audit.get("references") if isinstance(audit.get("references"), list) else []
+    assumptions = audit.get("assumptions") if isinstance(audit.get("assumptions"), list) else []
+    limitations = audit.get("limitations") if isinstance(audit.get("limitations"), list) else []
+    alerts = audit.get("alerts") if isinstance(audit.get("alerts"), list) else []
+
+    linhas = [
+        "=== AUDITORIA (BASE NORMATIVA & PREMISSAS) ===",
+        f"Ruleset: {ruleset_id}",
+        f"Vigencia: {vigencia_inicio} ate {vigencia_fim}",
+        f"Descricao do ruleset: {descricao_ruleset}",
+        f"As of date: {as_of_date}",
+        f"Tipo de calculo: {calculo_tipo}",
+        f"Gerado em (ISO): {generated_at}",
+        f"Integridade ruleset/baseline: {integrity_status}",
+        f"Hash ruleset: {integrity_ruleset_hash}",
+        f"Hash baseline: {integrity_baseline_hash}",
+        f"Arquivos verificados: {', '.join(checked_files) if checked_files else 'N/D'}",
+        "Fontes:",
+    ]
+    linhas.extend(f"- {s}" for s in sources)
+    if references:
+        linhas.append("Referencias oficiais:")
+        linhas.extend(f"- {r}" for r in references)
+    linhas.append("Premissas:")
+    linhas.extend(f"- {s}" for s in assumptions)
+    linhas.append("Limitacoes:")
+    linhas.extend(f"- {s}" for s in limitations)
+    if alerts:
+        linhas.append("Alertas:")
+        linhas.extend(f"- {s}" for s in alerts)
+    return "\n".join(linhas)
+
+
+def render_rodape_relatorio(audit: Dict[str, Any] | None) -> str:
+    if not isinstance(audit, dict):
+        return "Relatorio gerado em: (nao disponivel — evento legado)"
+    data_hora = _formatar_data_hora_br(audit.get("generated_at"))
+    if not data_hora:
+        return "Relatorio gerado em: (nao disponivel — evento legado)"
+    return f"Relatorio gerado em: {data_hora}"
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dto import DiagnosticInput
+from eligibility_engine import ELIGIBILITY_STATUSES, STATUS_OK, EligibilityBatch, compile_eligibility_rules
+from history_export import _iter_events_forward
+from history_store import _diagnostic_input_from_event, _history_path
+from regime_registry import MARGEM_LUCRO_PADRAO
+from regime_utils import (
+    REGIME_CODE_PRESUMIDO,
+    REGIME_CODE_REAL,
+    REGIME_CODE_SIMPLES,
+    REGIME_MODEL_MANUAL,
+    canonicalize_regime,
+)
+from tax_engine import DiagnosticService, RulesetSnapshot
+
+IMPACTO_REGIMES = (REGIME_CODE_SIMPLES, REGIME_CODE_PRESUMIDO, REGIME_CODE_REAL)
+IMPACTO_STATUS = ELIGIBILITY_STATUSES
+IMPACTO_QUANTIS = (0.05, 0.25, 0.5, 0.75, 0.95)
+SEM_RECOMENDACAO = "NENHUM"
+
+_OK = ELIGIBILITY_STATUSES.index(STATUS_OK)
+
+
+@dataclass(frozen=True)
+class LoteImpacto:
+    """Entradas do lote em colunas, com os defaults do perfil normalizado (independe do ruleset)."""
+
+    receita: np.ndarray
+    receita_base: np.ndarray
+    rbt12: np.ndarray
+    margem: np.ndarray
+    margem_informada: np.ndarray
+    fator_r: np.ndarray
+    folha: np.ndarray
+    despesas: np.ndarray
+    percentual_credito: np.ndarray
+    aliquota_simples: np.ndarray
+    anexo: np.ndarray
+    tipo_atividade: Tuple[str, ...]
+    periodicidade: Tuple[str, ...]
+    regime_atual: np.ndarray
+    simples_manual: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.receita.size)
+
+
+def _opcional(valor: Any) -> float:
+    return float(valor) if valor is not None else np.nan
+
+
+def montar_lote(inputs: Iterable[DiagnosticInput]) -> Tuple[LoteImpacto, int]:
+    """Lote com os inputs validos e quantos foram descartados (receita <= 0 ou regime invalido)."""
+    linhas: List[Tuple[DiagnosticInput, Dict[str, str]]] = []
+    descartados = 0
+    for inp in inputs:
+        try:
+            regime_info = canonicalize_regime(inp.regime, inp.regime_code, inp.regime_model)
+        except ValueError:
+            descartados += 1
+            continue
+        if not inp.receita_anual or float(inp.receita_anual) <= 0:
+            descartados += 1
+            continue
+        linhas.append((inp, regime_info))
+
+    receita = np.asarray([float(i.receita_anual) for i, _ in linhas], dtype=np.float64)
+    receita_base = np.asarray([_opcional(i.receita_base_periodo) for i, _ in linhas], dtype=np.float64)
+    rbt12 = np.asarray([_opcional(i.rbt12) for i, _ in linhas], dtype=np.float64)
+    margem = np.asarray([_opcional(i.margem_lucro) for i, _ in linhas], dtype=np.float64)
+    lote = LoteImpacto(
+        receita=receita,
+        receita_base=np.where(np.isnan(receita_base), receita, receita_base),
+        rbt12=np.where(np.isnan(rbt12), receita, rbt12),
+        margem=np.where(np.isnan(margem), MARGEM_LUCRO_PADRAO, margem),
+        margem_informada=~np.isnan(margem),
+        fator_r=np.asarray([_opcional(i.fator_r) for i, _ in linhas], dtype=np.float64),
+        folha=np.asarray([_opcional(i.folha_12m) for i, _ in linhas], dtype=np.float64),
+        despesas=np.asarray([_opcional(i.despesas_creditaveis) for i, _ in linhas], dtype=np.float64),
+        percentual_credito=np.asarray([_opcional(i.percentual_credito_estimado) for i, _ in linhas], dtype=np.float64),
+        aliquota_simples=np.asarray([_opcional(i.aliquota_simples) for i, _ in linhas], dtype=np.float64),
+        anexo=np.asarray([str(i.anexo_simples or "").strip().upper().replace("-", "/") for i, _ in linhas], dtype=object),
+        tipo_atividade=tuple((i.tipo_atividade or "").strip() for i, _ in linhas),
+        periodicidade=tuple(DiagnosticService._normalizar_periodicidade(i.periodicidade) for i, _ in linhas),
+        regime_atual=np.asarray([IMPACTO_REGIMES.index(r["regime_code"]) for _, r in linhas], dtype=np.int8),
+        simples_manual=np.asarray([r["regime_model"] == REGIME_MODEL_MANUAL for _, r in linhas], dtype=bool),
+    )
+    return lote, descartados
+
+
+def avaliar_ruleset(lote: LoteImpacto, ruleset_id: str) -> Dict[str, np.ndarray]:
+    """
+    Avalia o lote sob um ruleset, em arrays:
+    - `impostos` (n, 3): imposto por regime com a semantica do comparativo (Real sem creditos);
+    - `status` (n, 3): 0 OK, 1 WARNING, 2 BLOCKED (regras compiladas de `eligibility_engine`);
+    - `recomendacao` (n,): regime da recomendacao conservadora (mais barato entre OK), -1 se negada;
+    - `imposto_atual` (n,): imposto do regime atual como no DiagnosticService.
+    """
+    n = len(lote)
+    snapshot = RulesetSnapshot(ruleset_id)
+    regimes = snapshot.regimes()
+    colunas = {
+        "receita_anual": lote.receita,
+        "receita_base_periodo": lote.receita_base,
+        "rbt12": lote.rbt12,
+        "margem_lucro": lote.margem,
+        "fator_r": lote.fator_r,
+        "folha_12m": lote.folha,
+        "anexo_simples": lote.anexo,
+        "tipo_atividade": lote.tipo_atividade,
+        "periodicidade": lote.periodicidade,
+    }
+    simples = regimes.plugin(REGIME_CODE_SIMPLES).calcular_lote(colunas)
+    presumido_imposto = regimes.plugin(REGIME_CODE_PRESUMIDO).calcular_lote(colunas)
+    real = regimes.plugin(REGIME_CODE_REAL)
+    real_comparativo = real.calcular_lote(colunas)
+    real_atual = real.calcular_lote({**colunas, "despesas_creditaveis": lote.despesas, "percentual_credito_estimado": lote.percentual_credito})
+
+    elegibilidade = compile_eligibility_rules(snapshot.eligibility_rules(), ruleset_id).evaluate_batch(
+        EligibilityBatch(
+            rbt12=lote.rbt12,
+            receita_anual=lote.receita,
+            anexo_simples=lote.anexo,
+            fator_r=lote.fator_r,
+            folha_12m=lote.folha,
+            tipo_atividade_informado=np.asarray([bool(t) for t in lote.tipo_atividade], dtype=bool),
+            margem_assumida=~lote.margem_informada,
+        )
+    )
+    status = elegibilidade.status
+
+    impostos = np.stack([simples, presumido_imposto, real_comparativo], axis=1)
+    candidatos = np.where((status == _OK) & ~np.isnan(impostos), impostos, np.inf)
+    recomendacao = np.where(np.isfinite(candidatos).any(axis=1), np.argmin(candidatos, axis=1), -1).astype(np.int8)
+
+    atual = np.choose(lote.regime_atual, [simples, presumido_imposto, real_atual]) if n else np.zeros(0)
+    atual = np.where(lote.simples_manual, lote.receita * lote.aliquota_simples, atual)
+    return {"impostos": impostos, "status": status, "recomendacao": recomendacao, "imposto_atual": atual}
+
+
+def _distribuicao(valores: np.ndarray) -> Dict[str, Any]:
+    validos = valores[~np.isnan(valores)]
+    if not validos.size:
+        return {"n": 0}
+    quantis = np.quantile(validos, IMPACTO_QUANTIS)
+    return {
+        "n": int(validos.size),
+        "media": float(validos.mean()),
+        "total": float(validos.sum()),
+        "min": float(validos.min()),
+        "max": float(validos.max()),
+        "quantis": {f"p{q * 100:g}": float(v) for q, v in zip(IMPACTO_QUANTIS, quantis)},
+        "aumentos": int((validos > 0).sum()),
+        "reducoes": int((validos < 0).sum()),
+        "sem_mudanca": int((validos == 0).sum()),
+    }
+
+
+def _transicoes(de: np.ndarray, para: np.ndarray, rotulos: Sequence[str]) -> Dict[str, int]:
+    """Contagem de pares de -> para que mudaram (codigos inteiros indexando `rotulos`, -1 = ultimo)."""
+    mudou = de != para
+    if not mudou.any():
+        return {}
+    pares, contagens = np.unique(np.stack([de[mudou], para[mudou]], axis=1), axis=0, return_counts=True)
+    return {f"{rotulos[a]}->{rotulos[b]}": int(c) for (a, b), c in zip(pares.tolist(), contagens.tolist())}
+
+
+def analisar_impacto(inputs: Iterable[DiagnosticInput], ruleset_de: str, ruleset_para: str) -> Dict[str, Any]:
+    """
+    Impacto de trocar `ruleset_de` por `ruleset_para` na carteira: distribuicao dos deltas do
+    imposto atual (absoluto e em % da receita), viradas da recomendacao conservadora e mudancas
+    de elegibilidade por regime.
+    """
+    lote, descartados = montar_lote(inputs)
+    antes = avaliar_ruleset(lote, ruleset_de)
+    depois = avaliar_ruleset(lote, ruleset_para)
+
+    delta = depois["imposto_atual"] - antes["imposto_atual"]
+    rotulos_rec = IMPACTO_REGIMES + (SEM_RECOMENDACAO,)
+    viradas = _transicoes(antes["recomendacao"], depois["recomendacao"], rotulos_rec)
+    elegibilidade = {
+        regime: _transicoes(antes["status"][:, idx], depois["status"][:, idx], IMPACTO_STATUS) for idx, regime in enumerate(IMPACTO_REGIMES)
+    }
+    return {
+        "ruleset_de": ruleset_de,
+        "ruleset_para": ruleset_para,
+        "eventos": len(lote),
+        "descartados": descartados,
+        "delta_imposto": _distribuicao(delta),
+        "delta_carga_percentual": _distribuicao((delta / lote.receita) * 100.0),
+        "recomendacao_viradas": viradas,
+        "recomendacao_viradas_total": int(sum(viradas.values())),
+        "elegibilidade_mudancas": elegibilidade,
+        "elegibilidade_mudancas_total": int(sum(sum(v.values()) for v in elegibilidade.values())),
+    }
+
+
+def inputs_do_historico(pasta: str = "data", arquivo: str = "history.jsonl") -> List[DiagnosticInput]:
+    """Inputs reconstruidos de cada evento do historico (todos os segmentos, ordem cronologica)."""
+    caminho = _history_path(pasta=pasta, arquivo=arquivo)
+    if not os.path.isdir(os.path.dirname(caminho)):
+        return []
+    return [_diagnostic_input_from_event(evento) for _, _, evento in _iter_events_forward(caminho, None)]
+
+
+def analisar_impacto_historico(
+    ruleset_de: str,
+    ruleset_para: str,
+    pasta: str = "data",
+    arquivo: str = "history.jsonl",
+    inputs: Optional[Sequence[DiagnosticInput]] = None,
+) -> Dict[str, Any]:
+    """`analisar_impacto` sobre o historico (ou sobre `inputs` ja carregados, ex.: uma carteira)."""
+    if inputs is None:
+        inputs = inputs_do_historico(pasta=pasta, arquivo=arquivo)
+    return analisar_impacto(inputs, ruleset_de, ruleset_para)
@@ -1,9 +1,10 @@
-import json
 import os
 import sys
 from copy import deepcopy
 from typing import Any, Dict, Tuple
 
+import json_codec
+
 DEFAULT_RULESET_ID = "BR_TAX_2026_V1"
 
 _CACHE: Dict[Tuple[str, str], Dict[str, Any]] = {}
@@ -43,7 +44,8 @@ def _load_json(ruleset_id: str, filename: str) -> Dict[str, Any]:
         raise FileNotFoundError(f"Arquivo '{filename}' não encontrado para ruleset '{ruleset_id}'.")
 
     with open(file_path, "r", encoding="utf-8-sig") as f:
-        payload = json.load(f)
+        # Conteudo parseado alimenta os hashes de integridade: parser exato (stdlib).
+        payload = json_codec.loads_exact(f.read())
 
     if not isinstance(payload, dict):
         raise ValueError(f"Arquivo '{filename}' do ruleset '{ruleset_id}' deve conter objeto JSON.")
@@ -66,7 +68,8 @@ def _load_evidence_json(ruleset_id: str, filename: str) -> Dict[str, Any]:
         raise FileNotFoundError(f"Arquivo de baseline '{filename}' não encontrado para ruleset '{ruleset_id}'.")
 
     with open(file_path, "r", encoding="utf-8-sig") as f:
-        payload = json.load(f)
+        # Conteudo parseado alimenta os hashes de integridade: parser exato (stdlib).
+        payload = json_codec.loads_exact(f.read())
 
     if not isinstance(payload, dict):
         raise ValueError(f"Baseline '{filename}' do ruleset '{ruleset_id}' deve conter objeto JSON.")
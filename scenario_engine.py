@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dto import DiagnosticOutput, ScenarioResult
+from tax_engine import CLASSIFICACOES_IMPACTO, IMPACTO_LIMITE_BAIXO, IMPACTO_LIMITE_MODERADO, DiagnosticService
+
+# Varredura padrao de aliquotas de reforma: 18% a 32% em passos de 0,1 p.p. (141 aliquotas).
+SWEEP_INICIO = 0.18
+SWEEP_FIM = 0.32
+SWEEP_PASSO = 0.001
+
+RECOMENDACOES_IMPACTO = tuple(DiagnosticService._recomendacao(c) for c in CLASSIFICACOES_IMPACTO)
+
+
+def aliquotas_varredura(inicio: float = SWEEP_INICIO, fim: float = SWEEP_FIM, passo: float = SWEEP_PASSO) -> np.ndarray:
+    """Grade [inicio, fim] (inclusiva) com passo fixo, sem acumular erro de ponto flutuante."""
+    if passo <= 0 or fim < inicio:
+        raise ValueError("Varredura invalida: exige passo > 0 e fim >= inicio.")
+    n = int(round((fim - inicio) / passo)) + 1
+    return np.round(inicio + np.arange(n, dtype=np.float64) * passo, 10)
+
+
+def nomes_aliquotas(aliquotas: Sequence[float]) -> Tuple[str, ...]:
+    return tuple(f"Reforma ({float(a) * 100:.1f}%)" for a in aliquotas)
+
+
+@dataclass(frozen=True)
+class ScenarioGrid:
+    """
+    Resultado compacto empresas x aliquotas (float64, shape (n, m); `classe` int8 indexa
+    CLASSIFICACOES_IMPACTO). ScenarioResult/dicts so sao materializados sob demanda.
+    """
+
+    receitas: np.ndarray
+    impostos_atuais: np.ndarray
+    aliquotas: np.ndarray
+    nomes_cenario: Tuple[str, ...]
+    imposto_reforma: np.ndarray
+    diferenca: np.ndarray
+    impacto_percentual: np.ndarray
+    classe: np.ndarray
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.imposto_reforma.shape
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(getattr(self, campo).nbytes for campo in ("imposto_reforma", "diferenca", "impacto_percentual", "classe")))
+
+    def classificacao(self, empresa: int, cenario: int) -> str:
+        return CLASSIFICACOES_IMPACTO[int(self.classe[empresa, cenario])]
+
+    def contagem_por_classe(self) -> np.ndarray:
+        """Shape (m, 3): quantas empresas caem em cada classificacao, por aliquota."""
+        return np.stack([(self.classe == idx).sum(axis=0) for idx in range(len(CLASSIFICACOES_IMPACTO))], axis=1)
+
+    def to_dicts(self, empresa: int, cenarios: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+        """Linhas no formato de `resultados` do evento (mesmas chaves do loop do DiagnosticService)."""
+        indices = range(len(self.nomes_cenario)) if cenarios is None else cenarios
+        linhas: List[Dict[str, Any]] = []
+        for j in indices:
+            classe = int(self.classe[empresa, j])
+            linhas.append(
+                {
+                    "nome_cenario": self.nomes_cenario[j],
+                    "aliquota_reforma": float(self.aliquotas[j]),
+                    "imposto_reforma": float(self.imposto_reforma[empresa, j]),
+                    "diferenca": float(self.diferenca[empresa, j]),
+                    "impacto_percentual": float(self.impacto_percentual[empresa, j]),
+                    "classificacao": CLASSIFICACOES_IMPACTO[classe],
+                    "recomendacao": RECOMENDACOES_IMPACTO[classe],
+                }
+            )
+        return linhas
+
+    def scenario_results(self, empresa: int, cenarios: Optional[Sequence[int]] = None) -> List[ScenarioResult]:
+        return [ScenarioResult(**linha) for linha in self.to_dicts(empresa, cenarios)]
+
+
+def avaliar_cenarios(
+    receitas: Sequence[float],
+    impostos_atuais: Sequence[float],
+    aliquotas: Sequence[float],
+    nomes_cenario: Optional[Sequence[str]] = None,
+) -> ScenarioGrid:
+    """
+    Avalia a grade empresas x aliquotas com a mesma aritmetica do loop escalar
+    (`receita * aliquota`, `(diferenca / receita) * 100`), de modo que os valores coincidem
+    bit a bit com `DiagnosticService.run` para as mesmas entradas.
+    """
+    receitas_arr = np.asarray(receitas, dtype=np.float64).reshape(-1)
+    impostos_arr = np.asarray(impostos_atuais, dtype=np.float64).reshape(-1)
+    aliquotas_arr = np.asarray(aliquotas, dtype=np.float64).reshape(-1)
+    if receitas_arr.shape != impostos_arr.shape:
+        raise ValueError("receitas e impostos_atuais devem ter o mesmo tamanho.")
+    if not np.all(receitas_arr > 0):
+        raise ValueError("receita_anual deve ser maior que zero em todas as empresas.")
+    nomes = tuple(nomes_cenario) if nomes_cenario is not None else nomes_aliquotas(aliquotas_arr)
+    if len(nomes) != aliquotas_arr.size:
+        raise ValueError("nomes_cenario deve ter um nome por aliquota.")
+
+    receita_col = receitas_arr[:, None]
+    imposto_reforma = receita_col * aliquotas_arr[None, :]
+    diferenca = imposto_reforma - impostos_arr[:, None]
+    impacto = (diferenca / receita_col) * 100
+    # 2 - (x < 12) - (x < 5): mesma semantica do escalar, inclusive NaN -> "Alto impacto".
+    classe = (2 - (impacto < IMPACTO_LIMITE_MODERADO) - (impacto < IMPACTO_LIMITE_BAIXO)).astype(np.int8)
+    return ScenarioGrid(
+        receitas=receitas_arr,
+        impostos_atuais=impostos_arr,
+        aliquotas=aliquotas_arr,
+        nomes_cenario=nomes,
+        imposto_reforma=imposto_reforma,
+        diferenca=diferenca,
+        impacto_percentual=impacto,
+        classe=classe,
+    )
+
+
+def avaliar_outputs(
+    outputs: Sequence[DiagnosticOutput],
+    aliquotas: Optional[Sequence[float]] = None,
+    nomes_cenario: Optional[Sequence[str]] = None,
+) -> ScenarioGrid:
+    """Varre aliquotas (padrao: `aliquotas_varredura()`) sobre diagnosticos ja calculados."""
+    if aliquotas is None:
+        aliquotas = aliquotas_varredura()
+    return avaliar_cenarios(
+        [out.receita_anual for out in outputs],
+        [out.imposto_atual for out in outputs],
+        aliquotas,
+        nomes_cenario,
+    )
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
-from typing import Dict
+from typing import Any, Dict, Optional
 
 from ruleset_loader import DEFAULT_RULESET_ID, load_ruleset
 
 
-def gerar_cenarios_reforma(ruleset_id: str = DEFAULT_RULESET_ID) -> Dict[str, float]:
+def gerar_cenarios_reforma(ruleset_id: str = DEFAULT_RULESET_ID, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
     """
-    Carrega cenarios pos-reforma a partir do metadata do ruleset.
+    Carrega cenarios pos-reforma a partir do metadata do ruleset (ou do `metadata` ja carregado).
     """
-    metadata = load_ruleset(ruleset_id)
+    if metadata is None:
+        metadata = load_ruleset(ruleset_id)
     raw = metadata.get("cenarios_reforma")
     if not isinstance(raw, dict) or not raw:
         raise ValueError(
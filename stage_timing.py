@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import math
+import os
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Optional, Tuple
+
+TIMING_ENV_VAR = "TDE_TIMING"
+
+# Histograma log-escala: 1us .. ~100s, 20 buckets por decada (erro relativo ~12% por bucket).
+_HIST_BUCKETS_POR_DECADA = 20
+_HIST_MIN_US = 1.0
+_HIST_DECADAS = 8
+
+_NOOP = nullcontext()
+_ACTIVE: ContextVar[Optional["StageTimer"]] = ContextVar("tde_stage_timer", default=None)
+
+
+def timing_enabled() -> bool:
+    """Instrumentacao ligada via env TDE_TIMING (1/true/yes/on)."""
+    value = os.getenv(TIMING_ENV_VAR)
+    if value is None:
+        return False
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+class _Stage:
+    __slots__ = ("_timer", "_name", "_inicio")
+
+    def __init__(self, timer: "StageTimer", name: str) -> None:
+        self._timer = timer
+        self._name = name
+        self._inicio = 0
+
+    def __enter__(self) -> "_Stage":
+        self._inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._timer.add(self._name, (time.perf_counter_ns() - self._inicio) / 1_000_000.0)
+
+
+class StageTimer:
+    """Acumula duracao (ms) por estagio de um unico diagnostico."""
+
+    __slots__ = ("timings",)
+
+    def __init__(self) -> None:
+        self.timings: Dict[str, float] = {}
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def add(self, name: str, elapsed_ms: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed_ms
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(self.timings)
+
+
+def stage(name: str) -> Any:
+    """
+    Context manager de estagio. Sem timer ativo (instrumentacao desligada) retorna um
+    nullcontext compartilhado: custo de uma leitura de ContextVar.
+    """
+    timer = _ACTIVE.get()
+    if timer is None:
+        return _NOOP
+    return _Stage(timer, name)
+
+
+def begin_run() -> Tuple[Optional[StageTimer], Optional[Token]]:
+    """Ativa um StageTimer para o diagnostico corrente quando TDE_TIMING estiver ligado."""
+    if not timing_enabled():
+        return None, None
+    timer = StageTimer()
+    return timer, _ACTIVE.set(timer)
+
+
+def end_run(timer: Optional[StageTimer], token: Optional[Token]) -> Optional[Dict[str, float]]:
+    """Desativa o timer, agrega no histograma do processo e retorna as duracoes do run."""
+    if timer is None or token is None:
+        return None
+    _ACTIVE.reset(token)
+    timings = timer.as_dict()
+    _AGGREGATOR.record(timings)
+    return timings
+
+
+class StageHistogram:
+    """Histograma log-escala de memoria constante para percentis aproximados (ms)."""
+
+    __slots__ = ("buckets", "count", "total_ms", "min_ms", "max_ms")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (_HIST_BUCKETS_POR_DECADA * _HIST_DECADAS + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = math.inf
+        self.max_ms = 0.0
+
+    @staticmethod
+    def _bucket(elapsed_ms: float) -> int:
+        us = elapsed_ms * 1000.0
+        if us <= _HIST_MIN_US:
+            return 0
+        idx = int(math.log10(us / _HIST_MIN_US) * _HIST_BUCKETS_POR_DECADA) + 1
+        return min(idx, _HIST_BUCKETS_POR_DECADA * _HIST_DECADAS)
+
+    @staticmethod
+    def _upper_bound_ms(idx: int) -> float:
+        return (_HIST_MIN_US * (10 ** (idx / _HIST_BUCKETS_POR_DECADA))) / 1000.0
+
+    def add(self, elapsed_ms: float) -> None:
+        self.buckets[self._bucket(elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.min_ms = min(self.min_ms, elapsed_ms)
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        alvo = max(1, math.ceil(q * self.count))
+        acumulado = 0
+        for idx, n in enumerate(self.buckets):
+            acumulado += n
+            if acumulado >= alvo:
+                return min(max(self._upper_bound_ms(idx), self.min_ms), self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": (self.total_ms / self.count) if self.count else 0.0,
+            "min_ms": self.min_ms if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+        }
+
+
+class TimingAggregator:
+    """Agrega duracoes de varios diagnosticos (batch) em histogramas por estagio."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, StageHistogram] = {}
+
+    def record(self, timings: Dict[str, float]) -> None:
+        for name, elapsed_ms in timings.items():
+            hist = self.stages.get(name)
+            if hist is None:
+                hist = self.stages[name] = StageHistogram()
+            hist.add(elapsed_ms)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: hist.summary() for name, hist in sorted(self.stages.items())}
+
+    def reset(self) -> None:
+        self.stages.clear()
+
+
+_AGGREGATOR = TimingAggregator()
+
+
+def get_timing_aggregator() -> TimingAggregator:
+    return _AGGREGATOR
+
+
+def render_timing_summary(summary: Dict[str, Dict[str, float]]) -> str:
+    linhas = ["Estagio | n | p50 (ms) | p95 (ms) | p99 (ms) | max (ms)"]
+    for name, s in summary.items():
+        linhas.append(
+            f"{name} | {int(s['count'])} | {s['p50_ms']:.3f} | {s['p95_ms']:.3f} | {s['p99_ms']:.3f} | {s['max_ms']:.3f}"
+        )
+    return "\n".join(linhas)
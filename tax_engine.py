@@ -1,15 +1,16 @@
 ﻿from __future__ import annotations
 
-from datetime import datetime
-from typing import Any, Dict, List, Tuple
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from audit_metadata import build_audit_metadata
-from company_profile import normalize_company_profile
+from company_profile import apply_modo_analise, normalize_company_profile
 from dto import DiagnosticInput, DiagnosticOutput, ScenarioResult
+from eligibility_engine import get_compiled_eligibility_rules
+from evaluation_graph import EvaluationGraph
 from recommendation_engine import build_recommendation
+from regime_registry import CompiledRegimes, chave_calculo
 from regime_utils import (
-    REGIME_CODE_PRESUMIDO,
-    REGIME_CODE_REAL,
     REGIME_CODE_SIMPLES,
     REGIME_MODEL_MANUAL,
     REGIME_MODEL_TABELADO,
@@ -17,23 +18,102 @@ from regime_utils import (
 )
 from report_builder import montar_relatorio_executivo
 from report_formatters import (
+    render_auditoria_section,
     render_comparativo_section,
     render_detalhes_regime,
     render_eligibilidade_section,
     render_recomendacao_section,
+    render_rodape_relatorio,
 )
-from regimes import (
-    TRIBUTOS_DAS,
-    imposto_lucro_presumido,
-    imposto_lucro_real_estimado_completo,
-    imposto_simples,
-    imposto_simples_tabelado,
-    presuncao_por_tipo_atividade,
+from regimes import TRIBUTOS_DAS
+from ruleset_loader import (
+    DEFAULT_RULESET_ID,
+    get_eligibility_rules,
+    get_presumido_params,
+    get_real_params,
+    get_regime_catalog,
+    get_simples_tables,
+    load_ruleset,
 )
-from ruleset_loader import DEFAULT_RULESET_ID, get_presumido_params, get_real_params, get_simples_tables
 from scenarios import gerar_cenarios_reforma
+from stage_timing import begin_run, end_run, stage
 
 PERIODICIDADES_VALIDAS = ("mensal", "trimestral", "anual")
+# Faixas de impacto (% da receita) dos cenarios de reforma: < 5 baixo, < 12 moderado, demais alto.
+IMPACTO_LIMITE_BAIXO = 5
+IMPACTO_LIMITE_MODERADO = 12
+CLASSIFICACOES_IMPACTO = ("Baixo impacto", "Impacto moderado", "Alto impacto")
+
+
+class RulesetSnapshot:
+    """
+    Arquivos de um ruleset carregados no maximo uma vez por run (o loader devolve deepcopy a
+    cada chamada). Os loaders sao resolvidos neste modulo em tempo de chamada.
+    """
+
+    def __init__(self, ruleset_id: str) -> None:
+        self.ruleset_id = ruleset_id
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._regimes: Optional[CompiledRegimes] = None
+
+    def _get(self, arquivo: str, loader: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        payload = self._files.get(arquivo)
+        if payload is None:
+            payload = self._files[arquivo] = loader(self.ruleset_id)
+        return payload
+
+    def metadata(self) -> Dict[str, Any]:
+        return self._get("metadata.json", load_ruleset)
+
+    def simples_tables(self) -> Dict[str, Any]:
+        return self._get("simples_tables.json", get_simples_tables)
+
+    def presumido_params(self) -> Dict[str, Any]:
+        return self._get("presumido_params.json", get_presumido_params)
+
+    def real_params(self) -> Dict[str, Any]:
+        return self._get("real_params.json", get_real_params)
+
+    def eligibility_rules(self) -> Dict[str, Any]:
+        return self._get("eligibility_rules.json", get_eligibility_rules)
+
+    def regime_catalog(self) -> Dict[str, Any]:
+        return self._get("regime_catalog.json", get_regime_catalog)
+
+    def regimes(self) -> CompiledRegimes:
+        """Calculadores habilitados no catalogo, com os parametros deste ruleset pre-vinculados."""
+        if self._regimes is None:
+            self._regimes = CompiledRegimes(self.ruleset_id, self)
+        return self._regimes
+
+
+class RegimeCalculator:
+    """
+    Memo por run de `DiagnosticService._imposto_atual_por_regime`, chaveado pelos campos que o
+    calculo de cada regime le. O regime atual e a linha correspondente do comparativo so sao
+    calculados uma vez quando as entradas efetivas coincidem.
+    """
+
+    def __init__(self, ruleset: RulesetSnapshot) -> None:
+        self.ruleset = ruleset
+        self.hits = 0
+        self._memo: Dict[Tuple[Any, ...], Tuple[float, Dict[str, Any]]] = {}
+
+    @property
+    def regimes(self) -> CompiledRegimes:
+        return self.ruleset.regimes()
+
+    def __call__(self, inp: DiagnosticInput, regime_info: Optional[Dict[str, str]] = None) -> Tuple[float, Dict[str, Any]]:
+        if regime_info is None:
+            regime_info = canonicalize_regime(inp.regime, inp.regime_code, inp.regime_model)
+        key = DiagnosticService._calc_key(inp, regime_info)
+        resultado = self._memo.get(key)
+        if resultado is None:
+            resultado = DiagnosticService._imposto_atual_por_regime(inp, regime_info=regime_info, ruleset=self.ruleset)
+            self._memo[key] = resultado
+        else:
+            self.hits += 1
+        return resultado[0], dict(resultado[1])
 
 
 def calcular_imposto(receita_anual: float, aliquota: float) -> float:
@@ -50,17 +130,17 @@ class DiagnosticService:
     def _classificar_impacto(diferenca: float, receita: float) -> Tuple[float, str]:
         impacto_percentual = (diferenca / receita) * 100
 
-        if impacto_percentual < 5:
-            return impacto_percentual, "Baixo impacto"
-        if impacto_percentual < 12:
-            return impacto_percentual, "Impacto moderado"
-        return impacto_percentual, "Alto impacto"
+        if impacto_percentual < IMPACTO_LIMITE_BAIXO:
+            return impacto_percentual, CLASSIFICACOES_IMPACTO[0]
+        if impacto_percentual < IMPACTO_LIMITE_MODERADO:
+            return impacto_percentual, CLASSIFICACOES_IMPACTO[1]
+        return impacto_percentual, CLASSIFICACOES_IMPACTO[2]
 
     @staticmethod
     def _recomendacao(classificacao: str) -> str:
-        if classificacao == "Baixo impacto":
+        if classificacao == CLASSIFICACOES_IMPACTO[0]:
             return "Monitorar mudancas e manter estrategia atual."
-        if classificacao == "Impacto moderado":
+        if classificacao == CLASSIFICACOES_IMPACTO[1]:
             return "Revisar estrutura de custos e avaliar ajuste gradual de precos."
         return "Revisao urgente de precificacao, capital de giro e planejamento tributario."
 
@@ -77,52 +157,6 @@ class DiagnosticService:
             return inp.ruleset_id.strip()
         return DEFAULT_RULESET_ID
 
-    @staticmethod
-    def _required_float(
-        payload: Dict[str, Any],
-        key: str,
-        *,
-        ruleset_id: str,
-        section: str,
-        regime: str,
-        impacto: str,
-    ) -> float:
-        if key not in payload:
-            raise ValueError(
-                f"ruleset_id={ruleset_id} | arquivo={section} | chave={key} | "
-                f"regime={regime} | impacto={impacto} | detalhe=chave ausente"
-            )
-        value = payload.get(key)
-        if not isinstance(value, (int, float)):
-            raise ValueError(
-                f"ruleset_id={ruleset_id} | arquivo={section} | chave={key} | "
-                f"regime={regime} | impacto={impacto} | detalhe=valor nao numerico"
-            )
-        return float(value)
-
-    @staticmethod
-    def _required_dict(
-        payload: Dict[str, Any],
-        key: str,
-        *,
-        ruleset_id: str,
-        section: str,
-        regime: str,
-        impacto: str,
-    ) -> Dict[str, Any]:
-        if key not in payload:
-            raise ValueError(
-                f"ruleset_id={ruleset_id} | arquivo={section} | chave={key} | "
-                f"regime={regime} | impacto={impacto} | detalhe=chave ausente"
-            )
-        value = payload.get(key)
-        if not isinstance(value, dict):
-            raise ValueError(
-                f"ruleset_id={ruleset_id} | arquivo={section} | chave={key} | "
-                f"regime={regime} | impacto={impacto} | detalhe=objeto invalido"
-            )
-        return value
-
     @staticmethod
     def _bloco_partilha_simples(detalhes_regime: Dict[str, Any]) -> str:
         linhas = ["=== SIMPLES NACIONAL — PARTILHA DO DAS (ESTIMATIVA) ==="]
@@ -150,371 +184,169 @@ class DiagnosticService:
         return "\n".join(linhas) + "\n"
 
     @staticmethod
-    def _formatar_data_hora_br(iso_text: Any) -> str | None:
-        if not iso_text:
-            return None
-        try:
-            dt = datetime.fromisoformat(str(iso_text))
-        except (TypeError, ValueError):
-            return None
-        return dt.strftime("%d/%m/%Y %H:%M:%S")
+    def _calc_key(inp: DiagnosticInput, regime_info: Dict[str, str]) -> Tuple[Any, ...]:
+        """Campos efetivamente lidos pelo calculador do regime (ver `RegimePlugin.chave_calculo`)."""
+        return (
+            regime_info["regime_code"],
+            regime_info["regime_model"],
+            regime_info["regime_display"],
+            DiagnosticService._resolve_ruleset_id(inp),
+            DiagnosticService._normalizar_periodicidade(inp.periodicidade),
+            float(inp.receita_anual),
+        ) + chave_calculo(inp, regime_info)
 
     @staticmethod
-    def _bloco_auditoria(audit: Dict[str, Any]) -> str:
-        ruleset_metadata = audit.get("ruleset_metadata") if isinstance(audit.get("ruleset_metadata"), dict) else {}
-        ruleset_id = str(audit.get("ruleset_id", ruleset_metadata.get("ruleset_id", "N/D")))
-        vigencia_inicio = ruleset_metadata.get("vigencia_inicio", "N/D")
-        vigencia_fim = ruleset_metadata.get("vigencia_fim", "N/D")
-        descricao_ruleset = ruleset_metadata.get("descricao", "N/D")
-        as_of_date = str(audit.get("as_of_date", "N/D"))
-        calculo_tipo = str(audit.get("calculo_tipo", "N/D"))
-        generated_at = str(audit.get("generated_at", "N/D"))
-
-        integrity = audit.get("integrity") if isinstance(audit.get("integrity"), dict) else {}
-        integrity_status = integrity.get("status", "N/D")
-        integrity_ruleset_hash = integrity.get("ruleset_hash", "N/D")
-        integrity_baseline_hash = integrity.get("baseline_hash", "N/D")
-        checked_files = integrity.get("checked_files", []) if isinstance(integrity.get("checked_files"), list) else []
-
-        sources = audit.get("sources") if isinstance(audit.get("sources"), list) else []
-        references = audit.get("references") if isinstance(audit.get("references"), list) else []
-        assumptions = audit.get("assumptions") if isinstance(audit.get("assumptions"), list) else []
-        limitations = audit.get("limitations") if isinstance(audit.get("limitations"), list) else []
-        alerts = audit.get("alerts") if isinstance(audit.get("alerts"), list) else []
-
-        linhas = [
-            "=== AUDITORIA (BASE NORMATIVA & PREMISSAS) ===",
-            f"Ruleset: {ruleset_id}",
-            f"Vigencia: {vigencia_inicio} ate {vigencia_fim}",
-            f"Descricao do ruleset: {descricao_ruleset}",
-            f"As of date: {as_of_date}",
-            f"Tipo de calculo: {calculo_tipo}",
-            f"Gerado em (ISO): {generated_at}",
-            f"Integridade ruleset/baseline: {integrity_status}",
-            f"Hash ruleset: {integrity_ruleset_hash}",
-            f"Hash baseline: {integrity_baseline_hash}",
-            f"Arquivos verificados: {', '.join(checked_files) if checked_files else 'N/D'}",
-            "Fontes:",
-        ]
-        linhas.extend(f"- {s}" for s in sources)
-        if references:
-            linhas.append("Referencias oficiais:")
-            linhas.extend(f"- {r}" for r in references)
-        linhas.append("Premissas:")
-        linhas.extend(f"- {s}" for s in assumptions)
-        linhas.append("Limitacoes:")
-        linhas.extend(f"- {s}" for s in limitations)
-        if alerts:
-            linhas.append("Alertas:")
-            linhas.extend(f"- {s}" for s in alerts)
-        return "\n".join(linhas)
-
-    @staticmethod
-    def _rodape_relatorio(audit: Dict[str, Any] | None) -> str:
-        if not isinstance(audit, dict):
-            return "Relatorio gerado em: (nao disponivel — evento legado)"
-        data_hora = DiagnosticService._formatar_data_hora_br(audit.get("generated_at"))
-        if not data_hora:
-            return "Relatorio gerado em: (nao disponivel — evento legado)"
-        return f"Relatorio gerado em: {data_hora}"
-
-    @staticmethod
-    def _imposto_atual_por_regime(inp: DiagnosticInput) -> Tuple[float, Dict[str, Any]]:
+    def _imposto_atual_por_regime(
+        inp: DiagnosticInput,
+        regime_info: Optional[Dict[str, str]] = None,
+        ruleset: Optional[RulesetSnapshot] = None,
+    ) -> Tuple[float, Dict[str, Any]]:
         ruleset_id = DiagnosticService._resolve_ruleset_id(inp)
-        periodicidade_aplicada = DiagnosticService._normalizar_periodicidade(inp.periodicidade)
-        regime_info = canonicalize_regime(inp.regime, inp.regime_code, inp.regime_model)
-
-        regime_code = regime_info["regime_code"]
-        regime_model = regime_info["regime_model"]
-
-        if regime_code == REGIME_CODE_SIMPLES:
-            if regime_model == REGIME_MODEL_MANUAL:
-                if inp.aliquota_simples is None:
-                    raise ValueError("Evento manual do Simples requer aliquota_simples informada.")
-                return imposto_simples(inp.receita_anual, float(inp.aliquota_simples)), {
-                    "aliquota_efetiva": float(inp.aliquota_simples),
-                    "modelo": "manual_aliquota_informada",
-                    "regime_code": regime_code,
-                    "regime_model": regime_model,
-                    "regime_display": regime_info["regime_display"],
-                    "ruleset_id": ruleset_id,
-                }
-
-            tabelas = get_simples_tables(ruleset_id)
-            receita_base = float(inp.receita_base_periodo) if inp.receita_base_periodo is not None else float(inp.receita_anual)
-            rbt12 = float(inp.rbt12) if inp.rbt12 is not None else float(inp.receita_anual)
-            anexo = str(inp.anexo_simples or "").strip()
-            if not anexo:
-                raise ValueError(
-                    "ruleset_id="
-                    + ruleset_id
-                    + " | arquivo=simples_tables.json | chave=anexo_simples | regime=Simples Nacional | "
-                    "impacto=Nao e possivel calcular DAS | detalhe=input obrigatorio ausente"
-                )
-            limite_elegibilidade = DiagnosticService._required_float(
-                tabelas,
-                "limite_elegibilidade_simples",
-                ruleset_id=ruleset_id,
-                section="simples_tables.json",
-                regime="Simples Nacional",
-                impacto="Nao e possivel validar elegibilidade do Simples",
-            )
-            fator_r_limite = DiagnosticService._required_float(
-                tabelas,
-                "fator_r_limite",
-                ruleset_id=ruleset_id,
-                section="simples_tables.json",
-                regime="Simples Nacional",
-                impacto="Nao e possivel determinar anexo III/V",
-            )
-            imposto, calc = imposto_simples_tabelado(
-                receita_base=receita_base,
-                rbt12=rbt12,
-                anexo=anexo,
-                tabelas=tabelas,
-                fator_r=inp.fator_r,
-                folha_12m=inp.folha_12m,
-                limite_elegibilidade=limite_elegibilidade,
-                fator_r_limite=fator_r_limite,
-                ruleset_id=ruleset_id,
-            )
-            detalhes = {
-                "modelo": "simples_tabelado_anexo_faixa",
-                "regime_code": regime_code,
-                "regime_model": regime_model,
-                "regime_display": regime_info["regime_display"],
-                "ruleset_id": ruleset_id,
-                **calc,
-            }
-            return imposto, detalhes
-
-        if regime_code == REGIME_CODE_PRESUMIDO:
-            params = get_presumido_params(ruleset_id)
-            tipo_atividade = (inp.tipo_atividade or "").strip()
-
-            percentual_map = DiagnosticService._required_dict(
-                params,
-                "percentual_presuncao",
-                ruleset_id=ruleset_id,
-                section="presumido_params.json",
-                regime="Lucro Presumido",
-                impacto="Nao e possivel definir base presumida por atividade",
-            )
-            percentual_presuncao = presuncao_por_tipo_atividade(
-                tipo_atividade if tipo_atividade else None,
-                percentual_map,
-                fallback_key="Comercio",
-            )
+        if regime_info is None:
+            regime_info = canonicalize_regime(inp.regime, inp.regime_code, inp.regime_model)
+        if ruleset is None or ruleset.ruleset_id != ruleset_id:
+            ruleset = RulesetSnapshot(ruleset_id)
+        periodicidade = DiagnosticService._normalizar_periodicidade(inp.periodicidade)
+        return ruleset.regimes().calcular(inp, regime_info, periodicidade)
 
-            limites = DiagnosticService._required_dict(
-                params,
-                "limites_adicional_irpj",
-                ruleset_id=ruleset_id,
-                section="presumido_params.json",
-                regime="Lucro Presumido",
-                impacto="Nao e possivel calcular adicional de IRPJ",
-            )
-            if periodicidade_aplicada not in limites:
-                raise ValueError(
-                    f"ruleset_id={ruleset_id} | arquivo=presumido_params.json | chave=limites_adicional_irpj.{periodicidade_aplicada} | "
-                    f"regime=Lucro Presumido | impacto=Nao e possivel calcular adicional de IRPJ | detalhe=chave ausente"
-                )
-
-            limite_utilizado = float(limites[periodicidade_aplicada])
-
-            pis_aliquota = DiagnosticService._required_float(
-                params,
-                "pis",
-                ruleset_id=ruleset_id,
-                section="presumido_params.json",
-                regime="Lucro Presumido",
-                impacto="Nao e possivel calcular PIS/COFINS",
-            )
-            cofins_aliquota = DiagnosticService._required_float(
-                params,
-                "cofins",
-                ruleset_id=ruleset_id,
-                section="presumido_params.json",
-                regime="Lucro Presumido",
-                impacto="Nao e possivel calcular PIS/COFINS",
-            )
-            irpj_aliquota = DiagnosticService._required_float(
-                params,
-                "irpj",
-                ruleset_id=ruleset_id,
-                section="presumido_params.json",
-                regime="Lucro Presumido",
-                impacto="Nao e possivel calcular IRPJ",
-            )
-            adicional_irpj_aliquota = DiagnosticService._required_float(
-                params,
-                "adicional_irpj",
-                ruleset_id=ruleset_id,
-                section="presumido_params.json",
-                regime="Lucro Presumido",
-                impacto="Nao e possivel calcular adicional de IRPJ",
-            )
-            csll_aliquota = DiagnosticService._required_float(
-                params,
-                "csll",
-                ruleset_id=ruleset_id,
-                section="presumido_params.json",
-                regime="Lucro Presumido",
-                impacto="Nao e possivel calcular CSLL",
-            )
-
-            imposto = imposto_lucro_presumido(
-                receita_anual=inp.receita_anual,
-                pis=pis_aliquota,
-                cofins=cofins_aliquota,
-                percentual_presuncao=percentual_presuncao,
-                limite_adicional_irpj=limite_utilizado,
-                irpj=irpj_aliquota,
-                adicional_irpj=adicional_irpj_aliquota,
-                csll=csll_aliquota,
-            )
-
-            base_presumida = inp.receita_anual * percentual_presuncao
-            excedente_adicional = max(0.0, base_presumida - limite_utilizado)
-
-            detalhes = {
-                "modelo": "presumido_ruleset",
-                "regime_code": regime_code,
-                "regime_model": regime_model,
-                "regime_display": regime_info["regime_display"],
-                "ruleset_id": ruleset_id,
-                "tipo_atividade_considerado": tipo_atividade or "Nao informado",
-                "percentual_presuncao": percentual_presuncao,
-                "base_presumida": base_presumida,
-                "aliquota_irpj": irpj_aliquota,
-                "aliquota_csll": csll_aliquota,
-                "aliquota_pis": pis_aliquota,
-                "aliquota_cofins": cofins_aliquota,
-                "irpj_calculado": base_presumida * irpj_aliquota,
-                "csll_calculado": base_presumida * csll_aliquota,
-                "pis_calculado": inp.receita_anual * pis_aliquota,
-                "cofins_calculado": inp.receita_anual * cofins_aliquota,
-                "adicional_irpj_calculado": excedente_adicional * adicional_irpj_aliquota,
-                "periodicidade": periodicidade_aplicada,
-                "periodicidade_aplicada_adicional_irpj": periodicidade_aplicada,
-                "limite_adicional_irpj_utilizado": limite_utilizado,
-            }
-            if not tipo_atividade:
-                detalhes["alerta_premissa"] = "tipo_atividade ausente; fallback do ruleset aplicado (Comercio)."
-            elif tipo_atividade.lower() in ("outros", "outro"):
-                detalhes["alerta_premissa"] = "tipo 'Outros' usando percentual definido no ruleset."
-            return imposto, detalhes
-
-        if regime_code == REGIME_CODE_REAL:
-            params_real = get_real_params(ruleset_id)
-            margem = inp.margem_lucro if inp.margem_lucro is not None else 0.10
-            irpj = DiagnosticService._required_float(
-                params_real,
-                "irpj",
-                ruleset_id=ruleset_id,
-                section="real_params.json",
-                regime="Lucro Real",
-                impacto="Nao e possivel calcular IRPJ",
-            )
-            csll = DiagnosticService._required_float(
-                params_real,
-                "csll",
-                ruleset_id=ruleset_id,
-                section="real_params.json",
-                regime="Lucro Real",
-                impacto="Nao e possivel calcular CSLL",
-            )
-            pis_nao_cumulativo = DiagnosticService._required_float(
-                params_real,
-                "pis_nao_cumulativo",
-                ruleset_id=ruleset_id,
-                section="real_params.json",
-                regime="Lucro Real",
-                impacto="Nao e possivel calcular PIS nao cumulativo",
-            )
-            cofins_nao_cumulativo = DiagnosticService._required_float(
-                params_real,
-                "cofins_nao_cumulativo",
-                ruleset_id=ruleset_id,
-                section="real_params.json",
-                regime="Lucro Real",
-                impacto="Nao e possivel calcular COFINS nao cumulativo",
-            )
-            receita_base_periodo = float(inp.receita_base_periodo) if inp.receita_base_periodo is not None else float(inp.receita_anual)
-            base_pis_cofins_usada = "receita_base_periodo" if inp.receita_base_periodo is not None else "receita_anual"
-
-            imposto, componentes_real = imposto_lucro_real_estimado_completo(
-                receita_anual=inp.receita_anual,
-                receita_base_periodo=receita_base_periodo,
-                margem_lucro=margem,
-                irpj=irpj,
-                csll=csll,
-                pis_nao_cumulativo=pis_nao_cumulativo,
-                cofins_nao_cumulativo=cofins_nao_cumulativo,
-                despesas_creditaveis=inp.despesas_creditaveis,
-                percentual_credito_estimado=inp.percentual_credito_estimado,
-            )
-            return imposto, {
-                "margem_lucro_estimada": margem,
-                "irpj": irpj,
-                "csll": csll,
-                "pis_nao_cumulativo": pis_nao_cumulativo,
-                "cofins_nao_cumulativo": cofins_nao_cumulativo,
-                "despesas_creditaveis": float(inp.despesas_creditaveis) if inp.despesas_creditaveis is not None else None,
-                "percentual_credito_estimado": float(inp.percentual_credito_estimado) if inp.percentual_credito_estimado is not None else None,
-                "base_pis_cofins_usada": base_pis_cofins_usada,
-                "valor_base_pis_cofins": receita_base_periodo,
-                **componentes_real,
-                "regime_code": regime_code,
-                "regime_model": regime_model,
-                "regime_display": regime_info["regime_display"],
-                "ruleset_id": ruleset_id,
-            }
-
-        raise ValueError("Regime invalido apos canonicalizacao.")
-
-    def run(self, inp: DiagnosticInput) -> DiagnosticOutput:
+    @staticmethod
+    def validar_input(inp: DiagnosticInput) -> None:
         if not inp.nome_empresa.strip():
             raise ValueError("nome_empresa é obrigatório.")
         if inp.receita_anual <= 0:
             raise ValueError("receita_anual deve ser maior que zero.")
 
-        profile = normalize_company_profile(inp)
-        regime_info = canonicalize_regime(inp.regime, inp.regime_code, inp.regime_model)
-        regime_display = regime_info["regime_display"]
-        ruleset_id = self._resolve_ruleset_id(inp)
+    def run(self, inp: DiagnosticInput) -> DiagnosticOutput:
+        self.validar_input(inp)
+        return self.evaluate_graph(self.build_graph(inp))
+
+    def evaluate_graph(self, graph: EvaluationGraph) -> DiagnosticOutput:
+        """Avalia (ou reaproveita) o no `output`, com os timers de estagio do TDE_TIMING."""
+        timer, token = begin_run()
+        try:
+            out = graph.get("output")
+        finally:
+            timings = end_run(timer, token)
+        if timings is not None:
+            out = replace(out, stage_timings=timings)
+        return out
+
+    def build_graph(self, inp: DiagnosticInput) -> EvaluationGraph:
+        """
+        Grafo de avaliacao do diagnostico (nada e calculado ate `get`). Cada no roda uma vez por run:
+        perfil, regime canonico, snapshot do ruleset, calculo por regime (memo compartilhado entre
+        regime atual e comparativo), elegibilidade, comparativo, recomendacao, auditoria, cenarios
+        e relatorio. `graph.get("output")` produz o DiagnosticOutput; `graph.describe()` expoe
+        dependencias e duracao de cada no.
+        `cenarios` e `modo_analise` sao entradas proprias (prevalecem sobre os campos de `input`):
+        trocar via `graph.set_input` recalcula so cenarios+relatorio ou recomendacao+auditoria+relatorio.
+        """
+        graph = EvaluationGraph()
+        graph.input("input", inp)
+        graph.input("cenarios", inp.cenarios)
+        graph.input("modo_analise", inp.modo_analise)
+        graph.node("profile_base", normalize_company_profile, ("input",))
+        graph.node("profile", apply_modo_analise, ("profile_base", "modo_analise"))
+        graph.node("regime_info", lambda i: canonicalize_regime(i.regime, i.regime_code, i.regime_model), ("input",))
+        graph.node("ruleset", lambda i: RulesetSnapshot(self._resolve_ruleset_id(i)), ("input",))
+        graph.node("regime_calc", RegimeCalculator, ("ruleset",))
+        graph.node("imposto_atual", lambda i, info, calc: calc(i, info), ("input", "regime_info", "regime_calc"))
+        graph.node("detalhes_base", self._detalhes_base, ("profile_base", "input", "regime_info", "ruleset", "imposto_atual"))
+        graph.node(
+            "eligibility",
+            lambda profile, ruleset: get_compiled_eligibility_rules(ruleset.ruleset_id).evaluate(profile),
+            ("profile_base", "ruleset"),
+        )
+
+        from regime_comparator import compare_regimes
 
-        imposto_atual, detalhes_regime = self._imposto_atual_por_regime(inp)
-        detalhes_regime = dict(detalhes_regime)
+        graph.node(
+            "compare_regimes",
+            lambda profile, ruleset, eligibility, calc: compare_regimes(profile, ruleset.ruleset_id, eligibility, calc),
+            ("profile_base", "ruleset", "eligibility", "regime_calc"),
+        )
+        graph.node("recommendation", build_recommendation, ("profile", "compare_regimes"))
+        graph.node(
+            "detalhes_snapshot",
+            self._detalhes_snapshot,
+            ("detalhes_base", "profile", "compare_regimes", "recommendation"),
+        )
+        graph.node(
+            "audit_metadata",
+            lambda i, detalhes, info, ruleset: build_audit_metadata(i, detalhes, info, ruleset.metadata()),
+            ("input", "detalhes_snapshot", "regime_info", "ruleset"),
+        )
+        graph.node("detalhes_regime", lambda detalhes, audit: {**detalhes, "audit": audit}, ("detalhes_snapshot", "audit_metadata"))
+        graph.node("scenarios", self._cenarios, ("input", "cenarios", "ruleset", "imposto_atual"))
+        graph.node(
+            "report",
+            self._relatorio,
+            ("input", "regime_info", "imposto_atual", "detalhes_regime", "compare_regimes", "recommendation", "scenarios"),
+        )
+        graph.node(
+            "output",
+            lambda i, info, detalhes, imposto, cenarios, relatorio: DiagnosticOutput(
+                nome_empresa=i.nome_empresa,
+                receita_anual=i.receita_anual,
+                regime=info["regime_display"],
+                detalhes_regime=detalhes,
+                imposto_atual=imposto[0],
+                resultados=cenarios[0],
+                relatorio_texto=relatorio,
+            ),
+            ("input", "regime_info", "detalhes_regime", "imposto_atual", "scenarios", "report"),
+        )
+        return graph
+
+    def _detalhes_base(
+        self,
+        profile: Any,
+        inp: DiagnosticInput,
+        regime_info: Dict[str, str],
+        ruleset: RulesetSnapshot,
+        imposto_atual: Tuple[float, Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        detalhes_regime = dict(imposto_atual[1])
         detalhes_regime["periodicidade"] = self._normalizar_periodicidade(inp.periodicidade)
         detalhes_regime["competencia"] = str(inp.competencia).strip() if inp.competencia else "Nao informada"
-        detalhes_regime.setdefault("ruleset_id", ruleset_id)
+        detalhes_regime.setdefault("ruleset_id", ruleset.ruleset_id)
         detalhes_regime.setdefault("regime_code", regime_info["regime_code"])
         detalhes_regime.setdefault("regime_model", regime_info["regime_model"])
-        detalhes_regime.setdefault("regime_display", regime_display)
+        detalhes_regime.setdefault("regime_display", regime_info["regime_display"])
         if profile.assumptions:
             detalhes_regime["profile_assumptions"] = list(profile.assumptions)
-        detalhes_regime["modo_analise"] = profile.modo_analise
+        return detalhes_regime
 
-        from regime_comparator import compare_regimes
-
-        comparativo = compare_regimes(profile, ruleset_id)
-        recommendation_snapshot = build_recommendation(profile, comparativo)
+    @staticmethod
+    def _detalhes_snapshot(
+        detalhes_base: Dict[str, Any],
+        profile: Any,
+        comparativo: Dict[str, Any],
+        recommendation_snapshot: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        detalhes_regime = dict(detalhes_base)
+        detalhes_regime["modo_analise"] = profile.modo_analise
         detalhes_regime["eligibility_snapshot"] = comparativo.get("eligibility", {})
         detalhes_regime["comparison_snapshot"] = comparativo.get("rows", [])
         detalhes_regime["recommendation_snapshot"] = recommendation_snapshot
-
-        audit = build_audit_metadata(inp, detalhes_regime)
-        detalhes_regime["audit"] = audit
-
-        cenarios = inp.cenarios if inp.cenarios else gerar_cenarios_reforma(ruleset_id)
+        return detalhes_regime
+
+    def _cenarios(
+        self,
+        inp: DiagnosticInput,
+        cenarios: Dict[str, float] | None,
+        ruleset: RulesetSnapshot,
+        imposto_atual: Tuple[float, Dict[str, Any]],
+    ) -> Tuple[List[ScenarioResult], List[Dict[str, Any]]]:
+        cenarios = cenarios if cenarios else gerar_cenarios_reforma(ruleset.ruleset_id, ruleset.metadata())
+        imposto = imposto_atual[0]
 
         resultados: List[ScenarioResult] = []
         resultados_dict: List[Dict[str, Any]] = []
 
         for nome_cenario, aliq in cenarios.items():
             imposto_reforma = calcular_imposto(inp.receita_anual, aliq)
-            diferenca = imposto_reforma - imposto_atual
+            diferenca = imposto_reforma - imposto
             impacto_percentual, classificacao = self._classificar_impacto(diferenca, inp.receita_anual)
             recomendacao_cenario = self._recomendacao(classificacao)
 
@@ -528,54 +360,52 @@ class DiagnosticService:
                 recomendacao=recomendacao_cenario,
             )
             resultados.append(sr)
-
-            resultados_dict.append(
-                {
-                    "nome_cenario": nome_cenario,
-                    "aliquota_reforma": aliq,
-                    "imposto_reforma": imposto_reforma,
-                    "diferenca": diferenca,
-                    "impacto_percentual": impacto_percentual,
-                    "classificacao": classificacao,
-                    "recomendacao": recomendacao_cenario,
-                }
+            resultados_dict.append(sr.to_dict())
+        return resultados, resultados_dict
+
+    def _relatorio(
+        self,
+        inp: DiagnosticInput,
+        regime_info: Dict[str, str],
+        imposto_atual: Tuple[float, Dict[str, Any]],
+        detalhes_regime: Dict[str, Any],
+        comparativo: Dict[str, Any],
+        recommendation_snapshot: Dict[str, Any],
+        cenarios: Tuple[List[ScenarioResult], List[Dict[str, Any]]],
+    ) -> str:
+        audit = detalhes_regime.get("audit")
+        with stage("report.executivo"):
+            relatorio = montar_relatorio_executivo(
+                nome_empresa=inp.nome_empresa,
+                receita_anual=inp.receita_anual,
+                aliquota_atual=0.0,
+                imposto_atual=imposto_atual[0],
+                resultados=cenarios[1],
             )
 
-        relatorio = montar_relatorio_executivo(
-            nome_empresa=inp.nome_empresa,
-            receita_anual=inp.receita_anual,
-            aliquota_atual=0.0,
-            imposto_atual=imposto_atual,
-            resultados=resultados_dict,
-        )
-
-        cab = f"\nRegime atual: {regime_display}\n"
-        cab += f"Periodicidade considerada: {detalhes_regime.get('periodicidade', 'anual')}\n"
-        cab += f"Competência: {detalhes_regime.get('competencia', 'Nao informada')}\n"
-        cab += render_detalhes_regime(regime_info["regime_code"], detalhes_regime)
-
-        if regime_info["regime_code"] == REGIME_CODE_SIMPLES and regime_info["regime_model"] == REGIME_MODEL_TABELADO:
-            cab += self._bloco_partilha_simples(detalhes_regime)
-        if regime_info["regime_code"] == REGIME_CODE_SIMPLES and regime_info["regime_model"] == REGIME_MODEL_MANUAL:
-            cab += self._bloco_partilha_simples(detalhes_regime)
-        relatorio = relatorio.replace("Receita anual informada:", cab + "Receita anual informada:", 1)
-        relatorio += "\n\n" + render_eligibilidade_section(comparativo.get("eligibility", {}))
-        relatorio += "\n\n" + render_comparativo_section(comparativo.get("rows", []))
-        relatorio += "\n\n" + render_recomendacao_section(recommendation_snapshot)
+        with stage("report.detalhes_regime"):
+            cab = f"\nRegime atual: {regime_info['regime_display']}\n"
+            cab += f"Periodicidade considerada: {detalhes_regime.get('periodicidade', 'anual')}\n"
+            cab += f"Competência: {detalhes_regime.get('competencia', 'Nao informada')}\n"
+            cab += render_detalhes_regime(regime_info["regime_code"], detalhes_regime)
+
+            if regime_info["regime_code"] == REGIME_CODE_SIMPLES and regime_info["regime_model"] == REGIME_MODEL_TABELADO:
+                cab += self._bloco_partilha_simples(detalhes_regime)
+            if regime_info["regime_code"] == REGIME_CODE_SIMPLES and regime_info["regime_model"] == REGIME_MODEL_MANUAL:
+                cab += self._bloco_partilha_simples(detalhes_regime)
+            relatorio = relatorio.replace("Receita anual informada:", cab + "Receita anual informada:", 1)
+        with stage("report.elegibilidade"):
+            relatorio += "\n\n" + render_eligibilidade_section(comparativo.get("eligibility", {}))
+        with stage("report.comparativo"):
+            relatorio += "\n\n" + render_comparativo_section(comparativo.get("rows", []))
+        with stage("report.recomendacao"):
+            relatorio += "\n\n" + render_recomendacao_section(recommendation_snapshot)
 
         integrity = audit.get("integrity") if isinstance(audit, dict) else None
         if isinstance(integrity, dict) and integrity.get("status") == "FAIL":
             relatorio = "ALERTA DE INTEGRIDADE: ruleset/baseline com divergencia (compliance FAIL).\n\n" + relatorio
 
-        relatorio += "\n\n" + self._bloco_auditoria(audit if isinstance(audit, dict) else {})
-        relatorio += "\n" + self._rodape_relatorio(audit if isinstance(audit, dict) else None)
-
-        return DiagnosticOutput(
-            nome_empresa=inp.nome_empresa,
-            receita_anual=inp.receita_anual,
-            regime=regime_display,
-            detalhes_regime=detalhes_regime,
-            imposto_atual=imposto_atual,
-            resultados=resultados,
-            relatorio_texto=relatorio,
-        )
+        with stage("report.auditoria"):
+            relatorio += "\n\n" + render_auditoria_section(audit if isinstance(audit, dict) else {})
+            relatorio += "\n" + render_rodape_relatorio(audit if isinstance(audit, dict) else None)
+        return relatorio
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from alerta_limites import (
+    MonitorLimites,
+    clear_limites_compilados,
+    get_limites_compilados,
+    inclinacao_mensal,
+    meses_ate_cruzar,
+    mes_indice,
+)
+from dto import DiagnosticInput
+from history_segments import compact_report_refreshes, rotate_segments
+from history_store import append_event_ref, build_refreshed_event, list_events
+from period_engine import apurar_simples_mensal, competencias_mensais
+from tax_engine import DiagnosticService
+
+
+def _simples(nome: str, competencia: str, rbt12: float) -> DiagnosticInput:
+    return DiagnosticInput(
+        nome_empresa=nome,
+        receita_anual=rbt12,
+        regime="Simples Nacional",
+        regime_code="SIMPLES",
+        regime_model="tabelado",
+        anexo_simples="I",
+        tipo_atividade="Comercio",
+        rbt12=rbt12,
+        periodicidade="mensal",
+        competencia=competencia,
+    )
+
+
+class AlertaLimitesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        clear_limites_compilados()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.pasta = self._tmp.name
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+        clear_limites_compilados()
+
+    def test_limites_vem_do_ruleset(self) -> None:
+        limites = get_limites_compilados("BR_TAX_2026_V1")
+
+        self.assertEqual(limites.limite_simples, 4_800_000.0)
+        self.assertEqual(limites.limite_presumido, 78_000_000.0)
+        self.assertEqual([p for p, _ in limites.portes], ["MEI", "ME", "EPP", "ACIMA_EPP"])
+        self.assertNotIn(4_800_000.0, limites.faixas["I"].tolist())
+
+    def test_competencias_e_projecao(self) -> None:
+        self.assertEqual(mes_indice("2025-03"), 2025 * 12 + 2)
+        self.assertEqual(mes_indice("2025-T2"), 2025 * 12 + 5)
+        self.assertEqual(mes_indice("2025"), 2025 * 12 + 11)
+        self.assertIsNone(mes_indice("Nao informada"))
+
+        self.assertAlmostEqual(float(inclinacao_mensal([0, 1, 2], [10.0, 20.0, 30.0])[0]), 10.0)
+        self.assertTrue(np.isnan(inclinacao_mensal([0], [10.0])[0]))
+        # Igual ao limite nao cruza (comparacao estrita): 100 + 10 x 2 = 120 > 115 e 100 + 10 x 3 > 120.
+        meses = meses_ate_cruzar([100.0], [10.0], [115.0, 120.0, 90.0])
+        self.assertEqual(meses[0].tolist(), [2.0, 3.0, np.inf])
+        self.assertEqual(meses_ate_cruzar([100.0], [-5.0], [120.0])[0].tolist(), [np.inf])
+
+    def test_observar_sinaliza_cruzamentos_no_horizonte(self) -> None:
+        monitor = MonitorLimites(horizonte=6)
+        for mes, valor in enumerate((4_000_000.0, 4_150_000.0, 4_300_000.0), start=1):
+            alertas = monitor.observar("A", f"2025-{mes:02d}", valor, anexo="I")
+
+        tipos = {a.tipo: a for a in alertas}
+        self.assertEqual(tipos["limite_simples"].meses, 4)
+        self.assertEqual(tipos["limite_simples"].competencia_prevista, "2025-07")
+        self.assertEqual(tipos["porte"].detalhe, "EPP -> ACIMA_EPP")
+        self.assertNotIn("limite_presumido", tipos)
+
+        # Receita estavel: alertas desaparecem na reavaliacao da empresa.
+        for mes in range(4, 16):
+            alertas = monitor.observar("A", f"2025-{mes:02d}" if mes <= 12 else f"2026-{mes - 12:02d}", 4_300_000.0)
+        self.assertLess(float(inclinacao_mensal([monitor.tendencias["A"].meses], [monitor.tendencias["A"].valores])[0]), 1.0)
+        self.assertEqual(alertas, [])
+
+    def test_historico_incremental_com_watermark(self) -> None:
+        service = DiagnosticService()
+        estado = os.path.join(self.pasta, "alertas.json")
+        for mes, valor in enumerate((1_500_000.0, 1_600_000.0, 1_700_000.0), start=1):
+            append_event_ref(service.run(_simples("Cresce", f"2025-{mes:02d}", valor)).to_event(), pasta=self.pasta)
+            append_event_ref(service.run(_simples("Estavel", f"2025-{mes:02d}", 900_000.0)).to_event(), pasta=self.pasta)
+
+        monitor = MonitorLimites(horizonte=3, estado_path=estado)
+        primeira = monitor.processar_historico(pasta=self.pasta)
+        self.assertEqual(primeira.eventos, 6)
+        self.assertEqual([a.detalhe for a in primeira.alertas["Cresce"]], ["faixa 4 -> 5"])
+        self.assertEqual(primeira.alertas["Estavel"], [])
+
+        append_event_ref(service.run(_simples("Cresce", "2025-04", 1_750_000.0)).to_event(), pasta=self.pasta)
+        segunda = MonitorLimites(horizonte=3, estado_path=estado).processar_historico(pasta=self.pasta)
+
+        self.assertEqual(segunda.eventos, 1)
+        self.assertEqual(segunda.empresas_atualizadas, ["Cresce"])
+        recarregado = MonitorLimites(horizonte=3, estado_path=estado)
+        self.assertEqual(recarregado.tendencias["Cresce"].meses[-1], mes_indice("2025-04"))
+        self.assertEqual({a.chave for a in recarregado.alertas_ativos()}, {"Cresce"})
+
+    def test_watermark_apos_compactacao_rele_historico(self) -> None:
+        service = DiagnosticService()
+        estado = os.path.join(self.pasta, "alertas.json")
+        for mes in (1, 2, 3):
+            append_event_ref(service.run(_simples("Cresce", f"2025-{mes:02d}", 1_400_000.0 + mes * 100_000.0)).to_event(), pasta=self.pasta)
+        append_event_ref(build_refreshed_event(list_events(limit=1, pasta=self.pasta)[0]), pasta=self.pasta)
+        MonitorLimites(horizonte=3, estado_path=estado).processar_historico(pasta=self.pasta)
+
+        for mes in (4, 5, 6):
+            append_event_ref(service.run(_simples("Cresce", f"2025-{mes:02d}", 1_400_000.0 + mes * 100_000.0)).to_event(), pasta=self.pasta)
+        rotate_segments(self.pasta, "history.jsonl", max_bytes=1)
+        compact_report_refreshes(self.pasta, "history.jsonl")
+        segunda = MonitorLimites(horizonte=3, estado_path=estado).processar_historico(pasta=self.pasta)
+
+        # Offset antigo nao vale no segmento reescrito: relido desde o inicio, nenhuma competencia perdida.
+        self.assertEqual(segunda.eventos, 6)
+        recarregado = MonitorLimites(horizonte=3, estado_path=estado)
+        self.assertEqual(recarregado.tendencias["Cresce"].meses, [mes_indice(f"2025-{mes:02d}") for mes in range(1, 7)])
+        self.assertEqual(recarregado.watermark["geracao"], 1)
+
+    def test_carga_em_lote_do_period_engine(self) -> None:
+        competencias = competencias_mensais("2024-01", 24)
+        receitas = np.vstack(
+            [
+                np.linspace(200_000.0, 420_000.0, 24),  # RBT12 crescendo rumo ao limite do Simples
+                np.full(24, 50_000.0),  # estavel
+            ]
+        )
+        apuracao = apurar_simples_mensal(receitas, ["I", "I"], competencias)
+        monitor = MonitorLimites(horizonte=12)
+
+        resultado = monitor.carregar_apuracao(apuracao, ["Cresce", "Estavel"])
+
+        self.assertEqual(resultado.alertas["Estavel"], [])
+        self.assertIn("limite_simples", {a.tipo for a in resultado.alertas["Cresce"]})
+        # Paridade com a atualizacao incremental da mesma janela.
+        incremental = MonitorLimites(horizonte=12)
+        for j, competencia in enumerate(competencias):
+            alertas = incremental.observar("Cresce", competencia, float(apuracao.rbt12[0, j]), anexo="I")
+        self.assertEqual(alertas, resultado.alertas["Cresce"])
+
+    def test_thresholds_invalido(self) -> None:
+        with patch("alerta_limites.get_thresholds", return_value={"portes": [{"porte": "ME"}]}):
+            with self.assertRaisesRegex(ValueError, "thresholds.json"):
+                get_limites_compilados("BR_TAX_2026_V1")
+        with self.assertRaisesRegex(ValueError, "horizonte"):
+            MonitorLimites(horizonte=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from benchmarks.portfolio import gerar_portfolio
+from benchmarks.run_benchmarks import compare_with_baseline, merge_baseline_runs
+
+
+class BenchmarkSuiteTests(unittest.TestCase):
+    def test_portfolio_deterministico_por_seed(self) -> None:
+        a = gerar_portfolio(50, seed=7)
+        b = gerar_portfolio(50, seed=7)
+        c = gerar_portfolio(50, seed=8)
+
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+        self.assertTrue(all(inp.receita_anual > 0 for inp in a))
+        self.assertTrue(all(inp.anexo_simples for inp in a if inp.regime_code == "SIMPLES"))
+
+    def test_compare_with_baseline_detecta_regressao(self) -> None:
+        baseline = {"results": {"a": {"p50_ms": 1.0}, "b": {"p50_ms": 2.0}}}
+        current = {
+            "results": {
+                "a": {"p50_ms": 1.1},
+                "b": {"p50_ms": 3.0},
+                "c": {"p50_ms": 0.5},
+                "d": {"name": "d", "skipped": "reportlab indisponivel"},
+            }
+        }
+
+        linhas = {c["name"]: c for c in compare_with_baseline(current, baseline, threshold=0.2)}
+
+        self.assertEqual(linhas["a"]["status"], "PASS")
+        self.assertEqual(linhas["b"]["status"], "REGRESSION")
+        self.assertEqual(linhas["c"]["status"], "NEW")
+        self.assertNotIn("d", linhas)
+
+    def test_merge_baseline_runs_mantem_medicao_mais_lenta(self) -> None:
+        runs = [
+            {"profile": "quick", "results": {"a": {"p50_ms": 1.0}, "b": {"p50_ms": 5.0}, "d": {"skipped": "x"}}},
+            {"profile": "quick", "results": {"a": {"p50_ms": 1.4}, "b": {"p50_ms": 4.0}, "d": {"skipped": "x"}}},
+        ]
+
+        merged = merge_baseline_runs(runs)
+
+        self.assertEqual(merged["results"]["a"]["p50_ms"], 1.4)
+        self.assertEqual(merged["results"]["b"]["p50_ms"], 5.0)
+        self.assertEqual(merged["results"]["d"], {"skipped": "x"})
+        self.assertEqual(merged["baseline_runs"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import math
+import unittest
+from dataclasses import replace
+
+import numpy as np
+
+from breakeven import breakeven_folha_fator_r, breakeven_margem_real_presumido, find_breakeven
+from dto import DiagnosticInput
+from tax_engine import DiagnosticService
+
+_REGIMES = {
+    "SIMPLES": ("Simples Nacional", "tabelado"),
+    "PRESUMIDO": ("Lucro Presumido", "padrao"),
+    "REAL": ("Lucro Real", "padrao"),
+}
+
+
+def _input(**campos) -> DiagnosticInput:
+    base = dict(
+        nome_empresa="Empresa Breakeven",
+        receita_anual=1200000.0,
+        regime="Lucro Presumido",
+        regime_code="PRESUMIDO",
+        regime_model="padrao",
+        tipo_atividade="Servicos",
+        anexo_simples="III",
+    )
+    base.update(campos)
+    return DiagnosticInput(**base)
+
+
+def _custo(inp: DiagnosticInput, regime_code: str, variavel: str, valor: float) -> float:
+    campos = {variavel: valor}
+    if variavel == "receita_anual":
+        campos.update(receita_base_periodo=valor, rbt12=valor)
+    if variavel == "folha_12m":
+        campos["fator_r"] = None
+    regime, modelo = _REGIMES[regime_code]
+    alterado = replace(inp, regime=regime, regime_code=regime_code, regime_model=modelo, **campos)
+    return DiagnosticService._imposto_atual_por_regime(alterado)[0]
+
+
+class BreakevenTests(unittest.TestCase):
+    def _assert_troca_em_torno(self, inp, regime_a, regime_b, variavel, limiar, a_vence_abaixo, passo) -> None:
+        abaixo = _custo(inp, regime_a, variavel, limiar - passo) - _custo(inp, regime_b, variavel, limiar - passo)
+        acima = _custo(inp, regime_a, variavel, limiar + passo) - _custo(inp, regime_b, variavel, limiar + passo)
+        self.assertLess(abaixo * acima, 0)
+        self.assertEqual(abaixo < 0, a_vence_abaixo)
+
+    def test_margem_real_presumido_em_forma_fechada(self) -> None:
+        inputs = [_input(), _input(despesas_creditaveis=300000.0)]
+
+        resultado = breakeven_margem_real_presumido(inputs)
+
+        self.assertEqual(resultado.metodo, "fechado")
+        for inp, limiar, vence in zip(inputs, resultado.limiar, resultado.a_vence_abaixo):
+            self.assertTrue(vence)
+            self.assertAlmostEqual(_custo(inp, "REAL", "margem_lucro", limiar), _custo(inp, "PRESUMIDO", "margem_lucro", limiar), places=4)
+            self._assert_troca_em_torno(inp, "REAL", "PRESUMIDO", "margem_lucro", limiar, vence, 1e-4)
+
+    def test_receita_simples_presumido_com_troca_iii_v(self) -> None:
+        inputs = [_input(anexo_simples="III/V", folha_12m=200000.0), _input(anexo_simples="I", tipo_atividade="Comercio")]
+
+        resultado = find_breakeven(inputs, "SIMPLES", "PRESUMIDO", "receita_anual", 50000.0, 4800000.0)
+
+        self.assertAlmostEqual(resultado.limiar[0], 200000.0 / 0.28, places=4)
+        for inp, limiar, vence in zip(inputs, resultado.limiar, resultado.a_vence_abaixo):
+            self.assertFalse(math.isnan(limiar))
+            self._assert_troca_em_torno(inp, "SIMPLES", "PRESUMIDO", "receita_anual", limiar, vence, 1.0)
+
+    def test_rbt12_usa_bisseccao(self) -> None:
+        inp = _input(receita_anual=1000000.0, despesas_creditaveis=300000.0)
+
+        resultado = find_breakeven([inp], "SIMPLES", "PRESUMIDO", "rbt12", 50000.0, 4800000.0)
+
+        self.assertEqual(resultado.metodo, "bisseccao")
+        limiar = float(resultado.limiar[0])
+        self.assertAlmostEqual(_custo(inp, "SIMPLES", "rbt12", limiar), _custo(inp, "PRESUMIDO", "rbt12", limiar), places=4)
+        self._assert_troca_em_torno(inp, "SIMPLES", "PRESUMIDO", "rbt12", limiar, bool(resultado.a_vence_abaixo[0]), 1.0)
+
+    def test_folha_fator_r_salto_no_limite(self) -> None:
+        inputs = [_input(anexo_simples="III/V", folha_12m=100000.0, rbt12=1000000.0), _input()]
+
+        fechado = breakeven_folha_fator_r(inputs)
+        busca = find_breakeven(inputs[:1], "SIMPLES", "PRESUMIDO", "folha_12m", 0.0, 1000000.0)
+
+        self.assertEqual(fechado.limiar[0], 280000.0)
+        self.assertTrue(np.isnan(fechado.limiar[1]))
+        self.assertEqual(busca.limiar[0], 280000.0)
+        self.assertFalse(busca.a_vence_abaixo[0])
+
+    def test_sem_cruzamento_indica_quem_vence_no_intervalo(self) -> None:
+        resultado = find_breakeven([_input()], "REAL", "PRESUMIDO", "margem_lucro", 0.0, 0.05)
+
+        self.assertTrue(np.isnan(resultado.limiar[0]))
+        self.assertTrue(resultado.a_vence_abaixo[0])
+
+    def test_entradas_invalidas(self) -> None:
+        with self.assertRaises(ValueError):
+            find_breakeven([_input()], "REAL", "PRESUMIDO", "aliquota", 0.0, 1.0)
+        with self.assertRaises(ValueError):
+            find_breakeven([_input()], "REAL", "REAL", "margem_lucro", 0.0, 1.0)
+        with self.assertRaises(ValueError):
+            find_breakeven([_input(), _input(ruleset_id="outro")], "REAL", "PRESUMIDO", "margem_lucro", 0.0, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
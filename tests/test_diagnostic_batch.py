@@ -0,0 +1,118 @@
+import unittest
+from dataclasses import replace
+
+import numpy as np
+
+from benchmarks.portfolio import gerar_portfolio
+from diagnostic_batch import DiagnosticBatch, executar_lote
+from dto import DiagnosticInput
+from tax_engine import CLASSIFICACOES_IMPACTO, DiagnosticService
+
+try:
+    import pandas  # noqa: F401
+
+    HAS_PANDAS = True
+except ImportError:
+    HAS_PANDAS = False
+
+try:
+    import pyarrow as pa
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+class DiagnosticBatchTests(unittest.TestCase):
+    def test_dtos_slotted_e_to_event_sem_copia_profunda(self) -> None:
+        out = DiagnosticService().run(gerar_portfolio(1, seed=4)[0])
+
+        self.assertFalse(hasattr(out, "__dict__"))
+        self.assertFalse(hasattr(out.resultados[0], "__dict__"))
+        self.assertFalse(hasattr(DiagnosticInput(nome_empresa="A", receita_anual=1.0, regime="Lucro Real"), "__dict__"))
+        evento = out.to_event()
+        self.assertIsNot(evento["detalhes_regime"], out.detalhes_regime)
+        self.assertIs(evento["detalhes_regime"]["audit"], out.detalhes_regime["audit"])
+        self.assertEqual(evento["resultados"], [r.to_dict() for r in out.resultados])
+        self.assertNotIn("stage_timings", evento)
+
+    def test_lote_bate_com_outputs(self) -> None:
+        inputs = gerar_portfolio(40, seed=9)
+        service = DiagnosticService()
+        outputs = [service.run(inp) for inp in inputs]
+
+        lote = executar_lote(inputs, service)
+
+        self.assertEqual(len(lote), 40)
+        self.assertEqual(lote.grade.shape, (40, len(outputs[0].resultados)))
+        for i, (inp, out) in enumerate(zip(inputs, outputs)):
+            self.assertEqual(lote.entrada(i), inp)
+            self.assertEqual(lote.resultados(i), out.resultados)
+            self.assertEqual(lote.imposto_atual[i], out.imposto_atual)
+            self.assertEqual(lote.regime[i], out.regime)
+        self.assertTrue(np.isnan(lote.numericos["aliquota_simples"]).any())
+        self.assertLess(lote.nbytes, 40 * 400)
+
+    def test_cenarios_diferentes_no_lote(self) -> None:
+        inp = gerar_portfolio(1, seed=1)[0]
+        outro = replace(inp, cenarios={"Teste": 0.2})
+        service = DiagnosticService()
+        with self.assertRaisesRegex(ValueError, "cenarios diferentes"):
+            DiagnosticBatch.from_outputs([inp, outro], [service.run(inp), service.run(outro)])
+
+        vazio = executar_lote([])
+        self.assertEqual(len(vazio), 0)
+        self.assertEqual(vazio.grade.shape, (0, 0))
+
+    def test_getitem_materializa_output_completo(self) -> None:
+        inputs = gerar_portfolio(5, seed=2)
+        service = DiagnosticService()
+        lote = executar_lote(inputs, service)
+
+        out = lote[3]
+        esperado = service.run(inputs[3])
+        self.assertEqual(out.imposto_atual, esperado.imposto_atual)
+        self.assertEqual(out.resultados, esperado.resultados)
+        self.assertEqual(out.regime, esperado.regime)
+        self.assertTrue(out.relatorio_texto)
+        self.assertIn("audit", out.detalhes_regime)
+        self.assertEqual(lote[-1].nome_empresa, inputs[-1].nome_empresa)
+        with self.assertRaises(IndexError):
+            lote[5]
+
+    @unittest.skipUnless(HAS_PANDAS, "pandas nao instalado")
+    def test_to_pandas_colunas_sem_copia(self) -> None:
+        inputs = gerar_portfolio(30, seed=6)
+        service = DiagnosticService()
+        outputs = [service.run(inp) for inp in inputs]
+        lote = DiagnosticBatch.from_outputs(inputs, outputs)
+
+        df = lote.to_pandas()
+
+        self.assertEqual(len(df), 30)
+        self.assertTrue(np.shares_memory(df["receita_anual"].to_numpy(), lote.numericos["receita_anual"]))
+        self.assertEqual(list(df["regime_display"]), [out.regime for out in outputs])
+        self.assertEqual(df["regime_code"].tolist(), [inp.regime_code for inp in inputs])
+        nome, _, j = lote.colunas_cenario()[0]
+        coluna = nome.rsplit("_imposto_reforma", 1)[0]
+        for i, out in enumerate(outputs):
+            self.assertEqual(df[nome].iloc[i], out.resultados[j].imposto_reforma)
+            self.assertEqual(df[f"{coluna}_classificacao"].iloc[i], out.resultados[j].classificacao)
+        self.assertEqual(list(df[f"{coluna}_classificacao"].cat.categories), list(CLASSIFICACOES_IMPACTO))
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow nao instalado")
+    def test_to_arrow_dictionary_e_nulos(self) -> None:
+        inputs = gerar_portfolio(30, seed=6)
+        lote = executar_lote(inputs)
+
+        tabela = lote.to_arrow()
+
+        self.assertEqual(tabela.num_rows, 30)
+        self.assertEqual(tabela.column_names[-len(lote.colunas_cenario()):], [nome for nome, _, _ in lote.colunas_cenario()])
+        self.assertTrue(pa.types.is_dictionary(tabela.schema.field("regime_display").type))
+        self.assertEqual(tabela.column("anexo_simples").to_pylist(), [inp.anexo_simples for inp in inputs])
+        self.assertEqual(tabela.column("imposto_atual").to_pylist(), lote.imposto_atual.tolist())
+        self.assertEqual(tabela.column("nome_empresa").to_pylist(), [inp.nome_empresa for inp in inputs])
+
+
+if __name__ == "__main__":
+    unittest.main()
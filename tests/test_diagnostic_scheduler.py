@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+from dataclasses import replace
+from unittest.mock import patch
+
+from diagnostic_scheduler import DiagnosticScheduler, input_hash
+from dto import DiagnosticInput
+from history_store import list_events
+
+
+def _simples(nome: str, receita: float = 120000.0) -> DiagnosticInput:
+    return DiagnosticInput(
+        nome_empresa=nome,
+        receita_anual=receita,
+        regime="Simples Nacional",
+        regime_code="SIMPLES",
+        regime_model="tabelado",
+        anexo_simples="III",
+        tipo_atividade="Servicos",
+        periodicidade="mensal",
+    )
+
+
+class DiagnosticSchedulerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.pasta = self._tmp.name
+        self.carteira = {f"E{i}": _simples(f"Empresa {i}", 100000.0 + 10000.0 * i) for i in range(5)}
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_primeiro_tick_calcula_todas_e_grava_historico(self) -> None:
+        resultado = DiagnosticScheduler(pasta=self.pasta).tick("2025-01", self.carteira)
+
+        self.assertEqual(set(resultado.recalculadas.values()), {"nova"})
+        self.assertEqual(resultado.resumo()["recalculadas"], 5)
+        eventos = list_events(pasta=self.pasta)
+        self.assertEqual(len(eventos), 5)
+        self.assertEqual({e["detalhes_regime"]["competencia"] for e in eventos}, {"2025-01"})
+
+    def test_tick_seguinte_ignora_inalteradas(self) -> None:
+        scheduler = DiagnosticScheduler(pasta=self.pasta)
+        scheduler.tick("2025-01", self.carteira)
+        carteira = dict(self.carteira, E2=replace(self.carteira["E2"], receita_anual=999999.0))
+
+        resultado = scheduler.tick("2025-02", carteira)
+
+        self.assertEqual(resultado.recalculadas, {"E2": "input_alterado"})
+        self.assertEqual(len(resultado.ignoradas), 4)
+        self.assertEqual(len(list_events(pasta=self.pasta)), 6)
+
+    def test_ruleset_alterado_recalcula(self) -> None:
+        scheduler = DiagnosticScheduler(pasta=self.pasta)
+        scheduler.tick("2025-01", self.carteira)
+
+        with patch("diagnostic_scheduler.get_integrity_summary", return_value={"ruleset_hash": "novo"}):
+            resultado = scheduler.tick("2025-02", self.carteira)
+
+        self.assertEqual(set(resultado.recalculadas.values()), {"ruleset_alterado"})
+
+    def test_rbt12_movel_cruzando_faixa(self) -> None:
+        scheduler = DiagnosticScheduler(pasta=self.pasta)
+        carteira = {"A": _simples("A"), "B": _simples("B")}
+        serie_a = [14000.0] * 12
+        serie_b = [10000.0] * 12
+        scheduler.tick("2025-01", carteira, {"A": serie_a + [14000.0], "B": serie_b + [10000.0]})
+
+        # A: RBT12 vai de 168 mil para 180.000,01 (faixa 2); B: continua na faixa 1.
+        resultado = scheduler.tick("2025-02", carteira, {"A": serie_a[1:] + [14000.0, 26000.01, 0.0], "B": serie_b[1:] + [10000.0, 12000.0, 0.0]})
+
+        self.assertEqual(resultado.recalculadas, {"A": "fronteira_rbt12"})
+        self.assertEqual(resultado.ignoradas, ["B"])
+        self.assertEqual(scheduler.estado["A"].fronteira, ("III", 2, False))
+
+    def test_estado_persistido_entre_execucoes(self) -> None:
+        estado_path = os.path.join(self.pasta, "estado", "scheduler.json")
+        DiagnosticScheduler(pasta=self.pasta, estado_path=estado_path).tick("2025-01", self.carteira)
+
+        resultado = DiagnosticScheduler(pasta=self.pasta, estado_path=estado_path).tick("2025-02", dict(list(self.carteira.items())[:3]))
+
+        self.assertEqual(len(resultado.ignoradas), 3)
+        self.assertEqual(resultado.recalculadas, {})
+        self.assertEqual(len(DiagnosticScheduler(pasta=self.pasta, estado_path=estado_path).estado), 3)
+
+    def test_hash_ignora_campos_derivados(self) -> None:
+        base = self.carteira["E0"]
+
+        self.assertEqual(input_hash(base), input_hash(replace(base, competencia="2030-01", rbt12=1.0)))
+        self.assertNotEqual(input_hash(base), input_hash(replace(base, anexo_simples="V")))
+
+    def test_erro_de_calculo_nao_interrompe_tick(self) -> None:
+        carteira = dict(self.carteira, X=replace(self.carteira["E0"], anexo_simples="III/V"))
+
+        scheduler = DiagnosticScheduler(pasta=self.pasta)
+        resultado = scheduler.tick("2025-01", carteira)
+
+        self.assertEqual(len(resultado.recalculadas), 5)
+        self.assertIn("X", resultado.erros)
+        self.assertIn("X", scheduler.tick("2025-02", carteira).ignoradas)
+
+
+    def test_falha_inesperada_nao_duplica_eventos_no_tick_seguinte(self) -> None:
+        estado_path = os.path.join(self.pasta, "estado", "scheduler.json")
+        scheduler = DiagnosticScheduler(pasta=self.pasta, estado_path=estado_path)
+        run_original = scheduler.service.run
+
+        def run_com_falha(inp):
+            if inp.nome_empresa == "Empresa 2":
+                raise KeyError("plugin")
+            return run_original(inp)
+
+        with patch.object(scheduler.service, "run", side_effect=run_com_falha):
+            resultado = scheduler.tick("2025-01", self.carteira)
+
+        self.assertEqual(len(resultado.recalculadas), 4)
+        self.assertIn("KeyError", resultado.erros["E2"])
+        self.assertEqual(len(list_events(pasta=self.pasta)), 4)
+
+        resultado = DiagnosticScheduler(pasta=self.pasta, estado_path=estado_path).tick("2025-01", self.carteira)
+
+        self.assertEqual(resultado.recalculadas, {"E2": "nova"})
+        self.assertEqual(len(list_events(pasta=self.pasta)), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
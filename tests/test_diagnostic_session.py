@@ -0,0 +1,98 @@
+import unittest
+from dataclasses import replace
+
+from diagnostic_session import DiagnosticSession
+from dto import DiagnosticInput
+from tax_engine import DiagnosticService
+
+
+def _input_presumido() -> DiagnosticInput:
+    return DiagnosticInput(
+        nome_empresa="Empresa Sessao",
+        receita_anual=1200000.0,
+        regime="Lucro Presumido",
+        regime_code="PRESUMIDO",
+        regime_model="padrao",
+        tipo_atividade="Servicos",
+        anexo_simples="III",
+        rbt12=1200000.0,
+        cenarios={"Base (26%)": 0.26},
+    )
+
+
+class DiagnosticSessionTests(unittest.TestCase):
+    def test_alterar_cenarios_recalcula_so_cenarios_e_relatorio(self) -> None:
+        sessao = DiagnosticSession()
+        sessao.run(_input_presumido())
+        novo = replace(_input_presumido(), cenarios={"Base (26%)": 0.26, "Pessimista (28%)": 0.28})
+
+        out = sessao.run(novo)
+
+        self.assertEqual(sessao.last_invalidated, {"audit_metadata", "detalhes_regime", "scenarios", "report", "output"})
+        esperado = DiagnosticService().run(novo)
+        self.assertEqual(out.resultados, esperado.resultados)
+        self.assertIn("Pessimista (28%)", out.relatorio_texto)
+        self.assertEqual(sessao.graph.evaluations["compare_regimes"], 1)
+
+    def test_alterar_modo_recalcula_recomendacao_sem_comparativo(self) -> None:
+        sessao = DiagnosticSession()
+        sessao.run(_input_presumido())
+        novo = replace(_input_presumido(), modo_analise="estrategico")
+
+        out = sessao.run(novo)
+
+        self.assertIn("recommendation", sessao.last_invalidated)
+        self.assertNotIn("compare_regimes", sessao.last_invalidated)
+        self.assertNotIn("scenarios", sessao.last_invalidated)
+        esperado = DiagnosticService().run(novo)
+        self.assertEqual(out.detalhes_regime["modo_analise"], "estrategico")
+        self.assertEqual(out.detalhes_regime["recommendation_snapshot"], esperado.detalhes_regime["recommendation_snapshot"])
+
+    def test_outro_campo_monta_grafo_novo(self) -> None:
+        sessao = DiagnosticSession()
+        sessao.run(_input_presumido())
+        grafo_anterior = sessao.graph
+
+        out = sessao.run(replace(_input_presumido(), receita_anual=1500000.0))
+
+        self.assertIsNot(sessao.graph, grafo_anterior)
+        self.assertEqual(out.receita_anual, 1500000.0)
+
+    def test_input_identico_reaproveita_calculo_e_refaz_auditoria(self) -> None:
+        sessao = DiagnosticSession()
+        primeiro = sessao.run(_input_presumido())
+        segundo = sessao.run(_input_presumido())
+
+        # O generated_at da auditoria (e o relatorio) sao sempre do run atual.
+        self.assertEqual(sessao.last_invalidated, {"audit_metadata", "detalhes_regime", "report", "output"})
+        self.assertIsNot(segundo.detalhes_regime["audit"], primeiro.detalhes_regime["audit"])
+        self.assertEqual(segundo.resultados, primeiro.resultados)
+        self.assertEqual(sessao.graph.evaluations["compare_regimes"], 1)
+        self.assertEqual(sessao.graph.evaluations["audit_metadata"], 2)
+
+    def test_lru_de_grafos_por_sessao(self) -> None:
+        sessao = DiagnosticSession(max_graphs=2)
+        a, b, c = _input_presumido(), replace(_input_presumido(), receita_anual=1500000.0), replace(_input_presumido(), receita_anual=900000.0)
+        sessao.run(a)
+        grafo_a = sessao.graph
+        sessao.run(b)
+        grafo_b = sessao.graph
+        sessao.run(replace(a, modo_analise="estrategico"))
+
+        self.assertIs(sessao.graph, grafo_a)
+        self.assertEqual(grafo_a.evaluations["compare_regimes"], 1)
+        sessao.run(c)  # descarta b (menos recente)
+        sessao.run(b)
+        self.assertIsNot(sessao.graph, grafo_b)
+        sessao.run(replace(a, cenarios=None))  # a tambem saiu (c e b mais recentes)
+        self.assertIsNot(sessao.graph, grafo_a)
+        with self.assertRaises(ValueError):
+            DiagnosticSession(max_graphs=0)
+
+    def test_valida_input(self) -> None:
+        with self.assertRaises(ValueError):
+            DiagnosticSession().run(replace(_input_presumido(), receita_anual=0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
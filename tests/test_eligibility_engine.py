@@ -1,9 +1,22 @@
 import unittest
+from dataclasses import replace
+from unittest.mock import patch
 
-from company_profile import normalize_company_profile
+from company_profile import ASSUMPTION_MARGEM_DEFAULT, ASSUMPTION_RBT12_DEFAULT, normalize_company_profile
 from dto import DiagnosticInput
-from eligibility_engine import evaluate_eligibility
-from ruleset_loader import DEFAULT_RULESET_ID
+from eligibility_engine import (
+    ELIGIBILITY_REGIMES,
+    ELIGIBILITY_STATUSES,
+    REASON_PRESUMIDO_TIPO_ATIVIDADE_AUSENTE,
+    REASON_REAL_MARGEM_ASSUMIDA,
+    REASON_SIMPLES_FATOR_R_AUSENTE,
+    EligibilityBatch,
+    clear_compiled_eligibility_rules,
+    compile_eligibility_rules,
+    evaluate_eligibility,
+    get_compiled_eligibility_rules,
+)
+from ruleset_loader import DEFAULT_RULESET_ID, get_eligibility_rules
 
 
 class EligibilityEngineTests(unittest.TestCase):
@@ -49,6 +62,60 @@ class EligibilityEngineTests(unittest.TestCase):
         result = evaluate_eligibility(profile, DEFAULT_RULESET_ID)
         self.assertIn(result["REAL"].status, ("OK", "WARNING"))
 
+    def test_margem_assumida_vem_da_flag_estruturada(self) -> None:
+        profile = normalize_company_profile(
+            DiagnosticInput(nome_empresa="Empresa W", receita_anual=1_000_000.0, regime="Lucro Real", regime_code="REAL")
+        )
+        self.assertIn(ASSUMPTION_MARGEM_DEFAULT, profile.assumption_flags)
+        self.assertIn(ASSUMPTION_RBT12_DEFAULT, profile.assumption_flags)
+        self.assertEqual(evaluate_eligibility(profile, DEFAULT_RULESET_ID)["REAL"].status, "WARNING")
+
+        # O texto da premissa nao e mais consultado: sem a flag, Real fica OK.
+        sem_flag = replace(profile, assumption_flags=frozenset())
+        self.assertEqual(evaluate_eligibility(sem_flag, DEFAULT_RULESET_ID)["REAL"].status, "OK")
+
+    def test_regras_compiladas_uma_vez_por_ruleset(self) -> None:
+        clear_compiled_eligibility_rules()
+        profile = normalize_company_profile(
+            DiagnosticInput(nome_empresa="Empresa V", receita_anual=500_000.0, regime="Simples Nacional", anexo_simples="I")
+        )
+        with patch("eligibility_engine.get_eligibility_rules", wraps=get_eligibility_rules) as loader:
+            for _ in range(3):
+                evaluate_eligibility(profile, DEFAULT_RULESET_ID)
+        self.assertEqual(loader.call_count, 1)
+        clear_compiled_eligibility_rules()
+
+        with self.assertRaisesRegex(ValueError, "chave=rbt12_max"):
+            compile_eligibility_rules({"simples": {}, "presumido": {}, "real": {}}, DEFAULT_RULESET_ID)
+
+    def test_lote_igual_ao_perfil_individual(self) -> None:
+        base = DiagnosticInput(nome_empresa="Lote", receita_anual=1_000_000.0, regime="Simples Nacional")
+        profiles = [
+            normalize_company_profile(inp)
+            for inp in (
+                replace(base, anexo_simples="I", tipo_atividade="Comercio", margem_lucro=0.1),
+                replace(base, anexo_simples="III/V"),
+                replace(base, anexo_simples="III/V", fator_r=0.3, rbt12=5_000_000.0),
+                replace(base, receita_anual=90_000_000.0, tipo_atividade="Servicos"),
+                replace(base, anexo_simples="V", folha_12m=10_000.0, margem_lucro=0.2),
+            )
+        ]
+        compiled = get_compiled_eligibility_rules(DEFAULT_RULESET_ID)
+
+        lote = compiled.evaluate_batch(EligibilityBatch.from_profiles(profiles))
+
+        for i, profile in enumerate(profiles):
+            individual = compiled.evaluate(profile)
+            self.assertEqual(
+                [ELIGIBILITY_STATUSES[c] for c in lote.status[i]],
+                [individual[r].status for r in ELIGIBILITY_REGIMES],
+            )
+            self.assertEqual(lote.reason_codes(i), compiled.reasons(profile))
+        self.assertEqual(lote.reasons[REASON_SIMPLES_FATOR_R_AUSENTE].tolist(), [False, True, False, False, False])
+        self.assertEqual(lote.reasons[REASON_PRESUMIDO_TIPO_ATIVIDADE_AUSENTE].tolist(), [False, True, True, False, True])
+        self.assertEqual(lote.reasons[REASON_REAL_MARGEM_ASSUMIDA].tolist(), [False, True, True, True, False])
+        self.assertEqual([ELIGIBILITY_STATUSES[c] for c in lote.status_of("PRESUMIDO")], ["OK", "WARNING", "WARNING", "BLOCKED", "WARNING"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import patch
+
+from dto import DiagnosticInput
+from evaluation_graph import EvaluationGraph
+from tax_engine import DiagnosticService
+
+
+def _input_simples() -> DiagnosticInput:
+    return DiagnosticInput(
+        nome_empresa="Empresa Grafo",
+        receita_anual=600000.0,
+        regime="Simples Nacional",
+        regime_code="SIMPLES",
+        regime_model="tabelado",
+        rbt12=600000.0,
+        receita_base_periodo=600000.0,
+        anexo_simples="I",
+        competencia="2026",
+    )
+
+
+class EvaluationGraphTests(unittest.TestCase):
+    def test_no_compartilhado_e_avaliado_uma_vez(self) -> None:
+        chamadas = []
+        graph = EvaluationGraph()
+        graph.input("x", 2)
+        graph.node("dobro", lambda x: chamadas.append("dobro") or x * 2, ("x",))
+        graph.node("a", lambda d: d + 1, ("dobro",))
+        graph.node("b", lambda d: d + 2, ("dobro",))
+        graph.node("soma", lambda a, b: a + b, ("a", "b"))
+
+        self.assertEqual(graph.get("soma"), 11)
+        self.assertEqual(chamadas, ["dobro"])
+        self.assertEqual(graph.order, ["dobro", "a", "b", "soma"])
+        self.assertEqual(set(graph.timings), {"dobro", "a", "b", "soma"})
+
+    def test_set_input_invalida_apenas_jusante(self) -> None:
+        graph = EvaluationGraph()
+        graph.input("x", 1)
+        graph.input("y", 10)
+        graph.node("fx", lambda x: x * 2, ("x",))
+        graph.node("fy", lambda y: y * 2, ("y",))
+        graph.node("total", lambda a, b: a + b, ("fx", "fy"))
+        graph.get("total")
+
+        invalidados = graph.set_input("x", 5)
+
+        self.assertEqual(invalidados, {"fx", "total"})
+        self.assertEqual(graph.get("total"), 30)
+        self.assertEqual(graph.evaluations, {"fx": 2, "fy": 1, "total": 2})
+
+    def test_dependencia_desconhecida_rejeitada(self) -> None:
+        graph = EvaluationGraph()
+        with self.assertRaises(ValueError):
+            graph.node("a", lambda b: b, ("b",))
+        graph.input("b", 1)
+        graph.node("a", lambda b: b, ("b",))
+        with self.assertRaises(ValueError):
+            graph.node("a", lambda b: b, ("b",))
+        with self.assertRaises(ValueError):
+            graph.set_input("a", 2)
+
+
+class DiagnosticGraphTests(unittest.TestCase):
+    def test_run_avalia_cada_no_uma_vez_e_expoe_tempos(self) -> None:
+        graph = DiagnosticService().build_graph(_input_simples())
+        out = graph.get("output")
+
+        self.assertEqual(out.regime, "Simples Nacional")
+        self.assertTrue(all(n == 1 for n in graph.evaluations.values()))
+        descricao = {item["node"]: item for item in graph.describe()}
+        for no in ("profile", "ruleset", "imposto_atual", "eligibility", "compare_regimes", "recommendation", "audit_metadata", "scenarios", "report"):
+            self.assertTrue(descricao[no]["evaluated"], no)
+            self.assertGreaterEqual(descricao[no]["ms"], 0.0)
+        self.assertIn("regime_calc", descricao["compare_regimes"]["deps"])
+
+    def test_regime_atual_reaproveitado_no_comparativo(self) -> None:
+        graph = DiagnosticService().build_graph(_input_simples())
+        out = graph.get("output")
+
+        self.assertEqual(graph.get("regime_calc").hits, 1)
+        linha_simples = next(r for r in out.detalhes_regime["comparison_snapshot"] if r["regime_code"] == "SIMPLES")
+        self.assertEqual(linha_simples["imposto_total"], out.imposto_atual)
+
+    def test_memo_nao_altera_output_com_receita_base_ausente(self) -> None:
+        inp = DiagnosticInput(
+            nome_empresa="Empresa Real",
+            receita_anual=4800000.0,
+            regime="Lucro Real",
+            regime_code="REAL",
+            regime_model="padrao",
+            margem_lucro=0.10,
+            receita_base_periodo=None,
+        )
+        graph = DiagnosticService().build_graph(inp)
+        com_memo = graph.get("output")
+        with patch.object(DiagnosticService, "_calc_key", staticmethod(lambda i, info: object())):
+            sem_memo = DiagnosticService().run(inp)
+
+        self.assertEqual(graph.get("regime_calc").hits, 0)
+        self.assertEqual(com_memo.detalhes_regime["base_pis_cofins_usada"], "receita_anual")
+        for chave in ("comparison_snapshot", "recommendation_snapshot"):
+            self.assertEqual(com_memo.detalhes_regime[chave], sem_memo.detalhes_regime[chave], chave)
+        linha_real = next(r for r in com_memo.detalhes_regime["comparison_snapshot"] if r["regime_code"] == "REAL")
+        self.assertEqual(linha_real["detalhes_regime"]["base_pis_cofins_usada"], "receita_base_periodo")
+
+    def test_ruleset_carregado_uma_vez_por_run(self) -> None:
+        import ruleset_loader
+
+        original = ruleset_loader._load_json
+        arquivos = []
+
+        def _contar(ruleset_id, filename):
+            arquivos.append(filename)
+            return original(ruleset_id, filename)
+
+        with patch("ruleset_loader._load_json", side_effect=_contar):
+            DiagnosticService().run(_input_simples())
+
+        self.assertEqual(sorted(arquivos), sorted(set(arquivos)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import unittest
+
+from dto import DiagnosticInput
+from event_codec import (
+    EVENT_SCHEMA_VERSION,
+    BlobTable,
+    blob_table_path,
+    clear_blob_tables,
+    decode_event,
+    encode_event,
+)
+from history_store import append_event, build_report_from_event, get_event_report_text, has_audit, list_events
+from tax_engine import DiagnosticService
+
+
+def _evento(nome: str = "Empresa Codec") -> dict:
+    inp = DiagnosticInput(
+        nome_empresa=nome,
+        receita_anual=480000.0,
+        regime="Lucro Presumido",
+        tipo_atividade="Servicos",
+        competencia="2026",
+    )
+    return DiagnosticService().run(inp).to_event()
+
+
+def _via_json(data: dict) -> dict:
+    return json.loads(json.dumps(data, ensure_ascii=False))
+
+
+class EventCodecTests(unittest.TestCase):
+    def setUp(self) -> None:
+        clear_blob_tables()
+
+    def test_roundtrip_restaura_shape_sem_relatorio(self) -> None:
+        evento = _evento()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            table = BlobTable(os.path.join(tmp_dir, "history.blobs.jsonl"))
+            compacto = _via_json(encode_event(evento, table))
+            decodificado = decode_event(compacto, BlobTable(table.path))
+
+        esperado = _via_json({k: v for k, v in evento.items() if k != "relatorio_texto"})
+        esperado["schema_version"] = EVENT_SCHEMA_VERSION
+        self.assertEqual(compacto["schema_version"], EVENT_SCHEMA_VERSION)
+        self.assertNotIn("relatorio_texto", compacto)
+        self.assertIn("$ref", compacto["detalhes_regime"]["audit"])
+        self.assertNotIn("references", compacto["detalhes_regime"]["audit"])
+        self.assertEqual(decodificado, esperado)
+        self.assertIn("=== AUDITORIA", build_report_from_event(decodificado))
+
+    def test_tabela_lateral_deduplica_audit_entre_eventos(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for idx in range(3):
+                caminho_segmento = append_event(_evento(f"Empresa {idx}"), pasta=tmp_dir, arquivo="history.jsonl")
+            with open(blob_table_path(os.path.join(tmp_dir, "history.jsonl")), "r", encoding="utf-8") as f:
+                blobs = [linha for linha in f if linha.strip()]
+            clear_blob_tables()
+            eventos = list_events(pasta=tmp_dir, arquivo="history.jsonl")
+            tamanho_compacto = os.path.getsize(caminho_segmento)
+
+        tamanho_integral = sum(len(json.dumps(_evento(), ensure_ascii=False)) + 1 for _ in range(3))
+        self.assertEqual(len(blobs), 1)
+        self.assertEqual(len(eventos), 3)
+        self.assertTrue(all(has_audit(evento) for evento in eventos))
+        self.assertIn("Empresa: Empresa 2", get_event_report_text(eventos[0]))
+        self.assertLess(tamanho_compacto * 2, tamanho_integral)
+
+    def test_legado_passa_sem_alteracao_e_ref_ausente_degrada(self) -> None:
+        legado = {"nome_empresa": "Legado", "relatorio_texto": "txt", "detalhes_regime": {}}
+        self.assertIs(decode_event(legado, None), legado)
+
+        compacto = {
+            "schema_version": EVENT_SCHEMA_VERSION,
+            "nome_empresa": "Sem blob",
+            "detalhes_regime": {"audit": {"$ref": "inexistente", "generated_at": "2026-02-12T10:00:00"}},
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            decodificado = decode_event(compacto, BlobTable(os.path.join(tmp_dir, "h.blobs.jsonl")))
+
+        self.assertEqual(decodificado["detalhes_regime"]["audit"], {"generated_at": "2026-02-12T10:00:00"})
+        self.assertFalse(has_audit(decodificado))
+
+
+if __name__ == "__main__":
+    unittest.main()
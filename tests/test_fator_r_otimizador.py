@@ -0,0 +1,105 @@
+import time
+import unittest
+
+import numpy as np
+
+from dto import DiagnosticInput
+from fator_r_otimizador import otimizar_fator_r, planejar_fator_r
+from regimes import imposto_simples_tabelado
+from regimes_vetorizados import get_tabelas_simples_compiladas
+from ruleset_loader import DEFAULT_RULESET_ID, get_simples_tables
+
+
+def _input(nome: str, rbt12: float, folha=None, anexo: str = "III/V", fator_r=None) -> DiagnosticInput:
+    return DiagnosticInput(
+        nome_empresa=nome,
+        receita_anual=rbt12,
+        regime="Simples Nacional",
+        regime_code="SIMPLES",
+        regime_model="tabelado",
+        rbt12=rbt12,
+        anexo_simples=anexo,
+        folha_12m=folha,
+        fator_r=fator_r,
+    )
+
+
+class FatorROtimizadorTests(unittest.TestCase):
+    def test_folha_minima_cruza_limite_e_economia_bate_com_escalar(self) -> None:
+        tabelas = get_simples_tables(DEFAULT_RULESET_ID)
+        inputs = [_input("A", 1000000.0, 100000.0), _input("B", 333333.33, 20000.0), _input("C", 2500000.0, 600000.0)]
+
+        plano = otimizar_fator_r(inputs)
+
+        for pos, inp in enumerate(inputs):
+            minima = float(plano.folha_minima[pos])
+            _, acima = imposto_simples_tabelado(inp.receita_anual, inp.rbt12, "III/V", tabelas, folha_12m=minima)
+            _, abaixo = imposto_simples_tabelado(inp.receita_anual, inp.rbt12, "III/V", tabelas, folha_12m=float(np.nextafter(minima, 0)))
+            self.assertEqual(acima["anexo_aplicado"], "III")
+            self.assertEqual(abaixo["anexo_aplicado"], "V")
+            das_v, _ = imposto_simples_tabelado(inp.receita_anual, inp.rbt12, "V", tabelas)
+            das_iii, _ = imposto_simples_tabelado(inp.receita_anual, inp.rbt12, "III", tabelas)
+            self.assertEqual(plano.economia_das[pos], das_v - das_iii)
+            self.assertEqual(plano.economia_liquida[pos], (das_v - das_iii) - (minima - inp.folha_12m))
+
+    def test_ja_no_anexo_iii_e_entradas_ignoradas(self) -> None:
+        inputs = [
+            _input("Ja III", 1000000.0, 300000.0),
+            _input("Anexo I", 1000000.0, 0.0, anexo="I"),
+            _input("Sem folha", 1000000.0),
+            _input("Por fator", 1000000.0, fator_r=0.2),
+        ]
+
+        plano = otimizar_fator_r(inputs)
+
+        self.assertEqual(plano.indices.tolist(), [0, 3])
+        self.assertEqual(plano.folha_extra[0], 0.0)
+        self.assertEqual(plano.economia_liquida[0], 0.0)
+        self.assertAlmostEqual(plano.folha_extra[1], 80000.0, places=6)
+
+    def test_fator_r_informado_prevalece_sobre_folha_como_no_escalar(self) -> None:
+        tabelas = get_simples_tables(DEFAULT_RULESET_ID)
+        inputs = [
+            _input("Fator III, folha V", 1000000.0, folha=100000.0, fator_r=0.30),
+            _input("Fator V, folha III", 1000000.0, folha=400000.0, fator_r=0.10),
+            _input("Fator no limite", 1000000.0, folha=0.0, fator_r=0.28),
+        ]
+
+        plano = otimizar_fator_r(inputs)
+
+        for pos, inp in enumerate(inputs):
+            _, calc = imposto_simples_tabelado(
+                inp.receita_anual, inp.rbt12, "III/V", tabelas, fator_r=inp.fator_r, folha_12m=inp.folha_12m
+            )
+            ja_iii = plano.folha_extra[pos] == 0.0 and plano.economia_das[pos] == 0.0
+            self.assertEqual(ja_iii, calc["anexo_aplicado"] == "III", inp.nome_empresa)
+        self.assertEqual(plano.folha_atual[1], 100000.0)
+        self.assertGreater(plano.folha_extra[1], 0.0)
+
+    def test_top_k_por_heap(self) -> None:
+        inputs = [_input(f"E{i}", 400000.0 + 50000.0 * i, (0.27 - 0.01 * i) * (400000.0 + 50000.0 * i)) for i in range(10)]
+        plano = otimizar_fator_r(inputs)
+
+        top = plano.top(3)
+
+        esperado = sorted((v for v in plano.economia_liquida.tolist() if v > 0), reverse=True)[:3]
+        self.assertEqual([linha["economia_liquida"] for linha in top], esperado)
+        self.assertTrue(all(linha["nome_empresa"].startswith("E") for linha in top))
+        self.assertEqual(plano.top(0), [])
+
+    def test_varredura_20k_clientes(self) -> None:
+        rng = np.random.default_rng(7)
+        rbt12 = rng.uniform(60000.0, 4800000.0, 20000)
+        folha = rbt12 * rng.uniform(0.05, 0.4, 20000)
+        compiladas = get_tabelas_simples_compiladas(DEFAULT_RULESET_ID)
+
+        inicio = time.perf_counter()
+        colunas = planejar_fator_r(compiladas, rbt12, rbt12, folha)
+        decorrido = time.perf_counter() - inicio
+
+        self.assertEqual(colunas["economia_liquida"].shape, (20000,))
+        self.assertLess(decorrido, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import math
+import os
+import tempfile
+import unittest
+
+from dto import DiagnosticInput
+from history_export import WatermarkDesatualizado, export_history, flatten_event, read_export
+from history_segments import compact_report_refreshes, rotate_segments
+from history_store import append_event, build_refreshed_event, list_events, normalize_event
+from tax_engine import DiagnosticService
+
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+def _evento_simples(nome: str) -> dict:
+    inp = DiagnosticInput(
+        nome_empresa=nome,
+        receita_anual=600000.0,
+        regime="Simples Nacional",
+        regime_code="SIMPLES",
+        regime_model="tabelado",
+        rbt12=600000.0,
+        receita_base_periodo=600000.0,
+        anexo_simples="I",
+        competencia="2026",
+    )
+    return DiagnosticService().run(inp).to_event()
+
+
+def _evento_legado(nome: str) -> dict:
+    return {"nome_empresa": nome, "receita_anual": "1000", "regime": "Lucro Real", "imposto_atual": 10.0, "cenarios": []}
+
+
+class HistoryExportTests(unittest.TestCase):
+    def test_flatten_event_colunas_tipadas(self) -> None:
+        linha = flatten_event(normalize_event(_evento_simples("Empresa Flat")))
+        legado = flatten_event(normalize_event(_evento_legado("Legado")))
+
+        self.assertEqual(linha["regime_code"], "SIMPLES")
+        self.assertEqual(linha["competencia"], "2026")
+        self.assertTrue(linha["ruleset_id"])
+        self.assertTrue(linha["recomendacao_status"])
+        self.assertGreater(linha["das_CPP"], 0.0)
+        self.assertIn("cenario_base_25_impacto_percentual", linha)
+        self.assertTrue(math.isnan(legado["das_IRPJ"]))
+        self.assertEqual(legado["receita_anual"], 1000.0)
+        self.assertEqual(legado["regime_code"], "REAL")
+
+    def _exportacao_incremental(self, formato: str) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_dir = os.path.join(tmp_dir, "export")
+            append_event(_evento_legado("Empresa 0"), pasta=tmp_dir)
+            append_event(_evento_simples("Empresa 1"), pasta=tmp_dir)
+            primeira = export_history(pasta=tmp_dir, output_dir=out_dir, formato=formato)
+            vazia = export_history(pasta=tmp_dir, output_dir=out_dir)
+            append_event(_evento_simples("Empresa 2"), pasta=tmp_dir)
+            segunda = export_history(pasta=tmp_dir, output_dir=out_dir)
+            colunas = read_export(out_dir)
+            completa = export_history(pasta=tmp_dir, output_dir=out_dir, formato=formato, full=True)
+            colunas_completa = read_export(out_dir)
+
+        self.assertEqual(primeira["formato"], formato)
+        self.assertEqual(primeira["eventos"], 2)
+        self.assertEqual(vazia["eventos"], 0)
+        self.assertEqual(segunda["eventos"], 1)
+        self.assertEqual(completa["eventos"], 3)
+        self.assertEqual(colunas["nome_empresa"], ["Empresa 0", "Empresa 1", "Empresa 2"])
+        self.assertEqual(colunas["regime_code"], ["REAL", "SIMPLES", "SIMPLES"])
+        self.assertTrue(math.isnan(colunas["das_ICMS"][0]))
+        self.assertEqual(colunas_completa["nome_empresa"], colunas["nome_empresa"])
+
+    def test_exportacao_incremental_npz(self) -> None:
+        self._exportacao_incremental("npz")
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow nao instalado")
+    def test_exportacao_incremental_parquet(self) -> None:
+        self._exportacao_incremental("parquet")
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow nao instalado")
+    def test_exportacao_incremental_arrow(self) -> None:
+        self._exportacao_incremental("arrow")
+
+    def test_compactacao_do_segmento_exportado_invalida_watermark(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_dir = os.path.join(tmp_dir, "export")
+            for idx in range(3):
+                append_event(_evento_simples(f"E{idx}"), pasta=tmp_dir)
+            append_event(build_refreshed_event(list_events(limit=1, pasta=tmp_dir)[0]), pasta=tmp_dir)
+            primeira = export_history(pasta=tmp_dir, output_dir=out_dir, formato="npz")
+            for idx in range(3, 6):
+                append_event(_evento_simples(f"E{idx}"), pasta=tmp_dir)
+            rotate_segments(tmp_dir, "history.jsonl", max_bytes=1)
+            self.assertEqual(compact_report_refreshes(tmp_dir, "history.jsonl")["refreshes_incorporados"], 1)
+            append_event(_evento_simples("E6"), pasta=tmp_dir)
+
+            # Os offsets do segmento compactado mudaram: incremental falha em vez de pular E3-E5.
+            with self.assertRaisesRegex(WatermarkDesatualizado, "reescrito"):
+                export_history(pasta=tmp_dir, output_dir=out_dir)
+            completa = export_history(pasta=tmp_dir, output_dir=out_dir, formato="npz", full=True)
+            nomes = read_export(out_dir)["nome_empresa"]
+
+            vazio = os.path.join(tmp_dir, "vazio")
+            os.makedirs(vazio)
+            sem_eventos = export_history(pasta=vazio, output_dir=out_dir, formato="npz", full=True)
+            watermark_removido = not os.path.exists(os.path.join(out_dir, "watermark.json"))
+
+        self.assertEqual(primeira["eventos"], 4)
+        self.assertEqual(primeira["watermark"]["geracao"], 0)
+        self.assertEqual(completa["eventos"], 7)
+        self.assertEqual(completa["watermark"]["geracao"], 0)
+        self.assertEqual(nomes, [f"E{idx}" for idx in range(7)])
+        self.assertEqual(sem_eventos["eventos"], 0)
+        self.assertTrue(watermark_removido)
+
+    def test_refresh_exportado_com_tipo_e_vinculo(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_dir = os.path.join(tmp_dir, "export")
+            append_event(_evento_simples("Original"), pasta=tmp_dir)
+            original = list_events(limit=1, pasta=tmp_dir)[0]
+            append_event(build_refreshed_event(original), pasta=tmp_dir)
+            export_history(pasta=tmp_dir, output_dir=out_dir, formato="npz")
+            colunas = read_export(out_dir)
+
+        self.assertEqual(colunas["nome_empresa"], ["Original", "Original"])
+        self.assertEqual(colunas["evento_tipo"], ["", "report_refresh"])
+        self.assertEqual(colunas["refresh_of"], ["", original["timestamp"]])
+        diagnosticos = [i for i, tipo in enumerate(colunas["evento_tipo"]) if tipo != "report_refresh"]
+        self.assertEqual(diagnosticos, [0])
+
+    def test_formato_invalido(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(ValueError):
+                export_history(pasta=tmp_dir, output_dir=tmp_dir, formato="csv")
+
+
+if __name__ == "__main__":
+    unittest.main()
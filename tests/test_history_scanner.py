@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+import unittest
+
+from history_scanner import scan_history, split_ranges
+from history_segments import close_segment, list_segments, segment_name
+
+
+def _evento(idx: int, regime: str) -> dict:
+    return {
+        "timestamp": f"2026-08-{idx + 1:02d}T10:00:00",
+        "nome_empresa": f"Empresa {idx}",
+        "receita_anual": str(1000 * idx),
+        "regime": regime,
+        "imposto_atual": 10.0,
+        "resultados": [],
+    }
+
+
+class HistoryScannerTests(unittest.TestCase):
+    def _montar_historico(self, tmp_dir: str) -> None:
+        with open(os.path.join(tmp_dir, "history.jsonl"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(_evento(0, "Simples Nacional (v1)")) + "\n")
+            f.write("{linha corrompida}\n")
+        agosto = os.path.join(tmp_dir, segment_name("history.jsonl", "2026-08", 1))
+        with open(agosto, "w", encoding="utf-8") as f:
+            for idx in range(1, 4):
+                f.write(json.dumps(_evento(idx, "Lucro Presumido")) + "\n")
+        close_segment(list_segments(tmp_dir, "history.jsonl")[1], "gzip")
+        setembro = os.path.join(tmp_dir, segment_name("history.jsonl", "2026-09", 1))
+        with open(setembro, "w", encoding="utf-8") as f:
+            for idx in range(4, 20):
+                f.write(json.dumps(_evento(idx, "Lucro Real")) + "\n")
+
+    def test_scan_sequencial_e_paralelo_equivalentes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._montar_historico(tmp_dir)
+            sequencial = scan_history(pasta=tmp_dir, workers=1)
+            paralelo = scan_history(pasta=tmp_dir, workers=2, range_bytes=256, min_parallel_bytes=0)
+
+        self.assertGreater(paralelo["tarefas"], sequencial["tarefas"])
+        self.assertEqual(sequencial["columns"], paralelo["columns"])
+        self.assertEqual(sequencial["aggregates"], paralelo["aggregates"])
+        self.assertEqual(sequencial["columns"]["nome_empresa"], [f"Empresa {idx}" for idx in range(20)])
+        self.assertEqual(sequencial["columns"]["regime_code"][:2], ["SIMPLES", "PRESUMIDO"])
+        self.assertEqual(sequencial["columns"]["regime"][0], "Simples Nacional")
+        self.assertEqual(sequencial["columns"]["receita_anual"][3], 3000.0)
+        agregados = sequencial["aggregates"]
+        self.assertEqual(agregados["eventos"], 20)
+        self.assertEqual(agregados["linhas_invalidas"], 1)
+        self.assertEqual(agregados["por_regime"]["REAL"]["eventos"], 16)
+        self.assertAlmostEqual(agregados["por_regime"]["PRESUMIDO"]["receita_total"], 6000.0)
+
+    def test_refresh_fica_fora_dos_totais_por_regime(self) -> None:
+        original = _evento(1, "Lucro Real")
+        refresh = dict(original, timestamp="2026-08-05T10:00:00", evento_tipo="report_refresh", refresh_of=original["timestamp"])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, "history.jsonl"), "w", encoding="utf-8") as f:
+                for evento in (original, _evento(2, "Lucro Real"), refresh):
+                    f.write(json.dumps(evento) + "\n")
+            resultado = scan_history(pasta=tmp_dir, workers=1)
+
+        agregados = resultado["aggregates"]
+        self.assertEqual(resultado["columns"]["evento_tipo"], ["", "", "report_refresh"])
+        self.assertEqual(agregados["eventos"], 3)
+        self.assertEqual(agregados["refreshes"], 1)
+        self.assertEqual(agregados["por_regime"]["REAL"]["eventos"], 2)
+        self.assertAlmostEqual(agregados["por_regime"]["REAL"]["receita_total"], 3000.0)
+        self.assertAlmostEqual(agregados["por_regime"]["REAL"]["imposto_total"], 20.0)
+
+    def test_split_ranges_alinha_em_quebra_de_linha(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            caminho = os.path.join(tmp_dir, "h.jsonl")
+            with open(caminho, "wb") as f:
+                f.write(b"aaaa\nbbbbbbbb\ncc\n\ndddd")
+            faixas = split_ranges(caminho, range_bytes=3)
+            with open(caminho, "rb") as f:
+                conteudo = f.read()
+
+        self.assertEqual(faixas[0][0], 0)
+        self.assertEqual(faixas[-1][1], len(conteudo))
+        for (_, fim), (inicio, _) in zip(faixas, faixas[1:]):
+            self.assertEqual(fim, inicio)
+            self.assertEqual(conteudo[fim - 1 : fim], b"\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from history_segments import (
+    active_segment,
+    compact_report_refreshes,
+    compress_bytes,
+    find_segment,
+    list_segments,
+    read_segment_bytes,
+    resolve_codec,
+    rotate_segments,
+    segment_name,
+)
+from history_store import (
+    append_event,
+    append_event_ref,
+    build_refreshed_event,
+    list_event_page,
+    list_events,
+    load_event_at,
+)
+
+
+def _evento(nome: str, timestamp: str = "2026-08-10T10:00:00", **extra) -> dict:
+    return {
+        "timestamp": timestamp,
+        "nome_empresa": nome,
+        "receita_anual": 100000.0,
+        "regime": "Lucro Real",
+        "imposto_atual": 10.0,
+        "resultados": [],
+        **extra,
+    }
+
+
+def _escrever_segmento(tmp_dir: str, month: str, seq: int, eventos: list) -> str:
+    caminho = os.path.join(tmp_dir, segment_name("history.jsonl", month, seq))
+    with open(caminho, "w", encoding="utf-8") as f:
+        for evento in eventos:
+            f.write(json.dumps(evento, ensure_ascii=False) + "\n")
+    return caminho
+
+
+class HistorySegmentsTests(unittest.TestCase):
+    def test_rotacao_mensal_comprime_e_leitura_atravessa_segmentos(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, "history.jsonl"), "w", encoding="utf-8") as f:
+                f.write(json.dumps(_evento("Legado 0", "2025-12-01T00:00:00")) + "\n")
+            _escrever_segmento(tmp_dir, "2026-08", 1, [_evento(f"Agosto {i}") for i in range(3)])
+            ref_agosto = f"{segment_name('history.jsonl', '2026-08', 1)}:0"
+
+            with patch.dict(os.environ, {"TDE_HISTORY_CODEC": "lzma"}):
+                for idx in range(2):
+                    append_event_ref(_evento(f"Atual {idx}"), pasta=tmp_dir, arquivo="history.jsonl")
+                # O append so escolhe o segmento; a compressao e da manutencao.
+                self.assertEqual([s.codec for s in list_segments(tmp_dir, "history.jsonl")], [None, None, None])
+                rotate_segments(tmp_dir, "history.jsonl")
+
+            segmentos = list_segments(tmp_dir, "history.jsonl")
+            nomes = []
+            cursor = None
+            while True:
+                pagina = list_event_page(cursor=cursor, page_size=2, pasta=tmp_dir, arquivo="history.jsonl")
+                nomes.extend(item["nome_empresa"] for item in pagina["items"])
+                cursor = pagina["next_cursor"]
+                if cursor is None:
+                    break
+            evento_agosto = load_event_at(ref_agosto, pasta=tmp_dir, arquivo="history.jsonl")
+            evento_legado = load_event_at(0, pasta=tmp_dir, arquivo="history.jsonl")
+            ultimos = list_events(limit=3, pasta=tmp_dir, arquivo="history.jsonl")
+
+        self.assertEqual([s.codec for s in segmentos], [None, "lzma", None])
+        self.assertTrue(segmentos[1].path.endswith(".jsonl.xz"))
+        self.assertEqual(nomes, ["Atual 1", "Atual 0", "Agosto 2", "Agosto 1", "Agosto 0", "Legado 0"])
+        self.assertEqual(evento_agosto["nome_empresa"], "Agosto 0")
+        self.assertEqual(evento_legado["nome_empresa"], "Legado 0")
+        self.assertEqual([e["nome_empresa"] for e in ultimos], ["Atual 1", "Atual 0", "Agosto 2"])
+
+    def test_rotacao_por_tamanho_no_mesmo_mes(self) -> None:
+        agora = datetime(2026, 9, 15)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            _escrever_segmento(tmp_dir, "2026-09", 1, [_evento("Setembro")])
+            mesmo = active_segment(tmp_dir, "history.jsonl", now=agora)
+            novo = rotate_segments(tmp_dir, "history.jsonl", now=agora, max_bytes=10)
+            # O segmento 001 foi comprimido; 002 so existe apos o primeiro append.
+            fechado = find_segment(tmp_dir, "history.jsonl", mesmo.name)
+            conteudo = read_segment_bytes(fechado)
+
+        self.assertEqual(mesmo.seq, 1)
+        self.assertEqual(novo.seq, 2)
+        self.assertEqual(fechado.codec, "gzip")
+        self.assertIn(b"Setembro", conteudo)
+
+    def test_compactacao_incorpora_report_refresh(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            original = _evento("Empresa A", "2026-08-01T09:00:00")
+            outro = _evento("Empresa B", "2026-08-01T09:30:00")
+            refresh = build_refreshed_event(original)
+            refresh["timestamp"] = "2026-08-02T10:00:00"
+            refresh_sem_vinculo = dict(refresh, refresh_of="", timestamp="2026-08-03T10:00:00")
+            _escrever_segmento(tmp_dir, "2026-08", 1, [original, outro, refresh, refresh_sem_vinculo])
+            append_event(_evento("Atual"), pasta=tmp_dir, arquivo="history.jsonl")
+            rotate_segments(tmp_dir, "history.jsonl")
+
+            stats = compact_report_refreshes(tmp_dir, "history.jsonl")
+            eventos = list_events(pasta=tmp_dir, arquivo="history.jsonl")
+
+        self.assertEqual(stats, {"refreshes_incorporados": 2, "segmentos_reescritos": 1})
+        self.assertEqual([e["nome_empresa"] for e in eventos], ["Atual", "Empresa B", "Empresa A"])
+        folded = eventos[2]
+        self.assertEqual(folded["timestamp"], "2026-08-01T09:00:00")
+        self.assertEqual(folded["refreshed_at"], "2026-08-03T10:00:00")
+        self.assertNotIn("evento_tipo", folded)
+        self.assertIn("audit", folded["detalhes_regime"])
+
+    def test_jsonl_ao_lado_do_comprimido_e_erro(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            caminho = _escrever_segmento(tmp_dir, "2026-07", 1, [_evento("Julho")])
+            with open(caminho, "rb") as f:
+                conteudo = f.read()
+            with open(caminho + ".gz", "wb") as f:
+                f.write(compress_bytes(conteudo, "gzip"))
+
+            # Copia identica (compressao interrompida): a rotacao remove o `.jsonl`.
+            with self.assertRaisesRegex(ValueError, "sem compressao e comprimido"):
+                list_segments(tmp_dir, "history.jsonl")
+            rotate_segments(tmp_dir, "history.jsonl")
+            self.assertEqual([s.codec for s in list_segments(tmp_dir, "history.jsonl")], ["gzip"])
+
+            # `.jsonl` recriado com linhas novas: erro tambem para a manutencao e para o append.
+            _escrever_segmento(tmp_dir, "2026-07", 1, [_evento("Julho"), _evento("Perdido")])
+            with self.assertRaisesRegex(ValueError, "sem compressao e comprimido"):
+                rotate_segments(tmp_dir, "history.jsonl")
+            with self.assertRaisesRegex(ValueError, "sem compressao e comprimido"):
+                append_event(_evento("Novo"), pasta=tmp_dir, arquivo="history.jsonl")
+
+    def test_appends_concorrentes_com_rotacao_nao_perdem_eventos(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            _escrever_segmento(tmp_dir, "2026-07", 1, [_evento("Julho")])
+
+            def gravar(thread: int) -> None:
+                for idx in range(20):
+                    append_event(_evento(f"T{thread}-{idx}"), pasta=tmp_dir, arquivo="history.jsonl", compact=False)
+
+            with patch("history_segments.SEGMENT_MAX_BYTES", 1500):
+                threads = [threading.Thread(target=gravar, args=(t,)) for t in range(4)]
+                for thread in threads:
+                    thread.start()
+                while any(thread.is_alive() for thread in threads):
+                    rotate_segments(tmp_dir, "history.jsonl", max_bytes=1500)
+                for thread in threads:
+                    thread.join()
+                rotate_segments(tmp_dir, "history.jsonl", max_bytes=1500)
+
+            eventos = list_events(limit=1000, pasta=tmp_dir, arquivo="history.jsonl")
+            segmentos = list_segments(tmp_dir, "history.jsonl")
+
+        self.assertEqual(len(eventos), 81)
+        self.assertEqual(len({e["nome_empresa"] for e in eventos}), 81)
+        self.assertGreater(len(segmentos), 3)
+        self.assertEqual([s.codec for s in segmentos[:-1]], ["gzip"] * (len(segmentos) - 1))
+
+    def test_codec_invalido(self) -> None:
+        with self.assertRaises(ValueError):
+            resolve_codec("brotli")
+
+
+if __name__ == "__main__":
+    unittest.main()
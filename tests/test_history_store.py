@@ -4,7 +4,22 @@ import tempfile
 import unittest
 from typing import Any, Dict, List
 
-from history_store import get_event_report_text, list_events, normalize_event
+from dto import DiagnosticInput
+from history_store import (
+    append_event,
+    append_event_ref,
+    build_refreshed_event,
+    get_event_report_text,
+    history_signature,
+    list_event_page,
+    list_events,
+    load_event_at,
+    normalize_event,
+    normalize_loaded_event,
+    ref_generation,
+)
+from history_segments import compact_report_refreshes, rotate_segments
+from tax_engine import DiagnosticService
 
 
 def _scenario_row(nome: str) -> Dict[str, Any]:
@@ -61,6 +76,84 @@ class HistoryStoreTests(unittest.TestCase):
         self.assertEqual(normalized["regime"], "Lucro Presumido")
         self.assertEqual(normalized["detalhes_regime"].get("regime_code"), "PRESUMIDO")
 
+    def test_normalize_event_schema_atual_sem_copia(self) -> None:
+        evento = {
+            "schema_version": 2,
+            "timestamp": "2026-02-12T12:00:00",
+            "nome_empresa": "Empresa Atual",
+            "receita_anual": 200000.0,
+            "regime": "Lucro Presumido",
+            "detalhes_regime": {"regime_code": "PRESUMIDO", "regime_model": "defaults", "regime_display": "Lucro Presumido"},
+            "imposto_atual": 18000.0,
+            "resultados": [_scenario_row("Base (25%)")],
+        }
+
+        normalized = normalize_event(evento)
+
+        # Nao escreve no evento lido: so as chaves de topo ausentes vao numa copia rasa.
+        self.assertNotIn("cenarios", evento)
+        self.assertIs(normalized["cenarios"], evento["resultados"])
+        self.assertIs(normalized["detalhes_regime"], evento["detalhes_regime"])
+        completo = dict(evento, cenarios=evento["resultados"])
+        self.assertIs(normalize_loaded_event(completo), completo)
+        legado = {"nome_empresa": "L", "regime": "Simples Nacional (v1)", "detalhes_regime": {}}
+        normalize_loaded_event(legado)
+        self.assertEqual(legado["detalhes_regime"], {})
+
+    def test_normalize_event_memoiza_por_objeto_e_mantem_upgrade_legado(self) -> None:
+        legado = {"nome_empresa": "Empresa Legacy", "receita_anual": "100000", "regime": "Simples Nacional (v1)"}
+        legado_invalido = dict(legado, schema_version=2)
+
+        primeiro = normalize_event(legado)
+
+        self.assertIsNot(primeiro, legado)
+        self.assertIs(normalize_event(legado), primeiro)
+        self.assertIs(normalize_event(primeiro), primeiro)
+        self.assertEqual(legado["receita_anual"], "100000")
+        # schema_version atual com invariantes quebradas (receita texto) segue pelo caminho completo.
+        atualizado = normalize_event(legado_invalido)
+        self.assertIsNot(atualizado, legado_invalido)
+        self.assertEqual(atualizado["receita_anual"], 100000.0)
+        self.assertEqual(atualizado["detalhes_regime"]["regime_code"], "SIMPLES")
+
+    def test_append_event_grava_schema_version(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            append_event({"nome_empresa": "A", "receita_anual": 1.0, "regime": "Lucro Real"}, pasta=tmp_dir, compact=False)
+            append_event({"nome_empresa": "B", "receita_anual": 2.0, "regime": "Lucro Real"}, pasta=tmp_dir)
+            eventos = list_events(pasta=tmp_dir)
+
+        self.assertEqual([e["schema_version"] for e in eventos], [2, 2])
+
+    def test_relatorio_reconstruido_do_historico_igual_ao_do_diagnostico(self) -> None:
+        entradas = [
+            DiagnosticInput(
+                nome_empresa="Empresa Simples",
+                receita_anual=1200000.0,
+                regime="Simples Nacional",
+                regime_code="SIMPLES",
+                regime_model="tabelado",
+                rbt12=1200000.0,
+                anexo_simples="III",
+            ),
+            DiagnosticInput(
+                nome_empresa="Empresa Real",
+                receita_anual=4800000.0,
+                regime="Lucro Real",
+                regime_code="REAL",
+                regime_model="padrao",
+                margem_lucro=0.12,
+                modo_analise="estrategico",
+            ),
+        ]
+        for inp in entradas:
+            out = DiagnosticService().run(inp)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                append_event(out.to_event(), pasta=tmp_dir)
+                evento = list_events(pasta=tmp_dir)[0]
+
+            self.assertNotIn("relatorio_texto", evento)
+            self.assertEqual(get_event_report_text(evento), out.relatorio_texto)
+
     def test_list_events_ignores_corrupted_jsonl_lines(self) -> None:
         valid_older = {
             "timestamp": "2026-02-12T10:00:00",
@@ -109,7 +202,7 @@ class HistoryStoreTests(unittest.TestCase):
         self.assertTrue(report_text.strip())
         self.assertIn("Empresa: Empresa Sem Relatório", report_text)
         self.assertIn("Regime atual: Simples Nacional", report_text)
-        self.assertIn("Relatório gerado em: (não disponível — evento legado)", report_text)
+        self.assertIn("Relatorio gerado em: (nao disponivel — evento legado)", report_text)
         self.assertNotIn("Detalhes do regime: {", report_text)
         self.assertNotIn("'regime_code':", report_text)
         self.assertNotIn("'ruleset_id':", report_text)
@@ -161,7 +254,7 @@ class HistoryStoreTests(unittest.TestCase):
         self.assertIn("Percentual de presunção: 32.00%", report_text)
         self.assertIn("=== AUDITORIA (BASE NORMATIVA & PREMISSAS) ===", report_text)
         self.assertIn("Integridade ruleset/baseline: PASS", report_text)
-        self.assertIn("Relatório gerado em: 12/02/2026 14:30:05", report_text)
+        self.assertIn("Relatorio gerado em: 12/02/2026 14:30:05", report_text)
         self.assertNotIn("Detalhes do regime: {", report_text)
         self.assertNotIn("'regime_code':", report_text)
         self.assertNotIn("'ruleset_id':", report_text)
@@ -189,6 +282,77 @@ class HistoryStoreTests(unittest.TestCase):
         self.assertNotIn("'regime_code':", report_text)
         self.assertNotIn("'ruleset_id':", report_text)
 
+    def test_history_signature_muda_apos_append(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.assertEqual(history_signature(pasta=tmp_dir, arquivo="history.jsonl"), (0, 0))
+            append_event({"nome_empresa": "Empresa A", "resultados": []}, pasta=tmp_dir, arquivo="history.jsonl")
+            primeira = history_signature(pasta=tmp_dir, arquivo="history.jsonl")
+            append_event({"nome_empresa": "Empresa B", "resultados": []}, pasta=tmp_dir, arquivo="history.jsonl")
+            segunda = history_signature(pasta=tmp_dir, arquivo="history.jsonl")
+
+        self.assertGreater(primeira[1], 0)
+        self.assertNotEqual(primeira, segunda)
+
+    def test_list_event_page_pagina_por_cursor_com_projecao(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            offsets = []
+            for idx in range(7):
+                offsets.append(
+                    append_event_ref(
+                        {
+                            "nome_empresa": f"Empresa {idx}",
+                            "receita_anual": 1000.0 * idx,
+                            "regime": "Lucro Real",
+                            "imposto_atual": 10.0,
+                            "resultados": [],
+                            "relatorio_texto": "texto completo",
+                        },
+                        pasta=tmp_dir,
+                        arquivo="history.jsonl",
+                    )
+                )
+
+            nomes: List[str] = []
+            cursor = None
+            paginas = 0
+            while True:
+                pagina = list_event_page(cursor=cursor, page_size=3, pasta=tmp_dir, arquivo="history.jsonl")
+                paginas += 1
+                for item in pagina["items"]:
+                    self.assertNotIn("relatorio_texto", item)
+                    self.assertEqual(item["regime"], "Lucro Real")
+                nomes.extend(item["nome_empresa"] for item in pagina["items"])
+                cursor = pagina["next_cursor"]
+                if cursor is None:
+                    break
+
+            evento = load_event_at(offsets[2], pasta=tmp_dir, arquivo="history.jsonl")
+            filtrado = list_event_page(busca="empresa 4", pasta=tmp_dir, arquivo="history.jsonl")
+
+        self.assertEqual(paginas, 3)
+        self.assertEqual(nomes, [f"Empresa {idx}" for idx in range(6, -1, -1)])
+        self.assertEqual(evento["nome_empresa"], "Empresa 2")
+        self.assertNotIn("relatorio_texto", evento)  # formato compacto v2 nao persiste o texto
+        self.assertEqual([item["nome_empresa"] for item in filtrado["items"]], ["Empresa 4"])
+
+    def test_projecao_sinaliza_refresh_legado_e_referencia_invalida(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            legado = {"nome_empresa": "Legado", "regime": "Lucro Real", "relatorio_texto": "relatorio antigo", "resultados": []}
+            ref_legado = append_event_ref(legado, pasta=tmp_dir, compact=False)
+            ref_atual = append_event_ref({"nome_empresa": "Atual", "regime": "Lucro Real", "resultados": []}, pasta=tmp_dir)
+            itens = list_event_page(pasta=tmp_dir)["items"]
+            segmento, _, offset = str(ref_atual).rpartition(":")
+            no_meio = load_event_at(f"{segmento}:{int(offset) + 3}", pasta=tmp_dir)
+            geracao_antes = ref_generation(ref_legado, pasta=tmp_dir)
+            append_event_ref(build_refreshed_event(load_event_at(ref_legado, pasta=tmp_dir)), pasta=tmp_dir)
+            rotate_segments(tmp_dir, "history.jsonl", max_bytes=1)
+            compact_report_refreshes(tmp_dir, "history.jsonl")
+            geracao_depois = ref_generation(ref_legado, pasta=tmp_dir)
+
+        self.assertEqual([(i["nome_empresa"], i["refresh_legado"]) for i in itens], [("Atual", False), ("Legado", True)])
+        self.assertIsNone(no_meio)
+        self.assertEqual((geracao_antes, geracao_depois), (0, 1))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,96 @@
+import importlib.util
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+import json_codec
+import ruleset_loader
+from json_codec import JSON_BACKEND_ENV_VAR, JSON_BACKENDS, JsonCodec, resolve_backend, set_backend
+from ruleset_loader import DEFAULT_RULESET_ID
+from tools.ruleset_audit import audit_ruleset
+
+try:
+    import orjson  # noqa: F401
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+_EVENTO = {
+    "nome_empresa": "Empresa Ação/Teste",
+    "receita_anual": 123456.789,
+    "detalhes_regime": {"aliquota": 0.1, "lista": [1, 2.5, None, True], "vazio": {}},
+    "resultados": [],
+}
+
+
+class JsonCodecTests(unittest.TestCase):
+    def tearDown(self) -> None:
+        set_backend(None)
+
+    def test_stdlib_identico_ao_json_dumps(self) -> None:
+        codec = JsonCodec("json")
+        self.assertEqual(codec.dumps(_EVENTO), json.dumps(_EVENTO, ensure_ascii=False).encode("utf-8"))
+        self.assertEqual(codec.loads(codec.dumps(_EVENTO)), _EVENTO)
+
+    @unittest.skipUnless(HAS_ORJSON, "orjson nao instalado")
+    def test_orjson_roundtrip_e_fallback_preserva_semantica(self) -> None:
+        codec = JsonCodec("orjson")
+        self.assertEqual(codec.loads(codec.dumps(_EVENTO)), _EVENTO)
+        self.assertEqual(json.loads(codec.dumps(_EVENTO)), _EVENTO)
+        self.assertEqual(codec.dumps({1: "a"}), b'{"1":"a"}')
+        valor_nan = codec.loads(b'{"v": NaN}')["v"]
+        self.assertNotEqual(valor_nan, valor_nan)
+        self.assertEqual(
+            json_codec.loads_exact(b'{"v": 123456789012345678901234567890}')["v"],
+            123456789012345678901234567890,
+        )
+        with self.assertRaises(json.JSONDecodeError):
+            codec.loads(b"{linha corrompida}")
+        with self.assertRaises(UnicodeDecodeError):
+            codec.loads(b'{"v": "\xff"}')
+
+    @unittest.skipUnless(HAS_ORJSON, "orjson nao instalado")
+    def test_hashes_de_ruleset_independem_do_backend(self) -> None:
+        hashes = []
+        for backend in ("json", "orjson"):
+            set_backend(backend)
+            ruleset_loader._CACHE.clear()
+            result = audit_ruleset(DEFAULT_RULESET_ID)
+            hashes.append((result["ruleset_hash_sha256"], result["baseline_hash_sha256"]))
+        ruleset_loader._CACHE.clear()
+
+        self.assertEqual(hashes[0], hashes[1])
+
+    def test_nan_gravado_igual_em_todos_os_backends(self) -> None:
+        payload = {"v": float("nan"), "lista": [1.5, float("inf"), None], "aninhado": {"w": float("-inf")}}
+        esperado = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        instalados = [b for b in JSON_BACKENDS if b == "json" or importlib.util.find_spec(b) is not None]
+
+        for backend in instalados:
+            with self.subTest(backend=backend):
+                codec = JsonCodec(backend)
+                self.assertEqual(codec.dumps(payload), esperado)
+                self.assertIn(b"NaN", codec.dumps(payload))
+                relido = codec.loads(codec.dumps(payload))
+                self.assertNotEqual(relido["v"], relido["v"])
+                self.assertEqual(relido["aninhado"]["w"], float("-inf"))
+
+    def test_stdlib_padrao_mesmo_com_backend_rapido_instalado(self) -> None:
+        with patch.dict(os.environ, {JSON_BACKEND_ENV_VAR: ""}):
+            self.assertEqual(resolve_backend(), "json")
+            self.assertEqual(set_backend(None).name, "json")
+        with patch.dict(os.environ, {JSON_BACKEND_ENV_VAR: "json"}):
+            self.assertEqual(resolve_backend(), "json")
+
+    def test_backend_invalido(self) -> None:
+        with self.assertRaises(ValueError):
+            resolve_backend("simplejson")
+        self.assertEqual(set_backend("json").name, "json")
+        self.assertEqual(json_codec.dumps([1]), b"[1]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import time
+import unittest
+
+import numpy as np
+
+from breakeven import breakeven_margem_real_presumido
+from company_profile import normalize_company_profile
+from dto import DiagnosticInput
+from monte_carlo import amostrar, distribuicao_de_texto, simular_regimes
+from regime_comparator import compare_regimes
+
+
+def _input(**campos) -> DiagnosticInput:
+    base = dict(
+        nome_empresa="Empresa MC",
+        receita_anual=6000000.0,
+        regime="Lucro Presumido",
+        regime_code="PRESUMIDO",
+        regime_model="padrao",
+        tipo_atividade="Servicos",
+    )
+    base.update(campos)
+    return DiagnosticInput(**base)
+
+
+class MonteCarloTests(unittest.TestCase):
+    def test_distribuicao_fixa_reproduz_comparativo(self) -> None:
+        inp = _input(margem_lucro=0.2)
+        comparativo = compare_regimes(normalize_company_profile(inp), normalize_company_profile(inp).ruleset_id)
+        esperado = {row["regime_code"]: row["imposto_total"] for row in comparativo["rows"] if row["imposto_total"] is not None}
+
+        resultado = simular_regimes(inp, {"margem_lucro": {"tipo": "fixo", "valor": 0.2}}, n_amostras=10, seed=1)
+
+        self.assertEqual(resultado.regimes_avaliados, ("PRESUMIDO", "REAL"))
+        for regime, imposto in esperado.items():
+            self.assertAlmostEqual(resultado.quantis[regime]["p50"], imposto, places=6)
+        self.assertEqual(resultado.probabilidade_menor[min(esperado, key=esperado.get)], 1.0)
+
+    def test_distribuicao_degenerada_ignora_creditos_como_o_comparativo(self) -> None:
+        inp = _input(margem_lucro=0.15, despesas_creditaveis=2000000.0, percentual_credito_estimado=0.4, receita_base_periodo=5000000.0)
+        profile = normalize_company_profile(inp)
+        comparativo = compare_regimes(profile, profile.ruleset_id)
+        real = next(row["imposto_total"] for row in comparativo["rows"] if row["regime_code"] == "REAL")
+
+        sem_sorteio = simular_regimes(inp, {}, n_amostras=3, seed=0)
+        degenerada = simular_regimes(inp, {"margem_lucro": {"tipo": "fixo", "valor": 0.15}}, n_amostras=3, seed=0)
+
+        self.assertAlmostEqual(sem_sorteio.media["REAL"], real, places=6)
+        self.assertAlmostEqual(degenerada.media["REAL"], real, places=6)
+
+    def test_probabilidade_coerente_com_breakeven(self) -> None:
+        inp = _input()
+        limiar = float(breakeven_margem_real_presumido([inp]).limiar[0])
+
+        resultado = simular_regimes(inp, {"margem_lucro": {"tipo": "uniforme", "minimo": 0.0, "maximo": 0.3}}, n_amostras=100_000, seed=42)
+
+        self.assertAlmostEqual(resultado.probabilidade_menor["REAL"], limiar / 0.3, delta=0.01)
+        self.assertAlmostEqual(sum(resultado.probabilidade_menor.values()), 1.0)
+        self.assertLess(resultado.quantis["REAL"]["p5"], resultado.quantis["REAL"]["p95"])
+
+    def test_seed_reprodutivel(self) -> None:
+        distribuicoes = {
+            "margem_lucro": {"tipo": "triangular", "minimo": 0.05, "moda": 0.12, "maximo": 0.25},
+        }
+
+        primeiro = simular_regimes(_input(), distribuicoes, n_amostras=5000, seed=7)
+        segundo = simular_regimes(_input(), dict(distribuicoes), n_amostras=5000, seed=7)
+        outra_seed = simular_regimes(_input(), distribuicoes, n_amostras=5000, seed=8)
+
+        self.assertEqual(primeiro.to_dict(), segundo.to_dict())
+        self.assertNotEqual(primeiro.quantis, outra_seed.quantis)
+
+    def test_100k_amostras_rapido(self) -> None:
+        distribuicoes = {
+            "margem_lucro": {"tipo": "normal", "media": 0.12, "desvio": 0.04},
+        }
+        simular_regimes(_input(), distribuicoes, n_amostras=100, seed=0)
+
+        inicio = time.perf_counter()
+        simular_regimes(_input(), distribuicoes, n_amostras=100_000, seed=0)
+
+        self.assertLess(time.perf_counter() - inicio, 1.0)
+
+    def test_entradas_invalidas(self) -> None:
+        with self.assertRaises(ValueError):
+            simular_regimes(_input(), {"receita_anual": {"tipo": "fixo", "valor": 1.0}})
+        with self.assertRaises(ValueError):
+            simular_regimes(_input(), {"margem_lucro": {"tipo": "beta"}})
+        with self.assertRaises(ValueError):
+            simular_regimes(_input(), {"margem_lucro": {"tipo": "uniforme", "minimo": 0.3}})
+        with self.assertRaises(ValueError):
+            simular_regimes(_input(), {}, n_amostras=0)
+        with self.assertRaisesRegex(ValueError, "Creditos"):
+            simular_regimes(_input(), {"despesas_creditaveis": {"tipo": "fixo", "valor": 1.0}})
+
+    def test_amostras_recortadas_ao_dominio(self) -> None:
+        valores = amostrar(np.random.default_rng(0), "margem_lucro", {"tipo": "normal", "media": 0.05, "desvio": 0.2}, 1000)
+
+        self.assertGreaterEqual(valores.min(), 0.0)
+
+    def test_distribuicao_de_texto(self) -> None:
+        self.assertEqual(
+            distribuicao_de_texto("margem_lucro=triangular:0.05:0,12:0.25"),
+            ("margem_lucro", {"tipo": "triangular", "minimo": 0.05, "moda": 0.12, "maximo": 0.25}),
+        )
+        for texto in ("margem_lucro", "margem_lucro=beta:1", "margem_lucro=uniforme:0.1", "margem_lucro=fixo:x"):
+            with self.assertRaises(ValueError):
+                distribuicao_de_texto(texto)
+
+
+if __name__ == "__main__":
+    unittest.main()
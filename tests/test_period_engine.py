@@ -0,0 +1,86 @@
+import math
+import time
+import unittest
+
+import numpy as np
+
+from period_engine import apurar_simples_mensal, competencias_mensais, fator_r_movel, rbt12_movel
+from regimes import imposto_simples_tabelado
+from ruleset_loader import DEFAULT_RULESET_ID, get_simples_tables
+
+
+class PeriodEngineTests(unittest.TestCase):
+    def test_competencias_mensais_viram_o_ano(self) -> None:
+        self.assertEqual(competencias_mensais("2024-11", 3), ("2024-11", "2024-12", "2025-01"))
+        with self.assertRaises(ValueError):
+            competencias_mensais("2024/11", 3)
+
+    def test_rbt12_movel_janela_e_inicio_de_atividade(self) -> None:
+        receitas = np.array([[np.nan, 10.0, 20.0] + [30.0 + i for i in range(15)]])
+
+        rbt12 = rbt12_movel(receitas)[0]
+
+        self.assertTrue(math.isnan(rbt12[0]))
+        self.assertEqual(rbt12[1], 120.0)
+        self.assertEqual(rbt12[2], 120.0)
+        self.assertEqual(rbt12[3], 15.0 * 12)
+        valores = receitas[0]
+        for j in range(13, valores.size):
+            self.assertAlmostEqual(rbt12[j], float(np.sum(valores[j - 12 : j])), places=6)
+
+    def test_das_mensal_igual_ao_escalar(self) -> None:
+        tabelas = get_simples_tables(DEFAULT_RULESET_ID)
+        rng = np.random.default_rng(3)
+        receitas = rng.uniform(5000.0, 400000.0, (3, 30))
+        folhas = receitas * rng.uniform(0.15, 0.40, (3, 30))
+        anexos = ["I", "III/V", "V"]
+
+        apuracao = apurar_simples_mensal(receitas, anexos, competencias_mensais("2022-01", 30), folhas)
+        fatores = fator_r_movel(receitas, folhas)
+        partilha = apuracao.partilha()
+
+        for i, anexo in enumerate(anexos):
+            for j in range(30):
+                rbt12 = float(apuracao.rbt12[i, j])
+                das, calc = imposto_simples_tabelado(float(receitas[i, j]), rbt12, anexo, tabelas, fator_r=float(fatores[i, j]))
+                self.assertEqual(apuracao.das[i, j], das)
+                self.assertEqual(apuracao.anexos[apuracao.anexo[i, j]], calc["anexo_aplicado"])
+                self.assertEqual(apuracao.faixa[i, j], calc["faixa"])
+                self.assertEqual(partilha[i, j].tolist(), list(calc["breakdown_das"].values()))
+
+    def test_tabela_por_competencia(self) -> None:
+        apuracao = apurar_simples_mensal([[100000.0, 120000.0], [np.nan, 50000.0]], ["III", "III/V"], ["2025-01", "2025-02"])
+
+        linhas = apuracao.to_rows(nomes=["A", "B"])
+
+        self.assertEqual(len(linhas), 4)
+        self.assertEqual(linhas[1]["competencia"], "2025-02")
+        self.assertEqual(linhas[1]["rbt12"], 1200000.0)
+        self.assertAlmostEqual(sum(linhas[1]["breakdown_das"].values()), linhas[1]["das"])
+        self.assertIsNone(linhas[3]["anexo_aplicado"])
+        self.assertTrue(math.isnan(linhas[3]["das"]))
+
+    def test_backfill_5_anos_10k_empresas(self) -> None:
+        rng = np.random.default_rng(11)
+        receitas = rng.uniform(5000.0, 350000.0, (10_000, 60))
+        anexos = ["I", "III", "V", "II", "IV"] * 2000
+
+        inicio = time.perf_counter()
+        apuracao = apurar_simples_mensal(receitas, anexos, competencias_mensais("2021-01", 60))
+        decorrido = time.perf_counter() - inicio
+
+        self.assertEqual(apuracao.shape, (10_000, 60))
+        self.assertFalse(np.isnan(apuracao.das).any())
+        self.assertLess(decorrido, 2.0)
+
+    def test_entradas_invalidas(self) -> None:
+        with self.assertRaises(ValueError):
+            apurar_simples_mensal([[1.0, 2.0]], ["I", "III"], ["2025-01", "2025-02"])
+        with self.assertRaises(ValueError):
+            apurar_simples_mensal([[1.0, 2.0]], ["I"], ["2025-01"])
+        with self.assertRaises(ValueError):
+            fator_r_movel([[1.0, 2.0]], [[1.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import argparse
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from profiling import (
+    PROFILE_ENV_VAR,
+    add_profile_arguments,
+    profile_enabled_from_env,
+    profile_from_args,
+    profile_from_env,
+    profile_session,
+)
+from tax_engine import DiagnosticService
+from dto import DiagnosticInput
+
+
+def _carga(segundos: float = 0.05) -> None:
+    fim = time.perf_counter() + segundos
+    total = 0
+    while time.perf_counter() < fim:
+        total += sum(range(200))
+
+
+class ProfilingTests(unittest.TestCase):
+    def test_sample_mode_grava_collapsed_e_hotspots(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with profile_session("teste", mode="sample", output_dir=tmp_dir, interval_s=0.001) as info:
+                _carga()
+
+            self.assertEqual(len(info["files"]), 2)
+            collapsed_path = next(p for p in info["files"] if p.endswith(".collapsed"))
+            hotspots_path = next(p for p in info["files"] if p.endswith("_hotspots.txt"))
+            with open(collapsed_path, "r", encoding="utf-8") as f:
+                linhas = [linha for linha in f.read().splitlines() if linha]
+            with open(hotspots_path, "r", encoding="utf-8") as f:
+                hotspots = f.read()
+
+        self.assertTrue(linhas)
+        for linha in linhas:
+            stack, count = linha.rsplit(" ", 1)
+            self.assertGreater(int(count), 0)
+            self.assertIn(":", stack)
+        self.assertTrue(any("tests/test_profiling:_carga" in linha for linha in linhas))
+        self.assertIn("Top 30 por tempo proprio (self):", hotspots)
+        self.assertIn("Modulos foco", hotspots)
+
+    def test_cprofile_mode_destaca_modulos_foco(self) -> None:
+        inp = DiagnosticInput(
+            nome_empresa="Empresa Profile",
+            receita_anual=480000.0,
+            regime="Lucro Presumido",
+            tipo_atividade="Servicos",
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with profile_session("teste", mode="cprofile", output_dir=tmp_dir) as info:
+                DiagnosticService().run(inp)
+            self.assertTrue(any(p.endswith(".prof") for p in info["files"]))
+            hotspots_path = next(p for p in info["files"] if p.endswith("_hotspots.txt"))
+            with open(hotspots_path, "r", encoding="utf-8") as f:
+                hotspots = f.read()
+
+        self.assertIn("tottime", hotspots)
+        self.assertIn("tax_engine.py", hotspots)
+
+    def test_modo_invalido(self) -> None:
+        with self.assertRaises(ValueError):
+            with profile_session("teste", mode="perf"):
+                pass
+
+    def test_env_toggle_desligado_nao_grava(self) -> None:
+        with patch.dict(os.environ, {PROFILE_ENV_VAR: "0"}):
+            self.assertFalse(profile_enabled_from_env())
+            with profile_from_env("app") as info:
+                pass
+        self.assertIsNone(info)
+
+    def test_args_flag_customizada(self) -> None:
+        parser = argparse.ArgumentParser()
+        add_profile_arguments(parser, flag="--cpu-profile")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            args = parser.parse_args(["--cpu-profile", "--profile-dir", tmp_dir])
+            with patch("builtins.print"):
+                with profile_from_args("cli", args) as info:
+                    _carga(0.01)
+            self.assertTrue(all(os.path.isfile(p) for p in info["files"]))
+
+        desligado = parser.parse_args([])
+        with profile_from_args("cli", desligado) as info:
+            pass
+        self.assertIsNone(info)
+
+    def test_sessoes_seguidas_nao_sobrescrevem_artefatos(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with profile_session("app_diagnostico", mode="cprofile", output_dir=tmp_dir) as primeira:
+                pass
+            with profile_session("app_diagnostico", mode="cprofile", output_dir=tmp_dir) as segunda:
+                pass
+
+            self.assertTrue(set(primeira["files"]).isdisjoint(segunda["files"]))
+            self.assertEqual(len(os.listdir(tmp_dir)), 4)
+            self.assertIn(f"_{os.getpid()}_", os.path.basename(primeira["files"][0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
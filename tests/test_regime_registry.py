@@ -0,0 +1,129 @@
+import unittest
+from copy import deepcopy
+from unittest.mock import patch
+
+import numpy as np
+
+import ruleset_loader
+from benchmarks.portfolio import gerar_portfolio
+from company_profile import normalize_company_profile
+from dto import DiagnosticInput
+from eligibility_engine import EligibilityResult, evaluate_eligibility
+from regime_comparator import compare_regimes
+from regime_registry import REGIME_PLUGINS, RegimePlugin, clear_compiled_regimes, register_regime_plugin
+from regimes import RulesetError, imposto_simples
+from ruleset_impact import montar_lote
+from ruleset_loader import DEFAULT_RULESET_ID
+from tax_engine import RulesetSnapshot
+
+
+def _catalogo_com_mei(habilitar: bool = True):
+    original = ruleset_loader.get_regime_catalog
+
+    def carregar(ruleset_id: str):
+        payload = deepcopy(original(DEFAULT_RULESET_ID))
+        for item in payload["regimes"]:
+            if item["regime_code"] == "MEI":
+                item["enabled"] = habilitar
+        return payload
+
+    return patch("regime_registry.get_regime_catalog", side_effect=carregar)
+
+
+class MeiFicticio(RegimePlugin):
+    regime_code = "MEI"
+
+    def calcular(self, inp, regime_info, periodicidade):
+        return imposto_simples(inp.receita_anual, 0.01), {"modelo": "mei_teste", **self._metadados(regime_info)}
+
+
+class RegimeRegistryTests(unittest.TestCase):
+    def setUp(self) -> None:
+        clear_compiled_regimes()
+        self.addCleanup(clear_compiled_regimes)
+
+    def test_catalogo_define_regimes_habilitados(self) -> None:
+        regimes = RulesetSnapshot(DEFAULT_RULESET_ID).regimes()
+
+        self.assertEqual(regimes.codigos, ("SIMPLES", "PRESUMIDO", "REAL"))
+        self.assertFalse(regimes.entradas["MEI"].enabled)
+        self.assertEqual(regimes.entradas["REAL"].requires_fields, ("receita_anual", "margem_lucro"))
+
+    def test_lote_bate_com_calculo_escalar(self) -> None:
+        inputs = gerar_portfolio(60, seed=3)
+        lote, _ = montar_lote(inputs)
+        snapshot = RulesetSnapshot(DEFAULT_RULESET_ID)
+        colunas = {
+            "receita_anual": lote.receita,
+            "receita_base_periodo": lote.receita_base,
+            "rbt12": lote.rbt12,
+            "margem_lucro": lote.margem,
+            "fator_r": lote.fator_r,
+            "folha_12m": lote.folha,
+            "anexo_simples": lote.anexo,
+            "tipo_atividade": lote.tipo_atividade,
+            "periodicidade": lote.periodicidade,
+        }
+        lotes = {code: snapshot.regimes().plugin(code).calcular_lote(colunas) for code in snapshot.regimes().codigos}
+        for idx, inp in enumerate(inputs):
+            profile = normalize_company_profile(inp)
+            for row in compare_regimes(profile, profile.ruleset_id)["rows"]:
+                if row["imposto_total"] is not None:
+                    self.assertAlmostEqual(lotes[row["regime_code"]][idx], row["imposto_total"], places=6)
+
+    def test_campo_obrigatorio_ausente_bloqueia_sem_calcular(self) -> None:
+        profile = normalize_company_profile(
+            DiagnosticInput(
+                nome_empresa="Sem Anexo",
+                receita_anual=900_000.0,
+                regime="Lucro Presumido",
+                regime_code="PRESUMIDO",
+                tipo_atividade="Comercio",
+            )
+        )
+        # Elegibilidade externa liberando o Simples: o calculador ainda confere requires_fields.
+        elegibilidade = evaluate_eligibility(profile, DEFAULT_RULESET_ID)
+        elegibilidade["SIMPLES"] = EligibilityResult("SIMPLES", "OK", [], [], [])
+
+        with patch("regime_registry.imposto_simples_tabelado") as calculo:
+            result = compare_regimes(profile, DEFAULT_RULESET_ID, eligibility=elegibilidade)
+        calculo.assert_not_called()
+        simples = next(r for r in result["rows"] if r["regime_code"] == "SIMPLES")
+        self.assertEqual(simples["eligibility_status"], "BLOCKED")
+        self.assertIn("Campo obrigatório ausente: anexo_simples", simples["critical_alerts"])
+
+    def test_erro_de_ruleset_interrompe_comparativo(self) -> None:
+        reais = ruleset_loader.get_real_params(DEFAULT_RULESET_ID)
+        reais.pop("irpj")
+        profile = normalize_company_profile(
+            DiagnosticInput(nome_empresa="E", receita_anual=900_000.0, regime="Lucro Real", regime_code="REAL", margem_lucro=0.1)
+        )
+        with patch("regime_registry.get_real_params", return_value=reais):
+            with self.assertRaisesRegex(RulesetError, "chave=irpj"):
+                compare_regimes(profile, DEFAULT_RULESET_ID)
+
+    def test_mei_habilitado_por_plugin(self) -> None:
+        profile = normalize_company_profile(
+            DiagnosticInput(nome_empresa="Micro", receita_anual=60_000.0, regime="Simples Nacional", regime_code="SIMPLES", anexo_simples="I")
+        )
+        with _catalogo_com_mei():
+            with self.assertRaisesRegex(RulesetError, "regime habilitado sem plugin registrado"):
+                compare_regimes(profile, DEFAULT_RULESET_ID)
+
+            with patch.dict(REGIME_PLUGINS):
+                register_regime_plugin(MeiFicticio)
+                result = compare_regimes(profile, DEFAULT_RULESET_ID)
+
+        self.assertEqual([r["regime_code"] for r in result["rows"]], ["SIMPLES", "PRESUMIDO", "REAL", "MEI"])
+        mei = result["rows"][-1]
+        self.assertEqual(mei["regime_display"], "MEI (placeholder)")
+        self.assertEqual(mei["eligibility_status"], "OK")
+        self.assertAlmostEqual(mei["imposto_total"], 600.0)
+        self.assertEqual(result["eligibility"]["MEI"]["status"], "OK")
+        self.assertNotIn("MEI", REGIME_PLUGINS)
+        with self.assertRaises(NotImplementedError):
+            MeiFicticio("X", RulesetSnapshot(DEFAULT_RULESET_ID).regimes().entradas["MEI"], None).calcular_lote({"receita_anual": np.ones(1)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import numpy as np
+
+from regimes import imposto_lucro_presumido, imposto_lucro_real_estimado_completo, imposto_simples_tabelado
+from regimes_vetorizados import (
+    das_simples,
+    faixa_por_rbt12,
+    get_tabelas_simples_compiladas,
+    imposto_lucro_presumido_vetorizado,
+    imposto_lucro_real_vetorizado,
+)
+from ruleset_loader import DEFAULT_RULESET_ID, get_simples_tables
+
+
+class RegimesVetorizadosTests(unittest.TestCase):
+    def test_das_igual_ao_escalar_bit_a_bit(self) -> None:
+        tabelas = get_simples_tables(DEFAULT_RULESET_ID)
+        compiladas = get_tabelas_simples_compiladas(DEFAULT_RULESET_ID)
+        limite = compiladas.anexos["I"].limites[0]
+        rbt12 = np.array([50000.0, limite, np.nextafter(limite, np.inf), 900000.0, 2500000.0, 4800000.0, 6000000.0])
+        for anexo in ("I", "III", "V", "III/V"):
+            fator = 0.3 if anexo == "III/V" else None
+            vetor = das_simples(compiladas, anexo, rbt12 / 12, rbt12, np.nan if fator is None else fator)
+            escalar = [imposto_simples_tabelado(r / 12, r, anexo, tabelas, fator_r=fator)[0] for r in rbt12]
+            self.assertEqual(vetor.tolist(), escalar)
+
+    def test_faixa_no_limite_pertence_a_faixa_inferior(self) -> None:
+        tabela = get_tabelas_simples_compiladas(DEFAULT_RULESET_ID).anexos["I"]
+        limite = tabela.limites[0]
+
+        self.assertEqual(faixa_por_rbt12(tabela, [limite, np.nextafter(limite, np.inf), 1e12]).tolist(), [0, 1, tabela.limites.size - 1])
+
+    def test_iii_v_sem_fator_e_anexo_desconhecido_viram_nan(self) -> None:
+        compiladas = get_tabelas_simples_compiladas(DEFAULT_RULESET_ID)
+
+        resultado = das_simples(compiladas, ["III/V", "IX", "III"], 1000.0, 100000.0)
+
+        self.assertTrue(np.isnan(resultado[0]))
+        self.assertTrue(np.isnan(resultado[1]))
+        self.assertFalse(np.isnan(resultado[2]))
+
+    def test_presumido_e_real_iguais_ao_escalar(self) -> None:
+        receitas = np.array([100000.0, 900000.0, 3000000.0])
+        vetor = imposto_lucro_presumido_vetorizado(receitas, 0.0065, 0.03, 0.32, 60000.0, 0.15, 0.10, 0.09)
+        escalar = [imposto_lucro_presumido(r, 0.0065, 0.03, 0.32, 60000.0, 0.15, 0.10, 0.09) for r in receitas]
+        self.assertEqual(vetor.tolist(), escalar)
+
+        despesas = np.array([np.nan, 2000000.0, np.nan])
+        percentual = np.array([np.nan, np.nan, 0.4])
+        vetor = imposto_lucro_real_vetorizado(receitas, receitas, 0.12, 0.15, 0.09, 0.0165, 0.076, despesas, percentual)
+        escalar = [
+            imposto_lucro_real_estimado_completo(
+                receita_anual=r,
+                receita_base_periodo=r,
+                margem_lucro=0.12,
+                irpj=0.15,
+                csll=0.09,
+                pis_nao_cumulativo=0.0165,
+                cofins_nao_cumulativo=0.076,
+                despesas_creditaveis=None if np.isnan(d) else d,
+                percentual_credito_estimado=None if np.isnan(p) else p,
+            )[0]
+            for r, d, p in zip(receitas, despesas, percentual)
+        ]
+        self.assertEqual(vetor.tolist(), escalar)
+
+
+if __name__ == "__main__":
+    unittest.main()
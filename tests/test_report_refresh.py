@@ -21,7 +21,7 @@ class ReportRefreshTests(unittest.TestCase):
         report_text = build_report_from_event(legacy_event)
 
         self.assertNotIn("=== AUDITORIA (BASE NORMATIVA & PREMISSAS) ===", report_text)
-        self.assertIn("Relatório gerado em: (não disponível — evento legado)", report_text)
+        self.assertIn("Relatorio gerado em: (nao disponivel — evento legado)", report_text)
         self.assertIn("Regime atual: Lucro Presumido", report_text)
         self.assertNotIn("Detalhes do regime: {", report_text)
         self.assertNotIn("'regime_code':", report_text)
@@ -52,7 +52,7 @@ class ReportRefreshTests(unittest.TestCase):
 
         texto = refreshed.get("relatorio_texto", "")
         self.assertIn("=== AUDITORIA (BASE NORMATIVA & PREMISSAS) ===", texto)
-        self.assertIn("Relatório gerado em:", texto)
+        self.assertIn("Relatorio gerado em:", texto)
         self.assertNotIn("(não disponível — evento legado)", texto)
         self.assertIn("Origem do evento: legado/manual (migração).", texto)
         self.assertIn("partilha indisponível (evento legado)", texto)
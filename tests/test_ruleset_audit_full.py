@@ -4,7 +4,7 @@ import unittest
 from unittest.mock import patch
 
 from ruleset_loader import DEFAULT_RULESET_ID, get_baseline_simples_tables
-from tools.ruleset_audit import audit_ruleset, write_audit_report
+from tools.ruleset_audit import audit_ruleset, clear_integrity_cache, get_integrity_summary, write_audit_report
 
 
 class RulesetAuditFullTests(unittest.TestCase):
@@ -37,6 +37,18 @@ class RulesetAuditFullTests(unittest.TestCase):
         self.assertIn("RULESET AUDIT REPORT (FULL)", txt)
         self.assertIn("Overall: PASS", txt)
 
+    def test_integrity_summary_memoizado_por_ruleset(self) -> None:
+        clear_integrity_cache()
+        primeiro = get_integrity_summary(DEFAULT_RULESET_ID)
+        with patch("tools.ruleset_audit.audit_ruleset") as audit_mock:
+            segundo = get_integrity_summary(DEFAULT_RULESET_ID)
+        audit_mock.assert_not_called()
+        self.assertEqual(primeiro, segundo)
+        self.assertEqual(segundo.get("status"), "PASS")
+
+        segundo["checked_files"].append("mutado.json")
+        self.assertNotIn("mutado.json", get_integrity_summary(DEFAULT_RULESET_ID)["checked_files"])
+
 
 if __name__ == "__main__":
     unittest.main()
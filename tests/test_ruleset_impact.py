@@ -0,0 +1,117 @@
+import tempfile
+import unittest
+from copy import deepcopy
+from unittest.mock import patch
+
+import ruleset_loader
+from benchmarks.portfolio import gerar_portfolio
+from company_profile import normalize_company_profile
+from history_store import append_event
+from recommendation_engine import recommend_conservative
+from regime_comparator import compare_regimes
+from ruleset_impact import analisar_impacto, analisar_impacto_historico, avaliar_ruleset, montar_lote
+from ruleset_loader import DEFAULT_RULESET_ID
+from tax_engine import DiagnosticService
+
+NOVO = "TESTE_NOVO"
+
+
+def _carregador(nome: str, alterar=None):
+    original = getattr(ruleset_loader, nome)
+
+    def carregar(ruleset_id: str):
+        payload = original(DEFAULT_RULESET_ID)
+        if ruleset_id == NOVO and alterar is not None:
+            payload = deepcopy(payload)
+            alterar(payload)
+        return payload
+
+    return carregar
+
+
+def _ruleset_novo():
+    def presumido(p):
+        p["percentual_presuncao"]["Servicos (geral)"] = 0.40
+
+    def elegibilidade(e):
+        e["simples"]["rbt12_max"] = 1_000_000
+
+    return [
+        patch("tax_engine.get_simples_tables", side_effect=_carregador("get_simples_tables")),
+        patch("tax_engine.get_real_params", side_effect=_carregador("get_real_params")),
+        patch("tax_engine.get_presumido_params", side_effect=_carregador("get_presumido_params", presumido)),
+        patch("tax_engine.get_eligibility_rules", side_effect=_carregador("get_eligibility_rules", elegibilidade)),
+        patch("tax_engine.get_regime_catalog", side_effect=_carregador("get_regime_catalog")),
+    ]
+
+
+class RulesetImpactTests(unittest.TestCase):
+    def test_lote_bate_com_comparativo_recomendacao_e_service(self) -> None:
+        inputs = gerar_portfolio(80, seed=5)
+        lote, descartados = montar_lote(inputs)
+        avaliado = avaliar_ruleset(lote, DEFAULT_RULESET_ID)
+        service = DiagnosticService()
+
+        self.assertEqual(descartados, 0)
+        for idx, inp in enumerate(inputs):
+            profile = normalize_company_profile(inp)
+            comparativo = compare_regimes(profile, profile.ruleset_id)
+            for col, row in enumerate(comparativo["rows"]):
+                if row["imposto_total"] is not None:
+                    self.assertEqual(avaliado["impostos"][idx, col], row["imposto_total"])
+                self.assertEqual(("OK", "WARNING", "BLOCKED")[avaliado["status"][idx, col]], row["eligibility_status"])
+            recomendado = recommend_conservative(profile, comparativo).get("regime_recomendado")
+            codigo = int(avaliado["recomendacao"][idx])
+            self.assertEqual(("SIMPLES", "PRESUMIDO", "REAL")[codigo] if codigo >= 0 else None, recomendado)
+            try:
+                esperado = service.run(inp).imposto_atual
+            except ValueError:
+                continue
+            self.assertEqual(avaliado["imposto_atual"][idx], esperado)
+
+    def test_mesmo_ruleset_sem_impacto(self) -> None:
+        relatorio = analisar_impacto(gerar_portfolio(50, seed=1), DEFAULT_RULESET_ID, DEFAULT_RULESET_ID)
+
+        self.assertEqual(relatorio["delta_imposto"]["sem_mudanca"], relatorio["delta_imposto"]["n"])
+        self.assertEqual(relatorio["recomendacao_viradas"], {})
+        self.assertEqual(relatorio["elegibilidade_mudancas_total"], 0)
+
+    def test_novo_ruleset_gera_deltas_viradas_e_elegibilidade(self) -> None:
+        inputs = gerar_portfolio(300, seed=9)
+        patches = _ruleset_novo()
+        for p in patches:
+            p.start()
+        self.addCleanup(lambda: [p.stop() for p in patches])
+
+        relatorio = analisar_impacto(inputs, DEFAULT_RULESET_ID, NOVO)
+
+        self.assertGreater(relatorio["delta_imposto"]["aumentos"], 0)
+        self.assertEqual(relatorio["delta_imposto"]["reducoes"], 0)
+        self.assertGreater(relatorio["elegibilidade_mudancas"]["SIMPLES"].get("OK->BLOCKED", 0), 0)
+        self.assertEqual(relatorio["elegibilidade_mudancas"]["PRESUMIDO"], {})
+        self.assertGreater(relatorio["recomendacao_viradas_total"], 0)
+        self.assertEqual({chave.split("->")[0] for chave in relatorio["recomendacao_viradas"]}, {"SIMPLES", "PRESUMIDO"})
+
+    def test_historico_reconstroi_inputs(self) -> None:
+        service = DiagnosticService()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for inp in gerar_portfolio(20, seed=3):
+                try:
+                    append_event(service.run(inp).to_event(), pasta=tmp_dir)
+                except ValueError:
+                    continue
+
+            relatorio = analisar_impacto_historico(DEFAULT_RULESET_ID, DEFAULT_RULESET_ID, pasta=tmp_dir)
+
+        self.assertGreater(relatorio["eventos"], 0)
+        self.assertEqual(relatorio["delta_imposto"]["quantis"]["p50"], 0.0)
+
+    def test_lote_vazio(self) -> None:
+        relatorio = analisar_impacto([], DEFAULT_RULESET_ID, DEFAULT_RULESET_ID)
+
+        self.assertEqual(relatorio["eventos"], 0)
+        self.assertEqual(relatorio["delta_imposto"], {"n": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import math
+import unittest
+
+import numpy as np
+
+from dto import DiagnosticInput
+from scenario_engine import aliquotas_varredura, avaliar_cenarios, avaliar_outputs
+from tax_engine import DiagnosticService
+
+
+def _input(nome: str, receita: float, cenarios=None) -> DiagnosticInput:
+    return DiagnosticInput(
+        nome_empresa=nome,
+        receita_anual=receita,
+        regime="Lucro Presumido",
+        regime_code="PRESUMIDO",
+        regime_model="padrao",
+        tipo_atividade="Servicos",
+        cenarios=cenarios,
+    )
+
+
+class ScenarioEngineTests(unittest.TestCase):
+    def test_varredura_padrao_18_a_32_em_decimos(self) -> None:
+        aliquotas = aliquotas_varredura()
+
+        self.assertEqual(aliquotas.size, 141)
+        self.assertEqual(aliquotas[0], 0.18)
+        self.assertEqual(aliquotas[-1], 0.32)
+        self.assertEqual(aliquotas[25], 0.205)
+        with self.assertRaises(ValueError):
+            aliquotas_varredura(0.3, 0.2)
+
+    def test_grade_coincide_com_loop_do_service(self) -> None:
+        cenarios = {"Otimista (23%)": 0.23, "Base (25%)": 0.25, "Pessimista (27%)": 0.27}
+        service = DiagnosticService()
+        outputs = [service.run(_input(f"Empresa {i}", receita, cenarios)) for i, receita in enumerate((150000.0, 900000.0, 3500000.0))]
+
+        grid = avaliar_outputs(outputs, list(cenarios.values()), list(cenarios))
+
+        self.assertEqual(grid.shape, (3, 3))
+        for idx, out in enumerate(outputs):
+            self.assertEqual(grid.scenario_results(idx), out.resultados)
+
+    def test_classificacao_por_faixa_e_contagem(self) -> None:
+        grid = avaliar_cenarios([100.0, 100.0, 100.0], [0.0, 10.0, 20.0], [0.06, 0.16], nomes_cenario=["A", "B"])
+
+        self.assertEqual(grid.classificacao(0, 0), "Impacto moderado")
+        self.assertEqual(grid.classificacao(1, 0), "Baixo impacto")
+        self.assertEqual(grid.classificacao(0, 1), "Alto impacto")
+        self.assertEqual(grid.contagem_por_classe().tolist(), [[2, 1, 0], [1, 1, 1]])
+        self.assertEqual(grid.to_dicts(2, [1])[0]["nome_cenario"], "B")
+
+    def test_nan_segue_semantica_escalar(self) -> None:
+        grid = avaliar_cenarios([100.0], [math.nan], [0.2])
+
+        self.assertTrue(np.isnan(grid.impacto_percentual[0, 0]))
+        self.assertEqual(grid.classificacao(0, 0), "Alto impacto")
+
+    def test_entradas_invalidas(self) -> None:
+        with self.assertRaises(ValueError):
+            avaliar_cenarios([100.0, 0.0], [1.0, 1.0], [0.2])
+        with self.assertRaises(ValueError):
+            avaliar_cenarios([100.0], [1.0, 2.0], [0.2])
+        with self.assertRaises(ValueError):
+            avaliar_cenarios([100.0], [1.0], [0.2, 0.3], nomes_cenario=["A"])
+
+
+if __name__ == "__main__":
+    unittest.main()
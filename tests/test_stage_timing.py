@@ -0,0 +1,74 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from dto import DiagnosticInput
+from stage_timing import StageHistogram, get_timing_aggregator, stage
+from tax_engine import DiagnosticService
+
+
+def _input_simples() -> DiagnosticInput:
+    return DiagnosticInput(
+        nome_empresa="Empresa Timing",
+        receita_anual=600000.0,
+        regime="Simples Nacional",
+        regime_code="SIMPLES",
+        regime_model="tabelado",
+        rbt12=600000.0,
+        receita_base_periodo=600000.0,
+        anexo_simples="I",
+        competencia="2026",
+    )
+
+
+class StageTimingTests(unittest.TestCase):
+    def test_desligado_nao_gera_timings(self) -> None:
+        with patch.dict(os.environ, {}, clear=True):
+            out = DiagnosticService().run(_input_simples())
+            self.assertIs(stage("qualquer"), stage("outro"))
+
+        self.assertIsNone(out.stage_timings)
+        self.assertNotIn("stage_timings", out.to_event())
+
+    def test_ligado_registra_estagios_e_agrega(self) -> None:
+        aggregator = get_timing_aggregator()
+        aggregator.reset()
+        with patch.dict(os.environ, {"TDE_TIMING": "1"}, clear=False):
+            service = DiagnosticService()
+            out = service.run(_input_simples())
+            service.run(_input_simples())
+
+        timings = out.stage_timings or {}
+        for esperado in (
+            "profile",
+            "imposto_atual",
+            "compare_regimes",
+            "recommendation",
+            "audit_metadata",
+            "audit_metadata.integrity",
+            "scenarios",
+            "report.executivo",
+            "report.auditoria",
+        ):
+            self.assertIn(esperado, timings)
+            self.assertGreaterEqual(timings[esperado], 0.0)
+        self.assertNotIn("stage_timings", out.to_event())
+
+        summary = aggregator.summary()
+        self.assertEqual(summary["compare_regimes"]["count"], 2)
+        self.assertLessEqual(summary["compare_regimes"]["p50_ms"], summary["compare_regimes"]["p99_ms"])
+        aggregator.reset()
+
+    def test_histograma_percentis_aproximados(self) -> None:
+        hist = StageHistogram()
+        for valor in range(1, 101):
+            hist.add(float(valor))
+
+        self.assertEqual(hist.count, 100)
+        self.assertAlmostEqual(hist.percentile(0.50), 50.0, delta=50.0 * 0.13)
+        self.assertAlmostEqual(hist.percentile(0.99), 99.0, delta=99.0 * 0.13)
+        self.assertEqual(hist.percentile(1.0), 100.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from history_export import DEFAULT_EXPORT_DIR, EXPORT_FORMATS, export_history
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Exporta o historico em colunas (Parquet/Arrow/NPZ), incremental por watermark.")
+    parser.add_argument("--pasta", default="data")
+    parser.add_argument("--arquivo", default="history.jsonl")
+    parser.add_argument("--output-dir", default=DEFAULT_EXPORT_DIR)
+    parser.add_argument("--format", dest="formato", choices=("auto",) + EXPORT_FORMATS, default="auto")
+    parser.add_argument("--full", action="store_true", help="Descarta partes anteriores e reexporta tudo.")
+    args = parser.parse_args()
+
+    try:
+        result = export_history(
+            pasta=args.pasta,
+            arquivo=args.arquivo,
+            output_dir=args.output_dir,
+            formato=args.formato,
+            full=args.full,
+        )
+    except ValueError as exc:
+        print(f"Erro na exportacao do historico: {exc}")
+        return 2
+
+    print(f"Formato: {result['formato']}")
+    print(f"Eventos exportados: {result['eventos']}")
+    if result["arquivo"]:
+        print(f"Parte gerada: {result['arquivo']}")
+    print(f"Watermark: {result['watermark']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
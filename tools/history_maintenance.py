@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from history_segments import CODEC_EXTENSIONS, compact_report_refreshes, list_segments, rotate_segments
+from history_store import BASE_DIR
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rotacao, compressao e compactacao do historico segmentado.")
+    parser.add_argument("--pasta", default="data")
+    parser.add_argument("--arquivo", default="history.jsonl")
+    parser.add_argument("--codec", choices=sorted(CODEC_EXTENSIONS), default=None)
+    parser.add_argument("--rotate", action="store_true", help="Comprime segmentos que nao sao mais o ativo (o append nao comprime).")
+    parser.add_argument("--compact", action="store_true", help="Incorpora eventos report_refresh aos originais.")
+    args = parser.parse_args()
+
+    diretorio = os.path.join(BASE_DIR, args.pasta)
+    try:
+        if args.rotate:
+            ativo = rotate_segments(diretorio, args.arquivo, codec=args.codec)
+            print(f"Segmento ativo: {ativo.name}")
+        if args.compact:
+            stats = compact_report_refreshes(diretorio, args.arquivo)
+            print(f"Refreshes incorporados: {stats['refreshes_incorporados']}")
+            print(f"Segmentos reescritos: {stats['segmentos_reescritos']}")
+    except ValueError as exc:
+        print(f"Erro na manutencao do historico: {exc}")
+        return 2
+
+    for segmento in list_segments(diretorio, args.arquivo):
+        tamanho = os.path.getsize(segmento.path)
+        print(f"- {os.path.basename(segmento.path)}: {tamanho} bytes ({segmento.codec or 'sem compressao'})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
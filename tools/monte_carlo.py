@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from dataclasses import fields
+from datetime import datetime
+from typing import Any, Dict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from dto import DiagnosticInput
+from history_export import _slug
+from monte_carlo import MONTE_CARLO_AMOSTRAS_PADRAO, distribuicao_de_texto, simular_regimes
+from profiling import add_profile_arguments, profile_from_args
+
+
+def _ler_entrada(caminho: str) -> DiagnosticInput:
+    with open(caminho, "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    if not isinstance(dados, dict):
+        raise ValueError(f"Entrada deve ser um objeto JSON com os campos do DiagnosticInput: {caminho}")
+    desconhecidos = sorted(set(dados) - {f.name for f in fields(DiagnosticInput)})
+    if desconhecidos:
+        raise ValueError(f"Campos desconhecidos na entrada: {', '.join(desconhecidos)}")
+    try:
+        return DiagnosticInput(**dados)
+    except TypeError as exc:
+        raise ValueError(f"Entrada incompleta: {exc}") from None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Monte Carlo do comparativo de regimes para uma empresa.")
+    parser.add_argument("--entrada", required=True, help="JSON com os campos do DiagnosticInput da empresa.")
+    parser.add_argument(
+        "--distribuicao",
+        action="append",
+        default=[],
+        help="variavel=tipo:p1[:p2[:p3]] (ex.: margem_lucro=triangular:0.05:0.12:0.25); repetivel.",
+    )
+    parser.add_argument("--amostras", type=int, default=MONTE_CARLO_AMOSTRAS_PADRAO)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output-dir", default="outputs")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        inp = _ler_entrada(args.entrada)
+        distribuicoes: Dict[str, Dict[str, Any]] = dict(distribuicao_de_texto(d) for d in args.distribuicao)
+        with profile_from_args("monte_carlo", args):
+            result = simular_regimes(inp, distribuicoes, n_amostras=args.amostras, seed=args.seed)
+    except (ValueError, FileNotFoundError) as exc:
+        print(f"Erro na simulacao Monte Carlo: {exc}")
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(args.output_dir, f"monte_carlo_{_slug(inp.nome_empresa)}_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"distribuicoes": distribuicoes, **result.to_dict()}, f, ensure_ascii=False, indent=2)
+
+    print(f"Simulacao gerada: {path}")
+    for regime in result.regimes_avaliados:
+        quantis = " ".join(f"{rotulo}={valor:,.2f}" for rotulo, valor in result.quantis[regime].items())
+        print(f"{regime}: P(menor)={result.probabilidade_menor[regime]:.1%} media={result.media[regime]:,.2f} {quantis}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
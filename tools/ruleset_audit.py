@@ -5,6 +5,7 @@ import hashlib
 import json
 import os
 import sys
+from copy import deepcopy
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Dict, List, Sequence
@@ -13,6 +14,7 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+from profiling import add_profile_arguments, profile_from_args
 from ruleset_loader import (
     DEFAULT_RULESET_ID,
     get_baseline_eligibility_rules,
@@ -58,6 +60,8 @@ CHECKED_FILES = (
     "thresholds.json",
 )
 
+_INTEGRITY_CACHE: Dict[str, Dict[str, Any]] = {}
+
 
 @dataclass(frozen=True)
 class CheckResult:
@@ -750,10 +754,18 @@ def audit_ruleset(ruleset_id: str = DEFAULT_RULESET_ID) -> Dict[str, Any]:
     }
 
 
-def get_integrity_summary(ruleset_id: str = DEFAULT_RULESET_ID) -> Dict[str, Any]:
-    """Resumo curto de integridade para anexar no audit metadata do diagnóstico."""
+def get_integrity_summary(ruleset_id: str = DEFAULT_RULESET_ID, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Resumo curto de integridade para anexar no audit metadata do diagnóstico.
+    Memoizado por processo, como os payloads do ruleset_loader que ele audita: os arquivos do
+    ruleset são lidos uma vez por processo, então alterar um ruleset em disco exige reiniciar o
+    processo (CLI/Streamlit); em testes, `clear_integrity_cache`.
+    """
+    if use_cache and ruleset_id in _INTEGRITY_CACHE:
+        return deepcopy(_INTEGRITY_CACHE[ruleset_id])
+
     result = audit_ruleset(ruleset_id)
-    return {
+    summary = {
         "status": result.get("overall_status"),
         "ruleset_hash": result.get("ruleset_hash_sha256"),
         "baseline_hash": result.get("baseline_hash_sha256"),
@@ -761,6 +773,12 @@ def get_integrity_summary(ruleset_id: str = DEFAULT_RULESET_ID) -> Dict[str, Any
         "difference_count": len(result.get("json_differences", [])),
         "warning_count": len(result.get("warnings", [])),
     }
+    _INTEGRITY_CACHE[ruleset_id] = summary
+    return deepcopy(summary)
+
+
+def clear_integrity_cache() -> None:
+    _INTEGRITY_CACHE.clear()
 
 
 def render_audit_report_text(result: Dict[str, Any]) -> str:
@@ -837,10 +855,12 @@ def main() -> int:
     parser = argparse.ArgumentParser(description="Audita integridade estrutural e paridade com baseline de um ruleset fiscal.")
     parser.add_argument("--ruleset-id", default=DEFAULT_RULESET_ID)
     parser.add_argument("--output-dir", default="outputs")
+    add_profile_arguments(parser)
     args = parser.parse_args()
 
     try:
-        result = audit_ruleset(args.ruleset_id)
+        with profile_from_args("ruleset_audit", args):
+            result = audit_ruleset(args.ruleset_id)
     except Exception as exc:  # noqa: BLE001
         print(f"Erro ao auditar ruleset '{args.ruleset_id}': {exc}")
         return 2
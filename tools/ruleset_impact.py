@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from profiling import add_profile_arguments, profile_from_args
+from ruleset_impact import analisar_impacto_historico
+from ruleset_loader import DEFAULT_RULESET_ID
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Mede o impacto de um novo ruleset sobre o historico antes de troca-lo como padrao.")
+    parser.add_argument("--ruleset-de", default=DEFAULT_RULESET_ID)
+    parser.add_argument("--ruleset-para", required=True)
+    parser.add_argument("--pasta", default="data")
+    parser.add_argument("--arquivo", default="history.jsonl")
+    parser.add_argument("--output-dir", default="outputs")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        with profile_from_args("ruleset_impact", args):
+            result = analisar_impacto_historico(args.ruleset_de, args.ruleset_para, pasta=args.pasta, arquivo=args.arquivo)
+    except (ValueError, FileNotFoundError) as exc:
+        print(f"Erro na analise de impacto: {exc}")
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(args.output_dir, f"ruleset_impact_{args.ruleset_de}_{args.ruleset_para}_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    delta = result["delta_imposto"]
+    print(f"Relatorio de impacto gerado: {path}")
+    print(f"Eventos avaliados: {result['eventos']} (descartados: {result['descartados']})")
+    if delta.get("n"):
+        print(f"Delta imposto: media={delta['media']:,.2f} p50={delta['quantis']['p50']:,.2f} aumentos={delta['aumentos']} reducoes={delta['reducoes']}")
+    print(f"Viradas de recomendacao: {result['recomendacao_viradas_total']}")
+    print(f"Mudancas de elegibilidade: {result['elegibilidade_mudancas_total']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())